@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Microbenchmark of the edge string eta reductions of the GSSHA head BC update.
+
+Compares the per-node Python loop formerly used in
+gssha_set_bc_from_adcirc_depths (one element access of eta1/eta2 per node plus
+separate max/min calls) against the NumPy gather used now, for a range of edge
+string sizes. Plain NumPy arrays stand in for the f2py eta1/eta2 arrays, whose
+element access is at least as expensive.
+
+Usage: python3 benchmarks/bench_eta_reductions.py [--np N] [--sizes N N ...]
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import time
+
+import numpy as np
+
+################################################################################
+def loop_reductions(eta1, eta2, nodes):
+    my_max_delta_eta = -1.0e+200
+    my_min_delta_eta =  1.0e+200
+    count=0.0
+    my_avg_delta_eta=0.0
+    my_eta_sum=0.0
+    for node in nodes:
+        eta     = eta2[node]
+        old_eta = eta1[node]
+        my_eta_sum       += eta
+        my_avg_delta_eta += eta - old_eta
+        my_max_delta_eta = max(my_max_delta_eta, eta-old_eta)
+        my_min_delta_eta = min(my_min_delta_eta, eta-old_eta)
+        count += 1.0
+    return my_eta_sum, my_avg_delta_eta, my_max_delta_eta, my_min_delta_eta, count
+
+#------------------------------------------------------------------------------#
+def numpy_reductions(eta1, eta2, nodes):
+    eta     = np.asarray(eta2)[nodes]
+    old_eta = np.asarray(eta1)[nodes]
+    delta_eta = eta - old_eta
+    return float(eta.sum()), float(delta_eta.sum()), float(delta_eta.max()), \
+            float(delta_eta.min()), float(delta_eta.size)
+
+#------------------------------------------------------------------------------#
+def time_per_call(func, args, mintime=0.2):
+    ncalls = 0
+    t0 = time.time()
+    while True:
+        func(*args)
+        ncalls += 1
+        elapsed = time.time()-t0
+        if elapsed > mintime:
+            return elapsed/ncalls
+
+################################################################################
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--np', type=int, default=1000000,
+            help='Number of mesh nodes')
+    parser.add_argument('--sizes', type=int, nargs='+',
+            default=[10, 100, 1000, 10000, 100000],
+            help='Edge string sizes (number of nodes)')
+    args = parser.parse_args()
+
+    eta1 = np.random.rand(args.np)
+    eta2 = np.random.rand(args.np)
+
+    print("{0:>10s} {1:>16s} {2:>16s} {3:>10s}".format(
+        'nodes', 'loop [ms]', 'numpy [ms]', 'speedup'))
+    for size in args.sizes:
+        nodes = np.sort(np.random.choice(args.np, size, replace=False)).astype(np.int32)
+        assert np.allclose(loop_reductions(eta1, eta2, nodes),
+                           numpy_reductions(eta1, eta2, nodes))
+        tloop  = time_per_call(loop_reductions,  (eta1, eta2, nodes))
+        tnumpy = time_per_call(numpy_reductions, (eta1, eta2, nodes))
+        print("{0:10d} {1:16.6f} {2:16.6f} {3:10.1f}".format(
+            size, 1000.0*tloop, 1000.0*tnumpy, tloop/tnumpy))
+
+################################################################################
+if __name__ == '__main__':
+    main()
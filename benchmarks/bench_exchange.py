@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Error against coupling window length of the linear and pchip exchanges.
+
+A synthetic flood hydrograph (a gamma-shaped peak on a tidal head) is sampled
+at the end of every coupling window, as the coupler samples GSSHA's outlet
+discharge and ADCIRC's edge string depths. Each window's boundary series is
+then rebuilt from the samples the way the coupler does, and compared with the
+hydrograph on a fine grid, as the models read it, linearly in between points:
+ - interpolated: the window ends at its own sample (gdA, Adg, the second
+   model of gdAdg/AdgdA). linear draws a straight line from the previous
+   sample; pchip puts points across the window on the monotone cubic
+   through the last samples.
+ - extrapolated: the series runs one window ahead of the newest sample (the
+   first model of gdAdg/AdgdA, A|g). linear ends the window at the newest
+   sample; pchip continues the cubic along its end slope.
+For every window length, the table shows the RMS and maximum errors, relative
+to the hydrograph's range, and the longest window at which pchip is as
+accurate as linear is at that window length.
+
+Usage: python3 benchmarks/bench_exchange.py [--windows S S ...] [--history N]
+                                            [--points N] [--peak S]
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from watercoupler.coupler.exchange_interpolation import exchangehistory
+
+TIDE = 12.42*3600.0 # M2 period, s
+
+################################################################################
+def hydrograph(t, peak):
+    '''Gamma-shaped flood peaking at peak s, on a tide.'''
+    s = np.maximum(t, 0.0)/peak
+    return 1.0 + 50.0*s**4*np.exp(4.0*(1.0 - s)) + 0.5*np.sin(2.0*np.pi*t/TIDE)
+
+#------------------------------------------------------------------------------#
+def rebuild(window, duration, peak, mode, ahead, history, points):
+    '''Boundary series (times, values) rebuilt window by window.'''
+    samples = exchangehistory(history)
+    times, values = [0.0], [hydrograph(0.0, peak)]
+    samples.append(0.0, values[0])
+    for tend in np.arange(window, duration + 0.5*window, window):
+        # The newest sample: this window's end, or the last one's if ahead.
+        tsample = tend - window if ahead else tend
+        if tsample > 0.0:
+            samples.append(tsample, hydrograph(tsample, peak))
+        if mode == 'linear':
+            subtimes = np.array([tend])
+            subvalues = samples.newest()
+        else:
+            subtimes = tend - window + window*np.arange(1, points+1)/float(points)
+            subvalues = samples.evaluate(subtimes)[:, 0]
+        times.extend(subtimes)
+        values.extend(np.broadcast_to(subvalues, subtimes.shape))
+    return np.array(times), np.array(values)
+
+#------------------------------------------------------------------------------#
+def errors(window, duration, peak, mode, ahead, history, points):
+    times, values = rebuild(window, duration, peak, mode, ahead, history, points)
+    fine = np.linspace(0.0, times[-1], 20001)
+    truth = hydrograph(fine, peak)
+    error = np.abs(np.interp(fine, times, values) - truth)/(truth.max() - truth.min())
+    return np.sqrt(np.mean(error**2)), error.max()
+
+#------------------------------------------------------------------------------#
+def equal_error_window(windows, errs, target):
+    '''Longest window at which errs, log-log interpolated, is within target.'''
+    logw, loge = np.log(windows), np.log(errs)
+    if errs[0] > target:
+        return float('nan')
+    for i in range(1, len(windows)):
+        if errs[i] > target:
+            f = (np.log(target) - loge[i-1])/(loge[i] - loge[i-1])
+            return float(np.exp(logw[i-1] + f*(logw[i] - logw[i-1])))
+    return float(windows[-1])
+
+################################################################################
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--windows', type=float, nargs='+',
+            default=[300.0, 600.0, 1200.0, 2400.0, 4800.0, 9600.0, 19200.0],
+            help='Coupling window lengths [s]')
+    parser.add_argument('--history', type=int, default=4,
+            help='pchip samples (WATERCOUPLER_EXCHANGE_HISTORY)')
+    parser.add_argument('--points', type=int, default=4,
+            help='pchip points per window (WATERCOUPLER_EXCHANGE_POINTS)')
+    parser.add_argument('--peak', type=float, default=6.0*3600.0,
+            help='Time to the flood peak [s]')
+    args = parser.parse_args()
+
+    windows = np.array(sorted(args.windows))
+    duration = 6.0*args.peak
+    for ahead in [False, True]:
+        print("\n{0}".format('extrapolated (series one window ahead)' if ahead else 'interpolated'))
+        print("{0:>10s} {1:>12s} {2:>12s} {3:>12s} {4:>12s} {5:>14s}".format(
+            'window [s]', 'linear rms', 'pchip rms', 'linear max', 'pchip max', 'pchip window'))
+        linear = np.array([errors(w, duration, args.peak, 'linear', ahead, args.history, args.points)
+                           for w in windows])
+        pchip = np.array([errors(w, duration, args.peak, 'pchip', ahead, args.history, args.points)
+                          for w in windows])
+        for i, w in enumerate(windows):
+            equal = equal_error_window(windows, pchip[:, 0], linear[i, 0])
+            print("{0:10.0f} {1:12.3e} {2:12.3e} {3:12.3e} {4:12.3e} {5:9.0f} ({6:.1f}x)".format(
+                w, linear[i, 0], pchip[i, 0], linear[i, 1], pchip[i, 1], equal, equal/w))
+
+################################################################################
+if __name__ == '__main__':
+    main()
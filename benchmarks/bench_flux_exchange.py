@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Benchmark of one ADCIRC flux BC exchange: fort.20 round-trip vs in-memory.
+
+The file exchange mode of adcirc_set_bc_from_gssha_hydrograph closes unit 20,
+rewrites the fort.20 replacement twice with per-line formatting, and reopens
+it. The memory exchange mode only assigns qnin/qtime in place. This script
+reproduces both on plain NumPy arrays, so that it runs without ADCIRC, and
+reports the time per exchange.
+
+Usage: python3 benchmarks/bench_flux_exchange.py [--nvel N] [--nnodes N]
+                                                 [--exchanges N] [--dir PATH]
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+################################################################################
+def file_exchange(pathname, qnin1, qnin2, enin2, lbcodei, start, nnodes, value):
+    # Stands in for pu.pycloseopenedfileforread(20)/pg.pyopenfileforread(20,..)
+    readfile = open(pathname, 'r')
+    readfile.close()
+    qnin1[:] = qnin2
+    qnin2[start:start+nnodes] = value
+    with open(pathname, 'w') as fort20file:
+        for dumm in range(2):
+            for i in range(len(lbcodei)):
+                if lbcodei[i] in [2, 12, 22]:
+                    [fort20file.write('{0:10f}\n'.format(qnin2[i]))]
+                if lbcodei[i] == 32:
+                    [fort20file.write('{0:10f}  {1:10f}\n'.format(qnin2[i],enin2[i]))]
+    readfile = open(pathname, 'r')
+    readfile.close()
+
+#------------------------------------------------------------------------------#
+def memory_exchange(pathname, qnin1, qnin2, enin2, lbcodei, start, nnodes, value):
+    qnin1[:] = qnin2
+    qnin2[start:start+nnodes] = value
+
+################################################################################
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--nvel', type=int, default=20000,
+            help='Total number of flux boundary nodes (NVEL)')
+    parser.add_argument('--nnodes', type=int, default=2000,
+            help='Number of nodes on the coupled edge string')
+    parser.add_argument('--exchanges', type=int, default=50,
+            help='Number of exchanges to time')
+    parser.add_argument('--dir', default=None,
+            help='Directory for the fort.20 replacement (e.g. a shared filesystem)')
+    args = parser.parse_args()
+
+    lbcodei = np.full(args.nvel, 22, dtype=np.int32)
+    qnin1   = np.zeros(args.nvel)
+    qnin2   = np.zeros(args.nvel)
+    enin2   = np.zeros(args.nvel)
+
+    workdir = tempfile.mkdtemp(dir=args.dir)
+    pathname = os.path.join(workdir, 'fort.20.new.bench')
+    open(pathname, 'w').close()
+
+    try:
+        results = {}
+        for name, func in [('file', file_exchange), ('memory', memory_exchange)]:
+            t0 = time.time()
+            for k in range(args.exchanges):
+                func(pathname, qnin1, qnin2, enin2, lbcodei, 0, args.nnodes, float(k))
+            results[name] = (time.time()-t0)/args.exchanges
+    finally:
+        shutil.rmtree(workdir)
+
+    print("NVEL = {0}, edge string nodes = {1}, exchanges = {2}".format(
+        args.nvel, args.nnodes, args.exchanges))
+    print("file   exchange: {0:12.6f} ms/exchange".format(1000.0*results['file']))
+    print("memory exchange: {0:12.6f} ms/exchange".format(1000.0*results['memory']))
+    print("saved          : {0:12.6f} ms/exchange ({1:.1f}x)".format(
+        1000.0*(results['file']-results['memory']),
+        results['file']/max(results['memory'], 1.0e-12)))
+
+################################################################################
+if __name__ == '__main__':
+    main()
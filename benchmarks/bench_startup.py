@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Benchmark of watercoupler's startup: --help, --version and a bad command line.
+
+NumPy, the coupler and the model libraries are only imported once the command
+line is known to be good, so these should cost little more than starting the
+interpreter. This script times each of them, and the interpreter alone, in
+fresh processes, reports the import time of watercoupler.main from
+python -X importtime, and fails if importing it loads any of the heavy
+modules.
+
+Usage: python3 benchmarks/bench_startup.py [--repeat N]
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+################################################################################
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ['numpy', 'pyADCIRC', 'gsshapython', 'watercoupler.coupler.adcircgsshastruct']
+COMMANDS = [('interpreter', ['-c', 'pass']),
+            ('--version',   ['-m', 'watercoupler', '--version']),
+            ('--help',      ['-m', 'watercoupler', '--help']),
+            ('bad type',    ['-m', 'watercoupler', '1', 'gDA', 'x.prj', 'fort'])]
+
+#------------------------------------------------------------------------------#
+def _environ():
+    environ = dict(os.environ)
+    environ['PYTHONPATH'] = os.pathsep.join([ROOT, environ.get('PYTHONPATH', '')])
+    return environ
+
+#------------------------------------------------------------------------------#
+def time_command(args, repeat):
+    '''Wall times of repeat runs of python with args, in seconds.'''
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for k in range(repeat):
+            t0 = time.time()
+            subprocess.call([sys.executable]+args, stdout=devnull, stderr=devnull, env=_environ())
+            times.append(time.time()-t0)
+    return sorted(times)
+
+#------------------------------------------------------------------------------#
+def import_time():
+    '''Cumulative import time of watercoupler.main in seconds, from -X importtime.'''
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', 'import watercoupler.main'],
+        stderr=subprocess.STDOUT, env=_environ()).decode()
+    for line in output.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == 'watercoupler':
+            return int(fields[1])*1.0e-6
+    return float('nan')
+
+#------------------------------------------------------------------------------#
+def heavy_imports():
+    '''Heavy modules that importing watercoupler.main loads.'''
+    output = subprocess.check_output(
+        [sys.executable, '-c', 'import sys, watercoupler.main; '
+         'print(" ".join(sorted(sys.modules)))'], env=_environ()).decode()
+    modules = output.split()
+    return [name for name in HEAVY if name in modules]
+
+################################################################################
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=10,
+            help='Number of runs of every command')
+    args = parser.parse_args()
+
+    print("{0:12s} {1:>10s} {2:>10s}".format('command', 'min ms', 'median ms'))
+    for name, command in COMMANDS:
+        times = time_command(command, args.repeat)
+        print("{0:12s} {1:10.1f} {2:10.1f}".format(
+            name, 1000.0*times[0], 1000.0*times[len(times)//2]))
+    print("import watercoupler.main: {0:.1f} ms".format(1000.0*import_time()))
+
+    heavy = heavy_imports()
+    if heavy:
+        print("Importing watercoupler.main loads: "+', '.join(heavy))
+        return 1
+    return 0
+
+################################################################################
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,11 +8,16 @@ with open('README.md') as f:
 with open('LICENSE') as f:
     license = f.read()
 
-watercoupler_cmds = ['watercoupler = watercoupler.__main__:main']
+version = {}
+with open(os.path.join('watercoupler', 'watercoupler_version.py')) as f:
+    exec(f.read(), version)
+
+watercoupler_cmds = ['watercoupler = watercoupler.__main__:main',
+                     'watercoupler-ensemble = watercoupler.ensemble:main']
 
 setup(
     name='watercoupler',
-    version='0.2.0',
+    version=version['__version__'],
     description='Program for coupling hydrodynamic and hydrologic software',
     keywords='Coupling, hydrologic, hydrodynamic, ADCIRC, GSSHA',
     long_description=readme,
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Regression tests of watercoupler, run on the synthetic backend, so that they
+need neither pyADCIRC nor gsshapython: python -m unittest tests (make test).
+"""
+from __future__ import absolute_import, print_function
+import os
+
+#------------------------------------------------------------------------------#
+def load_tests(loader, tests, pattern):
+    '''Collect the test_*.py modules of this package for python -m unittest tests.'''
+    here = os.path.dirname(os.path.abspath(__file__))
+    tests.addTests(loader.discover(start_dir=here, pattern=pattern or 'test*.py',
+                                   top_level_dir=os.path.dirname(here)))
+    return tests
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import os
+import shutil
+import tempfile
+import unittest
+import ctypes as ct
+import logging
+
+try:
+    from unittest import mock
+except ImportError: # Python 2
+    import mock
+
+import numpy as np
+
+from watercoupler.coupler.adcircgsshastruct import adcircgsshastruct
+
+################################################################################
+# A small model: one day in 18 coupling windows of 480 time steps of 10 s.
+OPTIONS = {'nodes' : 400, 'edgenodes' : 20, 'gsshacells' : 200,
+           'dt' : 10.0, 'gsshadt' : 30.0, 'rnday' : 1.0}
+EDGESTRINGS = '1'
+
+################################################################################
+def run(couplingtype, options=None, environ=None, edgestrings=EDGESTRINGS, replay=None,
+        replayed=None, restartdir=None, dryrun=False):
+    '''Run couplingtype on the synthetic backend, in the current directory,
+    with OPTIONS updated by options, coupled to edgestrings, and with environ
+    as the only WATERCOUPLER_* variables set; with the replayed model played
+    back from the recording replay, and restarted from the coupler
+    checkpoints in restartdir, if given.
+
+    Returns a dict of the end state: GSSHA's timer (min), vout and qout, and
+    ADCIRC's final time (s), eta2 and qnin2, with the flux exchange and
+    one-way modes the run ended up in, and the ends of all coupling windows,
+    (ADCIRC time, GSSHA time), both in s; with dryrun, the timeline of the
+    coupling schedule instead of running the models.
+    '''
+    opts = dict(OPTIONS)
+    opts.update(options or {})
+    env = dict((name, value) for name, value in os.environ.items()
+               if not name.startswith('WATERCOUPLER_'))
+    env.update(environ or {})
+    args = [b'watercoupler', edgestrings.encode(), couplingtype.encode(), b'synthetic.prj', b'fort']
+    argc = ct.c_int(len(args))
+    argv = (ct.c_char_p*len(args))(*args)
+
+    with mock.patch.dict(os.environ, env, clear=True):
+        ags = adcircgsshastruct('synthetic', opts, replay, replayed)
+        ags.restartdir = restartdir
+        ags.coupler_initialize(couplingtype, argc, argv)
+        if dryrun:
+            result = {'timeline' : ags.schedule.timeline()}
+        else:
+            windows = []
+            end_window = ags.timers.end_window
+            def record_window():
+                windows.append((ags.adcirctprev, ags.gsshamv.timer*ags.gsshatimefact))
+                end_window()
+            ags.timers.end_window = record_window
+            ags.coupler_run()
+            result = {'timer'  : float(ags.gsshamv.timer),
+                      'vout'   : float(ags.gsshamv.vout),
+                      'qout'   : float(ags.gsshamv.qout),
+                      'tprev'  : float(ags.adcirctprev),
+                      'eta2'   : np.array(ags.pg.eta2, dtype=np.float64),
+                      'qnin2'  : np.array(ags.pg.qnin2, dtype=np.float64),
+                      'fluxexchange' : ags.adcircfluxexchange,
+                      'onewaymode'   : ags.onewaymode,
+                      'windows' : windows[1:]} # Window 0: the initial BCs
+        ags.coupler_finalize()
+    return result
+
+################################################################################
+class synthetictestcase(unittest.TestCase):
+    '''Runs every test in a temporary directory of its own, where the
+    synthetic models write their fort.* files, with quiet logging.'''
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp(prefix='watercoupler_test_')
+        os.chdir(self.tmpdir)
+        logging.disable(logging.WARNING)
+
+    #--------------------------------------------------------------------------#
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    #--------------------------------------------------------------------------#
+    def assertSameRun(self, result, expected):
+        '''The two runs end at the same times, in the same state, bit for bit.'''
+        for name in ['timer', 'vout', 'qout', 'tprev']:
+            self.assertEqual(result[name], expected[name], name)
+        np.testing.assert_array_equal(result['eta2'], expected['eta2'])
+
+################################################################################
+if __name__ == '__main__':
+    pass
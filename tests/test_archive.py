@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Coupling archives against replays of them and against the dry-run schedule.
+"""
+from __future__ import absolute_import, print_function
+import unittest
+
+import numpy as np
+
+from watercoupler.coupler.coupler_archive import couplerrecording, WINDOW_FIELDS, EDGESTRING_FIELDS
+from watercoupler.coupler.coupler_backend import REPLAY_ADCIRC, REPLAY_GSSHA
+
+from .synthetic_run import run, synthetictestcase
+
+################################################################################
+class replaytest(synthetictestcase):
+    def test_replay_reproduces_archive(self):
+        '''A replay exchanges what the recorded run did, window by window.'''
+        for couplingtype, replayed in [('gdA', REPLAY_GSSHA), ('Adg', REPLAY_ADCIRC)]:
+            with self.subTest(couplingtype=couplingtype):
+                recorded = run(couplingtype, environ={'WATERCOUPLER_ARCHIVE' : 'recorded.npz'})
+                recording = couplerrecording('recorded.npz')
+                replay = run(couplingtype, environ={'WATERCOUPLER_ARCHIVE' : 'replayed.npz'},
+                             replay=recording, replayed=replayed)
+                rerecording = couplerrecording('replayed.npz')
+
+                self.assertEqual(rerecording.meta, recording.meta)
+                self.assertEqual(len(rerecording), len(recording))
+                for field in WINDOW_FIELDS + EDGESTRING_FIELDS:
+                    np.testing.assert_array_equal(rerecording.windows[field], recording.windows[field],
+                                                  err_msg=field)
+                self.assertEqual(replay['vout'], recorded['vout'])
+                self.assertEqual(replay['timer'], recorded['timer'])
+                if replayed == REPLAY_GSSHA: # ADCIRC ran again
+                    np.testing.assert_array_equal(replay['eta2'], recorded['eta2'])
+
+################################################################################
+class archivetest(synthetictestcase):
+    def test_windows_match_timeline(self):
+        '''The archived windows end where the dry-run ones do.'''
+        for couplingtype in ['gdA', 'Adg', 'AdgdA', 'gdAdg', 'A|g']:
+            with self.subTest(couplingtype=couplingtype):
+                timeline = run(couplingtype, dryrun=True)['timeline']
+                run(couplingtype, environ={'WATERCOUPLER_ARCHIVE' : 'run.npz'})
+                windows = couplerrecording('run.npz').windows
+
+                # Window 0 of the archive holds the initial BCs.
+                self.assertEqual(len(timeline), len(windows['window']) - 1)
+                np.testing.assert_allclose([w['adcirc_end'] for w in timeline],
+                                           windows['adcirctprev'][1:], rtol=0.0, atol=1.0E-6)
+                np.testing.assert_allclose([w['gssha_end'] for w in timeline],
+                                           windows['gssha_timer'][1:]*60.0, rtol=0.0, atol=1.0E-6)
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Restarts from coupler checkpoints against uninterrupted runs.
+"""
+from __future__ import absolute_import, print_function
+import os
+import unittest
+
+from watercoupler.coupler.coupler_checkpoint import CHECKPOINT_FORMAT
+
+from .synthetic_run import run, synthetictestcase
+
+################################################################################
+# 8640 time steps, hot starts to fort.67 at 2880 and 8640, and to fort.68 at 5760.
+NHSINC = 2880
+RESTART_ITIME = 5760
+CHECKPOINTS = {'WATERCOUPLER_CHECKPOINT_DIR' : 'checkpoints',
+               'WATERCOUPLER_CHECKPOINT_KEEP' : '3'}
+
+################################################################################
+class restarttest(synthetictestcase):
+    def check_restart(self, couplingtype, environ):
+        environ = dict(CHECKPOINTS, **environ)
+        uninterrupted = run(couplingtype, {'nhsinc' : NHSINC}, environ)
+        self.assertTrue(os.path.isfile(os.path.join('checkpoints', CHECKPOINT_FORMAT.format(RESTART_ITIME, 0))))
+        restarted = run(couplingtype, {'nhsinc' : NHSINC, 'ihot' : 68}, environ, restartdir='checkpoints')
+        self.assertSameRun(restarted, uninterrupted)
+
+    #--------------------------------------------------------------------------#
+    def test_restart_matches_uninterrupted(self):
+        for couplingtype in ['gdA', 'Adg', 'AdgdA', 'gdAdg', 'A|g']:
+            with self.subTest(couplingtype=couplingtype):
+                self.check_restart(couplingtype, {})
+
+    #--------------------------------------------------------------------------#
+    def test_restart_file_exchange(self):
+        for couplingtype in ['gdA', 'AdgdA']:
+            with self.subTest(couplingtype=couplingtype):
+                self.check_restart(couplingtype, {'WATERCOUPLER_FLUX_EXCHANGE' : 'file'})
+
+    #--------------------------------------------------------------------------#
+    def test_restart_pchip(self):
+        '''The exchange interpolation's samples are checkpointed too.'''
+        for couplingtype in ['AdgdA', 'gdAdg']:
+            with self.subTest(couplingtype=couplingtype):
+                self.check_restart(couplingtype, {'WATERCOUPLER_EXCHANGE_INTERP' : 'pchip'})
+
+    #--------------------------------------------------------------------------#
+    def test_restart_adaptive(self):
+        '''Adaptive windows are cut to end on every hot start.'''
+        self.check_restart('AdgdA', {'WATERCOUPLER_COUPLING_DTFACTOR' : '120:700:960'})
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
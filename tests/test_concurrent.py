@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Concurrent 'A|g' coupling: GSSHA in a thread alongside ADCIRC.
+"""
+from __future__ import absolute_import, print_function
+import sys
+import unittest
+
+try:
+    from unittest import mock
+except ImportError: # Python 2
+    import mock
+
+from watercoupler.coupler import gssha_thread
+
+from .synthetic_run import run, synthetictestcase
+
+################################################################################
+# Two windows, with runs long enough to time.
+COSTLY = {'rnday' : 0.1, 'adcirccost' : 1.0E-4, 'gsshacost' : 1.0E-4}
+
+################################################################################
+class overlaptest(synthetictestcase):
+    def run_warned(self, options):
+        with mock.patch.object(gssha_thread.log, 'warning') as warning:
+            result = run('A|g', options)
+        return result, warning.called
+
+    #--------------------------------------------------------------------------#
+    def test_overlap(self):
+        '''Models that release the GIL run at the same time, without a warning.'''
+        self.assertFalse(self.run_warned(COSTLY)[1])
+
+    #--------------------------------------------------------------------------#
+    def test_gil_held(self):
+        '''Models that hold the GIL run in turn, with a warning, and the same results.'''
+        switchinterval = sys.getswitchinterval()
+        # Long enough that spinning holds the GIL for a whole run, like a
+        # compiled call that does not release it.
+        sys.setswitchinterval(100.0)
+        try:
+            result, warned = self.run_warned(dict(COSTLY, busy=1))
+        finally:
+            sys.setswitchinterval(switchinterval)
+        self.assertTrue(warned)
+        self.assertSameRun(result, run('A|g', COSTLY))
+
+    #--------------------------------------------------------------------------#
+    def test_short_runs_unchecked(self):
+        thread = gssha_thread.gsshathread(None)
+        thread.run = (0.0, 1.0E-3)
+        self.assertIsNone(thread.check_overlap((1.0, 1.0+1.0E-3)))
+        thread.run = (0.0, 1.0)
+        self.assertEqual(thread.check_overlap((0.5, 2.0)), 0.5)
+        self.assertIsNone(thread.check_overlap((0.0, 1.0)))
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Fixed and adaptive coupling intervals.
+"""
+from __future__ import absolute_import, print_function
+import unittest
+
+from watercoupler.coupler.coupling_interval import couplinginterval, _parse_dtfactor
+
+from .synthetic_run import run, synthetictestcase, OPTIONS
+
+################################################################################
+class _namespace(): #Note: This is not a ctypes Structure!!!!
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+#------------------------------------------------------------------------------#
+def window(ags, interval, qout, vout, eta=0.0):
+    '''End a 480 minute window with GSSHA's qout and vout, and eta.'''
+    ags.gsshamv.timer += 480.0
+    ags.gsshamv.qout, ags.gsshamv.vout = qout, vout
+    ags.adcirc_hprev = eta
+    interval.update(ags)
+    return ags.couplingdtfactor
+
+################################################################################
+class intervaltest(unittest.TestCase):
+    def setUp(self):
+        self.ags = _namespace(gsshamv=_namespace(timer=0.0, qout=0.0, vout=0.0), gsshatimefact=60.0,
+                              adcirc_hprev=0.0, pg=_namespace(dt=1.0), couplingdtfactor=480,
+                              checkpoints=None)
+
+    #--------------------------------------------------------------------------#
+    def test_parse(self):
+        self.assertEqual(_parse_dtfactor('480'), (480, 480, 480))
+        self.assertEqual(_parse_dtfactor('120:480:960'), (120, 480, 960))
+        for spec in ['120:480', '480:120:960', '0:480:960']:
+            with self.subTest(spec=spec):
+                with self.assertRaises(ValueError):
+                    _parse_dtfactor(spec)
+
+    #--------------------------------------------------------------------------#
+    def test_fixed(self):
+        interval = couplinginterval(480)
+        self.assertFalse(interval.adaptive)
+        self.assertEqual(window(self.ags, interval, 10.0, 0.0), 480)
+        self.assertEqual(window(self.ags, interval, 100.0, 1.0E+6), 480)
+
+    #--------------------------------------------------------------------------#
+    def test_steady_grows(self):
+        '''No change: the interval doubles per window, up to the maximum.'''
+        interval = couplinginterval(480, 120, 1200)
+        self.assertEqual(window(self.ags, interval, 10.0, 0.0), 480)
+        vout = 0.0
+        for expected in [960, 1200, 1200]:
+            vout += 10.0*480.0*60.0
+            self.assertEqual(window(self.ags, interval, 10.0, vout), expected)
+
+    #--------------------------------------------------------------------------#
+    def test_fast_change_shrinks(self):
+        '''A jump of qout, or of eta: the interval shrinks, down to the minimum.'''
+        for qout, eta, expected in [(100.0, 0.0, 120), (10.0, 0.5, 120), (10.5, 0.0, 454)]:
+            with self.subTest(qout=qout, eta=eta):
+                self.setUp()
+                interval = couplinginterval(480, 120, 1200)
+                window(self.ags, interval, 10.0, 0.0)
+                self.assertEqual(window(self.ags, interval, qout, 10.0*480.0*60.0, eta), expected)
+
+    #--------------------------------------------------------------------------#
+    def test_event(self):
+        '''At or above the event discharge, the shortest interval.'''
+        interval = couplinginterval(480, 120, 1200, eventqout=50.0)
+        window(self.ags, interval, 10.0, 0.0)
+        self.assertEqual(window(self.ags, interval, 60.0, 1.0), 120)
+
+    #--------------------------------------------------------------------------#
+    def test_align(self):
+        '''Windows end on the next hot start, cut or stretched to it, and
+        never leave less than the minimum interval before it.'''
+        interval = couplinginterval(480, 120, 1200)
+        self.assertEqual(interval.align(480, 0, 2880), 480)
+        self.assertEqual(interval.align(960, 2400, 2880), 480)
+        self.assertEqual(interval.align(400, 2400, 2880), 480)
+        self.assertEqual(interval.align(1200, 0, 1250), 1130)
+
+################################################################################
+class adaptivetest(synthetictestcase):
+    def test_fixed_matches_default(self):
+        self.assertSameRun(run('AdgdA', environ={'WATERCOUPLER_COUPLING_DTFACTOR' : '480'}),
+                           run('AdgdA'))
+
+    #--------------------------------------------------------------------------#
+    def test_adaptive_runs_to_the_end(self):
+        '''GSSHA, when it drives, may end one (longer) interval past ADCIRC.'''
+        for couplingtype in ['gdA', 'Adg', 'AdgdA', 'gdAdg', 'A|g']:
+            with self.subTest(couplingtype=couplingtype):
+                result = run(couplingtype, environ={'WATERCOUPLER_COUPLING_DTFACTOR' : '120:480:960'})
+                self.assertEqual(result['tprev'], OPTIONS['rnday']*86400.0)
+                self.assertGreaterEqual(result['timer'], OPTIONS['rnday']*1440.0)
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Several coupled ADCIRC edge strings.
+"""
+from __future__ import absolute_import, print_function
+import unittest
+
+import numpy as np
+
+from watercoupler.coupler.adcircedgestring import parse_edgestrings, sum_max_min, sum_max_min_by
+from .synthetic_run import run, synthetictestcase, OPTIONS
+
+################################################################################
+class parsetest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_edgestrings('3'), ([2], None))
+        self.assertEqual(parse_edgestrings(b'3,5'), ([2, 4], None))
+        self.assertEqual(parse_edgestrings('3:0.6,5:0.4'), ([2, 4], [0.6, 0.4]))
+
+    #--------------------------------------------------------------------------#
+    def test_bad_specs(self):
+        for spec in ['', 'a', '0', '3,3', '3:0.6,5', '3:0.6,5:0.6', '3:1.5,5:-0.5']:
+            with self.subTest(spec=spec):
+                with self.assertRaises(ValueError):
+                    parse_edgestrings(spec)
+
+    #--------------------------------------------------------------------------#
+    def test_grouped_reductions(self):
+        '''One call over all edge strings equals one call per edge string,
+        including edge strings that own no node on this PE.'''
+        values = np.random.RandomState(0).rand(9)
+        offsets = np.array([0, 4, 4, 9, 9])
+        grouped = sum_max_min_by(values, offsets)
+        for i in range(len(offsets)-1):
+            expected = sum_max_min(values[offsets[i]:offsets[i+1]])
+            np.testing.assert_allclose([g[i] for g in grouped], expected, rtol=1.0E-12)
+
+################################################################################
+class edgestringstest(synthetictestcase):
+    OPTIONS = {'boundaries' : 2}
+
+    def test_default_fractions(self):
+        '''Without fractions, the outlet is split by edge string length.'''
+        for couplingtype in ['gdA', 'AdgdA']:
+            with self.subTest(couplingtype=couplingtype):
+                self.assertSameRun(run(couplingtype, self.OPTIONS, edgestrings='1,2'),
+                                   run(couplingtype, self.OPTIONS, edgestrings='1:0.5,2:0.5'))
+
+    #--------------------------------------------------------------------------#
+    def test_outlet_fractions(self):
+        '''Each edge string takes its fraction of the outlet discharge.'''
+        result = run('gdA', self.OPTIONS, edgestrings='1:0.75,2:0.25')
+        edgenodes = OPTIONS['edgenodes']
+        qnin2 = result['qnin2']
+        self.assertGreater(qnin2[0], 0.0)
+        np.testing.assert_allclose(qnin2[:edgenodes], 3.0*qnin2[edgenodes:], rtol=1.0E-12)
+
+    #--------------------------------------------------------------------------#
+    def test_uncoupled_edge_string(self):
+        '''An edge string that is not listed gets no flux.'''
+        result = run('gdA', self.OPTIONS, edgestrings='2')
+        edgenodes = OPTIONS['edgenodes']
+        self.assertTrue(np.all(result['qnin2'][:edgenodes] == 0.0))
+        self.assertTrue(np.all(result['qnin2'][edgenodes:] > 0.0))
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
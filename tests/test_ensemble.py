@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+The ensemble driver, on members that run the synthetic backend.
+"""
+from __future__ import absolute_import, print_function
+import os
+import csv
+import json
+import unittest
+
+try:
+    from unittest import mock
+except ImportError: # Python 2
+    import mock
+
+from watercoupler import ensemble as ensemblemodule
+from watercoupler.ensemble import ensemble, link_tree, RESULTS, MEMBER_LOG
+
+from .synthetic_run import synthetictestcase
+
+################################################################################
+SYNTHETIC = ['--backend=synthetic', '--synthetic-rnday=0.05']
+
+################################################################################
+class ensembletest(synthetictestcase):
+    def setUp(self):
+        synthetictestcase.setUp(self)
+        os.makedirs(os.path.join('base', 'rain'))
+        # The outputs of an earlier run in the source, too.
+        for name in ['Stream.prj', 'fort.68', os.path.join('rain', 'storm1.gag'), 'storm2.gag',
+                     'Stream.otl', 'fort.63', MEMBER_LOG]:
+            with open(os.path.join('base', name), 'w') as inputfile:
+                inputfile.write(name)
+
+    #--------------------------------------------------------------------------#
+    def write(self, members, **spec):
+        spec = dict({'workdir' : 'ensemble',
+                     'defaults' : {'source' : 'base', 'args' : SYNTHETIC + ['1', 'gdA', 'Stream.prj', 'fort'],
+                                   'env' : {'WATERCOUPLER_LOG_RANKS' : '0'}},
+                     'members' : members}, **spec)
+        with open('ensemble.json', 'w') as manifest:
+            json.dump(spec, manifest)
+        return 'ensemble.json'
+
+    #--------------------------------------------------------------------------#
+    def test_link_tree(self):
+        '''Inputs are hard-linked, and the files the models write copied.'''
+        link_tree('base', 'member')
+        for name, linked in [('Stream.prj', True), ('fort.68', False), ('fort.63', False),
+                             ('Stream.otl', False), (os.path.join('rain', 'storm1.gag'), True)]:
+            with self.subTest(name=name):
+                self.assertEqual(os.path.samefile(os.path.join('base', name), os.path.join('member', name)),
+                                 linked)
+
+    #--------------------------------------------------------------------------#
+    def test_members(self):
+        '''Members take the defaults, with their env added to them.'''
+        runs = ensemble(self.write([{'name' : 'a'},
+                                    {'name' : 'b', 'np' : 2, 'args' : ['1', 'AdgdA', 'Stream.prj', 'fort'],
+                                     'env' : {'WATERCOUPLER_COUPLING_DTFACTOR' : 240}}]), cores=4)
+        a, b = runs.members
+        self.assertEqual(a.args, SYNTHETIC + ['1', 'gdA', 'Stream.prj', 'fort'])
+        self.assertEqual(a.env, {'WATERCOUPLER_LOG_RANKS' : '0'})
+        self.assertEqual(b.env, {'WATERCOUPLER_LOG_RANKS' : '0', 'WATERCOUPLER_COUPLING_DTFACTOR' : '240'})
+        self.assertEqual(b.command(['mpiexec', '-n'])[:3], ['mpiexec', '-n', '2'])
+        for members in [[], [{'args' : []}], [{'name' : 'a'}, {'name' : 'a'}]]:
+            with self.subTest(members=members):
+                with self.assertRaises(ValueError):
+                    ensemble(self.write(members))
+
+    #--------------------------------------------------------------------------#
+    def test_run(self):
+        '''Every member runs in its own directory, with its own files, and
+        reports its exit status and timing.'''
+        runs = ensemble(self.write([{'name' : 'storm1', 'files' : {'Stream.gag' : 'base/rain/storm1.gag'}},
+                                    {'name' : 'storm2', 'files' : {'Stream.gag' : 'base/storm2.gag'},
+                                     'args' : SYNTHETIC + ['1', 'AdgdA', 'Stream.prj', 'fort']},
+                                    {'name' : 'typo', 'args' : ['1', 'gDA', 'Stream.prj', 'fort']}]),
+                        cores=2)
+        results = runs.run()
+        runs.report(results)
+        self.assertEqual([result['status'] for result in results], [0, 0, 2])
+        self.assertGreater(results[0]['run'], 0.0)
+        with open(os.path.join('ensemble', 'storm2', 'Stream.gag')) as gag:
+            self.assertEqual(gag.read(), 'storm2.gag')
+        with open(os.path.join('ensemble', RESULTS)) as csvfile:
+            self.assertEqual([row['name'] for row in csv.DictReader(csvfile)], ['storm1', 'storm2', 'typo'])
+        with open(os.path.join('base', MEMBER_LOG)) as logfile:
+            self.assertEqual(logfile.read(), MEMBER_LOG)
+        with self.assertRaises(ValueError):
+            runs.run()
+
+################################################################################
+class _member(): #Note: This is not a ctypes Structure!!!!
+    '''A member that runs for a number of polls, and logs its start and end.'''
+    def __init__(self, name, np, polls, events):
+        self.name, self.np, self.polls, self.events = name, np, polls, events
+
+    #--------------------------------------------------------------------------#
+    def start(self, mpirun):
+        self.events.append(('start', self.name))
+
+    #--------------------------------------------------------------------------#
+    def poll(self):
+        self.polls -= 1
+        if self.polls > 0:
+            return False
+        self.events.append(('end', self.name))
+        return True
+
+    #--------------------------------------------------------------------------#
+    def terminate(self):
+        pass
+
+################################################################################
+class scheduletest(unittest.TestCase):
+    def schedule(self, cores, members):
+        events = []
+        runs = ensemble.__new__(ensemble)
+        runs.cores, runs.mpirun = cores, ['mpirun', '-np']
+        with mock.patch.object(ensemblemodule, '_POLL', 0.0):
+            runs._schedule([_member(name, np, polls, events) for name, np, polls in members])
+        return events
+
+    #--------------------------------------------------------------------------#
+    def test_serial_members_fill_free_cores(self):
+        '''Serial members run on the cores that the MPI members leave free.'''
+        events = self.schedule(4, [('mpi', 3, 10), ('s1', 1, 2), ('s2', 1, 2)])
+        self.assertEqual(events[:2], [('start', 'mpi'), ('start', 's1')])
+        self.assertLess(events.index(('start', 's2')), events.index(('end', 'mpi')))
+
+    #--------------------------------------------------------------------------#
+    def test_waiting_mpi_member_keeps_its_cores(self):
+        '''No serial member starts while an MPI member waits for cores.'''
+        events = self.schedule(4, [('mpi1', 2, 5), ('mpi2', 4, 5), ('s1', 1, 1)])
+        self.assertEqual(events, [('start', 'mpi1'), ('end', 'mpi1'), ('start', 'mpi2'),
+                                  ('end', 'mpi2'), ('start', 's1'), ('end', 's1')])
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
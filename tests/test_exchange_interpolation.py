@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+The monotone cubic of the pchip exchange interpolation on known cases, and
+coupled runs with it.
+"""
+from __future__ import absolute_import, print_function
+import unittest
+
+import numpy as np
+
+from watercoupler.coupler.exchange_interpolation import pchip_slopes, pchip_evaluate, exchangehistory
+
+from .synthetic_run import run, synthetictestcase
+
+################################################################################
+def interpolate(t, y, tnew):
+    t = np.asarray(t, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64).reshape(len(t), -1)
+    return pchip_evaluate(t, y, pchip_slopes(t, y), tnew)
+
+################################################################################
+class pchiptest(unittest.TestCase):
+    def test_linear(self):
+        '''Samples on a line, evenly spaced or not, give the line, also past
+        either end.'''
+        t = np.array([0.0, 1.0, 3.0, 3.5, 6.0])
+        tnew = np.linspace(-1.0, 7.0, 81)
+        np.testing.assert_allclose(interpolate(t, 2.0 - 0.5*t, tnew)[:, 0], 2.0 - 0.5*tnew,
+                                   rtol=0.0, atol=1.0E-12)
+
+    #--------------------------------------------------------------------------#
+    def test_two_samples(self):
+        np.testing.assert_allclose(interpolate([1.0, 3.0], [1.0, 5.0], [1.0, 2.0, 2.5])[:, 0],
+                                   [1.0, 3.0, 4.0])
+
+    #--------------------------------------------------------------------------#
+    def test_monotone_step(self):
+        '''A step stays monotone, within its samples, and flat where they are.'''
+        t = np.array([0.0, 1.0, 2.0, 3.0, 4.0])
+        y = np.array([0.0, 0.0, 1.0, 1.0, 1.0])
+        tnew = np.linspace(0.0, 4.0, 401)
+        values = interpolate(t, y, tnew)[:, 0]
+        self.assertTrue(np.all(np.diff(values) >= -1.0E-12))
+        np.testing.assert_allclose(values[tnew <= 1.0], 0.0, rtol=0.0, atol=1.0E-12)
+        np.testing.assert_allclose(values[tnew >= 2.0], 1.0, rtol=0.0, atol=1.0E-12)
+        self.assertTrue(np.all((values >= -1.0E-12) & (values <= 1.0 + 1.0E-12)))
+
+    #--------------------------------------------------------------------------#
+    def test_monotone_uneven(self):
+        '''Steep and flat segments, unevenly spaced: no overshoot.'''
+        t = np.array([0.0, 0.5, 3.0, 3.2, 7.0, 8.0])
+        y = np.array([0.0, 0.1, 0.2, 5.0, 5.1, 9.0])
+        tnew = np.linspace(0.0, 8.0, 801)
+        values = interpolate(t, y, tnew)[:, 0]
+        self.assertTrue(np.all(np.diff(values) >= -1.0E-12))
+        for k in range(len(t)-1):
+            inside = (tnew >= t[k]) & (tnew <= t[k+1])
+            self.assertTrue(np.all((values[inside] >= y[k] - 1.0E-12) &
+                                   (values[inside] <= y[k+1] + 1.0E-12)))
+
+    #--------------------------------------------------------------------------#
+    def test_extrema(self):
+        '''Zero slope at local extrema, so peaks are not overshot.'''
+        t = np.array([0.0, 1.0, 2.0, 3.0, 4.0])
+        y = np.array([[0.0], [1.0], [0.0], [-2.0], [0.5]])
+        d = pchip_slopes(t, y)
+        self.assertEqual(d[1, 0], 0.0)
+        self.assertEqual(d[3, 0], 0.0)
+        values = pchip_evaluate(t, y, d, np.linspace(0.0, 4.0, 401))
+        self.assertAlmostEqual(values.max(), 1.0, places=12)
+        self.assertAlmostEqual(values.min(), -2.0, places=12)
+
+    #--------------------------------------------------------------------------#
+    def test_columns(self):
+        '''Quantities are interpolated independently, one per column.'''
+        t = np.array([0.0, 1.0, 2.0, 4.0])
+        y = np.column_stack([[0.0, 1.0, 4.0, 9.0], [3.0, 2.0, 2.0, -1.0]])
+        tnew = np.linspace(0.0, 4.0, 17)
+        values = interpolate(t, y, tnew)
+        for k in range(y.shape[1]):
+            np.testing.assert_array_equal(values[:, k], interpolate(t, y[:, k], tnew)[:, 0])
+
+################################################################################
+class exchangehistorytest(unittest.TestCase):
+    def test_history(self):
+        '''The last samples, oldest first; a repeated time replaces the newest.'''
+        history = exchangehistory(3)
+        history.append(0.0, 5.0)
+        np.testing.assert_array_equal(history.evaluate([0.0, 1.0]), [[5.0], [5.0]])
+        for time in [1.0, 2.0, 3.0]:
+            history.append(time, 5.0 + time)
+        history.append(3.0, 9.0)
+        np.testing.assert_array_equal(history.times, [1.0, 2.0, 3.0])
+        np.testing.assert_array_equal(history.newest(), [9.0])
+        np.testing.assert_allclose(history.evaluate([1.0, 2.0, 3.0])[:, 0], [6.0, 7.0, 9.0])
+
+    #--------------------------------------------------------------------------#
+    def test_snapshot(self):
+        history = exchangehistory(4)
+        for time in [0.0, 60.0, 120.0]:
+            history.append(time, [time, -time])
+        restored = exchangehistory(4)
+        restored.restore(history.snapshot())
+        tnew = np.linspace(0.0, 180.0, 13)
+        np.testing.assert_array_equal(restored.evaluate(tnew), history.evaluate(tnew))
+
+################################################################################
+class interpolationruntest(synthetictestcase):
+    def test_linear_matches_default(self):
+        for couplingtype in ['gdA', 'AdgdA', 'gdAdg']:
+            with self.subTest(couplingtype=couplingtype):
+                self.assertSameRun(run(couplingtype, environ={'WATERCOUPLER_EXCHANGE_INTERP' : 'linear'}),
+                                   run(couplingtype))
+
+    #--------------------------------------------------------------------------#
+    def test_pchip_runs_to_the_end(self):
+        '''pchip runs in the file flux exchange mode, and changes the run.'''
+        for couplingtype in ['gdA', 'Adg', 'AdgdA', 'gdAdg', 'A|g']:
+            with self.subTest(couplingtype=couplingtype):
+                result = run(couplingtype, environ={'WATERCOUPLER_EXCHANGE_INTERP' : 'pchip'})
+                self.assertEqual(result['tprev'], 86400.0)
+                self.assertGreaterEqual(result['timer'], 1440.0)
+                self.assertEqual(result['fluxexchange'], 'file')
+        self.assertNotEqual(run('gdAdg', environ={'WATERCOUPLER_EXCHANGE_INTERP' : 'pchip'})['vout'],
+                            run('gdAdg')['vout'])
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Alternative ways of exchanging the same values must give the same run.
+"""
+from __future__ import absolute_import, print_function
+import unittest
+
+from watercoupler.coupler.adcircgsshastruct import FLUX_EXCHANGE_MEMORY, FLUX_EXCHANGE_FILE
+
+from .synthetic_run import run, synthetictestcase
+
+################################################################################
+class fluxexchangetest(synthetictestcase):
+    def test_memory_matches_file(self):
+        '''ADCIRC's flux series written into its memory or read from fort.20.'''
+        for couplingtype in ['gdA', 'AdgdA', 'gdAdg', 'A|g']:
+            with self.subTest(couplingtype=couplingtype):
+                memory = run(couplingtype, environ={'WATERCOUPLER_FLUX_EXCHANGE' : FLUX_EXCHANGE_MEMORY})
+                fort20 = run(couplingtype, environ={'WATERCOUPLER_FLUX_EXCHANGE' : FLUX_EXCHANGE_FILE})
+                self.assertEqual(memory['fluxexchange'], FLUX_EXCHANGE_MEMORY)
+                self.assertEqual(fort20['fluxexchange'], FLUX_EXCHANGE_FILE)
+                self.assertSameRun(memory, fort20)
+
+################################################################################
+class boundaryseriestest(synthetictestcase):
+    def test_ring_matches_memmove(self):
+        '''GSSHA's head boundary series shifted as a ring or in place.'''
+        for couplingtype in ['Adg', 'AdgdA', 'gdAdg', 'A|g']:
+            with self.subTest(couplingtype=couplingtype):
+                ring = run(couplingtype, environ={'WATERCOUPLER_GSSHA_TS_RING' : '1'})
+                memmove = run(couplingtype, environ={'WATERCOUPLER_GSSHA_TS_RING' : '0'})
+                self.assertSameRun(ring, memmove)
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
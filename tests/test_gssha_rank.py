@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+GSSHA on a dedicated MPI rank, split off ADCIRC's.
+"""
+from __future__ import absolute_import, print_function
+import os
+import sys
+import shutil
+import subprocess
+import unittest
+
+import numpy as np
+
+try:
+    import mpi4py
+except ImportError:
+    mpi4py = None
+
+from watercoupler.coupler.coupler_archive import couplerrecording
+from watercoupler.coupler.coupler_backend import _takes_arguments, adcirc_takes_comm, BACKEND_SYNTHETIC
+
+from .synthetic_run import synthetictestcase
+
+################################################################################
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MPIRUN = shutil.which('mpirun')
+SYNTHETIC = ['--backend=synthetic', '--synthetic-rnday=0.1']
+
+################################################################################
+class _fortran(): #Note: This is not a ctypes Structure!!!!
+    '''An f2py wrapped routine: no signature, but a docstring.'''
+    __signature__ = 'none' # inspect.signature raises TypeError, as on f2py's fortran objects.
+
+    def __init__(self, doc):
+        self.__doc__ = doc
+
+    #--------------------------------------------------------------------------#
+    def __call__(self, *args):
+        pass
+
+################################################################################
+class bindingtest(unittest.TestCase):
+    def test_takes_arguments(self):
+        for function, expected in [(lambda: None, False), (lambda comm=None: None, True),
+                                   (_fortran("pyadcirc_init()\n\nWrapper for ``pyadcirc_init``."), False),
+                                   (_fortran("pyadcirc_init([comm])\n\nWrapper for ``pyadcirc_init``."), True),
+                                   (_fortran(None), False)]:
+            with self.subTest(doc=function.__doc__):
+                self.assertEqual(_takes_arguments(function), expected)
+
+    #--------------------------------------------------------------------------#
+    def test_synthetic_takes_comm(self):
+        self.assertTrue(adcirc_takes_comm(BACKEND_SYNTHETIC))
+
+################################################################################
+@unittest.skipIf(mpi4py is None or MPIRUN is None, "needs mpi4py and mpirun")
+class dedicatedtest(synthetictestcase):
+    def run_mpi(self, nprocs, couplingtype, archive, environ):
+        env = dict((name, value) for name, value in os.environ.items()
+                   if not name.startswith('WATERCOUPLER_'))
+        env['PYTHONPATH'] = os.pathsep.join([ROOT] + sys.path)
+        env['WATERCOUPLER_ARCHIVE'] = archive
+        env.update(environ)
+        env.update(OMPI_ALLOW_RUN_AS_ROOT='1', OMPI_ALLOW_RUN_AS_ROOT_CONFIRM='1',
+                   OMPI_MCA_rmaps_base_oversubscribe='1')
+        with open(os.devnull, 'w') as devnull:
+            status = subprocess.call([MPIRUN, '-np', str(nprocs), sys.executable, '-m', 'watercoupler']
+                                     + SYNTHETIC + ['1', couplingtype, 'Stream.prj', 'fort'],
+                                     stdout=devnull, stderr=devnull, env=env)
+        self.assertEqual(status, 0)
+        return couplerrecording(archive).windows
+
+    #--------------------------------------------------------------------------#
+    def test_dedicated_matches_shared(self):
+        '''The dedicated GSSHA rank gives the results of a shared PE 0, bit for bit.'''
+        for couplingtype in ['gdA', 'AdgdA']:
+            with self.subTest(couplingtype=couplingtype):
+                dedicated = self.run_mpi(2, couplingtype, 'dedicated.npz',
+                                         {'WATERCOUPLER_GSSHA_RANK' : 'dedicated'})
+                shared = self.run_mpi(1, couplingtype, 'shared.npz', {})
+                self.assertEqual(sorted(dedicated), sorted(shared))
+                for name in shared:
+                    np.testing.assert_array_equal(dedicated[name], shared[name], name)
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Picard iterations of the two-way coupling types, with state rollback.
+"""
+from __future__ import absolute_import, print_function
+import unittest
+
+from watercoupler.coupler.coupler_iteration import couplingiteration
+
+from .synthetic_run import run, synthetictestcase
+
+################################################################################
+TWO_WAY_TYPES = ['AdgdA', 'gdAdg']
+CONVERGED = {'WATERCOUPLER_ITERATE' : '10', 'WATERCOUPLER_ITERATE_QTOL' : '1e-8',
+             'WATERCOUPLER_ITERATE_ETA_TOL' : '1e-8'}
+
+################################################################################
+class iterationtest(synthetictestcase):
+    def test_one_run_matches_default(self):
+        '''WATERCOUPLER_ITERATE=1 is no iteration, bit for bit.'''
+        for couplingtype in TWO_WAY_TYPES:
+            with self.subTest(couplingtype=couplingtype):
+                self.assertSameRun(run(couplingtype, environ={'WATERCOUPLER_ITERATE' : '1'}),
+                                   run(couplingtype))
+
+    #--------------------------------------------------------------------------#
+    def test_rollback(self):
+        '''Windows that converge on their first run, after the state is
+        saved, run as without iterations.'''
+        environ = {'WATERCOUPLER_ITERATE' : '4', 'WATERCOUPLER_ITERATE_QTOL' : '1e30',
+                   'WATERCOUPLER_ITERATE_ETA_TOL' : '1e30'}
+        for couplingtype in TWO_WAY_TYPES:
+            with self.subTest(couplingtype=couplingtype):
+                self.assertSameRun(run(couplingtype, environ=environ), run(couplingtype))
+
+    #--------------------------------------------------------------------------#
+    def test_orders_converge(self):
+        '''Iterated to convergence, ADCIRC first and GSSHA first are the same
+        implicit coupling, even on long windows.'''
+        for dtfactor in ['480', '4320']:
+            with self.subTest(dtfactor=dtfactor):
+                environ = dict(CONVERGED, WATERCOUPLER_COUPLING_DTFACTOR=dtfactor)
+                adcircfirst = run('AdgdA', environ=environ)
+                gsshafirst = run('gdAdg', environ=environ)
+                self.assertAlmostEqual(adcircfirst['vout']/gsshafirst['vout'], 1.0, places=8)
+                explicit = run('AdgdA', environ={'WATERCOUPLER_COUPLING_DTFACTOR' : dtfactor})
+                self.assertNotEqual(explicit['vout'], adcircfirst['vout'])
+
+    #--------------------------------------------------------------------------#
+    def test_fallback(self):
+        '''Without the memory flux exchange, every window runs once.'''
+        environ = {'WATERCOUPLER_FLUX_EXCHANGE' : 'file'}
+        self.assertSameRun(run('AdgdA', environ=dict(CONVERGED, **environ)), run('AdgdA', environ=environ))
+
+    #--------------------------------------------------------------------------#
+    def test_bad_settings(self):
+        for settings in [{'maxiter' : 0}, {'qtol' : 0.0}, {'relax' : 0.0}, {'relax' : 1.5}]:
+            with self.subTest(settings=settings):
+                with self.assertRaises(ValueError):
+                    couplingiteration(**settings)
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Rank-aware, leveled logging of the 'watercoupler' logger.
+"""
+from __future__ import absolute_import, print_function
+import io
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import unittest
+
+from watercoupler import watercoupler_logging
+from watercoupler.watercoupler_logging import configure_logging, set_logging_rank, LOGGER_NAME
+
+################################################################################
+class loggingtest(unittest.TestCase):
+    def setUp(self):
+        self.state = dict(watercoupler_logging._state)
+        self.tmpdir = tempfile.mkdtemp(prefix='watercoupler_test_')
+        self.stdout = sys.stdout
+        sys.stdout = self.console = io.StringIO()
+        self.log = logging.getLogger(LOGGER_NAME + '.tests')
+
+    #--------------------------------------------------------------------------#
+    def tearDown(self):
+        sys.stdout = self.stdout
+        logger = logging.getLogger(LOGGER_NAME)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        watercoupler_logging._state.update(self.state)
+        shutil.rmtree(self.tmpdir)
+
+    #--------------------------------------------------------------------------#
+    def configure(self, myid, level='INFO', ranks='0', logdir=None):
+        watercoupler_logging._state['myid'] = myid
+        configure_logging(level, ranks, logdir)
+
+    #--------------------------------------------------------------------------#
+    def test_levels(self):
+        self.configure(0, level='WARNING')
+        self.log.info("hidden")
+        self.log.warning("shown")
+        self.assertEqual(self.console.getvalue(), "shown\n")
+        self.assertFalse(self.log.isEnabledFor(logging.INFO))
+
+    #--------------------------------------------------------------------------#
+    def test_console_ranks(self):
+        '''Only the selected PEs print, tagged when there are several.'''
+        self.configure(1)
+        self.log.info("from PE 1")
+        self.assertEqual(self.console.getvalue(), "")
+        self.configure(1, ranks='0,1')
+        self.log.info("from PE 1")
+        self.assertEqual(self.console.getvalue(), "PE[1] from PE 1\n")
+
+    #--------------------------------------------------------------------------#
+    def test_rank_files(self):
+        '''Every PE writes all its messages to its own file, console or not.'''
+        self.configure(0, logdir=self.tmpdir)
+        set_logging_rank(3)
+        self.log.info("to the file")
+        self.assertEqual(self.console.getvalue(), "")
+        logging.getLogger(LOGGER_NAME).handlers[-1].flush()
+        with open(os.path.join(self.tmpdir, 'watercoupler.PE0003.log')) as logfile:
+            self.assertIn("PE[3] INFO {0}: to the file".format(self.log.name), logfile.read())
+
+    #--------------------------------------------------------------------------#
+    def test_bad_level(self):
+        with self.assertRaises(ValueError):
+            self.configure(0, level='LOUD')
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
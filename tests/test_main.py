@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+The command line, checked before the models load.
+"""
+from __future__ import absolute_import, print_function
+import io
+import os
+import sys
+import logging
+import unittest
+
+try:
+    from unittest import mock
+except ImportError: # Python 2
+    import mock
+
+from watercoupler import watercoupler_logging
+from watercoupler.main import main, _parser, _parse_args
+from watercoupler.watercoupler_logging import LOGGER_NAME
+
+from .synthetic_run import synthetictestcase
+
+################################################################################
+POSITIONALS = ['1', 'AdgdA', 'Stream.prj', 'fort']
+SYNTHETIC = ['--backend=synthetic', '--synthetic-rnday=0.1']
+
+################################################################################
+class maintestcase(synthetictestcase):
+    '''Keeps the console, the environment and the logging configuration that
+    main() sets up to the test.'''
+    def setUp(self):
+        synthetictestcase.setUp(self)
+        self.state = dict(watercoupler_logging._state)
+        self.level = logging.getLogger(LOGGER_NAME).level
+        self.patches = [mock.patch.object(sys, 'stdout', io.StringIO()),
+                        mock.patch.object(sys, 'stderr', io.StringIO()),
+                        mock.patch.dict(os.environ)]
+        for patch in self.patches:
+            patch.start()
+        for name in list(os.environ):
+            if name.startswith('WATERCOUPLER_'):
+                del os.environ[name]
+
+    #--------------------------------------------------------------------------#
+    def tearDown(self):
+        logger = logging.getLogger(LOGGER_NAME)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        logger.setLevel(self.level)
+        watercoupler_logging._state.update(self.state)
+        for patch in reversed(self.patches):
+            patch.stop()
+        synthetictestcase.tearDown(self)
+
+    #--------------------------------------------------------------------------#
+    def assertUsageError(self, args):
+        with self.assertRaises(SystemExit) as context:
+            _parse_args(_parser(), args)
+        self.assertEqual(context.exception.code, 2)
+
+################################################################################
+class argumentstest(maintestcase):
+    def test_bad_arguments(self):
+        for args in [['1', 'gDA', 'Stream.prj', 'fort'],
+                     ['0', 'AdgdA', 'Stream.prj', 'fort'],
+                     ['1:0.6,2:0.6', 'AdgdA', 'Stream.prj', 'fort'],
+                     ['1', 'AdgdA', 'Stream.prj'],
+                     ['--no-such-option'] + POSITIONALS,
+                     ['--backend=other'] + POSITIONALS,
+                     ['--synthetic-nodes=10'] + POSITIONALS,
+                     ['--replay=run.npz'] + POSITIONALS,
+                     ['--replay=run.npz', '--restart=checkpoints', '1', 'gdA', 'Stream.prj', 'fort'],
+                     ['--restart'] + POSITIONALS]:
+            with self.subTest(args=args):
+                self.assertUsageError(args)
+
+    #--------------------------------------------------------------------------#
+    def test_flags(self):
+        '''Bare --dry-run and --restart never take the next positional.'''
+        os.environ['WATERCOUPLER_CHECKPOINT_DIR'] = 'checkpoints'
+        parsed, options = _parse_args(_parser(), ['--dry-run', '--restart'] + POSITIONALS)
+        self.assertEqual(parsed.dry_run, '')
+        self.assertEqual(parsed.restart, 'checkpoints')
+        self.assertEqual(parsed.edgestrings, '1')
+        self.assertEqual(options, {})
+
+    #--------------------------------------------------------------------------#
+    def test_synthetic_options(self):
+        parsed, options = _parse_args(_parser(), SYNTHETIC + ['--synthetic-nodes=10'] + POSITIONALS)
+        self.assertEqual(options, {'rnday' : '0.1', 'nodes' : '10'})
+
+    #--------------------------------------------------------------------------#
+    def test_version(self):
+        with self.assertRaises(SystemExit) as context:
+            main(['--version'])
+        self.assertEqual(context.exception.code, 0)
+
+################################################################################
+class maintest(maintestcase):
+    def test_missing_inputs(self):
+        '''Missing input files are reported before the models load.'''
+        with mock.patch('watercoupler.coupler.adcircgsshastruct.adcircgsshastruct') as ags:
+            self.assertEqual(main(POSITIONALS), -1)
+            self.assertEqual(main(['--backend=synthetic', '--replay=run.npz', '1', 'gdA', 'x', 'y']), -1)
+        self.assertFalse(ags.called)
+
+    #--------------------------------------------------------------------------#
+    def test_missing_inputs_on_every_rank(self):
+        '''Every PE stops before the models load, but only PE 0 logs why.'''
+        with mock.patch('watercoupler.main.logging_rank', return_value=1), \
+                mock.patch('watercoupler.coupler.adcircgsshastruct.adcircgsshastruct') as ags, \
+                mock.patch.object(logging.getLogger('watercoupler.main'), 'error') as error:
+            self.assertEqual(main(POSITIONALS), -1)
+        self.assertFalse(ags.called)
+        self.assertFalse(error.called)
+
+    #--------------------------------------------------------------------------#
+    def test_synthetic_run(self):
+        self.assertEqual(main(SYNTHETIC + POSITIONALS), 0)
+        self.assertEqual(main(SYNTHETIC + ['--dry-run=schedule.csv'] + POSITIONALS), 0)
+        self.assertTrue(os.path.isfile('schedule.csv'))
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+couplermessenger's packed reductions, on two stand-in PEs.
+"""
+from __future__ import absolute_import, print_function
+import unittest
+
+try:
+    from mpi4py import MPI # Initializes MPI, as ADCIRC would have.
+except ImportError:
+    MPI = None
+
+from watercoupler.coupler.coupler_messenger import couplermessenger, MSG_SUM, MSG_MAX, MSG_MIN
+from watercoupler.coupler.coupler_timers import couplertimers
+
+################################################################################
+OPS = [MSG_MAX, MSG_SUM, MSG_MIN, MSG_SUM, MSG_MIN, MSG_MAX, MSG_SUM]
+PE0 = [ 1.5, 2.0, -3.0, 1.0E+10,  4.0, -7.0,  0.25]
+PE1 = [-2.5, 3.0,  5.0, 1.0,     -4.0, -6.0, -0.5]
+EXPECTED = [1.5, 5.0, -3.0, 1.0E+10 + 1.0, -4.0, -6.0, -0.25]
+
+################################################################################
+class _namespace(): #Note: This is not a ctypes Structure!!!!
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+#------------------------------------------------------------------------------#
+class pairedpymsg(): #Note: This is not a ctypes Structure!!!!
+    '''pymessenger's reductions on PE 0, with PE 1 holding values.'''
+    def __init__(self, values):
+        self.values = list(values)
+        self.ncalls = 0
+
+    def _other(self):
+        self.ncalls += 1
+        return self.values.pop(0)
+
+    def pymsg_dbl_sum(self, value, comm):
+        return value + self._other()
+
+    def pymsg_dbl_max(self, value, comm):
+        return max(value, self._other())
+
+    def pymsg_dbl_min(self, value, comm):
+        return min(value, self._other())
+
+#------------------------------------------------------------------------------#
+class pairedcomm(): #Note: This is not a ctypes Structure!!!!
+    '''An mpi4py communicator of two PEs, reduced locally: the first
+    Allreduce is PE 1's, whose send buffer the second, PE 0's, reduces with.'''
+    def __init__(self):
+        self.other = None
+        self.ncalls = 0
+
+    def Allreduce(self, sendbuf, recvbuf, op):
+        self.ncalls += 1
+        if self.other is None:
+            self.other = sendbuf.copy()
+            recvbuf[:] = sendbuf
+            return
+        recvbuf[:] = self.other
+        op.Reduce_local(sendbuf, recvbuf)
+
+#------------------------------------------------------------------------------#
+def messenger(pmsg=None, parallel=True):
+    ags = _namespace(pmsg=pmsg, myid=0, pu=_namespace(messg=int(parallel), on=1),
+                     adcirc_comm_comp=(0 if MPI is None else MPI.COMM_SELF.py2f()),
+                     backend=_namespace(native=True), timers=couplertimers())
+    return couplermessenger(ags)
+
+################################################################################
+class messengertest(unittest.TestCase):
+    def test_serial(self):
+        msg = messenger(parallel=False)
+        self.assertEqual(msg.allreduce(PE0, OPS), PE0)
+        self.assertEqual(msg.ncollectives, 0)
+
+    #--------------------------------------------------------------------------#
+    def test_pymsg_mixed(self):
+        '''Without mpi4py, one pymsg call per value.'''
+        pmsg = pairedpymsg(PE1)
+        msg = messenger(pmsg)
+        msg.comm = None # As without mpi4py.
+        self.assertEqual(msg.allreduce(PE0, OPS), EXPECTED)
+        self.assertEqual(msg.ncollectives, len(OPS))
+        self.assertEqual(pmsg.ncalls, len(OPS))
+
+    #--------------------------------------------------------------------------#
+    @unittest.skipIf(MPI is None, "needs mpi4py")
+    def test_mpi4py_mixed(self):
+        '''With mpi4py, one Allreduce of all values, through the sum/max op.'''
+        pe1, pe0 = messenger(), messenger()
+        pe1.comm = pe0.comm = pairedcomm()
+        self.assertEqual(pe1.allreduce(PE1, OPS), PE1)
+        self.assertEqual(pe0.allreduce(PE0, OPS), EXPECTED)
+        self.assertEqual(pe0.comm.ncalls, 2)
+        self.assertEqual(pe0.ncollectives, 1)
+
+    #--------------------------------------------------------------------------#
+    @unittest.skipIf(MPI is None, "needs mpi4py")
+    def test_mpi4py_single_op(self):
+        '''All sums, or all max and min, use MPI's own ops.'''
+        for ops in [[MSG_SUM]*3, [MSG_MAX, MSG_MIN, MSG_MIN]]:
+            with self.subTest(ops=ops):
+                pe1, pe0 = messenger(), messenger()
+                pe1.comm = pe0.comm = pairedcomm()
+                pe1.allreduce(PE1[:3], ops)
+                pmsg = messenger(pairedpymsg(PE1[:3]))
+                pmsg.comm = None
+                self.assertEqual(pe0.allreduce(PE0[:3], ops), pmsg.allreduce(PE0[:3], ops))
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+One-way coupling, window by window and in two phases.
+"""
+from __future__ import absolute_import, print_function
+import unittest
+
+from .synthetic_run import run, synthetictestcase
+
+################################################################################
+BATCH = {'WATERCOUPLER_ONE_WAY' : 'batch'}
+
+################################################################################
+class onewaytest(synthetictestcase):
+    def test_batch_matches_interleaved(self):
+        for couplingtype in ['gdA', 'Adg']:
+            with self.subTest(couplingtype=couplingtype):
+                batch = run(couplingtype, environ=BATCH)
+                self.assertEqual(batch['onewaymode'], 'batch')
+                interleaved = run(couplingtype)
+                self.assertEqual(interleaved['onewaymode'], 'interleaved')
+                self.assertSameRun(batch, interleaved)
+
+    #--------------------------------------------------------------------------#
+    def test_batch_file_exchange(self):
+        environ = dict(BATCH, WATERCOUPLER_FLUX_EXCHANGE='file')
+        self.assertSameRun(run('gdA', environ=environ),
+                           run('gdA', environ={'WATERCOUPLER_FLUX_EXCHANGE' : 'file'}))
+
+    #--------------------------------------------------------------------------#
+    def test_fallbacks(self):
+        '''Window by window where the two phases cannot run.'''
+        for couplingtype, environ in [('Adg', {'WATERCOUPLER_COUPLING_DTFACTOR' : '120:480:960'}),
+                                      ('Adg', {'WATERCOUPLER_GSSHA_TS_RING' : '0'}),
+                                      ('gdA', {'WATERCOUPLER_CHECKPOINT_DIR' : 'checkpoints'})]:
+            with self.subTest(couplingtype=couplingtype, environ=environ):
+                self.assertEqual(run(couplingtype, environ=dict(BATCH, **environ))['onewaymode'],
+                                 'interleaved')
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Sub-sampling of eta and qout within coupling windows.
+"""
+from __future__ import absolute_import, print_function
+import unittest
+
+from watercoupler.coupler.coupler_sampling import couplersampling
+
+from .synthetic_run import run, synthetictestcase
+
+################################################################################
+SAMPLED_TYPES = ['gdA', 'Adg', 'AdgdA', 'gdAdg']
+
+################################################################################
+class samplingtest(synthetictestcase):
+    def test_off_matches_default(self):
+        '''WATERCOUPLER_SAMPLING=off is the default, bit for bit.'''
+        for couplingtype in SAMPLED_TYPES + ['A|g']:
+            with self.subTest(couplingtype=couplingtype):
+                self.assertSameRun(run(couplingtype, environ={'WATERCOUPLER_SAMPLING' : 'off'}),
+                                   run(couplingtype))
+
+    #--------------------------------------------------------------------------#
+    def test_sampled_runs(self):
+        '''Sampled runs end where the default does, exchanging other values.'''
+        for mode in ['mean', 'series']:
+            for couplingtype in SAMPLED_TYPES:
+                with self.subTest(mode=mode, couplingtype=couplingtype):
+                    expected = run(couplingtype)
+                    result = run(couplingtype, environ={'WATERCOUPLER_SAMPLING' : mode,
+                                                        'WATERCOUPLER_SAMPLING_CHUNKS' : '3'})
+                    self.assertEqual(result['tprev'], expected['tprev'])
+                    self.assertEqual(result['timer'], expected['timer'])
+                    # GSSHA's head follows the sampled eta, ADCIRC's flux the
+                    # sampled qout, and in two-way coupling one feeds the other.
+                    self.assertTrue(result['vout'] != expected['vout'] or
+                                    (result['eta2'] != expected['eta2']).any())
+
+    #--------------------------------------------------------------------------#
+    def test_fallback(self):
+        '''The concurrent type runs its windows whole.'''
+        self.assertSameRun(run('A|g', environ={'WATERCOUPLER_SAMPLING' : 'mean'}), run('A|g'))
+
+    #--------------------------------------------------------------------------#
+    def test_bad_settings(self):
+        for args in [('median',), ('mean', 1)]:
+            with self.subTest(args=args):
+                with self.assertRaises(ValueError):
+                    couplersampling(*args)
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+The coupling schedule, and its dry-run timeline, against the run loops.
+"""
+from __future__ import absolute_import, print_function
+import unittest
+
+import numpy as np
+
+from .synthetic_run import run, synthetictestcase
+
+################################################################################
+COUPLING_TYPES = ['gdA', 'Adg', 'AdgdA', 'gdAdg', 'A|g']
+
+################################################################################
+class timelinetest(synthetictestcase):
+    def check_timeline(self, couplingtype, options=None, environ=None):
+        timeline = run(couplingtype, options, environ, dryrun=True)['timeline']
+        windows = run(couplingtype, options, environ)['windows']
+        self.assertEqual(len(timeline), len(windows))
+        np.testing.assert_allclose([w['adcirc_end'] for w in timeline], [w[0] for w in windows],
+                                   rtol=0.0, atol=1.0E-6)
+        np.testing.assert_allclose([w['gssha_end'] for w in timeline], [w[1] for w in windows],
+                                   rtol=0.0, atol=1.0E-6)
+
+    #--------------------------------------------------------------------------#
+    def test_timeline_matches_run(self):
+        '''The dry-run windows end where the run's do.'''
+        for couplingtype in COUPLING_TYPES:
+            with self.subTest(couplingtype=couplingtype):
+                self.check_timeline(couplingtype)
+
+    #--------------------------------------------------------------------------#
+    def test_uneven_time_steps(self):
+        '''Intervals and time steps that share no whole minute, and a run
+        length that is not a whole number of time steps.'''
+        options = {'dt' : 0.7, 'gsshadt' : 45.0, 'rnday' : 0.05}
+        for couplingtype in COUPLING_TYPES:
+            with self.subTest(couplingtype=couplingtype):
+                self.check_timeline(couplingtype, options)
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+The coupler on the synthetic backend.
+"""
+from __future__ import absolute_import, print_function
+import unittest
+
+import numpy as np
+
+from watercoupler.synthetic import syntheticconfig
+
+from .synthetic_run import run, synthetictestcase, OPTIONS
+
+################################################################################
+COUPLING_TYPES = ['gdA', 'Adg', 'AdgdA', 'gdAdg', 'A|g']
+
+################################################################################
+class synthetictest(synthetictestcase):
+    def test_runs_to_the_end(self):
+        '''Both models reach the end of the run, and the same run twice
+        gives the same results.'''
+        for couplingtype in COUPLING_TYPES:
+            with self.subTest(couplingtype=couplingtype):
+                result = run(couplingtype)
+                self.assertEqual(result['tprev'], OPTIONS['rnday']*86400.0)
+                self.assertEqual(result['timer'], OPTIONS['rnday']*1440.0)
+                self.assertTrue(np.all(np.isfinite(result['eta2'])))
+                self.assertSameRun(run(couplingtype), result)
+
+    #--------------------------------------------------------------------------#
+    def test_coupling_matters(self):
+        '''GSSHA's discharge reaches ADCIRC, and ADCIRC's depths GSSHA.'''
+        gdA, AdgdA, Adg = run('gdA'), run('AdgdA'), run('Adg')
+        self.assertFalse(np.array_equal(gdA['eta2'], Adg['eta2']))
+        self.assertNotEqual(AdgdA['vout'], gdA['vout'])
+        self.assertNotEqual(Adg['vout'], gdA['vout'])
+
+    #--------------------------------------------------------------------------#
+    def test_bad_options(self):
+        for options in [{'nodes' : 10}, {'ihot' : 99}, {'unknown' : 1}]:
+            with self.subTest(options=options):
+                with self.assertRaises(ValueError):
+                    syntheticconfig(options)
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
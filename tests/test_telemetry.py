@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Live progress and throughput telemetry.
+"""
+from __future__ import absolute_import, print_function
+import os
+import re
+import json
+import unittest
+
+from watercoupler.coupler.coupler_telemetry import couplertelemetry
+
+from .synthetic_run import run, synthetictestcase
+
+################################################################################
+# name{labels} value
+_SAMPLE = re.compile(r'^watercoupler_(\w+)\{couplingtype="AdgdA"(,\w+="\w+")*\} \S+$')
+
+################################################################################
+class telemetrytest(synthetictestcase):
+    def test_json(self):
+        '''The record of the last window: both models at the end of the run.'''
+        result = run('AdgdA', environ={'WATERCOUPLER_TELEMETRY' : 'telemetry.json',
+                                       'WATERCOUPLER_TIMING_DIR' : 'timing'})
+        with open('telemetry.json') as telemetryfile:
+            record = json.load(telemetryfile)
+        self.assertEqual(record['couplingtype'], 'AdgdA')
+        self.assertEqual(record['window'], 18)
+        self.assertEqual(record['remaining'], 0.0)
+        for model in ['adcirc', 'gssha']:
+            self.assertEqual(record[model]['time'], record[model]['final'])
+        self.assertEqual(record['adcirc']['time'], result['tprev'])
+        self.assertGreater(record['adcirc']['rate'], 0.0)
+        self.assertGreater(record['phases']['adcirc_run'], 0.0)
+        self.assertIn('telemetry', record['phases'])
+        self.assertEqual(record['rss']['npes'], 1)
+        self.assertGreater(record['rss']['max'], 0.0)
+        self.assertFalse(os.path.exists('telemetry.json.tmp'))
+
+    #--------------------------------------------------------------------------#
+    def test_every(self):
+        run('AdgdA', environ={'WATERCOUPLER_TELEMETRY' : 'telemetry.json',
+                              'WATERCOUPLER_TELEMETRY_EVERY' : '4'})
+        with open('telemetry.json') as telemetryfile:
+            self.assertEqual(json.load(telemetryfile)['window'], 16)
+        with self.assertRaises(ValueError):
+            couplertelemetry('telemetry.json', 0)
+
+    #--------------------------------------------------------------------------#
+    def test_prometheus(self):
+        run('AdgdA', environ={'WATERCOUPLER_TELEMETRY' : 'telemetry.prom'})
+        with open('telemetry.prom') as telemetryfile:
+            lines = telemetryfile.read().splitlines()
+        helps = [line.split()[2] for line in lines if line.startswith('# HELP ')]
+        self.assertEqual(len(helps), len(set(helps)))
+        samples = [line for line in lines if not line.startswith('#')]
+        for line in samples:
+            self.assertRegex(line, _SAMPLE)
+        self.assertIn('watercoupler_window{couplingtype="AdgdA"} 18.0', samples)
+
+    #--------------------------------------------------------------------------#
+    def test_unchanged_run(self):
+        self.assertSameRun(run('AdgdA', environ={'WATERCOUPLER_TELEMETRY' : 'telemetry.json'}),
+                           run('AdgdA'))
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Per-phase, per-window timers and their report.
+"""
+from __future__ import absolute_import, print_function
+import os
+import json
+import shutil
+import logging
+import tempfile
+import unittest
+
+from watercoupler.coupler.coupler_timers import couplertimers, PHASES, PHASE_ADCIRC_RUN, \
+        PHASE_GSSHA_RUN, PHASE_MPI, HISTOGRAM_EDGES
+
+from .test_messenger import messenger
+
+################################################################################
+class timerstest(unittest.TestCase):
+    def test_disabled(self):
+        timers = couplertimers()
+        with timers.phase(PHASE_ADCIRC_RUN):
+            pass
+        timers.end_window()
+        self.assertEqual(timers.nwindows, 0)
+        self.assertEqual(timers.ncalls[PHASE_ADCIRC_RUN], 0)
+
+    #--------------------------------------------------------------------------#
+    def test_windows(self):
+        '''Phase times add up within a window, and start over in the next.'''
+        timers = couplertimers(enabled=True)
+        timers.add(PHASE_ADCIRC_RUN, 2000)
+        timers.add(PHASE_ADCIRC_RUN, 1000)
+        timers.end_window()
+        with timers.phase(PHASE_GSSHA_RUN):
+            with timers.phase(PHASE_MPI):
+                pass
+        timers.end_window()
+        self.assertEqual(timers.nwindows, 2)
+        self.assertEqual(timers.windows[PHASE_ADCIRC_RUN], [3000, 0])
+        self.assertEqual(timers.ncalls[PHASE_ADCIRC_RUN], 2)
+        self.assertEqual(timers.windows[PHASE_GSSHA_RUN][0], 0)
+        self.assertGreater(timers.windows[PHASE_GSSHA_RUN][1], 0)
+        self.assertGreaterEqual(timers.windows[PHASE_GSSHA_RUN][1], timers.windows[PHASE_MPI][1])
+        # Windows where a phase did not run are not in its histogram.
+        self.assertEqual(timers.histogram(PHASE_ADCIRC_RUN).sum(), 1)
+
+    #--------------------------------------------------------------------------#
+    def test_report(self):
+        outdir = tempfile.mkdtemp(prefix='watercoupler_test_')
+        self.addCleanup(shutil.rmtree, outdir)
+        timers = couplertimers(enabled=True, outdir=os.path.join(outdir, 'timing'))
+        for ns in [1000, 3000000]:
+            timers.add(PHASE_ADCIRC_RUN, ns)
+            timers.end_window()
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        timers.report(messenger(parallel=False))
+
+        with open(os.path.join(outdir, 'timing', 'timing.json')) as jsonfile:
+            report = json.load(jsonfile)
+        self.assertEqual(report['npes'], 1)
+        self.assertEqual(report['nwindows'], 2)
+        self.assertEqual(sorted(report['phases']), sorted(PHASES))
+        adcirc = report['phases'][PHASE_ADCIRC_RUN]
+        self.assertAlmostEqual(adcirc['total_mean'], 3.001E-3)
+        self.assertEqual(adcirc['total_min'], adcirc['total_max'])
+        self.assertEqual(len(adcirc['histogram']), len(HISTOGRAM_EDGES)-1)
+        self.assertEqual(sum(adcirc['histogram']), 2)
+        with open(os.path.join(outdir, 'timing', 'timing.PE0000.csv')) as csvfile:
+            self.assertEqual(len(csvfile.readlines()), 3)
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
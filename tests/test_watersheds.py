@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Several GSSHA watersheds coupled to one ADCIRC mesh, with gdA.
+"""
+from __future__ import absolute_import, print_function
+import io
+import os
+import sys
+import shutil
+import subprocess
+import unittest
+
+import numpy as np
+
+try:
+    from unittest import mock
+except ImportError: # Python 2
+    import mock
+
+try:
+    import mpi4py
+except ImportError:
+    mpi4py = None
+
+from watercoupler.coupler.coupler_arguments import parse_watersheds
+from watercoupler.coupler.coupler_archive import couplerrecording
+from watercoupler.main import _parser, _parse_args
+
+from .synthetic_run import synthetictestcase
+
+################################################################################
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MPIRUN = shutil.which('mpirun')
+# Watershed 1 feeds edge strings 1 and 3, watershed 2 feeds edge string 2.
+MANIFEST = "# Two watersheds\nNorth.prj  1:0.25,3:0.75\n\nSouth.prj  2\n"
+SYNTHETIC = ['--backend=synthetic', '--synthetic-boundaries=3', '--synthetic-rnday=0.1']
+
+################################################################################
+class manifesttest(synthetictestcase):
+    def write(self, text, pathname='watersheds.txt'):
+        with open(pathname, 'w') as manifest:
+            manifest.write(text)
+        return pathname
+
+    #--------------------------------------------------------------------------#
+    def test_parse(self):
+        self.assertEqual(parse_watersheds(self.write(MANIFEST)),
+                         [('North.prj', [0, 2], [0.25, 0.75]), ('South.prj', [1], None)])
+
+    #--------------------------------------------------------------------------#
+    def test_bad_manifests(self):
+        for text in ['', '# Nothing\n', 'North.prj\n', 'North.prj 1 2\n',
+                     'North.prj 1,2\nSouth.prj 2\n', 'North.prj 1:0.5\n']:
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    parse_watersheds(self.write(text))
+
+    #--------------------------------------------------------------------------#
+    def test_usage_errors(self):
+        '''Only gdA, and no replay.'''
+        for args in [['--watersheds', '1,3,2', 'AdgdA', 'watersheds.txt', 'fort'],
+                     ['--watersheds', '--replay=run.npz', '1,3,2', 'gdA', 'watersheds.txt', 'fort']]:
+            with self.subTest(args=args):
+                with self.assertRaises(SystemExit) as context, \
+                        mock.patch.object(sys, 'stderr', io.StringIO()):
+                    _parse_args(_parser(), args)
+                self.assertEqual(context.exception.code, 2)
+
+################################################################################
+@unittest.skipIf(mpi4py is None or MPIRUN is None, "needs mpi4py and mpirun")
+class gathertest(synthetictestcase):
+    def run_mpi(self, nprocs, args):
+        env = dict((name, value) for name, value in os.environ.items()
+                   if not name.startswith('WATERCOUPLER_'))
+        env['PYTHONPATH'] = os.pathsep.join([ROOT] + sys.path)
+        env['WATERCOUPLER_ARCHIVE'] = args[-1]
+        env.update(OMPI_ALLOW_RUN_AS_ROOT='1', OMPI_ALLOW_RUN_AS_ROOT_CONFIRM='1',
+                   OMPI_MCA_rmaps_base_oversubscribe='1')
+        with open(os.devnull, 'w') as devnull:
+            status = subprocess.call([MPIRUN, '-np', str(nprocs), sys.executable, '-m', 'watercoupler']
+                                     + SYNTHETIC + args[:-1], stdout=devnull, stderr=devnull, env=env)
+        self.assertEqual(status, 0)
+        return couplerrecording(args[-1]).windows
+
+    #--------------------------------------------------------------------------#
+    def test_outlets_feed_their_edge_strings(self):
+        '''Every edge string takes its fraction of its own watershed's outlet,
+        gathered from the GSSHA ranks every window.'''
+        with open('watersheds.txt', 'w') as manifest:
+            manifest.write(MANIFEST)
+        # One ADCIRC PE and two GSSHA ranks, against a single watershed; the
+        # synthetic watersheds are all the same, and gdA does not feed back.
+        windows = self.run_mpi(3, ['--watersheds', '1,3,2', 'gdA', 'watersheds.txt', 'fort', 'several.npz'])
+        single = self.run_mpi(1, ['1', 'gdA', 'Stream.prj', 'fort', 'single.npz'])
+
+        flux = single['flux'][:, 0]
+        np.testing.assert_allclose(windows['flux'], np.column_stack([0.25*flux, 0.75*flux, flux]),
+                                   rtol=1.0E-12)
+        np.testing.assert_allclose(windows['gssha_qout'], 2.0*single['gssha_qout'], rtol=1.0E-12)
+        np.testing.assert_array_equal(windows['gssha_timer'], single['gssha_timer'])
+
+################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,7 @@ Main function of watercoupler that gets invoked on the command line.
 """
 
 from __future__ import absolute_import
+import sys
 
 if (__package__ == "watercoupler"):
     from . import watercoupler_path as _watercoupler_path
@@ -21,5 +22,5 @@ else:
 
 #------------------------------------------------------------------------------#
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
 
@@ -4,30 +4,39 @@
 # LICENSE: BSD 3-Clause "New" or "Revised"
 #------------------------------------------------------------------------------#
 from __future__ import absolute_import, print_function
-
-import gsshapython.sclass.build_options as gsshaopts
-import gsshapython.sclass.define_h      as gsshadefine
-import gsshapython.sclass.fnctn_h       as gsshafnctn
+import logging
 
 ################################################################################
-DEBUG_LOCAL = 1
+log = logging.getLogger(__name__)
 
 ################################################################################
 def adcircgssha_coupler_finalize(self):
 
-    if gsshaopts._DEBUG==gsshadefine.ON and DEBUG_LOCAL!=0 and self.myid==0:
-        print("Finalizing GSSHA")
-    ierr_code = gsshafnctn.main_gssha_finalize(self.mvs)
-    if self.myid==0:
-        print("*********************** GSSHA Finalized ***********************")
-        print("***************************************************************")
-
-    if self.pu.debug==self.pu.on and DEBUG_LOCAL!=0 and self.myid==0:
-        print('\n\nFinalizing ADCIRC\n')
+    # The last checkpoint may still be being written.
+    if self.checkpoints is not None:
+        self.checkpoints.close()
+    if self.archive is not None:
+        self.archive.close(self.timers)
+    if self.iteration is not None:
+        self.iteration.close()
+    if self.telemetry is not None:
+        self.telemetry.close(self)
+
+    # Collective over all PEs, so it must come before ADCIRC finalizes MPI.
+    self.timers.report(self.messenger)
+
+    log.debug("Finalizing GSSHA")
+    # GSSHA must get its own boundary series buffers back before it frees them.
+    if self.gsshaboundts is not None:
+        self.gsshaboundts.release()
+    ierr_code = self.gsshafnctn.main_gssha_finalize(self.mvs)
+    log.info("*********************** GSSHA Finalized ***********************\n"
+             "***************************************************************")
+
+    log.debug('\n\nFinalizing ADCIRC\n')
     ierr_code = self.pmain.pyadcirc_finalize()
-    if self.myid==0:
-        print("********************** ADCIRC Finalized ***********************")
-        print("***************************************************************")
+    log.info("********************** ADCIRC Finalized ***********************\n"
+             "***************************************************************")
 
 
 ################################################################################
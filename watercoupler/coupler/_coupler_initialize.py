@@ -5,11 +5,46 @@
 #------------------------------------------------------------------------------#
 from __future__ import absolute_import, print_function
 from sys import version_info as _version_info
+import os
+import logging
 
 import numpy as np
 from ctypes import byref as ctypes_byref
 
-DEBUG_LOCAL = 0
+from .adcircedgestring import adcircedgestrings, parse_edgestrings
+from .adcircfort20 import adcircfort20writer
+from .coupler_arguments import ONE_WAY_TYPES
+from .coupler_archive import couplerarchive
+from .coupler_checkpoint import couplercheckpoints
+from .coupler_iteration import couplingiteration
+from .coupler_messenger import couplermessenger
+from .coupler_sampling import couplersampling
+from .coupler_telemetry import couplertelemetry
+from .coupler_timers import couplertimers
+from .exchange_interpolation import exchangeinterpolation
+from .coupling_interval import couplinginterval
+from .coupling_schedule import couplingschedule
+from ..watercoupler_logging import set_logging_rank
+
+log = logging.getLogger(__name__)
+
+################################################################################
+def bind_accessors(self):
+    '''Cache the struct references and arrays used on the exchange path.
+
+    Indexing mvs[0] builds a new ctypes struct proxy, and every attribute
+    access of an f2py module array builds a new ndarray. Both stay valid for
+    the whole run since neither model reallocates them after initialization,
+    so they are looked up once here. The f2py arrays are zero-copy views of
+    ADCIRC memory: writing to them writes into ADCIRC.
+    '''
+    self.gsshamv = self.mvs[0]
+    self.adcirceta1 = np.asarray(self.pg.eta1)
+    self.adcirceta2 = np.asarray(self.pg.eta2)
+    self.adcircqnin1 = np.asarray(self.pg.qnin1)
+    self.adcircqnin2 = np.asarray(self.pg.qnin2)
+    self.adcircenin2 = np.asarray(self.pg.enin2)
+    self.adcirclbcodei = np.asarray(self.pb.lbcodei)
 
 ################################################################################
 def adcircgssha_coupler_initialize(self, couplingtype, argc, argv):
@@ -18,89 +53,180 @@ def adcircgssha_coupler_initialize(self, couplingtype, argc, argv):
     # argv[argc-3] must be coupling type: 'gda', 'adg', 'gdadg', 'adgda'
     # argv[argc-4] must be edge string ID of the ADCIRC model that we are coupling to
 
-    ######################################################
-    import pyADCIRC.pyadcirc as pa
-    ps    = pa.sizes
-    pg    = pa.pyglobal
-    pm    = pa.pymesh
-    pmsg  = pa.pymessenger
-    pb    = pa.pyboundaries
-    pmain = pa.pyadcirc_mod
-    pu    = pa.utilities
-
-    ######################################################
-    import gsshapython.sclass.build_options as gsshaopts
-    import gsshapython.sclass.define_h      as gsshadefine
-    import gsshapython.sclass.fnctn_h       as gsshafnctn
+    from .adcircgsshastruct import SERIESLENGTH, FLUX_EXCHANGE_MEMORY, FLUX_EXCHANGE_FILE, FLUX_EXCHANGE_MODES, \
+            ONE_WAY_INTERLEAVED, ONE_WAY_BATCH, ONE_WAY_MODES, COUPLING_CONCURRENT
 
     ######################################################
     #SET UP ADCIRC.
     ######################################################
-    if pu.debug == pu.on and DEBUG_LOCAL != 0:
-        print("\nInitializing ADCIRC\n")
-    self.pmain.pyadcirc_init()
+    log.debug("\nInitializing ADCIRC\n")
+    split = self.backend.split
+    if split is not None:
+        # ADCIRC runs on all PEs but the dedicated GSSHA ranks, on a
+        # communicator that gssharanksplit has checked pyadcirc_init takes.
+        self.pmain.pyadcirc_init(split.adcirccomm_f)
+    else:
+        self.pmain.pyadcirc_init()
     self.npes = self.ps.mnproc
     self.myid = self.ps.myproc
+    set_logging_rank(self.myid)
+    # Live progress record, replaced on PE 0 after every window.
+    self.telemetry = couplertelemetry.from_environ(self.myid)
+    # Per-phase, per-window timing report, written at finalize; the telemetry
+    # reports the last window's phase times too.
+    timingdir = os.environ.get('WATERCOUPLER_TIMING_DIR', '')
+    self.timers = couplertimers(enabled=(timingdir != '' or self.telemetry.enabled),
+                                myid=self.myid, outdir=timingdir)
     if self.pu.messg == self.pu.on:
-        self.adcirc_comm_world = pmsg.mpi_comm_adcirc
-        self.adcirc_comm_comp = pg.comm
-    if pu.debug == pu.on and DEBUG_LOCAL != 0:
-        print("MPI Info: npes =", self.npes, ", myid =", self.myid)
+        self.adcirc_comm_world = self.pmsg.mpi_comm_adcirc
+        self.adcirc_comm_comp = self.pg.comm
+    log.debug("MPI Info: npes = %s, myid = %s", self.npes, self.myid)
 
     ######################################################
-    if pu.messg == pu.on:
+    if self.pu.messg == self.pu.on:
         #self.pmsg.msg_init()
-        if (pu.debug == pu.on and DEBUG_LOCAL!=0):
-            print('Python: adcirc_comm_world pointer value         : '+hex(self.adcirc_comm_world))
-            print('Python: adcirc_comm_comp  pointer value         : '+hex(self.adcirc_comm_comp))
-        print("*********************** MPI Initialized ***********************")
-        print("***************************************************************")
+        log.debug('Python: adcirc_comm_world pointer value         : %#x', self.adcirc_comm_world)
+        log.debug('Python: adcirc_comm_comp  pointer value         : %#x', self.adcirc_comm_comp)
+        log.info("*********************** MPI Initialized ***********************\n"
+                 "***************************************************************")
+    self.messenger = couplermessenger(self)
 
 
-    print("********************* ADCIRC Initialized **********************")
-    print("***************************************************************")
+    log.info("********************* ADCIRC Initialized **********************\n"
+             "***************************************************************")
 
     ######################################################
     #SET UP GSSHA.
     ######################################################
-    if gsshaopts._DEBUG == gsshadefine.ON and DEBUG_LOCAL != 0:
-        print("\nInitializing GSSHA\n")
+    log.debug("\nInitializing GSSHA\n")
     prj_name = argv[argc.value-2]
-    ierr_code = gsshafnctn.main_gssha_initialize(ctypes_byref(self.mvs), prj_name, None, prj_name)
+    ierr_code = self.gsshafnctn.main_gssha_initialize(ctypes_byref(self.mvs), prj_name, None, prj_name)
     assert(ierr_code == 0) #Since sm is not NULL now
-    print("********************** GSSHA Initialized **********************")
-    print("***************************************************************")
+    bind_accessors(self)
+    log.info("********************** GSSHA Initialized **********************\n"
+             "***************************************************************")
 
     ######################################################
     #SET UP COUPLED STRUCT.
     ######################################################
     self.couplingtype=couplingtype #argv[argc.value-3]
-    self.couplingdtfactor = 480 #in case of original Gal-brays-coupling
-    self.adcircrunflag=pu.on
+    if split is not None and self.couplingtype == COUPLING_CONCURRENT and not split.threadmultiple:
+        raise RuntimeError("Coupling type {0} with a dedicated GSSHA rank needs MPI_THREAD_MULTIPLE".format(
+            COUPLING_CONCURRENT))
+    # Coupling interval: 480 ADCIRC time steps in case of original
+    # Gal-brays-coupling, unless set (or made adaptive) by the environment.
+    self.couplinginterval = couplinginterval.from_environ()
+    self.couplinginterval.apply(self) # Sets couplingdtfactor and adcircdt
+    self.adcircrunflag=self.pu.on
     self.adcirctstart=0.+self.pg.statim*86400.0 #statim is in days.
-    self.adcircdt=0.+self.pg.dt*float(self.couplingdtfactor) #Needed 0+ to prevent the two from being the same object :-/ Careful!!!!
     self.adcircnt=0+self.pg.nt #Needed 0+ to prevent the two from being the same object :-/ Careful!!!!
     self.adcirctprev=self.adcirctstart
     self.adcirctnext=self.adcirctprev
-    self.adcirctfinal=(self.pg.statim + self.pg.rnday)*86400.0
     self.adcircntsteps=0+self.pmain.itime_end #Needed 0+ to prevent the two from being the same object :-/ Careful!!!!
+    # ADCIRC's last time step, not STATIM+RNDAY: NT is RNDAY rounded to whole
+    # time steps, and the run loops must stop where ADCIRC (and the coupling
+    # schedule) does.
+    self.adcirctfinal=self.adcirctstart + self.adcircntsteps*self.pg.dtdp
     if (_version_info < (3, 0)):
         inputdir = self.ps.inputdir
     else:
         inputdir = str(self.ps.inputdir, 'utf-8')
-    self.adcircfort20pathname=''.join(np.append(np.char.strip(inputdir),'/fort.20.new.'+self.couplingtype))
-    self.adcircedgestringid=int(argv[argc.value-4])-1
-    self.adcircedgestringnnodes=self.pb.nvell[self.adcircedgestringid]
+    self.adcircfort20pathname=''.join(np.append(np.char.strip(inputdir),'/fort.20.new.'+self.couplingtype.replace('|', '_')))
+    # Flux BC exchange: 'memory' (default) or 'file' (fort.20 rewrite fallback).
+    self.adcircfluxexchange=os.environ.get('WATERCOUPLER_FLUX_EXCHANGE', self.adcircfluxexchange)
+    assert(self.adcircfluxexchange in FLUX_EXCHANGE_MODES)
+    # Boundary series points per window: one (linear) or several (pchip).
+    self.exchangeinterp=exchangeinterpolation.from_environ()
+    if self.exchangeinterp.cubic:
+        log.info("Exchange interpolation: %s, %d samples, %d points per window",
+                 self.exchangeinterp.mode, self.exchangeinterp.history, self.exchangeinterp.points)
+        if self.adcircfluxexchange != FLUX_EXCHANGE_FILE:
+            # ADCIRC reads the points of its flux series from fort.20.
+            log.info("Using the file flux exchange mode for the %s exchange", self.exchangeinterp.mode)
+            self.adcircfluxexchange = FLUX_EXCHANGE_FILE
+    # Values exchanged once per window (off), or sampled within it.
+    self.sampling=couplersampling.from_environ()
+    self.sampling.setup(self)
+    if self.adcircfluxexchange == FLUX_EXCHANGE_MEMORY:
+        # ADCIRC reads the next fort.20 record only once its time exceeds
+        # QTIME2, and QTIME2 is not used in the flux interpolation itself
+        # (QTRATIO uses QTIME1 and FTIMINC). Padding QTIME2 by half an ADCIRC
+        # time step therefore guarantees that unit 20 is never read while the
+        # coupler owns the flux series, even with round-off in the run loops.
+        self.adcircqtimeguard=0.5*self.pg.dtdp
+    else:
+        self.adcircqtimeguard=0.0
+    # Coupled edge strings, e.g. '3' or '3:0.6,5:0.4' with GSSHA outlet fractions.
+    self.adcircedgestringids, fractions = parse_edgestrings(argv[argc.value-4])
+    outlets = None
+    if self.watersheds is not None:
+        # Several watersheds, each feeding its own edge strings; remotegssha
+        # gathers their outlets on PE 0.
+        self.adcircedgestringids, fractions, outlets = [], [], []
+        for k, (prj, ids, fracs) in enumerate(self.watersheds):
+            self.adcircedgestringids += ids
+            fractions += fracs if fracs is not None else [None]*len(ids)
+            outlets += [k]*len(ids)
+        self.gsshaqouts = self.gsshafnctn.qouts
     # We are only accounting for open boundaries and not for closed loops here:
-    self.adcircedgestringnodes=self.pb.nbvv[self.adcircedgestringid][1:self.adcircedgestringnnodes+1]
-    self.gssharunflag=gsshadefine.ON
-    self.gsshatstartjul=self.mvs[0].btime # in Julian date
-    self.gsshadt=self.mvs[0].dt # in seconds
-    #self.effectivegsshadt=max(60.0, self.mvs[0].dt) # in seconds. This is in case we decide to use niter in mins as ending time
-    self.effectivegsshadt=self.mvs[0].dt # in seconds. This is in case we decide to use single_event_end time as ending time
-    self.gsshatprev=self.mvs[0].timer # in minutes
-    self.gsshatfinal=self.mvs[0].niter # in minutes
-    self.gsshasingle_event_end=self.mvs[0].single_event_end # in minutes
+    self.adcircedgestrings=adcircedgestrings(self, self.adcircedgestringids, fractions, outlets)
+    if self.adcircfluxexchange == FLUX_EXCHANGE_FILE:
+        self.adcircfort20=adcircfort20writer(self, self.adcircfort20pathname,
+                                             self.adcircedgestrings.nnodes*SERIESLENGTH)
+    self.gssharunflag=self.gsshadefine.ON
+    self.gsshatstartjul=self.gsshamv.btime # in Julian date
+    self.gsshadt=self.gsshamv.dt # in seconds
+    #self.effectivegsshadt=max(60.0, self.gsshamv.dt) # in seconds. This is in case we decide to use niter in mins as ending time
+    self.effectivegsshadt=self.gsshamv.dt # in seconds. This is in case we decide to use single_event_end time as ending time
+    # Even the shortest coupling interval must hold a GSSHA time step.
+    assert(self.pg.dt*self.couplinginterval.dtfactormin > self.gsshadt)
+    if self.couplinginterval.adaptive:
+        log.info("Adaptive coupling interval: %d to %d ADCIRC time steps, starting at %d",
+                 self.couplinginterval.dtfactormin, self.couplinginterval.dtfactormax,
+                 self.couplinginterval.dtfactor)
+    self.gsshatprev=self.gsshamv.timer # in minutes
+    self.gsshatfinal=self.gsshamv.niter # in minutes
+    self.gsshasingle_event_end=self.gsshamv.single_event_end # in minutes
+    # Closed-form coupling window boundaries, on an integer time grid.
+    self.schedule=couplingschedule(self)
+    log.debug("Coupling schedule tick = %s s", self.schedule.tick)
+    # Set WATERCOUPLER_GSSHA_TS_RING=0 to shift GSSHA's boundary series in place.
+    self.gsshaboundtsring=(os.environ.get('WATERCOUPLER_GSSHA_TS_RING', '1') != '0')
+    # Checkpoints at ADCIRC hot starts, and restarts from them (--restart).
+    self.checkpoints=couplercheckpoints.from_environ(self.myid, self.restartdir)
+    if self.backend.replayed is not None and self.checkpoints.enabled:
+        log.warning("No coupler checkpoints while replaying %s from an archive", self.backend.replayed)
+        self.checkpoints=couplercheckpoints(restartdir=self.restartdir, myid=self.myid)
+    self.checkpoints.setup(self)
+    # Archive of the exchanged quantities, window by window.
+    self.archive=couplerarchive.from_environ(self.myid)
+    # Picard iterations of the two-way coupling types within every window.
+    self.iteration=couplingiteration.from_environ()
+    self.iteration.setup(self)
+    # One-way coupling types: window by window (default), or in two phases.
+    self.onewaymode=os.environ.get('WATERCOUPLER_ONE_WAY', self.onewaymode)
+    assert(self.onewaymode in ONE_WAY_MODES)
+    if self.onewaymode == ONE_WAY_BATCH and self.couplingtype in ONE_WAY_TYPES:
+        if self.checkpoints.enabled or self.checkpoints.restarting:
+            reason = "checkpoints and restarts need the window by window run"
+        elif self.archive.pathname != '':
+            reason = "the coupling archive records the windows as they run"
+        elif self.backend.replayed is not None:
+            reason = "a model replayed from an archive runs window by window"
+        elif self.gsshaqouts is not None:
+            reason = "the outlets of several watersheds are exchanged window by window"
+        elif self.sampling.enabled:
+            reason = "the windows are sub-sampled as they run"
+        elif self.couplingtype == 'Adg' and self.couplinginterval.adaptive:
+            reason = "an adaptive interval depends on GSSHA, which runs after ADCIRC"
+        elif self.couplingtype == 'Adg' and not self.gsshaboundtsring:
+            reason = "the GSSHA boundary series must be a ring (WATERCOUPLER_GSSHA_TS_RING=1)"
+        else:
+            reason = None
+        if reason is not None:
+            log.warning("Running %s window by window instead of in two phases: %s",
+                        self.couplingtype, reason)
+            self.onewaymode = ONE_WAY_INTERLEAVED
 
 ################################################################################
 if __name__ == '__main__':
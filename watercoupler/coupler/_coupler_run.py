@@ -4,23 +4,18 @@
 # LICENSE: BSD 3-Clause "New" or "Revised"
 #------------------------------------------------------------------------------#
 from __future__ import absolute_import, print_function
-
-from ctypes import c_double as ctypes_c_double
-
-################################################################################
-import gsshapython.sclass.build_options as gsshaopts
-import gsshapython.sclass.types_h       as gsshatypes
-import gsshapython.sclass.define_h      as gsshadefine
-import gsshapython.sclass.fnctn_h       as gsshafnctn
+import logging
 
 ################################################################################
 from .adcirc_init_bc_func import adcirc_init_bc_from_gssha_hydrograph
 from .adcirc_set_bc_func  import adcirc_set_bc_from_gssha_hydrograph
 from .gssha_init_bc_func  import gssha_init_bc_from_adcirc_depths
-from .gssha_set_bc_func   import gssha_set_bc_from_adcirc_depths
+from .gssha_set_bc_func   import gssha_set_bc_from_adcirc_depths, edgestring_eta_stats
+from .coupler_timers      import PHASE_ADCIRC_RUN, PHASE_GSSHA_RUN, PHASE_ADCIRC_BC, PHASE_GSSHA_BC
+from .gssha_thread        import gsshathread
 
 ################################################################################
-DEBUG_LOCAL = 1
+log = logging.getLogger(__name__)
 ###########################################################################
 # Gajanan gkc:
 # Note: coupler_run_gssha_driving_adcirc and coupler_run_adcirc_driving_gssha
@@ -31,250 +26,654 @@ DEBUG_LOCAL = 1
 # -ags.adcircdt+TIME_TOL to +ags.gsshadt-TIME_TOL, and
 # +ags.adcircdt-TIME_TOL to -ags.gsshadt+TIME_TOL.
 # I wonder if this could have been combined into a single function?
+# Those window conditions now live in couplingschedule, as exact ceiling
+# divisions on an integer time grid, for all coupling types.
 
 #########################################################################functag
-def coupler_run_gssha_driving_adcirc(ags):
+def broadcast_gssha_state(ags):
+    '''Broadcast GSSHA's timer, vout and qout from PE 0, which runs GSSHA.
+
+    One collective replaces the separate timer and vout max reductions, and
+    also hands qout to the other PEs, which use it for their flux BCs. With
+    several watersheds, each one's qout, gathered on PE 0, goes along, and so
+    do GSSHA's samples of the window when sub-sampling.
+    '''
+    if ags.pu.messg == ags.pu.on:
+        log.debug('PE[%s] Before messg: timer = %s', ags.myid, ags.gsshamv.timer)
+        samples = ags.sampling.gssha_values(ags)
+        if ags.gsshaqouts is None and not samples:
+            ags.gsshamv.timer, ags.gsshamv.vout, ags.gsshamv.qout = ags.messenger.bcast(
+                    [ags.gsshamv.timer, ags.gsshamv.vout, ags.gsshamv.qout], root=0)
+        else:
+            qouts = [] if ags.gsshaqouts is None else ags.gsshaqouts.tolist()
+            values = ags.messenger.bcast([ags.gsshamv.timer, ags.gsshamv.vout, ags.gsshamv.qout]
+                                         + qouts + samples, root=0)
+            ags.gsshamv.timer, ags.gsshamv.vout, ags.gsshamv.qout = values[:3]
+            if ags.gsshaqouts is not None:
+                ags.gsshaqouts[:] = values[3:3+len(qouts)]
+            ags.sampling.set_gssha_values(ags, values[3+len(qouts):])
+        log.debug('PE[%s] After messg : timer = %s', ags.myid, ags.gsshamv.timer)
 
-    from .adcircgsshastruct     import TIME_TOL
+#########################################################################functag
+def coupler_run_gssha_driving_adcirc(ags):
 
-    adcirc_init_bc_from_gssha_hydrograph(ags)
+    with ags.timers.phase(PHASE_ADCIRC_BC):
+        adcirc_init_bc_from_gssha_hydrograph(ags)
     if ags.couplingtype == 'gdAdg':
+        with ags.timers.phase(PHASE_GSSHA_BC):
+            gssha_init_bc_from_adcirc_depths(ags)
+
+    if ags.checkpoints.restarting:
+        # Carry on at the checkpointed window instead.
+        ags.checkpoints.restore(ags)
+    else:
+        # Set final times to zero.
+        ags.pmain.itime_end = 0
+        ags.gsshamv.niter = 0
+        # Run GSSHA only on 1 processsor: PE 0.
+        if ags.myid == 0:
+            with ags.timers.phase(PHASE_GSSHA_RUN):
+                ierr_code = ags.gsshafnctn.main_gssha_run(ags.mvs)
+            assert(ierr_code == 0)
+            ags.gsshamv.go    = ags.gsshatypes.TRUE
+        else:
+            # Assumes GSSHA cannot start at negative time!
+            ags.gsshamv.go    = ags.gsshatypes.FALSE
+        broadcast_gssha_state(ags)
+    ags.timers.end_window() # Window 0: initial BCs and first GSSHA run.
+    ags.telemetry.publish(ags)
+    ags.archive.record(ags)
+
+    while (ags.adcirctprev<ags.adcirctfinal or ags.gsshamv.timer<ags.gsshatfinal):
+        # Run the window, again from its start while iterating.
+        for iteration in ags.iteration.window(ags):
+            ######################################################
+            if (ags.gsshamv.timer < ags.gsshatfinal):
+                #while (ags.gsshamv.niter*ags.gsshatimefact < ags.adcirctprev+ags.adcircdt-TIME_TOL):
+                #    ags.gsshamv.niter             += int(ags.effectivegsshadt)/60
+                #if (ags.adcircrunflag==ags.pu.off): #If ADCIRC is done first, let GSSHA finish off directly.
+                #    ags.gsshamv.niter            = ags.gsshatfinal
+                ## This one is the important one that determines end time:
+                #ags.gsshamv.single_event_end = ags.gsshamv.b_lt_start + ags.gsshamv.niter/1440.0 #float(ags.gsshamv.niter)/1440.0
+
+                # Decided while writing report. Driving model must take at least one time step forward.
+                superdt, tend                    = ags.schedule.gssha_window(ags)
+                ags.gsshamv.niter                = ags.schedule.gssha_niter(tend)
+                # This one is the important one that determines end time:
+                ags.gsshamv.single_event_end     = ags.gsshamv.b_lt_start + tend/86400.0 #Julian
+
+                if (ags.adcircrunflag==ags.pu.off): #If ADCIRC is done first, let GSSHA finish off directly.
+                    ags.gsshamv.niter            = ags.gsshatfinal
+                    ags.gsshamv.single_event_end = ags.gsshamv.b_lt_start + ags.gsshamv.niter/1440.0 #gsshatfinal was original niter in mins
+
+                log.info("\n*******************************************\nRunning GSSHA:")
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("dt             = %s", ags.gsshamv.dt)
+                    log.debug("timer          = %s", ags.gsshamv.timer)
+                    log.debug("niter          = %s", ags.gsshamv.niter)
+                    log.debug("superdt        = %s", superdt)
+                    log.debug("end time       = %s", ags.gsshamv.timer*ags.gsshatimefact + superdt)
+
+                # Run GSSHA only on 1 processsor: PE 0.
+                if ags.myid == 0:
+                    with ags.timers.phase(PHASE_GSSHA_RUN):
+                        ierr_code = ags.sampling.run_gssha(ags, tend)
+                    assert(ierr_code == 0)
+                    # Needed to force gssha to run for next time step:
+                    ags.gsshamv.go    = ags.gsshatypes.TRUE
+                else:
+                    # Note: We are keeping gssharunflag as ON, but mvs[0].go as FALSE!!
+                    # This matters in adcirc_set_bc functions!
+                    ags.gsshamv.go    = ags.gsshatypes.FALSE
+                broadcast_gssha_state(ags)
+
+            else:
+                ags.gssharunflag = ags.gsshadefine.OFF
+                ags.gsshamv.go    = ags.gsshatypes.FALSE
+
+            ######################################################
+            # Set ADCIRC Boundary conditions from GSSHA
+            with ags.timers.phase(PHASE_ADCIRC_BC):
+                adcirc_set_bc_from_gssha_hydrograph(ags)
+
+            ######################################################
+            if (ags.adcirctprev < ags.adcirctfinal):
+                ntsteps, ags.adcirctnext = ags.schedule.adcirc_window(ags)
+                if (ags.gssharunflag == ags.gsshadefine.OFF):
+                    ntsteps = (ags.adcircntsteps-ags.pmain.itime_bgn+1)
+                    ags.adcirctnext = ags.adcirctfinal
+
+                log.info("\n****************************************\nRunning ADCIRC:")
+                log.debug("dt             = %s", ags.adcircdt)
+                log.debug("t_prev         = %s", ags.adcirctprev)
+                log.debug("t_final        = %s", ags.adcirctnext)
+                log.debug("ntsteps        = %s", ntsteps)
+
+                # Run ADCIRC
+                with ags.timers.phase(PHASE_ADCIRC_RUN):
+                    ags.sampling.run_adcirc(ags, ntsteps)
+                ags.adcirctprev = (ags.pmain.itime_bgn-1)*ags.pg.dtdp + ags.pg.statim*86400.0
+
+            else:
+                ags.adcircrunflag=ags.pu.off
+
+        # Next interval, before the GSSHA series is set one interval ahead.
+        ags.couplinginterval.update(ags)
+
+        ######################################################
+        ## Set GSSHA Boundary conditions from ADCIRC
+        if ags.couplingtype == 'gdAdg':
+            with ags.timers.phase(PHASE_GSSHA_BC):
+                # Reduced by the iterations already, if any.
+                gssha_set_bc_from_adcirc_depths(ags, ags.iteration.reduced)
+
+        ags.timers.end_window()
+        ags.telemetry.publish(ags)
+        ags.archive.record(ags)
+        ags.checkpoints.save(ags)
+
+#########################################################################functag
+def coupler_run_adcirc_driving_gssha(ags):
+
+    with ags.timers.phase(PHASE_GSSHA_BC):
         gssha_init_bc_from_adcirc_depths(ags)
+    if ags.couplingtype == 'AdgdA':
+       with ags.timers.phase(PHASE_ADCIRC_BC):
+           adcirc_init_bc_from_gssha_hydrograph(ags)
 
-    # Set final times to zero.
-    ags.pmain.itime_end = 0
-    ags.mvs[0].niter = 0
-    # Run GSSHA only on 1 processsor: PE 0.
-    if ags.myid == 0:
-        ierr_code = gsshafnctn.main_gssha_run(ags.mvs)
-        assert(ierr_code == 0)
-        ags.mvs[0].go    = gsshatypes.TRUE
+    if ags.checkpoints.restarting:
+        # Carry on at the checkpointed window instead.
+        ags.checkpoints.restore(ags)
     else:
-        # Assumes GSSHA cannot start at negative time!
-        ags.mvs[0].go    = gsshatypes.FALSE
-    if ags.pu.messg == ags.pu.on:
-        if (ags.pu.debug ==ags.pu.on or DEBUG_LOCAL != 0):
-            print('PE[',ags.myid,'] Before messg: timer = ', ags.mvs[0].timer)
-        ags.mvs[0].timer = ags.pmsg.pymsg_dbl_max(ags.mvs[0].timer, ags.adcirc_comm_comp)
-        if (ags.pu.debug ==ags.pu.on or DEBUG_LOCAL != 0):
-            print('PE[',ags.myid,'] After messg : timer = ', ags.mvs[0].timer)
+        # Set final times to zero.
+        ags.pmain.itime_end = 0
+        ags.gsshamv.niter = 0
+        # Run GSSHA only on 1 processsor: PE 0.
+        if ags.myid == 0:
+            with ags.timers.phase(PHASE_GSSHA_RUN):
+                ierr_code = ags.gsshafnctn.main_gssha_run(ags.mvs)
+            assert(ierr_code == 0)
+            ags.gsshamv.go    = ags.gsshatypes.TRUE
+        else:
+            # Assumes GSSHA cannot start at negative time!
+            ags.gsshamv.go    = ags.gsshatypes.FALSE
+        broadcast_gssha_state(ags)
+    ags.timers.end_window() # Window 0: initial BCs and first GSSHA run.
+    ags.telemetry.publish(ags)
+    ags.archive.record(ags)
+
+    while (ags.adcirctprev<ags.adcirctfinal or ags.gsshamv.timer<ags.gsshatfinal):
+        # Run the window, again from its start while iterating.
+        for iteration in ags.iteration.window(ags):
+            ######################################################
+            if (ags.adcirctprev < ags.adcirctfinal):
+                ntsteps, ags.adcirctnext = ags.schedule.adcirc_window(ags)
+                if (ags.gssharunflag == ags.gsshadefine.OFF):
+                    ntsteps = (ags.adcircntsteps-ags.pmain.itime_bgn+1)
+                    ags.adcirctnext = ags.adcirctfinal
+
+                log.info("\n****************************************\nRunning ADCIRC:")
+                log.debug("dt             = %s", ags.adcircdt)
+                log.debug("t_prev         = %s", ags.adcirctprev)
+                log.debug("t_final        = %s", ags.adcirctnext)
+                log.debug("ntsteps        = %s", ntsteps)
+
+                # Run ADCIRC
+                with ags.timers.phase(PHASE_ADCIRC_RUN):
+                    ags.sampling.run_adcirc(ags, ntsteps)
+                ags.adcirctprev = (ags.pmain.itime_bgn-1)*ags.pg.dtdp + ags.pg.statim*86400.0
+
+            else:
+                ags.adcircrunflag=ags.pu.off
+
+            ######################################################
+            ## Set GSSHA Boundary conditions from ADCIRC
+            with ags.timers.phase(PHASE_GSSHA_BC):
+                gssha_set_bc_from_adcirc_depths(ags)
+
+            ######################################################
+            if (ags.gsshamv.timer < ags.gsshatfinal):
+                #while (ags.gsshamv.niter*ags.gsshatimefact < ags.adcirctprev-ags.adcircdt+TIME_TOL):
+                #    ags.gsshamv.niter             += int(ags.effectivegsshadt)/60
+                #if (ags.adcircrunflag==ags.pu.off): #If ADCIRC is done first, let GSSHA finish off directly.
+                #    ags.gsshamv.niter            = ags.gsshatfinal
+                ## This one is the important one that determines end time:
+                #ags.gsshamv.single_event_end = ags.gsshamv.b_lt_start + ags.gsshamv.niter/1440.0 #float(ags.gsshamv.niter)/1440.0
+
+                # Decided while writing report. Driving model must take at least one time step forward.
+                superdt, tend                    = ags.schedule.gssha_window(ags)
+                ags.gsshamv.niter                = ags.schedule.gssha_niter(tend)
+                # This one is the important one that determines end time:
+                ags.gsshamv.single_event_end     = ags.gsshamv.b_lt_start + tend/86400.0 #Julian
+
+                if (ags.adcircrunflag==ags.pu.off): #If ADCIRC is done first, let GSSHA finish off directly.
+                    ags.gsshamv.niter            = ags.gsshatfinal
+                    ags.gsshamv.single_event_end = ags.gsshamv.b_lt_start + ags.gsshamv.niter/1440.0 #gsshatfinal was original niter in mins
+
+                log.info("\n*******************************************\nRunning GSSHA:")
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("dt             = %s", ags.gsshamv.dt)
+                    log.debug("timer          = %s", ags.gsshamv.timer)
+                    log.debug("niter          = %s", ags.gsshamv.niter)
+                    log.debug("superdt        = %s", superdt)
+                    log.debug("end time       = %s", ags.gsshamv.timer*ags.gsshatimefact + superdt)
+
+                # Run GSSHA only on 1 processsor: PE 0.
+                if ags.myid == 0:
+                    with ags.timers.phase(PHASE_GSSHA_RUN):
+                        ierr_code = ags.sampling.run_gssha(ags, tend)
+                    assert(ierr_code == 0)
+                    # Needed to force gssha to run for next time step:
+                    ags.gsshamv.go    = ags.gsshatypes.TRUE
+                else:
+                    # Note: We are keeping gssharunflag as ON, but mvs[0].go as FALSE!!
+                    # This matters in adcirc_set_bc functions!
+                    ags.gsshamv.go    = ags.gsshatypes.FALSE
+                broadcast_gssha_state(ags)
+
+            else:
+                ags.gssharunflag = ags.gsshadefine.OFF
+                ags.gsshamv.go    = ags.gsshatypes.FALSE
+
+        # Next interval, before the ADCIRC series is set one interval ahead.
+        ags.couplinginterval.update(ags)
+
+        ######################################################
+        # Set ADCIRC Boundary conditions from GSSHA
+        if ags.couplingtype == 'AdgdA':
+            with ags.timers.phase(PHASE_ADCIRC_BC):
+                adcirc_set_bc_from_gssha_hydrograph(ags)
+
+        ags.timers.end_window()
+        ags.telemetry.publish(ags)
+        ags.archive.record(ags)
+        ags.checkpoints.save(ags)
+
+
+#########################################################################functag
+def coupler_run_concurrent(ags):
+    '''Lagged two-way coupling with ADCIRC and GSSHA running at the same time.
+
+    In every coupling window, GSSHA runs in a background thread on PE 0 while
+    ADCIRC runs on all PEs, each with the boundary values the other model
+    produced in the previous window. Both series are therefore set one window
+    ahead, as in AdgdA for ADCIRC and gdAdg for GSSHA. The models join at the
+    end of the window, where the boundary values are exchanged. See
+    gsshathread for the GIL and thread-safety requirements.
+    '''
+
+    with ags.timers.phase(PHASE_GSSHA_BC):
+        gssha_init_bc_from_adcirc_depths(ags)
+    with ags.timers.phase(PHASE_ADCIRC_BC):
+        adcirc_init_bc_from_gssha_hydrograph(ags)
+
+    if ags.checkpoints.restarting:
+        # Carry on at the checkpointed window instead.
+        ags.checkpoints.restore(ags)
+    else:
+        # Set final times to zero.
+        ags.pmain.itime_end = 0
+        ags.gsshamv.niter = 0
+        # Run GSSHA only on 1 processsor: PE 0.
+        if ags.myid == 0:
+            with ags.timers.phase(PHASE_GSSHA_RUN):
+                ierr_code = ags.gsshafnctn.main_gssha_run(ags.mvs)
+            assert(ierr_code == 0)
+            ags.gsshamv.go    = ags.gsshatypes.TRUE
+        else:
+            # Assumes GSSHA cannot start at negative time!
+            ags.gsshamv.go    = ags.gsshatypes.FALSE
+        broadcast_gssha_state(ags)
+    ags.timers.end_window() # Window 0: initial BCs and first GSSHA run.
+    ags.telemetry.publish(ags)
+    ags.archive.record(ags)
+
+    gssha = gsshathread(ags)
+    while (ags.adcirctprev<ags.adcirctfinal or ags.gsshamv.timer<ags.gsshatfinal):
+        adcircrun = None
+        ######################################################
+        # ADCIRC's share of the window: one coupling interval, or the rest of
+        # the run once GSSHA is done.
+        if (ags.adcirctprev < ags.adcirctfinal):
+            ntsteps, ags.adcirctnext = ags.schedule.adcirc_window(ags)
+            if (ags.gssharunflag == ags.gsshadefine.OFF):
+                ntsteps = (ags.adcircntsteps-ags.pmain.itime_bgn+1)
+                ags.adcirctnext = ags.adcirctfinal
+        else:
+            ags.adcircrunflag=ags.pu.off
 
-    while (ags.adcirctprev<ags.adcirctfinal or ags.mvs[0].timer<ags.gsshatfinal):
         ######################################################
-        if (ags.mvs[0].timer < ags.gsshatfinal):
-            #while (ags.mvs[0].niter*ags.gsshatimefact < ags.adcirctprev+ags.adcircdt-TIME_TOL):
-            #    ags.mvs[0].niter             += int(ags.effectivegsshadt)/60
-            #if (ags.adcircrunflag==ags.pu.off): #If ADCIRC is done first, let GSSHA finish off directly.
-            #    ags.mvs[0].niter            = ags.gsshatfinal
-            ## This one is the important one that determines end time:
-            #ags.mvs[0].single_event_end = ags.mvs[0].b_lt_start + ags.mvs[0].niter/1440.0 #float(ags.mvs[0].niter)/1440.0
-
-            # Decided while writing report. Driving model must take at least one time step forward.
-            superdt = ags.effectivegsshadt
-            #superdt = 0.0
-            while (ags.mvs[0].timer*ags.gsshatimefact + superdt < ags.adcirctprev+ags.adcircdt-TIME_TOL):
-                superdt                    += ags.effectivegsshadt
-
-            ags.mvs[0].niter               += int(max(1.0, (superdt+TIME_TOL)/60.0))
+        # Start GSSHA on the same window, in the background.
+        gssharunning = (ags.gsshamv.timer < ags.gsshatfinal)
+        if gssharunning:
+            # Driving model must take at least one time step forward.
+            superdt, tend                    = ags.schedule.gssha_window(ags)
+            ags.gsshamv.niter                = ags.schedule.gssha_niter(tend)
             # This one is the important one that determines end time:
-            ags.mvs[0].single_event_end     = ags.mvs[0].b_lt_start + (ags.mvs[0].timer*ags.gsshatimefact + superdt)/86400.0 #Julian
+            ags.gsshamv.single_event_end     = ags.gsshamv.b_lt_start + tend/86400.0 #Julian
 
             if (ags.adcircrunflag==ags.pu.off): #If ADCIRC is done first, let GSSHA finish off directly.
-                ags.mvs[0].niter            = ags.gsshatfinal
-                ags.mvs[0].single_event_end = ags.mvs[0].b_lt_start + ags.mvs[0].niter/1440.0 #gsshatfinal was original niter in mins
-
-            if gsshaopts._DEBUG == gsshadefine.ON and DEBUG_LOCAL != 0 and ags.myid == 0:
-                print("\n*******************************************\nRunning GSSHA:")
-                print("dt             =", ags.mvs[0].dt)
-                print("timer          =", ags.mvs[0].timer)
-                print("niter          =", ags.mvs[0].niter)
-                print("superdt        =", superdt)
-                print("end time       =", ags.mvs[0].timer*ags.gsshatimefact + superdt)
-            elif ags.myid==0:
-                print("\n*******************************************\nRunning GSSHA:")
+                ags.gsshamv.niter            = ags.gsshatfinal
+                ags.gsshamv.single_event_end = ags.gsshamv.b_lt_start + ags.gsshamv.niter/1440.0 #gsshatfinal was original niter in mins
+
+            log.info("\n*******************************************\nRunning GSSHA (background):")
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("dt             = %s", ags.gsshamv.dt)
+                log.debug("timer          = %s", ags.gsshamv.timer)
+                log.debug("niter          = %s", ags.gsshamv.niter)
+                log.debug("superdt        = %s", superdt)
+                log.debug("end time       = %s", ags.gsshamv.timer*ags.gsshatimefact + superdt)
 
             # Run GSSHA only on 1 processsor: PE 0.
             if ags.myid == 0:
-                ierr_code = gsshafnctn.main_gssha_run(ags.mvs)
-                assert(ierr_code == 0)
-                # Needed to force gssha to run for next time step:
-                ags.mvs[0].go    = gsshatypes.TRUE
+                gssha.start()
             else:
                 # Note: We are keeping gssharunflag as ON, but mvs[0].go as FALSE!!
                 # This matters in adcirc_set_bc functions!
-                ags.mvs[0].go    = gsshatypes.FALSE
-            if ags.pu.messg == ags.pu.on:
-                if (ags.pu.debug ==ags.pu.on or DEBUG_LOCAL != 0):
-                    print('PE[',ags.myid,'] Before messg: timer = ', ags.mvs[0].timer)
-                ags.mvs[0].timer = ags.pmsg.pymsg_dbl_max(ctypes_c_double(ags.mvs[0].timer), ags.adcirc_comm_comp)
-                if (ags.pu.debug ==ags.pu.on or DEBUG_LOCAL != 0):
-                    print('PE[',ags.myid,'] After messg : timer = ', ags.mvs[0].timer)
+                ags.gsshamv.go    = ags.gsshatypes.FALSE
+        else:
+            ags.gssharunflag = ags.gsshadefine.OFF
+            ags.gsshamv.go    = ags.gsshatypes.FALSE
+
+        ######################################################
+        if (ags.adcircrunflag != ags.pu.off):
+            log.info("\n****************************************\nRunning ADCIRC:")
+            log.debug("dt             = %s", ags.adcircdt)
+            log.debug("t_prev         = %s", ags.adcirctprev)
+            log.debug("t_final        = %s", ags.adcirctnext)
+            log.debug("ntsteps        = %s", ntsteps)
+
+            # Run ADCIRC
+            with ags.timers.phase(PHASE_ADCIRC_RUN):
+                adcircstart = gsshathread.clock()
+                ags.pmain.pyadcirc_run(ntsteps)
+                adcircrun = (adcircstart, gsshathread.clock())
+            ags.adcirctprev = (ags.pmain.itime_bgn-1)*ags.pg.dtdp + ags.pg.statim*86400.0
 
+        ######################################################
+        # Join at the end of the window.
+        if gssharunning:
+            if ags.myid == 0:
+                gssha.join()
+                gssha.check_overlap(adcircrun)
+                # Needed to force gssha to run for next time step:
+                ags.gsshamv.go    = ags.gsshatypes.TRUE
+            broadcast_gssha_state(ags)
+
+        # Next interval, before both series are set one interval ahead.
+        ags.couplinginterval.update(ags)
+
+        ######################################################
+        # Exchange this window's results for the next window.
+        with ags.timers.phase(PHASE_GSSHA_BC):
+            gssha_set_bc_from_adcirc_depths(ags)
+        with ags.timers.phase(PHASE_ADCIRC_BC):
+            adcirc_set_bc_from_gssha_hydrograph(ags)
+
+        ags.timers.end_window()
+        ags.telemetry.publish(ags)
+        ags.archive.record(ags)
+        ags.checkpoints.save(ags)
+
+
+#########################################################################functag
+def coupler_run_batch_gssha_driving_adcirc(ags):
+    '''One-way coupling, GSSHA driving ADCIRC, in two phases.
+
+    Phase 1 runs GSSHA alone on PE 0 through all the coupling windows, with
+    ADCIRC's side of each window taken from the schedule, as ADCIRC will run
+    it in phase 2. GSSHA's timer, vout and qout at the end of every window go
+    to the other PEs in one broadcast. Phase 2 runs ADCIRC through the same
+    windows, with its flux series set from these, and no collectives or GSSHA
+    runs in between. Gives the same results as
+    coupler_run_gssha_driving_adcirc.
+    '''
+
+    with ags.timers.phase(PHASE_ADCIRC_BC):
+        adcirc_init_bc_from_gssha_hydrograph(ags)
+
+    # Set final times to zero.
+    ags.pmain.itime_end = 0
+    ags.gsshamv.niter = 0
+
+    ######################################################
+    # Phase 1: GSSHA through all the windows, on PE 0 only.
+    records = []
+    if ags.myid == 0:
+        with ags.timers.phase(PHASE_GSSHA_RUN):
+            ierr_code = ags.gsshafnctn.main_gssha_run(ags.mvs)
+        assert(ierr_code == 0)
+        ags.gsshamv.go    = ags.gsshatypes.TRUE
+        records.append((ags.gsshamv.timer, ags.gsshamv.vout, ags.gsshamv.qout))
+
+        # ADCIRC's state, to be put back for phase 2.
+        interval = ags.couplinginterval.snapshot()
+        adcirctprev, adcirctnext = ags.adcirctprev, ags.adcirctnext
+        itime = ags.pmain.itime_bgn-1
+        while (ags.gsshamv.timer < ags.gsshatfinal):
+            superdt, tend                    = ags.schedule.gssha_window(ags)
+            ags.gsshamv.niter                = ags.schedule.gssha_niter(tend)
+            ags.gsshamv.single_event_end     = ags.gsshamv.b_lt_start + tend/86400.0 #Julian
+
+            if (ags.adcircrunflag==ags.pu.off): #If ADCIRC is done first, let GSSHA finish off directly.
+                ags.gsshamv.niter            = ags.gsshatfinal
+                ags.gsshamv.single_event_end = ags.gsshamv.b_lt_start + ags.gsshamv.niter/1440.0 #gsshatfinal was original niter in mins
+
+            log.info("\n*******************************************\nRunning GSSHA:")
+            with ags.timers.phase(PHASE_GSSHA_RUN):
+                ierr_code = ags.gsshafnctn.main_gssha_run(ags.mvs)
+            assert(ierr_code == 0)
+            ags.gsshamv.go    = ags.gsshatypes.TRUE
+            records.append((ags.gsshamv.timer, ags.gsshamv.vout, ags.gsshamv.qout))
+
+            # Where ADCIRC will be at the end of this window in phase 2.
+            if (ags.adcirctprev < ags.adcirctfinal):
+                ntsteps, ags.adcirctnext = ags.schedule.adcirc_window(ags)
+                itime = min(itime+ntsteps, ags.adcircntsteps)
+                ags.adcirctprev = itime*ags.pg.dtdp + ags.pg.statim*86400.0
+            else:
+                ags.adcircrunflag=ags.pu.off
+
+            ags.couplinginterval.update(ags)
+
+        ags.couplinginterval.restore(ags, interval)
+        ags.adcirctprev, ags.adcirctnext = adcirctprev, adcirctnext
+        ags.adcircrunflag=ags.pu.on
+    else:
+        # Assumes GSSHA cannot start at negative time!
+        ags.gsshamv.go    = ags.gsshatypes.FALSE
+
+    # All the records in one broadcast, after their count.
+    nrecords = int(ags.messenger.bcast([len(records)], root=0)[0])
+    values = [value for record in records for value in record] or [0.0]*(3*nrecords)
+    values = ags.messenger.bcast(values, root=0)
+    records = [tuple(values[3*k:3*k+3]) for k in range(nrecords)]
+    ags.gsshamv.timer, ags.gsshamv.vout, ags.gsshamv.qout = records[0]
+    ags.timers.end_window() # Window 0: initial BCs and phase 1.
+    ags.telemetry.publish(ags)
+
+    ######################################################
+    # Phase 2: ADCIRC through the same windows.
+    k = 1
+    while (ags.adcirctprev<ags.adcirctfinal or ags.gsshamv.timer<ags.gsshatfinal):
+        if (ags.gsshamv.timer < ags.gsshatfinal):
+            # GSSHA's side of the window, as it ran in phase 1.
+            assert(k < nrecords)
+            ags.gsshamv.timer, ags.gsshamv.vout, ags.gsshamv.qout = records[k]
+            k += 1
+            if ags.myid != 0:
+                ags.gsshamv.go    = ags.gsshatypes.FALSE
         else:
-            ags.gssharunflag = gsshadefine.OFF
-            ags.mvs[0].go    = gsshatypes.FALSE
+            ags.gssharunflag = ags.gsshadefine.OFF
+            ags.gsshamv.go    = ags.gsshatypes.FALSE
 
         ######################################################
         # Set ADCIRC Boundary conditions from GSSHA
-        adcirc_set_bc_from_gssha_hydrograph(ags)
+        with ags.timers.phase(PHASE_ADCIRC_BC):
+            adcirc_set_bc_from_gssha_hydrograph(ags)
 
         ######################################################
         if (ags.adcirctprev < ags.adcirctfinal):
-            ntsteps = 0
-            while (ags.adcirctnext < ags.mvs[0].timer*ags.gsshatimefact-ags.adcircdt+TIME_TOL):
-                ntsteps += ags.couplingdtfactor
-                ags.adcirctnext += ags.adcircdt
-            if (ags.gssharunflag == gsshadefine.OFF):
+            ntsteps, ags.adcirctnext = ags.schedule.adcirc_window(ags)
+            if (ags.gssharunflag == ags.gsshadefine.OFF):
                 ntsteps = (ags.adcircntsteps-ags.pmain.itime_bgn+1)
                 ags.adcirctnext = ags.adcirctfinal
 
-            if ags.pu.debug == ags.pu.on and DEBUG_LOCAL != 0 and ags.myid == 0:
-                print("\n****************************************\nRunning ADCIRC:")
-                print("dt             =", ags.adcircdt)
-                print("t_prev         =", ags.adcirctprev)
-                print("t_final        =", ags.adcirctnext)
-                print("ntsteps        =", ntsteps)
-            elif ags.myid==0:
-                print("\n****************************************\nRunning ADCIRC:")
+            log.info("\n****************************************\nRunning ADCIRC:")
+            log.debug("t_prev         = %s", ags.adcirctprev)
+            log.debug("t_final        = %s", ags.adcirctnext)
+            log.debug("ntsteps        = %s", ntsteps)
 
             # Run ADCIRC
-            ags.pmain.pyadcirc_run(ntsteps)
+            with ags.timers.phase(PHASE_ADCIRC_RUN):
+                ags.pmain.pyadcirc_run(ntsteps)
             ags.adcirctprev = (ags.pmain.itime_bgn-1)*ags.pg.dtdp + ags.pg.statim*86400.0
 
         else:
             ags.adcircrunflag=ags.pu.off
 
-        ######################################################
-        ## Set GSSHA Boundary conditions from ADCIRC
-        if ags.couplingtype == 'gdAdg':
-            gssha_set_bc_from_adcirc_depths(ags)
+        # The same inputs as in phase 1, hence the same next interval.
+        ags.couplinginterval.update(ags)
 
-#########################################################################functag
-def coupler_run_adcirc_driving_gssha(ags):
-
-    from .adcircgsshastruct     import TIME_TOL
+        ags.timers.end_window()
+        ags.telemetry.publish(ags)
 
-    gssha_init_bc_from_adcirc_depths(ags)
-    if ags.couplingtype == 'AdgdA':
-       adcirc_init_bc_from_gssha_hydrograph(ags)
+#########################################################################functag
+def coupler_run_batch_adcirc_driving_gssha(ags):
+    '''One-way coupling, ADCIRC driving GSSHA, in two phases.
+
+    Phase 1 runs ADCIRC through all the coupling windows, with GSSHA's side of
+    each window taken from the schedule, as GSSHA will run it in phase 2.
+    Every PE keeps its edge string eta statistics of every window, and these
+    are all reduced in a single collective at the end. Phase 2 sets GSSHA's
+    head series from them, window by window, into one long series, and runs
+    GSSHA through it in a single call on PE 0. Gives the same results as
+    coupler_run_adcirc_driving_gssha.
+    '''
+
+    with ags.timers.phase(PHASE_GSSHA_BC):
+        gssha_init_bc_from_adcirc_depths(ags)
 
     # Set final times to zero.
     ags.pmain.itime_end = 0
-    ags.mvs[0].niter = 0
+    ags.gsshamv.niter = 0
     # Run GSSHA only on 1 processsor: PE 0.
     if ags.myid == 0:
-        ierr_code = gsshafnctn.main_gssha_run(ags.mvs)
+        with ags.timers.phase(PHASE_GSSHA_RUN):
+            ierr_code = ags.gsshafnctn.main_gssha_run(ags.mvs)
         assert(ierr_code == 0)
-        ags.mvs[0].go    = gsshatypes.TRUE
+        ags.gsshamv.go    = ags.gsshatypes.TRUE
     else:
         # Assumes GSSHA cannot start at negative time!
-        ags.mvs[0].go    = gsshatypes.FALSE
-    if ags.pu.messg == ags.pu.on:
-        if (ags.pu.debug ==ags.pu.on or DEBUG_LOCAL != 0):
-            print('PE[',ags.myid,'] Before messg: timer = ', ags.mvs[0].timer)
-        ags.mvs[0].timer = ags.pmsg.pymsg_dbl_max(ags.mvs[0].timer, ags.adcirc_comm_comp)
-        if (ags.pu.debug ==ags.pu.on or DEBUG_LOCAL != 0):
-            print('PE[',ags.myid,'] After messg : timer = ', ags.mvs[0].timer)
-
-    while (ags.adcirctprev<ags.adcirctfinal or ags.mvs[0].timer<ags.gsshatfinal):
+        ags.gsshamv.go    = ags.gsshatypes.FALSE
+    broadcast_gssha_state(ags)
+    ags.timers.end_window() # Window 0: initial BCs and first GSSHA run.
+    ags.telemetry.publish(ags)
+
+    ######################################################
+    # Phase 1: ADCIRC through all the windows.
+    gsshatimer = ags.gsshamv.timer
+    windows = [] # ADCIRC's time and run flag at the end of every window.
+    stats, ops = [], []
+    while (ags.adcirctprev<ags.adcirctfinal or ags.gsshamv.timer<ags.gsshatfinal):
         ######################################################
         if (ags.adcirctprev < ags.adcirctfinal):
-            ntsteps = 0
-            while (ags.adcirctnext < ags.mvs[0].timer*ags.gsshatimefact+ags.effectivegsshadt-TIME_TOL):
-            #while (ags.adcirctnext < ags.mvs[0].timer*ags.gsshatimefact+ags.adcircdt-TIME_TOL):
-                ntsteps += ags.couplingdtfactor
-                ags.adcirctnext += ags.adcircdt
-            if (ags.gssharunflag == gsshadefine.OFF):
+            ntsteps, ags.adcirctnext = ags.schedule.adcirc_window(ags)
+            if (ags.gssharunflag == ags.gsshadefine.OFF):
                 ntsteps = (ags.adcircntsteps-ags.pmain.itime_bgn+1)
                 ags.adcirctnext = ags.adcirctfinal
 
-            if ags.pu.debug == ags.pu.on and DEBUG_LOCAL != 0 and ags.myid == 0:
-                print("\n****************************************\nRunning ADCIRC:")
-                print("dt             =", ags.adcircdt)
-                print("t_prev         =", ags.adcirctprev)
-                print("t_final        =", ags.adcirctnext)
-                print("ntsteps        =", ntsteps)
-            elif ags.myid==0:
-                print("\n****************************************\nRunning ADCIRC:")
+            log.info("\n****************************************\nRunning ADCIRC:")
+            log.debug("t_prev         = %s", ags.adcirctprev)
+            log.debug("t_final        = %s", ags.adcirctnext)
+            log.debug("ntsteps        = %s", ntsteps)
 
             # Run ADCIRC
-            ags.pmain.pyadcirc_run(ntsteps)
+            with ags.timers.phase(PHASE_ADCIRC_RUN):
+                ags.pmain.pyadcirc_run(ntsteps)
             ags.adcirctprev = (ags.pmain.itime_bgn-1)*ags.pg.dtdp + ags.pg.statim*86400.0
 
         else:
             ags.adcircrunflag=ags.pu.off
 
-        ######################################################
-        ## Set GSSHA Boundary conditions from ADCIRC
-        gssha_set_bc_from_adcirc_depths(ags)
+        # This window's share of the GSSHA boundary conditions, for phase 2.
+        windows.append((ags.adcirctprev, ags.adcircrunflag))
+        if (ags.adcircrunflag != ags.pu.off):
+            with ags.timers.phase(PHASE_GSSHA_BC):
+                values, valueops = edgestring_eta_stats(ags)
+            stats.extend(values)
+            ops.extend(valueops)
 
         ######################################################
-        if (ags.mvs[0].timer < ags.gsshatfinal):
-            #while (ags.mvs[0].niter*ags.gsshatimefact < ags.adcirctprev-ags.adcircdt+TIME_TOL):
-            #    ags.mvs[0].niter             += int(ags.effectivegsshadt)/60
-            #if (ags.adcircrunflag==ags.pu.off): #If ADCIRC is done first, let GSSHA finish off directly.
-            #    ags.mvs[0].niter            = ags.gsshatfinal
-            ## This one is the important one that determines end time:
-            #ags.mvs[0].single_event_end = ags.mvs[0].b_lt_start + ags.mvs[0].niter/1440.0 #float(ags.mvs[0].niter)/1440.0
-
-            # Decided while writing report. Driving model must take at least one time step forward.
-            superdt = ags.effectivegsshadt
-            #superdt = 0.0
-            while (ags.mvs[0].timer*ags.gsshatimefact + superdt < ags.adcirctprev-ags.effectivegsshadt+TIME_TOL):
-                superdt                    += ags.effectivegsshadt
-
-            ags.mvs[0].niter               += int(max(1.0, (superdt+TIME_TOL)/60.0))
-            # This one is the important one that determines end time:
-            ags.mvs[0].single_event_end     = ags.mvs[0].b_lt_start + (ags.mvs[0].timer*ags.gsshatimefact + superdt)/86400.0 #Julian
-
+        # Where GSSHA will be at the end of this window in phase 2.
+        if (ags.gsshamv.timer < ags.gsshatfinal):
+            superdt, tend = ags.schedule.gssha_window(ags)
             if (ags.adcircrunflag==ags.pu.off): #If ADCIRC is done first, let GSSHA finish off directly.
-                ags.mvs[0].niter            = ags.gsshatfinal
-                ags.mvs[0].single_event_end = ags.mvs[0].b_lt_start + ags.mvs[0].niter/1440.0 #gsshatfinal was original niter in mins
-
-            if gsshaopts._DEBUG == gsshadefine.ON and DEBUG_LOCAL != 0 and ags.myid == 0:
-                print("\n*******************************************\nRunning GSSHA:")
-                print("dt             =", ags.mvs[0].dt)
-                print("timer          =", ags.mvs[0].timer)
-                print("niter          =", ags.mvs[0].niter)
-                print("superdt        =", superdt)
-                print("end time       =", ags.mvs[0].timer*ags.gsshatimefact + superdt)
-            elif ags.myid==0:
-                print("\n*******************************************\nRunning GSSHA:")
-
-            # Run GSSHA only on 1 processsor: PE 0.
-            if ags.myid == 0:
-                ierr_code = gsshafnctn.main_gssha_run(ags.mvs)
-                assert(ierr_code == 0)
-                # Needed to force gssha to run for next time step:
-                ags.mvs[0].go    = gsshatypes.TRUE
-            else:
-                # Note: We are keeping gssharunflag as ON, but mvs[0].go as FALSE!!
-                # This matters in adcirc_set_bc functions!
-                ags.mvs[0].go    = gsshatypes.FALSE
-            if ags.pu.messg == ags.pu.on:
-                if (ags.pu.debug ==ags.pu.on or DEBUG_LOCAL != 0):
-                    print('PE[',ags.myid,'] Before messg: timer = ', ags.mvs[0].timer)
-                ags.mvs[0].timer = ags.pmsg.pymsg_dbl_max(ctypes_c_double(ags.mvs[0].timer), ags.adcirc_comm_comp)
-                if (ags.pu.debug ==ags.pu.on or DEBUG_LOCAL != 0):
-                    print('PE[',ags.myid,'] After messg : timer = ', ags.mvs[0].timer)
-
+                tend = ags.gsshatfinal*ags.gsshatimefact
+            ags.gsshamv.timer = tend/ags.gsshatimefact
         else:
-            ags.gssharunflag = gsshadefine.OFF
-            ags.mvs[0].go    = gsshatypes.FALSE
-
-        ######################################################
-        # Set ADCIRC Boundary conditions from GSSHA
-        if ags.couplingtype == 'AdgdA':
-            adcirc_set_bc_from_gssha_hydrograph(ags)
+            ags.gssharunflag = ags.gsshadefine.OFF
+            ags.gsshamv.go    = ags.gsshatypes.FALSE
+
+        ags.couplinginterval.update(ags)
+
+        ags.timers.end_window()
+        ags.telemetry.publish(ags)
+
+    ######################################################
+    # Phase 2: GSSHA through all the windows at once.
+    adcirctprev, adcircrunflag = ags.adcirctprev, ags.adcircrunflag
+    ags.gsshamv.timer = gsshatimer
+    with ags.timers.phase(PHASE_GSSHA_BC):
+        # The edge string statistics of all the windows in one collective.
+        reduced = ags.messenger.allreduce(stats, ops)
+        nvalues = 5*len(ags.adcircedgestrings)
+        ts = ags.gsshaboundts
+        last_access = ts.offset + ts.ts.last_access
+        ts.reserve(len(windows)*ags.exchangeinterp.npoints(ts.num_vals))
+        k = 0
+        for ags.adcirctprev, ags.adcircrunflag in windows:
+            if (ags.adcircrunflag != ags.pu.off):
+                gssha_set_bc_from_adcirc_depths(ags, reduced[k:k+nvalues])
+                k += nvalues
+            else:
+                gssha_set_bc_from_adcirc_depths(ags)
+        assert(k == len(reduced))
+    ags.adcirctprev, ags.adcircrunflag = adcirctprev, adcircrunflag
 
+    # Run GSSHA only on 1 processsor: PE 0.
+    if ags.myid == 0:
+        ts.history(last_access)
+        ags.gsshamv.niter            = ags.gsshatfinal
+        ags.gsshamv.single_event_end = ags.gsshamv.b_lt_start + ags.gsshamv.niter/1440.0 #gsshatfinal was original niter in mins
+        log.info("\n*******************************************\nRunning GSSHA:")
+        with ags.timers.phase(PHASE_GSSHA_RUN):
+            ierr_code = ags.gsshafnctn.main_gssha_run(ags.mvs)
+        assert(ierr_code == 0)
+        ts.window()
+        ags.gsshamv.go    = ags.gsshatypes.TRUE
+    broadcast_gssha_state(ags)
+    ags.timers.end_window()
+    ags.telemetry.publish(ags)
 
 #########################################################################functag
 def adcircgssha_coupler_run(self):
 
-    if self.couplingtype == 'gdA':
+    from .adcircgsshastruct import ONE_WAY_BATCH
+
+    batch = (self.onewaymode == ONE_WAY_BATCH)
+    if self.couplingtype == 'gdA' and batch:
+        run_string = 'Running GSSHA driving ADCIRC, One-way coupling in two phases'
+        run_func = coupler_run_batch_gssha_driving_adcirc
+
+    elif self.couplingtype == 'gdA':
         run_string = 'Running GSSHA driving ADCIRC, One-way coupling'
         run_func = coupler_run_gssha_driving_adcirc
 
+    elif self.couplingtype == 'Adg' and batch:
+        run_string = 'Running ADCIRC driving GSSHA, One-way coupling in two phases'
+        run_func = coupler_run_batch_adcirc_driving_gssha
+
     elif self.couplingtype == 'Adg':
         run_string = 'Running ADCIRC driving GSSHA, One-way coupling'
         run_func = coupler_run_adcirc_driving_gssha
@@ -287,23 +686,28 @@ def adcircgssha_coupler_run(self):
         run_string = 'Running ADCIRC driving GSSHA driving ADCIRC, Two-way coupling'
         run_func = coupler_run_adcirc_driving_gssha
 
+    elif self.couplingtype == 'A|g':
+        run_string = 'Running ADCIRC and GSSHA concurrently, Lagged two-way coupling'
+        run_func = coupler_run_concurrent
+
     else:
-        print('Unkown coupling type supplied by user:', self.couplingtype, '\nExiting.')
+        log.error('Unkown coupling type supplied by user: %s\nExiting.', self.couplingtype)
         return
 
-    print("\n\n***************************************************************")
-    print(    "***************************************************************")
-    print(    run_string)
-    print(    "***************************************************************")
-    print(    "***************************************************************")
+    log.info("\n\n***************************************************************\n"
+             "***************************************************************\n"
+             "%s\n"
+             "***************************************************************\n"
+             "***************************************************************", run_string)
 
     run_func(self)
+    log.info("Coupling windows: %d", self.couplinginterval.nwindows)
 
-    print("\n\n***************************************************************")
-    print(    "***************************************************************")
-    print(    "Finished", run_string)
-    print(    "***************************************************************")
-    print(    "***************************************************************")
+    log.info("\n\n***************************************************************\n"
+             "***************************************************************\n"
+             "Finished %s\n"
+             "***************************************************************\n"
+             "***************************************************************", run_string)
 
 
 #########################################################################functag
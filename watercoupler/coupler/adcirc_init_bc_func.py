@@ -4,99 +4,83 @@
 # LICENSE: BSD 3-Clause "New" or "Revised"
 #------------------------------------------------------------------------------#
 from __future__ import absolute_import, print_function
-import numpy as np
+import logging
+
+from .coupler_timers import PHASE_FORT20_IO
 
 ################################################################################
-DEBUG_LOCAL = 1
+log = logging.getLogger(__name__)
 
 ################################################################################
 def adcirc_init_bc_from_gssha_hydrograph(ags): # ags is of type adcircgsshatruct.
 
-    from .adcircgsshastruct import SERIESLENGTH, TIME_TOL
+    from .adcircgsshastruct import SERIESLENGTH, FLUX_EXCHANGE_FILE, ADCIRC_BC_AHEAD
 
     ######################################################
     #SET UP ADCIRC BC series and edgestring.
     ######################################################
-    assert(ags.pb.ibtype[ags.adcircedgestringid] == 22)
+    strings = ags.adcircedgestrings
+    for es in strings:
+        assert(ags.pb.ibtype[es.id] == 22)
 
-    ######################################################
-    # Store the length of the coupled ADCIRC edge string
-    # Valid only for open boundary and not a closed one!
-    for inode in range(1,ags.adcircedgestringnnodes):
-        # -1 needed below since Python is 0 indexed whereas Fortan node numbers are 1-indexed
-        n1 = ags.adcircedgestringnodes[inode-1]-1
-        n2 = ags.adcircedgestringnodes[inode  ]-1
-        x1 = ags.pm.x[n1]
-        y1 = ags.pm.y[n1]
-        x2 = ags.pm.x[n2]
-        y2 = ags.pm.y[n2]
-        delx = x2-x1
-        dely = y2-y1
-        ags.adcircedgestringlen += np.sqrt(delx*delx+dely*dely)
-        if ags.pu.debug == ags.pu.on and DEBUG_LOCAL != 0:
-            print("Nodes ",n1,"(",x1,",",y1,"),",n2,"(",x2,",",y2,")")
-    if ags.pu.messg==ags.pu.on:
-        ags.adcircedgestringlen = ags.pmsg.pymsg_dbl_sum(ags.adcircedgestringlen, ags.adcirc_comm_comp)
-    if ags.pu.debug == ags.pu.on and DEBUG_LOCAL != 0:
-        print("Edge string(",ags.adcircedgestringid+1,"): Length = ", ags.adcircedgestringlen)
+        ######################################################
+        # The length of the coupled ADCIRC edge string was computed with its
+        # topology at initialize. Valid only for open boundary and not a closed one!
+        log.debug("Edge string( %d ): Length = %s", es.id+1, es.length)
 
     ######################################################
     # Find series to modify during coupling.
     assert (SERIESLENGTH>=2)
 
-    if ags.pu.debug == ags.pu.on and DEBUG_LOCAL != 0 and ags.myid==0:
-        nbvStartIndex=sum(ags.pb.nvell[:ags.adcircedgestringid])
-        print("Original: Flux time increment FTIMINC =", ags.pg.ftiminc,\
-                "\nOriginal: Flux times:\nQTIME1 =", ags.pg.qtime1, \
-                "\nQTIME2 =", ags.pg.qtime2, \
-                "\nOriginal: Flux values:\nQNIN1  =\n",  ags.pg.qnin1[nbvStartIndex : nbvStartIndex+ags.adcircedgestringnnodes], \
-                "\nQNIN2  =\n",  ags.pg.qnin2[nbvStartIndex : nbvStartIndex+ags.adcircedgestringnnodes])
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Original: Flux time increment FTIMINC = %s"
+                  "\nOriginal: Flux times:\nQTIME1 = %s\nQTIME2 = %s"
+                  "\nOriginal: Flux values:\nQNIN1  =\n%s\nQNIN2  =\n%s",
+                  ags.pg.ftiminc, ags.pg.qtime1, ags.pg.qtime2,
+                  strings.fluxes(ags.adcircqnin1),
+                  strings.fluxes(ags.adcircqnin2))
 
     ##################################################
     # Replace the flux time increment value.
-    if ags.adcirctstart > 0.0: # GSSHA starting time is before ADCIRC starting time; GSSHA always starts at 0.0, hopefully!
-        superdt = ags.adcircdt
-    else:
-        superdt = ags.adcirctstart
-        while (superdt < ags.effectivegsshadt - TIME_TOL):
-            superdt += ags.adcircdt #max(ags.effectivegsshadt, ags.adcircdt)
-        superdt -= ags.adcirctstart
+    # If ADCIRC starts after GSSHA, one coupling interval; GSSHA always starts
+    # at 0.0, hopefully! Otherwise, enough intervals to reach one GSSHA dt.
+    superdt = ags.schedule.adcirc_init_ftiminc(ags)
 
     assert(ags.adcircdt>ags.gsshadt) #If this is true, then superdt = either adcirctstart or adcircdt.
     ags.pg.ftiminc = superdt
 
     ######################################################
-    # Close the original fort.20, write a new one with a different name, and reopen it for reading
-    errorio = ags.pu.pycloseopenedfileforread(20)
-    assert(errorio==0)
-
-    # Replace the fort.20 file.
-    with open(ags.adcircfort20pathname, 'w') as fort20file:
-        [fort20file.write('0.0\n') for i in range(ags.adcircedgestringnnodes*SERIESLENGTH)]
-
-    errorio = ags.pg.pyopenfileforread(20,ags.adcircfort20pathname)
-    assert(errorio==0)
+    # In file exchange mode, close the original fort.20, write a new one with a
+    # different name, and reopen it for reading. In memory exchange mode, unit
+    # 20 is left alone; the QTIME2 guard keeps ADCIRC from ever reading it.
+    # PEs that own no flux boundary node have no unit 20 to replace.
+    fileexchange = (ags.adcircfluxexchange == FLUX_EXCHANGE_FILE and ags.adcircfort20.active)
+    if fileexchange:
+        with ags.timers.phase(PHASE_FORT20_IO):
+            errorio = ags.pu.pycloseopenedfileforread(20)
+            assert(errorio==0)
+
+            # Replace the fort.20 file.
+            ags.adcircfort20.write_zeros()
+
+            errorio = ags.pg.pyopenfileforread(20,ags.adcircfort20pathname)
+            assert(errorio==0)
 
     ##################################################
     # Replace the flux times and values.
-    nbvStartIndex=sum(ags.pb.nvell[:ags.adcircedgestringid])
-    ags.pg.qnin2[nbvStartIndex : nbvStartIndex+ags.adcircedgestringnnodes+1] = 0.0
-    with open(ags.adcircfort20pathname, 'w') as fort20file:
-        #Set series value to zero
-        #ags.adcircseries[0].entry[i].value[0] = 0.0
-        for dumm in range(SERIESLENGTH):
-            for i in range(ags.pb.nvel):
-                if ags.pb.lbcodei[i] in [2, 12, 22]:
-                    [fort20file.write('{0:10f}\n'.format(ags.pg.qnin2[i]))]
-                if ags.pb.lbcodei[i] == 32:
-                    [fort20file.write('{0:10f}  {1:10f}\n'.format(ags.pg.qnin2[i],ags.pg.enin2[i]))]
+    strings.zeroflux(ags.adcircqnin2)
+    if fileexchange:
+        with ags.timers.phase(PHASE_FORT20_IO):
+            #Set series value to zero
+            #ags.adcircseries[0].entry[i].value[0] = 0.0
+            ags.adcircfort20.write(ags.adcircqnin2, ags.adcircenin2, SERIESLENGTH)
         #Set starting time to <whatever>
         #ags.adcircseries[0].entry[i].time = ags.adcirctstart + i*superdt
         #if ags.couplingtype == 'AdgdA':
         #    ags.adcircseries[0].entry[i].time += superdt # If 2-way AdgdA, then time series has to be shifted ahead since ADCIRC goes first.
     ags.pg.qtime1 = ags.adcirctstart-superdt
     ags.pg.qtime2 = ags.pg.qtime1+ags.pg.ftiminc
-    if ags.couplingtype == 'AdgdA':
+    if ags.couplingtype in ADCIRC_BC_AHEAD:
         ags.pg.qtime1 += superdt
         ags.pg.qtime2 += superdt
     #for i in range(ags.adcircseries[0].size):
@@ -109,18 +93,22 @@ def adcirc_init_bc_from_gssha_hydrograph(ags): # ags is of type adcircgsshatruct
     if ags.adcirctstart > 0:  # If ADCIRC starting time is later than GSSHA. GSSHA always starts at 0.
         #for i in range(SERIESLENGTH-2):
         #    ags.adcircseries[0].entry[i].time -= ags.adcirctstart
-        if ags.couplingtype != 'AdgdA':
+        if ags.couplingtype not in ADCIRC_BC_AHEAD:
             #ags.adcircseries[0].entry[ags.adcircseries[0].size-2].time -= ags.adcirctstart
             ags.pg.qtime1 -= ags.adcirctstart
             ags.pg.ftiminc += ags.adcirctstart ## Gajanan gkc warning caution: Newly added in 03/2020
                                                ## Ensure this gets replaced in set_bc function.
 
-    if ags.pu.debug == ags.pu.on and DEBUG_LOCAL != 0:
-        print("Replaced: Flux time increment FTIMINC =", ags.pg.ftiminc,\
-                "\nReplaced: Flux times:\nQTIME1 =", ags.pg.qtime1, \
-                "\nQTIME2 =", ags.pg.qtime2, \
-                "\nReplaced: Flux values:\nQNIN1  =\n",  ags.pg.qnin1[nbvStartIndex : nbvStartIndex+ags.adcircedgestringnnodes], \
-                "\nQNIN2  =\n",  ags.pg.qnin2[nbvStartIndex : nbvStartIndex+ags.adcircedgestringnnodes])
+    # Zero in file exchange mode. Must be the last change to QTIME2 here.
+    ags.pg.qtime2 += ags.adcircqtimeguard
+
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Replaced: Flux time increment FTIMINC = %s"
+                  "\nReplaced: Flux times:\nQTIME1 = %s\nQTIME2 = %s"
+                  "\nReplaced: Flux values:\nQNIN1  =\n%s\nQNIN2  =\n%s",
+                  ags.pg.ftiminc, ags.pg.qtime1, ags.pg.qtime2,
+                  strings.fluxes(ags.adcircqnin1),
+                  strings.fluxes(ags.adcircqnin2))
 
 ################################################################################
 if __name__ == '__main__':
@@ -4,84 +4,109 @@
 # LICENSE: BSD 3-Clause "New" or "Revised"
 #------------------------------------------------------------------------------#
 from __future__ import absolute_import, print_function
+import logging
 
-import gsshapython.sclass.build_options as gsshaopts
-import gsshapython.sclass.define_h      as gsshadefine
+import numpy as np
 
+from .coupler_sampling import time_mean, resample
+from .coupler_timers import PHASE_FORT20_IO
+
+################################################################################
+log = logging.getLogger(__name__)
 ################################################################################
-DEBUG_LOCAL = 1
+def set_flux_points(ags, times, qouts, fileexchange):
+    '''Spread this window's flux series over the points (times, qouts), evenly
+    spaced from QTIME1, excluded, to QTIME2.
+
+    ADCIRC gets the first point as QTIME2/QNIN2, with FTIMINC the spacing of
+    the points, and reads the others from fort.20, one record per FTIMINC,
+    as it goes.
+    '''
+    strings = ags.adcircedgestrings
+    qnins = [ags.adcircqnin2.copy() for i in range(len(times))]
+    for qnin, q in zip(qnins, qouts):
+        strings.setflux(qnin, q)
+    ags.pg.ftiminc = times[0] - ags.pg.qtime1
+    ags.pg.qtime2 = times[0]
+    ags.adcircqnin2[:] = qnins[0]
+    if fileexchange:
+        with ags.timers.phase(PHASE_FORT20_IO):
+            ags.adcircfort20.write_series(qnins[1:] or qnins, ags.adcircenin2)
+
 ################################################################################
 def adcirc_set_bc_from_gssha_hydrograph(ags): # ags is of type adcircgsshatruct.
 
-    from .adcircgsshastruct import SERIESLENGTH, TIME_TOL
+    from .adcircgsshastruct import SERIESLENGTH, FLUX_EXCHANGE_FILE, ADCIRC_BC_AHEAD
 
     ########## Set ADCIRC Boundary Conditions ###########
     # Note: ags.adcircseries already points to the head of series in ADCIRC that needs to be modified.
-    nbvStartIndex=sum(ags.pb.nvell[:ags.adcircedgestringid])
-    if ags.pu.debug == ags.pu.on and DEBUG_LOCAL != 0 and ags.myid==0:
-        print("\nOriginal: Flux time increment FTIMINC =", ags.pg.ftiminc,\
-                "\nOriginal: Flux times:\nQTIME1 =", ags.pg.qtime1, \
-                "\nQTIME2 =", ags.pg.qtime2, \
-                "\nOriginal: Flux values:\nQNIN1  =\n",  ags.pg.qnin1[nbvStartIndex : nbvStartIndex+ags.adcircedgestringnnodes], \
-                "\nQNIN2  =\n",  ags.pg.qnin2[nbvStartIndex : nbvStartIndex+ags.adcircedgestringnnodes])
-
-    if ags.pu.messg == ags.pu.on:
-        if ags.myid != 0:
-            messgvout  = -1.0E+200
-        else:
-            messgvout  = ags.mvs[0].vout
-        if (ags.pu.debug ==ags.pu.on or gsshaopts._DEBUG == gsshadefine.ON) or DEBUG_LOCAL != 0:
-            print('PE[',ags.myid,'] Before messg: vout = ', ags.mvs[0].vout)
-        ags.mvs[0].vout  = ags.pmsg.pymsg_dbl_max(messgvout, ags.adcirc_comm_comp)
-        if (ags.pu.debug ==ags.pu.on or gsshaopts._DEBUG == gsshadefine.ON) or DEBUG_LOCAL != 0:
-            print('PE[',ags.myid,'] After messg : vout = ', ags.mvs[0].vout)
+    strings = ags.adcircedgestrings
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("\nOriginal: Flux time increment FTIMINC = %s"
+                  "\nOriginal: Flux times:\nQTIME1 = %s\nQTIME2 = %s"
+                  "\nOriginal: Flux values:\nQNIN1  =\n%s\nQNIN2  =\n%s",
+                  ags.pg.ftiminc, ags.pg.qtime1, ags.pg.qtime2,
+                  strings.fluxes(ags.adcircqnin1),
+                  strings.fluxes(ags.adcircqnin2))
+
+    # Note: GSSHA's timer, vout and qout were broadcast from PE 0 right after
+    # GSSHA ran (see _coupler_run.py), so no collective is needed here.
 
     ######################################################
-    # Close the original fort.20
-    errorio = ags.pu.pycloseopenedfileforread(20)
-    assert(errorio==0)
+    # Close the original fort.20. Only the file exchange mode goes to disk; the
+    # memory exchange mode writes qnin/qtime/ftiminc straight into ADCIRC.
+    # PEs that own no flux boundary node have no unit 20 to replace.
+    fileexchange = (ags.adcircfluxexchange == FLUX_EXCHANGE_FILE and ags.adcircfort20.active)
+    if fileexchange:
+        with ags.timers.phase(PHASE_FORT20_IO):
+            errorio = ags.pu.pycloseopenedfileforread(20)
+            assert(errorio==0)
 
-    if (ags.gssharunflag != gsshadefine.OFF):
+    if (ags.gssharunflag != ags.gsshadefine.OFF):
 
         # Inflow volume in the current gssha time step:
         # V=(t2-t1)(q1+q2)/2; So to conserve mass entering in ADCIRC in interval t2-t1, q2 = 2*V/(t2-t1) - q1  in cu.m/s
         # Therefore, in (cu.m/s)/m, ADCIRC series value be val2 = 2*V/(t2-t1)/edgestringleng - val1; since val_i=q_i/edgestringlen
-        DV = (ags.mvs[0].vout-ags.gsshavoutprev)
-        if ags.couplingtype == 'AdgdA':
-            DT = 0.0
+        DV = (ags.gsshamv.vout-ags.gsshavoutprev)
+        if ags.couplingtype in ADCIRC_BC_AHEAD:
             ags.adcirctprev=ags.pu.pyfindelapsedtime(ags.pmain.itime_end) #Last time at which ADCIRC was paused & solution known
-            while (ags.adcirctprev + DT < ags.mvs[0].timer*ags.gsshatimefact+ags.effectivegsshadt-TIME_TOL):
-                DT += ags.adcircdt
+            DT = ags.schedule.adcirc_lead(ags)
         else: # For gda and gdadg:
-            DT = (ags.mvs[0].timer-ags.gsshavoutprev_t)*ags.gsshatimefact + 1.0E-20
+            DT = (ags.gsshamv.timer-ags.gsshavoutprev_t)*ags.gsshatimefact + 1.0E-20
 
-        if (ags.pu.debug ==ags.pu.on or gsshaopts._DEBUG == gsshadefine.ON) and DEBUG_LOCAL != 0 and ags.myid == 0:
+        if ags.myid == 0 and log.isEnabledFor(logging.DEBUG):
             # This is valid only for PE 0 which is running GSSHA. Not on other PEs!
-            outlet_area  = ags.mvs[0].area[      ags.mvs[0].nx[ags.mvs[0].nlinks]][ags.mvs[0].nlinks]
-            outlet_depth = ags.mvs[0].chan_depth[ags.mvs[0].nx[ags.mvs[0].nlinks]][ags.mvs[0].nlinks]
-            print("outlet area       =", outlet_area, "m2")
-            print("outlet chan_depth =", outlet_depth, "m")
-            print("qout              =", ags.mvs[0].qout, "m3/s")
-            print("voutprev          =", ags.gsshavoutprev, "m3")
-            print("vout              =", ags.mvs[0].vout, "m3")
-            print("DV                =", DV, "m3")
-            print("DT                =", DT, "s")
-            print("GSSHA qout/area   =", ags.mvs[0].qout / outlet_area,"m/s")
-            print("Avg. GSSHA speed  ~", DV / DT / outlet_area, "m/s")
-            print("Avg. ADCIRC speed ~", DV / DT, "(m3/s) / ADCIRC area (needs more work!)")
+            # Only computed when debug logging is enabled.
+            outlet_area  = ags.gsshamv.area[      ags.gsshamv.nx[ags.gsshamv.nlinks]][ags.gsshamv.nlinks]
+            outlet_depth = ags.gsshamv.chan_depth[ags.gsshamv.nx[ags.gsshamv.nlinks]][ags.gsshamv.nlinks]
+            log.debug("outlet area       = %s m2", outlet_area)
+            log.debug("outlet chan_depth = %s m", outlet_depth)
+            log.debug("qout              = %s m3/s", ags.gsshamv.qout)
+            log.debug("voutprev          = %s m3", ags.gsshavoutprev)
+            log.debug("vout              = %s m3", ags.gsshamv.vout)
+            log.debug("DV                = %s m3", DV)
+            log.debug("DT                = %s s", DT)
+            log.debug("GSSHA qout/area   = %s m/s", ags.gsshamv.qout / outlet_area)
+            log.debug("Avg. GSSHA speed  ~ %s m/s", DV / DT / outlet_area)
+            log.debug("Avg. ADCIRC speed ~ %s (m3/s) / ADCIRC area (needs more work!)", DV / DT)
 
         if DV < 0.0:
-            print("Warning: Outflow from ADCIRC model forced by GSSHA! This can cause instabilities in the model!")
+            log.warning("Warning: Outflow from ADCIRC model forced by GSSHA! This can cause instabilities in the model!")
 
         # Move current to previous: Current is at [2], previous is at [1]
         # Shift values backward
-        ags.pg.qtime1 = ags.pg.qtime2
-        for i in range(len(ags.pg.qnin1)):
-            ags.pg.qnin1[i] = ags.pg.qnin2[i]
+        interp = ags.exchangeinterp
+        ags.pg.qtime1 = ags.pg.qtime2 - ags.adcircqtimeguard
+        ags.adcircqnin1[:] = ags.adcircqnin2
+        if interp.fluxend is not None:
+            # Where the last window's points ended, whichever of their
+            # fort.20 records ADCIRC has read.
+            ags.pg.qtime1, ags.adcircqnin1[:] = interp.fluxend
+            interp.fluxend = None
 
         # Set ADCIRC series value for gssha time t2
-        ags.pg.qtime2 = ags.mvs[0].timer*ags.gsshatimefact # This is GSSHA time set in ADCIRC series.
-        if ags.couplingtype == 'AdgdA':
+        ags.pg.qtime2 = ags.gsshamv.timer*ags.gsshatimefact # This is GSSHA time set in ADCIRC series.
+        if ags.couplingtype in ADCIRC_BC_AHEAD:
             ags.pg.qtime2 = ags.adcirctprev+DT #ags.adcircdt # If 2-way AdgdA, then time series has to be shifted ahead since ADCIRC goes first.
 
         # ADCIRC Series value
@@ -89,66 +114,91 @@ def adcirc_set_bc_from_gssha_hydrograph(ags): # ags is of type adcircgsshatruct.
         #print("DT_calculated     =", DT_calculated, "s")
         #DT_calculated affects how the mass is distributed. If we want to dump all the mass from GSSHA into ADCIRC's next time step
         #no matter how large it may be, we should use DT_calculated. For now, I'm skipping DT_calculated.
-        oldseriesvalue = ags.pg.qnin2[nbvStartIndex]
-        #seriesvalue = (2*DV/DT/ags.adcircedgestringlen * ags.gsshahydrofact - oldseriesvalue)
-        seriesvalue =  ags.mvs[0].qout/ags.adcircedgestringlen
-        ags.pg.qnin2[nbvStartIndex : nbvStartIndex+ags.adcircedgestringnnodes] = seriesvalue
-        with open(ags.adcircfort20pathname, 'w') as fort20file:
-            #print("QNIN values start at", nbvStartIndex)
-            for i in range(ags.pb.nvel):
-                if ags.pb.lbcodei[i] in [2, 12, 22]:
-                    [fort20file.write('{0:10f}\n'.format(ags.pg.qnin2[i]))]
-                if ags.pb.lbcodei[i] == 32:
-                    [fort20file.write('{0:10f}  {1:10f}\n'.format(ags.pg.qnin2[i],ags.pg.enin2[i]))]
-            # Now set the last value same as the current value, but not the time!
-            # TO IMPLEMENT THIS PART, JUST WRITE THE SERIES TWICE IN fort.22 replacement!
-            #ags.adcircseries[0].entry[SERIESLENGTH-1].time     = ags.adcircseries[0].entry[SERIESLENGTH-2].time + TIME_TOL
-            #ags.adcircseries[0].entry[SERIESLENGTH-1].value[0] = ags.adcircseries[0].entry[SERIESLENGTH-2].value[0]
-            for i in range(ags.pb.nvel):
-                if ags.pb.lbcodei[i] in [2, 12, 22]:
-                    [fort20file.write('{0:10f}\n'.format(ags.pg.qnin2[i]))]
-                if ags.pb.lbcodei[i] == 32:
-                    [fort20file.write('{0:10f}  {1:10f}\n'.format(ags.pg.qnin2[i],ags.pg.enin2[i]))]
+        # Per edge string: each takes its fraction of qout, spread over its
+        # length; with several watersheds, of its own watershed's qout.
+        oldseriesvalue = ags.adcircqnin2[strings.qninstarts]
+        #seriesvalue = (2*DV/DT/es.length * ags.gsshahydrofact - oldseriesvalue)
+        qout = ags.gsshamv.qout if ags.gsshaqouts is None else ags.gsshaqouts
+        # GSSHA's outlet discharge across its last run, when sub-sampling.
+        sampling = ags.sampling
+        samples = sampling.gssha_qouts()
+        if samples is not None and sampling.mean:
+            qout = time_mean(*samples)
+            if ags.gsshaqouts is None:
+                qout = float(qout[0])
+        strings.setflux(ags.adcircqnin2, qout)
+        seriesvalue = ags.adcircqnin2[strings.qninstarts]
+        qtime2 = ags.pg.qtime2 # The end of the series, past the points of set_flux_points.
+        if interp.cubic:
+            interp.flux.append(ags.gsshamv.timer*ags.gsshatimefact, qout)
+            interp.fluxend = (ags.pg.qtime2, ags.adcircqnin2.copy())
+            times = interp.subtimes(ags.pg.qtime1, ags.pg.qtime2, interp.npoints())
+            qouts = interp.flux.evaluate(times)
+            set_flux_points(ags, times, qouts if np.ndim(qout) else qouts[:, 0], fileexchange)
+        elif samples is not None and sampling.series and ags.couplingtype not in ADCIRC_BC_AHEAD:
+            # Points across the window, between GSSHA's samples.
+            interp.fluxend = (ags.pg.qtime2, ags.adcircqnin2.copy())
+            times = interp.subtimes(ags.pg.qtime1, ags.pg.qtime2, sampling.chunks)
+            qouts = resample(samples[0], samples[1], times)
+            set_flux_points(ags, times, qouts if np.ndim(qout) else qouts[:, 0], fileexchange)
+        elif fileexchange:
+            with ags.timers.phase(PHASE_FORT20_IO):
+                # Now set the last value same as the current value, but not the time!
+                # TO IMPLEMENT THIS PART, JUST WRITE THE SERIES TWICE IN fort.22 replacement!
+                #ags.adcircseries[0].entry[SERIESLENGTH-1].time     = ags.adcircseries[0].entry[SERIESLENGTH-2].time + TIME_TOL
+                #ags.adcircseries[0].entry[SERIESLENGTH-1].value[0] = ags.adcircseries[0].entry[SERIESLENGTH-2].value[0]
+                ags.adcircfort20.write(ags.adcircqnin2, ags.adcircenin2, 2)
 
         # Calculate slope
         ags.adcircseriesslope = \
                 (seriesvalue - oldseriesvalue) / \
-                (ags.pg.qtime2 - ags.pg.qtime1)#+1.0E-14)
+                (qtime2 - ags.pg.qtime1)#+1.0E-14)
 
         # Calculate 'area', i.e., volume/unit width that has flown in at this time step.
         ags.adcircseriesarea  = 0.5 * \
                 (seriesvalue + oldseriesvalue) * \
-                (ags.pg.qtime2 - ags.pg.qtime1)
+                (qtime2 - ags.pg.qtime1)
 
         #Store volume for the next time step.
-        ags.gsshavoutprev   = ags.mvs[0].vout
-        ags.gsshavoutprev_t = ags.mvs[0].timer
+        ags.gsshavoutprev   = ags.gsshamv.vout
+        ags.gsshavoutprev_t = ags.gsshamv.timer
+
+        # Keep ADCIRC from reading unit 20 before the next exchange.
+        ags.pg.qtime2 += ags.adcircqtimeguard
 
     else:
         # Shift values backward
-        ags.pg.qtime1 = ags.pg.qtime2
-        for i in range(ags.pb.nvel):
-            ags.pg.qnin1[i] = ags.pg.qnin2[i]
-        # Replace the fort.20 file.
-        with open(ags.adcircfort20pathname, 'w') as fort20file:
-            [fort20file.write('0.0\n') for i in range(ags.adcircedgestringnnodes*SERIESLENGTH)]
+        ags.pg.qtime1 = ags.pg.qtime2 - ags.adcircqtimeguard
+        ags.adcircqnin1[:] = ags.adcircqnin2
         # Reset the flux time increment
         # Gajanan gkc warning: Note that this will cause a problem if there are multiple non-zero-flux boundaries!!!
         ags.pg.ftiminc = abs(ags.adcirctfinal)*10.0
+        if fileexchange:
+            # Replace the fort.20 file.
+            with ags.timers.phase(PHASE_FORT20_IO):
+                ags.adcircfort20.write_zeros()
+        else:
+            # Same state ADCIRC ends up in after reading the all-zero record
+            # that the file exchange mode writes above.
+            ags.pg.qtime2 = ags.pg.qtime1 + ags.pg.ftiminc
+            strings.zeroflux(ags.adcircqnin2)
 
     ######################################################
     # Reopen the fort.20 replacement file
-    errorio = ags.pg.pyopenfileforread(20,ags.adcircfort20pathname)
-    assert(errorio==0)
-
-    if ags.pu.debug == ags.pu.on and DEBUG_LOCAL != 0:
-        print("Replaced: Flux time increment FTIMINC =", ags.pg.ftiminc,\
-                "\nReplaced: Flux times:\nQTIME1 =", ags.pg.qtime1, \
-                "\nQTIME2 =", ags.pg.qtime2, \
-                "\nReplaced: Flux values:\nQNIN1  =\n",  ags.pg.qnin1[nbvStartIndex : nbvStartIndex+ags.adcircedgestringnnodes], \
-                "\nQNIN2  =\n",  ags.pg.qnin2[nbvStartIndex : nbvStartIndex+ags.adcircedgestringnnodes])
-        print('Area   contained  =', ags.adcircseriesarea)
-        print('Volume contained  =', ags.adcircseriesarea*ags.adcircedgestringlen)
+    if fileexchange:
+        with ags.timers.phase(PHASE_FORT20_IO):
+            errorio = ags.pg.pyopenfileforread(20,ags.adcircfort20pathname)
+            assert(errorio==0)
+
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Replaced: Flux time increment FTIMINC = %s"
+                  "\nReplaced: Flux times:\nQTIME1 = %s\nQTIME2 = %s"
+                  "\nReplaced: Flux values:\nQNIN1  =\n%s\nQNIN2  =\n%s",
+                  ags.pg.ftiminc, ags.pg.qtime1, ags.pg.qtime2,
+                  strings.fluxes(ags.adcircqnin1),
+                  strings.fluxes(ags.adcircqnin2))
+        log.debug('Area   contained  = %s', ags.adcircseriesarea)
+        log.debug('Volume contained  = %s', np.dot(ags.adcircseriesarea, strings.lengths))
 
 
 ############################################################################################################
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import logging
+
+import numpy as np
+
+from .coupler_arguments import parse_edgestrings # Re-exported
+
+################################################################################
+log = logging.getLogger(__name__)
+
+################################################################################
+def _owned_node_mask(ags, nodes):
+    '''Mask of the nodes (0-based) that this rank owns, i.e., not ghost nodes.
+
+    ADCIRC's messenger marks resident nodes in RESNODE. In serial, or when the
+    ADCIRC python interface does not expose it, every node is owned.
+    '''
+    owned = np.ones(len(nodes), dtype=bool)
+    if ags.pu.messg == ags.pu.on:
+        resnode = getattr(ags.pmsg, 'resnode', None)
+        if resnode is not None and np.size(resnode) > 0:
+            owned = np.asarray(resnode, dtype=bool)[nodes]
+        else:
+            log.warning("Warning: pymessenger.resnode not available; ghost nodes on the"
+                        " coupled edge string will be counted on every PE.")
+    return owned
+
+################################################################################
+def sum_max_min(values):
+    '''Sum, max, min and count of a 1D NumPy array, as Python floats.
+
+    An empty array, e.g. on a PE that owns no node of the edge string, gives
+    the -1.0e+200/1.0e+200 sentinels for max/min so that parallel max/min
+    reductions ignore it.
+    '''
+    if values.size == 0:
+        return 0.0, -1.0e+200, 1.0e+200, 0.0
+    return float(np.sum(values)), float(np.max(values)), float(np.min(values)), float(values.size)
+
+#------------------------------------------------------------------------------#
+def sum_max_min_by(values, offsets):
+    '''Per-group sum, max, min and count of a 1D NumPy array, as arrays.
+
+    Group i is values[offsets[i]:offsets[i+1]]. Each group is reduced in one
+    NumPy call over all groups, with the sentinels of sum_max_min for empty
+    groups.
+    '''
+    counts = np.diff(offsets)
+    sums = np.zeros(len(counts))
+    maxs = np.full(len(counts), -1.0e+200)
+    mins = np.full(len(counts), 1.0e+200)
+    nonempty = counts > 0
+    if values.size > 0:
+        # Empty groups in between are zero-length, so the next nonempty start
+        # is where the previous nonempty group ends.
+        starts = offsets[:-1][nonempty]
+        sums[nonempty] = np.add.reduceat(values, starts)
+        maxs[nonempty] = np.maximum.reduceat(values, starts)
+        mins[nonempty] = np.minimum.reduceat(values, starts)
+    return sums, maxs, mins, counts.astype(np.float64)
+
+################################################################################
+class adcircedgestring(): #Note: This is not a ctypes Structure!!!!
+    '''Topology of a coupled ADCIRC open-boundary edge string on this rank.
+
+    Built once in adcircgssha_coupler_initialize and used by every BC function.
+    Node numbers are 0-based, unlike ADCIRC's 1-based ones. Only open
+    boundaries and not closed loops are accounted for here.
+    '''
+    def __init__(self, ags, edgestringid):
+        self.id = edgestringid
+        self.nnodes = int(ags.pb.nvell[edgestringid])
+        self.nodes = np.array(ags.pb.nbvv[edgestringid][1:self.nnodes+1], dtype=np.int32) - 1
+
+        # Slice of qnin1/qnin2/enin2 holding this edge string's flux values.
+        self.qninstart = int(np.sum(ags.pb.nvell[:edgestringid]))
+        self.qninend = self.qninstart + self.nnodes
+
+        # Length of each segment (node i to node i+1) of the edge string.
+        x = np.asarray(ags.pm.x)[self.nodes]
+        y = np.asarray(ags.pm.y)[self.nodes]
+        self.seglens = np.hypot(np.diff(x), np.diff(y))
+
+        # A segment is counted by the rank owning its first node, which always
+        # has the whole segment, so parallel sums do not double-count.
+        self.owned = _owned_node_mask(ags, self.nodes)
+        self.ownednodes = self.nodes[self.owned]
+        self.nowned = int(np.count_nonzero(self.owned))
+        self.locallength = float(np.sum(self.seglens[self.owned[:-1]]))
+
+        if ags.pu.messg == ags.pu.on:
+            self.length = ags.pmsg.pymsg_dbl_sum(self.locallength, ags.adcirc_comm_comp)
+        else:
+            self.length = self.locallength
+
+        log.debug("Edge string( %d ): nodes = %d , owned nodes = %d , local length = %s , length = %s",
+                  self.id+1, self.nnodes, self.nowned, self.locallength, self.length)
+
+    def gather(self, nodal):
+        '''Values of a nodal array (e.g. pg.eta2) at the owned edge string nodes.
+
+        np.asarray is a zero-copy view of f2py arrays, so this is a single
+        fancy-indexing gather instead of one f2py element access per node.
+        '''
+        return np.asarray(nodal)[self.ownednodes]
+
+################################################################################
+class adcircedgestrings(): #Note: This is not a ctypes Structure!!!!
+    '''All coupled ADCIRC edge strings, each fed a fraction of GSSHA's outlet.
+
+    Edge string i takes fractions[i] of the outlet discharge, spread over its
+    length, and the GSSHA head boundary follows the fraction-weighted average
+    of the edge strings' mean eta. Fractions default to the edge string
+    lengths over their total, i.e., the same flux per unit length on all of
+    them. With a single edge string, this is the original one-string coupling.
+
+    With several watersheds, outlets[i] is the watershed whose outlet feeds
+    edge string i, fractions[i] its fraction of that outlet's discharge,
+    None for the lengths of that watershed's edge strings over their total,
+    and setflux and flux take one qout per watershed.
+
+    The flux slices of all edge strings are set in one fancy-indexed
+    assignment, and their owned nodes are gathered and reduced together, so
+    the cost per exchange does not grow with one NumPy call per edge string.
+    '''
+    def __init__(self, ags, edgestringids, fractions=None, outlets=None):
+        self.strings = [adcircedgestring(ags, edgestringid) for edgestringid in edgestringids]
+        self.ids = [es.id for es in self.strings]
+        self.lengths = np.array([es.length for es in self.strings])
+        self.outlets = None if outlets is None else np.asarray(outlets, dtype=np.intp)
+        if self.outlets is not None:
+            fractions = [None]*len(self.strings) if fractions is None else fractions
+            bylength = np.array([fraction is None for fraction in fractions])
+            fractions = np.array([np.nan if fraction is None else fraction for fraction in fractions])
+            outletlengths = np.bincount(self.outlets[bylength], weights=self.lengths[bylength],
+                                        minlength=np.max(self.outlets)+1)
+            fractions[bylength] = self.lengths[bylength]/outletlengths[self.outlets[bylength]]
+        elif fractions is None:
+            fractions = self.lengths/np.sum(self.lengths)
+        self.fractions = np.asarray(fractions, dtype=np.float64)
+        assert(len(self.fractions) == len(self.strings))
+        self.nnodes = sum(es.nnodes for es in self.strings)
+        self.qninstarts = np.array([es.qninstart for es in self.strings])
+
+        # All coupled qnin1/qnin2 entries, and the length that each one spreads
+        # qout over: its edge string's length over its outlet fraction.
+        self.qninindex = np.concatenate([np.arange(es.qninstart, es.qninend) for es in self.strings])
+        self.qninlength = np.concatenate([np.full(es.nnodes, es.length/fraction)
+                                          for es, fraction in zip(self.strings, self.fractions)])
+        # Watershed of each of those entries, with several watersheds.
+        if self.outlets is not None:
+            self.qninoutlet = np.concatenate([np.full(es.nnodes, outlet, dtype=np.intp)
+                                              for es, outlet in zip(self.strings, self.outlets)])
+
+        # Owned nodes of all edge strings, one group per edge string.
+        self.ownednodes = np.concatenate([es.ownednodes for es in self.strings])
+        self.ownedoffsets = np.concatenate([[0], np.cumsum([es.nowned for es in self.strings])])
+
+        for i, (es, fraction) in enumerate(zip(self.strings, self.fractions)):
+            if self.outlets is not None:
+                log.info("Edge string( %d ): length = %s , GSSHA watershed %d outlet fraction = %s",
+                         es.id+1, es.length, self.outlets[i]+1, fraction)
+            else:
+                log.info("Edge string( %d ): length = %s , GSSHA outlet fraction = %s",
+                         es.id+1, es.length, fraction)
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __iter__(self):
+        return iter(self.strings)
+
+    def gather(self, nodal):
+        '''Values of a nodal array at the owned nodes of all edge strings.'''
+        return np.asarray(nodal)[self.ownednodes]
+
+    def sum_max_min(self, values):
+        '''Per-edge string sum, max, min and count of gathered values.'''
+        return sum_max_min_by(values, self.ownedoffsets)
+
+    def setflux(self, qnin, qout):
+        '''Set all coupled flux entries of qnin from GSSHA's outlet discharge,
+        or, with several watersheds, from each one's.'''
+        if self.outlets is not None:
+            qnin[self.qninindex] = qout[self.qninoutlet]/self.qninlength
+        else:
+            qnin[self.qninindex] = qout/self.qninlength
+
+    def flux(self, qout):
+        '''Flux per unit length that setflux sets on each edge string.'''
+        if self.outlets is not None:
+            return qout[self.outlets]*self.fractions/self.lengths
+        return qout*self.fractions/self.lengths
+
+    def zeroflux(self, qnin):
+        qnin[self.qninindex] = 0.0
+
+    def fluxes(self, qnin):
+        '''Coupled entries of qnin, for logging.'''
+        return qnin[self.qninindex]
+
+    def head(self, avg_etas):
+        '''GSSHA head boundary value from the edge strings' mean eta.'''
+        return float(np.dot(self.fractions, avg_etas))
+
+################################################################################
+if __name__ == '__main__':
+    pass
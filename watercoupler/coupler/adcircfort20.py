@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import logging
+
+import numpy as np
+
+################################################################################
+log = logging.getLogger(__name__)
+
+################################################################################
+FLUX_CODES = [2, 12, 22] # LBCODEI of flux boundary nodes: one value per line
+ELEVATION_CODE = 32      # LBCODEI of flux and elevation nodes: two values per line
+
+################################################################################
+class adcircfort20writer(): #Note: This is not a ctypes Structure!!!!
+    '''Writer of the fort.20 replacement in the file flux exchange mode.
+
+    A fort.20 record has one line per flux boundary node, in LBCODEI order:
+    QNIN for flux nodes, and QNIN and ENIN for flux and elevation nodes. The
+    nodes, the position of their values in the record, and the record's
+    format string are found once here, so writing a record is one fancy-
+    indexed gather into a reused buffer, one %-format of the whole record and
+    one write, with no Python work per node.
+
+    ADCIRC does not read unit 20 on a PE that owns no flux boundary node, so
+    such a PE (active is False) writes nothing.
+    '''
+    def __init__(self, ags, pathname, nzeros):
+        lbcodei = np.asarray(ags.adcirclbcodei)
+        self.pathname = pathname
+        self.nodes = np.flatnonzero(np.isin(lbcodei, FLUX_CODES) | (lbcodei == ELEVATION_CODE))
+        iselevation = (lbcodei[self.nodes] == ELEVATION_CODE)
+        self.elevationnodes = self.nodes[iselevation]
+
+        # Every line takes one value, and a second one on elevation nodes.
+        self.qninpos = np.arange(len(self.nodes)) + np.cumsum(iselevation) - iselevation
+        self.eninpos = self.qninpos[iselevation] + 1
+        self.values = np.zeros(len(self.nodes) + len(self.elevationnodes), dtype=np.float64)
+        # '%10f' formats as '{0:10f}' did when the record was written line by line.
+        self.format = ''.join(np.where(iselevation, '%10f  %10f\n', '%10f\n'))
+        # Zero flux series: nzeros lines of zeros.
+        self.zeros = '0.0\n'*nzeros
+
+        self.active = len(self.nodes) > 0
+        log.debug("fort.20 writer: %d flux boundary nodes, %d with elevations",
+                  len(self.nodes), len(self.elevationnodes))
+
+    def record(self, qnin, enin):
+        '''One fort.20 record of qnin and enin, as a string.'''
+        self.values[self.qninpos] = qnin[self.nodes]
+        self.values[self.eninpos] = enin[self.elevationnodes]
+        return self.format % tuple(self.values.tolist())
+
+    def write(self, qnin, enin, nrecords=1):
+        '''Replace fort.20 with nrecords copies of the record of qnin and enin.'''
+        if not self.active:
+            return
+        with open(self.pathname, 'w') as fort20file:
+            fort20file.write(self.record(qnin, enin)*nrecords)
+
+    def write_series(self, qnins, enin, nrepeat=2):
+        '''Replace fort.20 with the records of every qnin of qnins in turn, the
+        last one nrepeat times.'''
+        if not self.active:
+            return
+        records = [self.record(qnin, enin) for qnin in qnins]
+        records[-1] *= nrepeat
+        with open(self.pathname, 'w') as fort20file:
+            fort20file.write(''.join(records))
+
+    def write_zeros(self):
+        '''Replace fort.20 with the zero flux series.'''
+        if not self.active:
+            return
+        with open(self.pathname, 'w') as fort20file:
+            fort20file.write(self.zeros)
+
+################################################################################
+if __name__ == '__main__':
+    pass
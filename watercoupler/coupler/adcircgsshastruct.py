@@ -7,22 +7,35 @@ from __future__ import absolute_import, print_function
 import sys
 import ctypes as ct
 
-from pyADCIRC import pyadcirc as pa
-
-import gsshapython.sclass.define_h      as gsshadefine
-import gsshapython.sclass.fnctn_h       as gsshafnctn
-import gsshapython.sclass.main_struct_h as gsshamain
+from .coupler_arguments import COUPLING_CONCURRENT
+from .coupler_backend import couplerbackend, BACKEND_NATIVE
+from .coupler_timers import couplertimers
 
 ################################################################################
 TIME_TOL = 1.0E-3
 SERIESLENGTH = 4 #This is the MINIMUM number of lines required in an ADCIRC series to be coupled. Compulsory.
 GSSHA_TIME_FACTOR = 60.0 #Minutes to second conversion
 GSSHA_CUFTPERSEC_TO_CUMPERSEC = 0.028316846592 # cu.ft/s to cu.m/s factor
+FLUX_EXCHANGE_MEMORY = 'memory' # Write qnin/qtime/ftiminc straight into ADCIRC memory
+FLUX_EXCHANGE_FILE   = 'file'   # Rewrite and reopen fort.20 every exchange (fallback)
+FLUX_EXCHANGE_MODES  = [FLUX_EXCHANGE_MEMORY, FLUX_EXCHANGE_FILE]
+# Coupling types whose ADCIRC flux series / GSSHA head series is set one
+# coupling interval ahead, since the receiving model runs before, or at the
+# same time as, the model providing the series.
+ADCIRC_BC_AHEAD      = ['AdgdA', COUPLING_CONCURRENT]
+GSSHA_BC_AHEAD       = ['gdAdg', COUPLING_CONCURRENT]
+ONE_WAY_INTERLEAVED  = 'interleaved' # Both models window by window
+ONE_WAY_BATCH        = 'batch'       # Driving model through all windows, then the driven one
+ONE_WAY_MODES        = [ONE_WAY_INTERLEAVED, ONE_WAY_BATCH]
 DEBUG_LOCAL = 1
 
 class adcircgsshastruct(): #Note: This is not a ctypes Structure!!!!
-    def __init__(self):
-        # Main ADCIRC and GSSHA structures
+    def __init__(self, backend=BACKEND_NATIVE, options=None, replay=None, replayed=None, split=None):
+        # Main ADCIRC and GSSHA structures, native or synthetic, or one of them
+        # played back from a coupling archive or, with a gssharanksplit, run on
+        # a dedicated rank; see couplerbackend.
+        self.backend = couplerbackend(backend, options, replay, replayed, split)
+        pa = self.backend.pa
         self.pa    = pa
         self.ps    = pa.sizes
         self.pg    = pa.pyglobal
@@ -31,12 +44,35 @@ class adcircgsshastruct(): #Note: This is not a ctypes Structure!!!!
         self.pb    = pa.pyboundaries
         self.pmain = pa.pyadcirc_mod
         self.pu    = pa.utilities
-        self.mvs = gsshafnctn.get_lib_var(gsshafnctn.gsshalib,'python_main_var_struct_ptr', ct.POINTER(gsshamain.main_var_struct))
+        self.gsshadefine = self.backend.gsshadefine
+        self.gsshatypes  = self.backend.gsshatypes
+        self.gsshafnctn  = self.backend.gsshafnctn
+        self.mvs = self.backend.mvs
+        # Cached accessors, bound once at initialize; see bind_accessors.
+        self.gsshamv = None
+        self.adcirceta1 = None
+        self.adcirceta2 = None
+        self.adcircqnin1 = None
+        self.adcircqnin2 = None
+        self.adcircenin2 = None
+        self.adcirclbcodei = None
         # watercoupler data
         self.couplingtype = ''
         self.couplingntsteps = 1 #Number of ADCIRC time steps between coupled intervals; minimum = 1
         self.npes = 0
         self.myid = 0
+        self.timers = couplertimers() # Disabled unless WATERCOUPLER_TIMING_DIR is set
+        self.couplinginterval = None  # couplinginterval, sets couplingdtfactor/adcircdt
+        self.schedule = None          # couplingschedule, window boundaries of the run loops
+        self.checkpoints = None       # couplercheckpoints, disabled unless WATERCOUPLER_CHECKPOINT_DIR is set
+        self.restartdir = None        # Checkpoint directory to restart from, set by --restart
+        self.onewaymode = ONE_WAY_INTERLEAVED # How one-way coupling types run; see _coupler_run.py
+        self.archive = None           # couplerarchive, disabled unless WATERCOUPLER_ARCHIVE is set
+        self.exchangeinterp = None    # exchangeinterpolation, linear unless WATERCOUPLER_EXCHANGE_INTERP is set
+        self.iteration = None         # couplingiteration, one run per window unless WATERCOUPLER_ITERATE is set
+        self.sampling = None          # couplersampling, one value per window unless WATERCOUPLER_SAMPLING is set
+        self.telemetry = None         # couplertelemetry, disabled unless WATERCOUPLER_TELEMETRY is set
+        self.watersheds = None        # (GSSHA project, edge string IDs, fractions) of every watershed, set by --watersheds
 
         # ADCIRC data
         self.adcircrunflag=self.pu.on
@@ -49,26 +85,33 @@ class adcircgsshastruct(): #Note: This is not a ctypes Structure!!!!
         self.adcircntsteps=0
         self.adcirc_comm_world=0
         self.adcirc_comm_comp=0
+        self.messenger=None # couplermessenger, batched collectives over adcirc_comm_comp
 
         self.adcircseries=0
-        self.adcircedgestringid=self.pu.unset_int
-        self.adcircedgestringnnodes=self.pu.unset_int
-        self.adcircedgestringnodes=[]
-        self.adcircedgestringlen=0.0
+        self.adcircedgestringids=[] # 0-based IDs of the coupled edge strings
+        self.adcircedgestrings=None # adcircedgestrings topology, built at initialize
         self.adcircfort20pathname=''
-        self.adcirc_hprev=0.0   # Avg depth
+        self.adcircfort20=None # adcircfort20writer, in the file flux exchange mode
+        self.adcircfluxexchange=FLUX_EXCHANGE_MEMORY
+        self.adcircqtimeguard=0.0 # Padding on QTIME2 that keeps ADCIRC from reading unit 20
+        self.adcirc_hprev=0.0   # Avg depth, fraction-weighted over the edge strings
         self.adcirc_hprev_len=0.0   # count
+        self.adcirc_hprevs=None # Avg depth of each edge string
+        self.adcircetastats=None # Reduced edge string eta statistics of the last GSSHA BC update
 
         # GSSHA data
-        self.gssharunflag=gsshadefine.ON
+        self.gssharunflag=self.gsshadefine.ON
         self.gsshatstartjul=0.0
         self.gsshadt=0.0
         self.effectivegsshadt=0.0
         self.gsshatprev=0.0
         self.gsshatfinal=0.0
         self.gsshasingle_event_end=0.0
+        self.gsshaqouts=None # Outlet discharge of every watershed, with several watersheds
         self.gsshavoutprev=0.0
         self.gsshavoutprev_t=0.0
+        self.gsshaboundts=None # gsshaboundaryseries managing mvs[0].bound_ts_ptr[0]
+        self.gsshaboundtsring=True # Shift bound_ts by moving pointers over a larger buffer
         self.gsshatimefact=GSSHA_TIME_FACTOR ## Minutes to seconds conversion, since niter is in mins.
         self.gsshahydrofact=1.0 # GSSHA_CUFTPERSEC_TO_CUMPERSEC may not be required after all since GSSHA internally seems to use cu.m/s.
 
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import io
+import os
+import json
+import zipfile
+import logging
+
+import numpy as np
+
+from .coupler_timers import PHASE_ARCHIVE
+
+################################################################################
+log = logging.getLogger(__name__)
+
+################################################################################
+ARCHIVE_VERSION = 1
+DEFAULT_CHUNK = 64 # Coupling windows per chunk appended to the archive
+META = 'meta'      # Archive member holding the run's constants, as JSON
+# Quantities exchanged in every coupling window, one value per window.
+WINDOW_FIELDS = ['window', 'adcirc_itime', 'adcirctprev', 'adcircrunflag', 'gssharunflag',
+                 'gssha_timer', 'gssha_vout', 'gssha_qout', 'dtfactor',
+                 'qtime1', 'qtime2', 'ftiminc']
+# Quantities exchanged in every coupling window, per edge string: the flux per
+# unit length set in ADCIRC, and the edge string eta statistics that set
+# GSSHA's head boundary (see edgestring_eta_stats), NaN where not exchanged.
+EDGESTRING_FIELDS = ['flux', 'eta_stats']
+NETA_STATS = 5      # eta_stats entries per edge string
+NETA_STATS_INIT = 4 # eta_stats_init entries per edge string
+
+################################################################################
+def _member(field, chunk):
+    return '{0}.{1:06d}'.format(field, chunk)
+
+#------------------------------------------------------------------------------#
+def _npy(values):
+    '''values in .npy format, as np.savez stores each member.'''
+    buf = io.BytesIO()
+    np.save(buf, values, allow_pickle=False)
+    return buf.getvalue()
+
+################################################################################
+class couplerarchive(): #Note: This is not a ctypes Structure!!!!
+    '''Archive of every quantity the models exchange, window by window.
+
+    PE 0 records, at the end of window 0 (the initial BCs and first GSSHA
+    run) and of every coupling window after it, the window's ADCIRC and GSSHA
+    times, GSSHA's broadcast outlet totals, the ADCIRC flux series, and the
+    reduced edge string eta statistics of the GSSHA head series, i.e., only
+    values every PE already has. Every chunk windows are appended to the
+    archive as new members of an npz (zip) file, which stays readable after
+    every chunk, so np.load, or couplerrecording, reads a run that stopped
+    early up to its last chunk.
+
+    Configured by the environment:
+        WATERCOUPLER_ARCHIVE        pathname of the .npz archive (unset: none)
+        WATERCOUPLER_ARCHIVE_CHUNK  chunk (64)
+    '''
+    def __init__(self, pathname='', chunk=DEFAULT_CHUNK, myid=0):
+        self.pathname = pathname
+        self.chunk = chunk
+        self.myid = myid
+        assert(self.chunk > 0)
+        self.rows = []
+        self.nchunks = 0
+        self.nwindows = 0
+
+    #--------------------------------------------------------------------------#
+    @classmethod
+    def from_environ(cls, myid=0):
+        return cls(os.environ.get('WATERCOUPLER_ARCHIVE', ''),
+                   int(os.environ.get('WATERCOUPLER_ARCHIVE_CHUNK', DEFAULT_CHUNK)), myid)
+
+    #--------------------------------------------------------------------------#
+    @property
+    def enabled(self):
+        return self.pathname != '' and self.myid == 0
+
+    #--------------------------------------------------------------------------#
+    def record(self, ags):
+        '''Record the window that just ended. Call after ags.timers.end_window().'''
+        if not self.enabled:
+            return
+        strings = ags.adcircedgestrings
+        if self.nwindows == 0:
+            meta = self._meta(ags)
+            with ags.timers.phase(PHASE_ARCHIVE):
+                with zipfile.ZipFile(self.pathname, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+                    archive.writestr(META + '.npy', _npy(np.array(json.dumps(meta))))
+
+        row = {'window'        : ags.couplinginterval.nwindows,
+               'adcirc_itime'  : int(ags.pmain.itime_bgn) - 1,
+               'adcirctprev'   : ags.adcirctprev,
+               'adcircrunflag' : ags.adcircrunflag,
+               'gssharunflag'  : ags.gssharunflag,
+               'gssha_timer'   : ags.gsshamv.timer,
+               'gssha_vout'    : ags.gsshamv.vout,
+               'gssha_qout'    : ags.gsshamv.qout,
+               'dtfactor'      : ags.couplingdtfactor,
+               'qtime1'        : ags.pg.qtime1,
+               'qtime2'        : ags.pg.qtime2,
+               'ftiminc'       : ags.pg.ftiminc}
+        if ags.couplingtype == 'Adg': # No ADCIRC BCs
+            row['flux'] = np.full(len(strings), np.nan)
+        elif ags.gssharunflag != ags.gsshadefine.OFF:
+            row['flux'] = strings.flux(ags.gsshamv.qout if ags.gsshaqouts is None else ags.gsshaqouts)
+        else:
+            row['flux'] = np.zeros(len(strings))
+        # Taken, so that a window without a GSSHA BC update records NaNs.
+        if self.nwindows > 0 and ags.adcircetastats is not None:
+            row['eta_stats'] = np.array(ags.adcircetastats)
+        else:
+            row['eta_stats'] = np.full(NETA_STATS*len(strings), np.nan)
+        ags.adcircetastats = None
+        self.rows.append(row)
+        self.nwindows += 1
+        if len(self.rows) >= self.chunk:
+            self.flush(ags.timers)
+
+    #--------------------------------------------------------------------------#
+    def flush(self, timers):
+        '''Append the windows recorded since the last flush as a new chunk.'''
+        if not self.rows:
+            return
+        with timers.phase(PHASE_ARCHIVE):
+            with zipfile.ZipFile(self.pathname, mode='a', compression=zipfile.ZIP_DEFLATED) as archive:
+                for field in WINDOW_FIELDS + EDGESTRING_FIELDS:
+                    values = np.array([row[field] for row in self.rows])
+                    archive.writestr(_member(field, self.nchunks) + '.npy', _npy(values))
+        self.nchunks += 1
+        self.rows = []
+
+    #--------------------------------------------------------------------------#
+    def close(self, timers):
+        '''Append the last windows. Call before finalizing.'''
+        if not self.enabled:
+            return
+        self.flush(timers)
+        log.info("Coupling archive: %d windows in %s", self.nwindows, self.pathname)
+
+    #--------------------------------------------------------------------------#
+    def _meta(self, ags):
+        '''Constants of the run, and the ADCIRC and GSSHA settings a replay of
+        either model needs in place of the model itself.'''
+        strings = ags.adcircedgestrings
+        return {'version'          : ARCHIVE_VERSION,
+                'couplingtype'     : ags.couplingtype,
+                'edgestrings'      : [int(es.id) for es in strings],
+                'fractions'        : [float(f) for f in strings.fractions],
+                'lengths'          : [float(length) for length in strings.lengths],
+                'adcirc_dt'        : float(ags.pg.dt),
+                'adcirc_dtdp'      : float(ags.pg.dtdp),
+                'adcirc_statim'    : float(ags.pg.statim),
+                'adcirc_rnday'     : float(ags.pg.rnday),
+                'adcirc_nt'        : int(ags.pg.nt),
+                'adcirc_ntsteps'   : int(ags.adcircntsteps),
+                'adcirc_itime'     : int(ags.pmain.itime_bgn) - 1,
+                'gssha_timer'      : float(ags.gsshatprev),
+                'gssha_niter'      : int(ags.gsshatfinal),
+                'gssha_dt'         : float(ags.gsshadt),
+                'gssha_btime'      : float(ags.gsshatstartjul),
+                'gssha_b_lt_start' : float(ags.gsshamv.b_lt_start),
+                'gssha_single_event_end' : float(ags.gsshasingle_event_end),
+                'eta_stats_init'   : (None if ags.adcircetastats is None
+                                      else [float(v) for v in ags.adcircetastats])}
+
+################################################################################
+class couplerrecording(): #Note: This is not a ctypes Structure!!!!
+    '''A couplerarchive, read back: meta holds the run's constants, and
+    windows[field] the values of all the recorded windows, in order.'''
+    def __init__(self, pathname):
+        self.pathname = pathname
+        try:
+            with np.load(pathname) as archive:
+                self.meta = json.loads(str(archive[META]))
+                self.windows = {}
+                for field in WINDOW_FIELDS + EDGESTRING_FIELDS:
+                    chunks = sorted(name for name in archive.files
+                                    if name.rsplit('.', 1)[0] == field)
+                    self.windows[field] = np.concatenate([archive[name] for name in chunks])
+        except (IOError, OSError, KeyError, ValueError, zipfile.BadZipfile) as err:
+            raise ValueError("Cannot read coupling archive '{0}': {1}".format(pathname, err))
+        if self.meta.get('version') != ARCHIVE_VERSION:
+            raise ValueError("Coupling archive '{0}' is of version {1}, not {2}".format(
+                pathname, self.meta.get('version'), ARCHIVE_VERSION))
+
+    #--------------------------------------------------------------------------#
+    def __len__(self):
+        return len(self.windows['window'])
+
+    #--------------------------------------------------------------------------#
+    def check_edgestrings(self, edgestringids, fractions):
+        '''The edge strings of a replay must be the archive's.'''
+        if list(edgestringids) != self.meta['edgestrings'] or (
+                fractions is not None and not np.allclose(fractions, self.meta['fractions'])):
+            raise ValueError("Coupling archive '{0}' couples edge strings {1} with fractions {2}".format(
+                self.pathname, [i+1 for i in self.meta['edgestrings']], self.meta['fractions']))
+
+################################################################################
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Coupling types and edge string arguments of the coupler.
+
+Pure Python, with no NumPy and no model library, so that the command line is
+checked before anything heavy loads.
+"""
+
+from __future__ import absolute_import, print_function
+
+################################################################################
+COUPLING_CONCURRENT  = 'A|g'    # Lagged two-way coupling, GSSHA in a thread alongside ADCIRC
+COUPLING_TYPES       = ['gdA', 'Adg', 'gdAdg', 'AdgdA', COUPLING_CONCURRENT]
+ONE_WAY_TYPES        = ['gdA', 'Adg']
+
+################################################################################
+def parse_edgestrings(spec):
+    '''Edge string IDs (0-based) and GSSHA outlet fractions, or None, from a
+    command line argument: '<id>', '<id>,<id>,...' or '<id>:<fraction>,...'.
+
+    IDs on the command line are 1-based, like ADCIRC's. Fractions must be
+    given for all edge strings or none, and add up to 1.
+    '''
+    if isinstance(spec, bytes):
+        spec = spec.decode('utf-8')
+    ids, fractions = [], []
+    try:
+        for item in str(spec).split(','):
+            edgestringid, sep, fraction = item.partition(':')
+            ids.append(int(edgestringid)-1)
+            if sep:
+                fractions.append(float(fraction))
+    except ValueError:
+        raise ValueError("Edge strings must be '<id>[:<fraction>][,...]', got '{0}'".format(spec))
+    if min(ids) < 0 or len(set(ids)) != len(ids):
+        raise ValueError("Edge string IDs must be distinct and at least 1, got '{0}'".format(spec))
+    if not fractions:
+        return ids, None
+    if len(fractions) != len(ids) or min(fractions) <= 0.0 or abs(sum(fractions)-1.0) > 1.0E-6:
+        raise ValueError("Edge string outlet fractions must be positive, given for every "
+                         "edge string, and add up to 1, got '{0}'".format(spec))
+    return ids, fractions
+
+#------------------------------------------------------------------------------#
+def parse_watersheds(pathname):
+    '''(GSSHA project, edge string IDs, fractions) of every watershed of a
+    manifest, in order, with the edge strings parsed as parse_edgestrings.
+
+    Every line of the manifest is a watershed: its GSSHA project file and the
+    ADCIRC edge strings its outlet feeds, e.g., 'Creek.prj 3:0.6,5:0.4'.
+    Blank lines and lines starting with '#' are skipped. An edge string may
+    be fed by one watershed only.
+    '''
+    watersheds, seen = [], set()
+    with open(pathname) as manifest:
+        for lineno, line in enumerate(manifest, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split()
+            if len(fields) != 2:
+                raise ValueError("Watershed manifest '{0}', line {1}: expected "
+                                 "'<GSSHA project> <edge strings>', got '{2}'".format(pathname, lineno, line))
+            ids, fractions = parse_edgestrings(fields[1])
+            if seen.intersection(ids):
+                raise ValueError("Watershed manifest '{0}', line {1}: edge strings {2} "
+                                 "already feed another watershed".format(
+                                     pathname, lineno, sorted(i+1 for i in seen.intersection(ids))))
+            seen.update(ids)
+            watersheds.append((fields[0], ids, fractions))
+    if not watersheds:
+        raise ValueError("Watershed manifest '{0}' lists no watershed".format(pathname))
+    return watersheds
+
+################################################################################
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import re
+import inspect
+
+################################################################################
+BACKEND_NATIVE    = 'native'    # pyADCIRC and gsshapython
+BACKEND_SYNTHETIC = 'synthetic' # NumPy/ctypes stand-ins of watercoupler.synthetic
+BACKENDS = [BACKEND_NATIVE, BACKEND_SYNTHETIC]
+REPLAY_ADCIRC = 'adcirc' # ADCIRC played back from a coupling archive
+REPLAY_GSSHA  = 'gssha'  # GSSHA played back from a coupling archive
+
+################################################################################
+def _takes_arguments(function):
+    '''Whether function takes any argument: from its signature, or, for an
+    f2py wrapped Fortran routine, which has none, from the first line of its
+    docstring, e.g., 'pyadcirc_init([comm])'.'''
+    try:
+        return len(inspect.signature(function).parameters) > 0
+    except (AttributeError, TypeError, ValueError):
+        pass
+    doc = (getattr(function, '__doc__', None) or '').strip()
+    match = re.match(r'\s*\w+\((.*?)\)', doc.split('\n')[0] if doc else '')
+    return bool(match and match.group(1).strip())
+
+#------------------------------------------------------------------------------#
+def adcirc_takes_comm(name=BACKEND_NATIVE):
+    '''Whether the ADCIRC library's pyadcirc_init takes ADCIRC's MPI
+    communicator, which a dedicated GSSHA rank needs. Imports pyADCIRC, but
+    initializes neither ADCIRC nor MPI, so every rank can check it before
+    MPI_COMM_WORLD is split.'''
+    if name != BACKEND_NATIVE:
+        return True # The synthetic stand-in keeps it.
+    import pyADCIRC.pyadcirc as pa
+    return _takes_arguments(pa.pyadcirc_mod.pyadcirc_init)
+
+################################################################################
+class couplerbackend(): #Note: This is not a ctypes Structure!!!!
+    '''The ADCIRC and GSSHA libraries the coupler runs on.
+
+    Holds pyADCIRC's pyadcirc module (pa), gsshapython's define_h, types_h
+    and fnctn_h modules, and the pointer to GSSHA's main_var_struct (mvs), or
+    their synthetic stand-ins. The libraries are only imported here, so that
+    the synthetic backend runs without them.
+
+    With a replay, a couplerrecording, the replayed model (REPLAY_ADCIRC or
+    REPLAY_GSSHA) is not loaded at all: the stand-ins of coupler_replay play
+    it back from the recording instead.
+
+    With a gssharanksplit, the dedicated GSSHA rank loads GSSHA only (pa is
+    None), and ADCIRC's PEs load ADCIRC only, running GSSHA through the
+    remotegssha stand-in.
+    '''
+    def __init__(self, name=BACKEND_NATIVE, options=None, replay=None, replayed=None, split=None):
+        if name not in BACKENDS:
+            raise ValueError("Unknown backend '{0}', choose one of: {1}".format(
+                name, ', '.join(BACKENDS)))
+        if replay is not None and split is not None:
+            raise ValueError("A replay cannot run with a dedicated GSSHA rank")
+        self.name = name
+        self.native = (name == BACKEND_NATIVE)
+        self.replayed = replayed if replay is not None else None
+        self.split = split
+        self.pa = None
+        loadadcirc = (self.replayed != REPLAY_ADCIRC and (split is None or not split.isgssharank))
+        loadgssha = (self.replayed != REPLAY_GSSHA and (split is None or split.isgssharank))
+
+        if self.native:
+            import ctypes as ct
+            self.config = None
+            if loadadcirc:
+                import pyADCIRC.pyadcirc as pa
+                self.pa = pa
+            if loadgssha:
+                import gsshapython.sclass.define_h      as gsshadefine
+                import gsshapython.sclass.types_h       as gsshatypes
+                import gsshapython.sclass.fnctn_h       as gsshafnctn
+                import gsshapython.sclass.main_struct_h as gsshamain
+                self.gsshadefine = gsshadefine
+                self.gsshatypes = gsshatypes
+                self.gsshafnctn = gsshafnctn
+                self.mvs = gsshafnctn.get_lib_var(gsshafnctn.gsshalib,'python_main_var_struct_ptr', ct.POINTER(gsshamain.main_var_struct))
+        else:
+            from ..synthetic import syntheticconfig, syntheticadcirc, syntheticgssha
+            from ..synthetic.synthetic_gssha import define_h, types_h
+            self.config = syntheticconfig(options)
+            gssha = syntheticgssha(self.config)
+            if loadadcirc:
+                self.pa = syntheticadcirc(self.config)
+            self.gsshadefine = define_h
+            self.gsshatypes = types_h
+            self.gsshafnctn = gssha
+            self.mvs = gssha.mvs
+
+        if self.replayed == REPLAY_ADCIRC:
+            from .coupler_replay import recordedadcirc
+            self.pa = recordedadcirc(replay)
+        elif self.replayed == REPLAY_GSSHA:
+            from .coupler_replay import recordedgssha
+            from ..synthetic.synthetic_gssha import define_h, types_h
+            gssha = recordedgssha(replay)
+            self.gsshadefine = define_h
+            self.gsshatypes = types_h
+            self.gsshafnctn = gssha
+            self.mvs = gssha.mvs
+        elif split is not None and not split.isgssharank:
+            from .gssha_rank import remotegssha
+            from ..synthetic.synthetic_gssha import define_h, types_h
+            gssha = remotegssha(split)
+            self.gsshadefine = define_h
+            self.gsshatypes = types_h
+            self.gsshafnctn = gssha
+            self.mvs = gssha.mvs
+
+################################################################################
+if __name__ == '__main__':
+    pass
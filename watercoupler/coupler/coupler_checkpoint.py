@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import os
+import re
+import logging
+import threading
+try:
+    import queue as _queue
+except ImportError:
+    # Python 2
+    import Queue as _queue
+
+import numpy as np
+
+from .coupler_timers import PHASE_CHECKPOINT, PHASE_FORT20_IO
+
+################################################################################
+log = logging.getLogger(__name__)
+
+################################################################################
+DEFAULT_KEEP = 2
+CHECKPOINT_FORMAT = 'checkpoint.{0:010d}.PE{1:04d}.npz' # ADCIRC time step, PE
+CHECKPOINT_PATTERN = re.compile(r'^checkpoint\.(\d+)\.PE(\d+)\.npz$')
+
+# Coupler attributes carried from window to window.
+STRUCT_STATE = ['adcirctprev', 'adcirctnext', 'adcircrunflag', 'gssharunflag',
+                'gsshavoutprev', 'gsshavoutprev_t', 'adcirc_hprev', 'adcirc_hprev_len']
+# Members of GSSHA's main_var_struct that the coupler sets or broadcasts.
+GSSHA_STATE = ['timer', 'niter', 'go', 'btime', 'single_event_end', 'vout', 'qout']
+# ADCIRC's flux boundary times, set by the coupler in place of fort.20 records.
+ADCIRC_FLUX_STATE = ['qtime1', 'qtime2', 'ftiminc']
+
+################################################################################
+def _adcirc_itime(ags):
+    '''ADCIRC time steps taken so far, the count its hot start files go by.'''
+    return int(ags.pmain.itime_bgn) - 1
+
+#------------------------------------------------------------------------------#
+def snapshot(ags):
+    '''Copy of the coupler state at the end of a window, as a dict of arrays.
+
+    Only the state the run loops and the BC functions carry from one window
+    to the next: the model states themselves are in ADCIRC's hot start files
+    and GSSHA's restart files.
+    '''
+    from .adcircgsshastruct import FLUX_EXCHANGE_FILE
+
+    state = dict((name, getattr(ags, name)) for name in STRUCT_STATE)
+    state['couplingtype'] = ags.couplingtype
+    state['adcircitime'] = _adcirc_itime(ags)
+    state['adcirc_hprevs'] = [] if ags.adcirc_hprevs is None else np.array(ags.adcirc_hprevs)
+    for name in ADCIRC_FLUX_STATE:
+        state['adcirc_'+name] = getattr(ags.pg, name)
+    state['adcirc_qnin1'] = ags.adcircqnin1.copy()
+    state['adcirc_qnin2'] = ags.adcircqnin2.copy()
+    if ags.adcircfluxexchange == FLUX_EXCHANGE_FILE and os.path.isfile(ags.adcircfort20pathname):
+        # The fort.20 replacement ADCIRC reads next, as written by adcirc_set_bc.
+        with ags.timers.phase(PHASE_FORT20_IO):
+            with open(ags.adcircfort20pathname, 'rb') as fort20file:
+                state['adcirc_fort20'] = np.frombuffer(fort20file.read(), dtype=np.uint8)
+
+    for name in GSSHA_STATE:
+        state['gssha_'+name] = getattr(ags.gsshamv, name)
+    state['gssha_b_lt_start'] = ags.gsshamv.b_lt_start
+    if ags.gsshaboundts is not None:
+        jul_time, val = ags.gsshaboundts.views()
+        state['gssha_bound_jul_time'] = jul_time.copy()
+        state['gssha_bound_val'] = val.copy()
+        state['gssha_bound_last_access'] = ags.gsshaboundts.ts.last_access
+
+    for name, value in ags.couplinginterval.snapshot().items():
+        state['interval_'+name] = value
+    for name, value in ags.exchangeinterp.snapshot().items():
+        state['exchange_'+name] = value
+    return state
+
+################################################################################
+class couplercheckpoints(): #Note: This is not a ctypes Structure!!!!
+    '''Periodic checkpoints of the coupler state, and restarts from them.
+
+    A checkpoint is taken at the end of every coupling window that ends on a
+    time step at which ADCIRC writes a hot start file, i.e., a multiple of
+    NHSINC, so that ADCIRC can be hot started at the same time step; an
+    adaptive coupling interval is cut to end windows there. Every PE
+    writes its own checkpoint.<time step>.PE<myid>.npz to outdir: the state is
+    copied on the main thread, and written by a background thread to a
+    temporary file that is then renamed, so a checkpoint is either complete
+    or missing. Only the last keep checkpoints of every PE are kept, and any
+    at later time steps, left over from an earlier run, are removed.
+
+    On a restart, ADCIRC is hot started by its own input files, and the
+    checkpoint at ADCIRC's hot start time step is read from restartdir in
+    place of the first GSSHA run of the run loops, which then carry on at
+    the checkpointed window. GSSHA's clock, outlet totals and head boundary
+    series, and the samples of the pchip exchange, come from the checkpoint; its other state must come from GSSHA's
+    own restart files, written at the GSSHA time logged with the checkpoint.
+
+    Configured by the environment:
+        WATERCOUPLER_CHECKPOINT_DIR   outdir (unset: no checkpoints)
+        WATERCOUPLER_CHECKPOINT_KEEP  keep (2)
+    '''
+    def __init__(self, outdir='', keep=DEFAULT_KEEP, restartdir=None, myid=0):
+        self.outdir = outdir
+        self.keep = keep
+        self.restartdir = restartdir
+        self.myid = myid
+        assert(self.keep > 0)
+
+        self.nhsinc = 0         # ADCIRC hot start interval, set by setup()
+        self.lastitime = None   # ADCIRC time step of the last checkpoint
+        self.nwritten = 0
+        self.thread = None
+        self.queue = _queue.Queue(maxsize=1) # At most one checkpoint waits to be written.
+        self.error = None
+
+    #--------------------------------------------------------------------------#
+    @classmethod
+    def from_environ(cls, myid=0, restartdir=None):
+        '''restartdir '' restarts from the checkpoint directory itself.'''
+        outdir = os.environ.get('WATERCOUPLER_CHECKPOINT_DIR', '')
+        if restartdir == '':
+            restartdir = outdir
+        return cls(outdir, int(os.environ.get('WATERCOUPLER_CHECKPOINT_KEEP', DEFAULT_KEEP)),
+                   restartdir, myid)
+
+    #--------------------------------------------------------------------------#
+    @property
+    def enabled(self):
+        return self.outdir != ''
+
+    #--------------------------------------------------------------------------#
+    @property
+    def restarting(self):
+        return self.restartdir is not None
+
+    #--------------------------------------------------------------------------#
+    def pathname(self, directory, itime):
+        return os.path.join(directory, CHECKPOINT_FORMAT.format(itime, self.myid))
+
+    #--------------------------------------------------------------------------#
+    def available(self, directory):
+        '''{ADCIRC time step: pathname} of this PE's checkpoints in directory.'''
+        result = {}
+        if not os.path.isdir(directory):
+            return result
+        for name in os.listdir(directory):
+            match = CHECKPOINT_PATTERN.match(name)
+            if match and int(match.group(2)) == self.myid:
+                result[int(match.group(1))] = os.path.join(directory, name)
+        return result
+
+    #--------------------------------------------------------------------------#
+    def setup(self, ags):
+        '''Find ADCIRC's hot start interval, once both models are initialized.'''
+        if not self.enabled:
+            return
+        try:
+            os.makedirs(self.outdir)
+        except OSError:
+            # Another PE may have just created it.
+            if not os.path.isdir(self.outdir):
+                raise
+        if ags.pg.nhstar == 0 or ags.pg.nhsinc <= 0:
+            log.warning("ADCIRC writes no hot start files (NHSTAR = 0), so no coupler "
+                        "checkpoints will be written")
+            return
+        self.nhsinc = int(ags.pg.nhsinc)
+        if ags.couplinginterval.adaptive:
+            log.info("The adaptive coupling interval ends a window on every hot start, every NHSINC = %d "
+                     "ADCIRC time steps", self.nhsinc)
+            if self.nhsinc % ags.couplingdtfactor != 0:
+                log.warning("The initial coupling interval of %d ADCIRC time steps does not divide "
+                            "NHSINC = %d: the first hot start may have no coupler checkpoint",
+                            ags.couplingdtfactor, self.nhsinc)
+        elif self.nhsinc % ags.couplingdtfactor != 0:
+            log.warning("The coupling interval of %d ADCIRC time steps does not divide NHSINC = %d: "
+                        "coupler checkpoints are only taken at windows ending on a hot start",
+                        ags.couplingdtfactor, self.nhsinc)
+        log.info("Coupler checkpoints: every %d ADCIRC time steps, last %d kept in %s",
+                 self.nhsinc, self.keep, self.outdir)
+
+    #--------------------------------------------------------------------------#
+    def due(self, ags):
+        itime = _adcirc_itime(ags)
+        return (self.nhsinc > 0 and itime > 0 and itime % self.nhsinc == 0
+                and itime != self.lastitime)
+
+    ############################################################################
+    # Checkpoint
+    ############################################################################
+    def save(self, ags):
+        '''Checkpoint the coupler at the end of a window, if it is due.
+
+        Blocks only while the previous checkpoint is still being written.
+        '''
+        if not self.due(ags):
+            return
+        itime = _adcirc_itime(ags)
+        with ags.timers.phase(PHASE_CHECKPOINT):
+            state = snapshot(ags)
+            self._raise()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='checkpoint')
+                self.thread.daemon = True
+                self.thread.start()
+            self.queue.put((itime, state))
+        self.lastitime = itime
+        log.info("Coupler checkpoint at ADCIRC time step %d (%s s), GSSHA time %s min",
+                 itime, ags.adcirctprev, ags.gsshamv.timer)
+
+    #--------------------------------------------------------------------------#
+    def close(self):
+        '''Wait for the last checkpoint to be written. Call before finalizing.'''
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        self._raise()
+        if self.nwritten > 0:
+            log.debug("Coupler checkpoints written: %d", self.nwritten)
+
+    #--------------------------------------------------------------------------#
+    def _raise(self):
+        '''Re-raise, on the main thread, an error of the writer thread.'''
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("Writing a coupler checkpoint failed: {0}".format(error))
+
+    #--------------------------------------------------------------------------#
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            try:
+                self._write(*item)
+            except BaseException as err:
+                self.error = err
+
+    #--------------------------------------------------------------------------#
+    def _write(self, itime, state):
+        pathname = self.pathname(self.outdir, itime)
+        tmppathname = pathname + '.tmp'
+        with open(tmppathname, 'wb') as checkpointfile:
+            np.savez(checkpointfile, **state)
+            checkpointfile.flush()
+            os.fsync(checkpointfile.fileno())
+        os.rename(tmppathname, pathname) # Atomic on POSIX file systems
+        self.nwritten += 1
+
+        # Keep only the last keep checkpoints of this PE. Later ones are left
+        # over from an earlier run, which this one has taken over from.
+        checkpoints = self.available(self.outdir)
+        kept = sorted(old for old in checkpoints if old <= itime)[-self.keep:]
+        for old in checkpoints:
+            if old not in kept:
+                os.remove(checkpoints[old])
+
+    ############################################################################
+    # Restart
+    ############################################################################
+    def restore(self, ags):
+        '''Rebuild the coupler state from the checkpoint at ADCIRC's hot start
+        time step. Called by the run loops in place of the first GSSHA run,
+        after the initial BC functions have set up the series it overwrites.
+        '''
+        from .adcircgsshastruct import TIME_TOL, FLUX_EXCHANGE_FILE
+        from .coupler_messenger import MSG_MIN
+
+        itime = _adcirc_itime(ags)
+        pathname = self.pathname(self.restartdir, itime)
+        # Either all PEs restart, or none.
+        found = ags.messenger.allreduce([1.0 if os.path.isfile(pathname) else 0.0], [MSG_MIN])[0]
+        if found < 1.0:
+            raise RuntimeError("No coupler checkpoint at ADCIRC's hot start time step {0} in "
+                               "'{1}' on all PEs. Time steps checkpointed on PE {2}: {3}".format(
+                                   itime, self.restartdir, self.myid,
+                                   sorted(self.available(self.restartdir)) or 'none'))
+        with np.load(pathname) as data:
+            state = dict((name, data[name]) for name in data.files)
+
+        if str(state['couplingtype']) != ags.couplingtype:
+            raise RuntimeError("Coupler checkpoint {0} is of coupling type {1}, not {2}".format(
+                pathname, state['couplingtype'], ags.couplingtype))
+        if abs(float(state['gssha_b_lt_start']) - ags.gsshamv.b_lt_start)*86400.0 > TIME_TOL:
+            raise RuntimeError("GSSHA's start time differs from that of coupler checkpoint "
+                               "{0}; keep GSSHA's start date when restarting".format(pathname))
+        assert(state['adcirc_qnin2'].shape == ags.adcircqnin2.shape)
+
+        for name in STRUCT_STATE:
+            setattr(ags, name, state[name].item())
+        ags.adcirc_hprevs = state['adcirc_hprevs'] if state['adcirc_hprevs'].size > 0 else None
+        for name in ADCIRC_FLUX_STATE:
+            setattr(ags.pg, name, state['adcirc_'+name].item())
+        ags.adcircqnin1[:] = state['adcirc_qnin1']
+        ags.adcircqnin2[:] = state['adcirc_qnin2']
+        if ags.adcircfluxexchange == FLUX_EXCHANGE_FILE and 'adcirc_fort20' in state:
+            with ags.timers.phase(PHASE_FORT20_IO):
+                errorio = ags.pu.pycloseopenedfileforread(20)
+                assert(errorio==0)
+                with open(ags.adcircfort20pathname, 'wb') as fort20file:
+                    fort20file.write(state['adcirc_fort20'].tobytes())
+                errorio = ags.pg.pyopenfileforread(20,ags.adcircfort20pathname)
+                assert(errorio==0)
+
+        for name in GSSHA_STATE:
+            setattr(ags.gsshamv, name, state['gssha_'+name].item())
+        if ags.gsshaboundts is not None and 'gssha_bound_val' in state:
+            jul_time, val = ags.gsshaboundts.views()
+            jul_time[:] = state['gssha_bound_jul_time']
+            val[:] = state['gssha_bound_val']
+            ags.gsshaboundts.ts.last_access = state['gssha_bound_last_access'].item()
+
+        ags.couplinginterval.restore(ags, dict((name[len('interval_'):], state[name].item()
+                                                if state[name].ndim == 0 else state[name])
+                                               for name in state if name.startswith('interval_')))
+        if 'exchange_fluxend_time' in state:
+            ags.exchangeinterp.restore(dict((name[len('exchange_'):], state[name])
+                                            for name in state if name.startswith('exchange_')))
+        self.lastitime = itime
+        log.info("Restarted from coupler checkpoint %s: window %d, ADCIRC time %s s, GSSHA time %s min",
+                 pathname, ags.couplinginterval.nwindows, ags.adcirctprev, ags.gsshamv.timer)
+
+################################################################################
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import os
+import logging
+
+import numpy as np
+
+from .coupler_checkpoint import STRUCT_STATE, GSSHA_STATE, ADCIRC_FLUX_STATE
+from .coupling_interval import QOUT_FLOOR
+
+################################################################################
+log = logging.getLogger(__name__)
+
+################################################################################
+ITERATIVE_TYPES = ['AdgdA', 'gdAdg']
+DEFAULT_MAXITER = 1       # Iterations per window; 1: the explicit scheme
+DEFAULT_QTOL = 1.0E-3     # Relative change of GSSHA's qout
+DEFAULT_ETA_TOL = 1.0E-3  # m, change of the edge string mean eta
+DEFAULT_RELAX = 1.0       # Under-relaxation of the iterated boundary value
+
+################################################################################
+def save_state(ags):
+    '''Copy of the coupler and model state at the start of a window, to go
+    back to with restore_state. The models save their own state in memory.'''
+    state = dict((name, getattr(ags, name)) for name in STRUCT_STATE)
+    state['adcirc_hprevs'] = None if ags.adcirc_hprevs is None else np.array(ags.adcirc_hprevs)
+    for name in ADCIRC_FLUX_STATE:
+        state['adcirc_'+name] = getattr(ags.pg, name)
+    state['adcirc_qnin1'] = ags.adcircqnin1.copy()
+    state['adcirc_qnin2'] = ags.adcircqnin2.copy()
+    for name in GSSHA_STATE:
+        state['gssha_'+name] = getattr(ags.gsshamv, name)
+    state['gssha_bound_ts'] = ags.gsshaboundts.snapshot()
+    state['adcirc_model'] = ags.pmain.pyadcirc_save_state()
+    state['gssha_model'] = ags.gsshafnctn.main_gssha_save_state(ags.mvs)
+    return state
+
+#------------------------------------------------------------------------------#
+def restore_state(ags, state):
+    '''Go back to a state of save_state.'''
+    ags.pmain.pyadcirc_restore_state(state['adcirc_model'])
+    ags.gsshafnctn.main_gssha_restore_state(ags.mvs, state['gssha_model'])
+    for name in STRUCT_STATE:
+        setattr(ags, name, state[name])
+    ags.adcirc_hprevs = None if state['adcirc_hprevs'] is None else state['adcirc_hprevs'].copy()
+    for name in ADCIRC_FLUX_STATE:
+        setattr(ags.pg, name, state['adcirc_'+name])
+    ags.adcircqnin1[:] = state['adcirc_qnin1']
+    ags.adcircqnin2[:] = state['adcirc_qnin2']
+    for name in GSSHA_STATE:
+        setattr(ags.gsshamv, name, state['gssha_'+name])
+    ags.gsshaboundts.restore(state['gssha_bound_ts'])
+
+################################################################################
+class couplingiteration(): #Note: This is not a ctypes Structure!!!!
+    '''Picard iterations of the two-way coupling types within every window.
+
+    In AdgdA and gdAdg, the model that runs first in a window reads a
+    boundary series that the other model set one window ahead, i.e., that
+    ends at the other model's value from the last window: ADCIRC's flux from
+    GSSHA's qout in AdgdA, GSSHA's head from ADCIRC's edge string mean eta in
+    gdAdg. With maxiter > 1, the coupler saves both models and its own state
+    at the start of every window, and runs the window again with that end
+    value replaced by the one the window produced, relaxed by relax, until
+    GSSHA's qout and the edge string mean eta at the end of the window change
+    by less than qtol (relative) and etatol from one run of the window to the
+    next, or maxiter runs. The first run's values are compared with those the
+    window started from.
+
+    The models must be able to save their state in memory and go back to it
+    (pyadcirc_save_state/pyadcirc_restore_state and
+    main_gssha_save_state/main_gssha_restore_state); only the synthetic
+    backend can so far. Otherwise, for the other coupling types, and with
+    sub-sampling, every window runs once.
+
+    Configured by the environment:
+        WATERCOUPLER_ITERATE          maxiter (1: no iterations)
+        WATERCOUPLER_ITERATE_QTOL     qtol (1e-3)
+        WATERCOUPLER_ITERATE_ETA_TOL  etatol, m (1e-3)
+        WATERCOUPLER_ITERATE_RELAX    relax, in (0, 1] (1.0)
+    '''
+    def __init__(self, maxiter=DEFAULT_MAXITER, qtol=DEFAULT_QTOL, etatol=DEFAULT_ETA_TOL,
+                 relax=DEFAULT_RELAX):
+        if maxiter < 1 or qtol <= 0.0 or etatol <= 0.0 or not (0.0 < relax <= 1.0):
+            raise ValueError("Coupling iterations need WATERCOUPLER_ITERATE >= 1, positive tolerances "
+                             "and 0 < WATERCOUPLER_ITERATE_RELAX <= 1, got {0}, {1}, {2} and {3}".format(
+                                 maxiter, qtol, etatol, relax))
+        self.maxiter = maxiter
+        self.qtol = qtol
+        self.etatol = etatol
+        self.relax = relax
+        self.enabled = (maxiter > 1)
+
+        self.counts = []     # Runs of every window
+        self.unconverged = 0 # Windows that ran maxiter times without converging
+        self.reduced = None  # gdAdg: reduced edge string eta statistics of the accepted run
+
+    #--------------------------------------------------------------------------#
+    @classmethod
+    def from_environ(cls):
+        return cls(int(os.environ.get('WATERCOUPLER_ITERATE', DEFAULT_MAXITER)),
+                   qtol=float(os.environ.get('WATERCOUPLER_ITERATE_QTOL', DEFAULT_QTOL)),
+                   etatol=float(os.environ.get('WATERCOUPLER_ITERATE_ETA_TOL', DEFAULT_ETA_TOL)),
+                   relax=float(os.environ.get('WATERCOUPLER_ITERATE_RELAX', DEFAULT_RELAX)))
+
+    #--------------------------------------------------------------------------#
+    def setup(self, ags):
+        '''Fall back to running every window once where iterations cannot run.'''
+        from .adcircgsshastruct import FLUX_EXCHANGE_MEMORY
+        if not self.enabled:
+            return
+        if ags.couplingtype not in ITERATIVE_TYPES:
+            reason = "only {0} iterate".format(' and '.join(ITERATIVE_TYPES))
+        elif not (hasattr(ags.pmain, 'pyadcirc_save_state') and
+                  hasattr(ags.gsshafnctn, 'main_gssha_save_state')):
+            reason = "the ADCIRC and GSSHA bindings cannot save and restore their state in memory"
+        elif ags.exchangeinterp.cubic:
+            reason = "the {0} exchange interpolation is not iterated".format(ags.exchangeinterp.mode)
+        elif ags.sampling.enabled:
+            reason = "sub-sampled windows are not iterated"
+        elif ags.adcircfluxexchange != FLUX_EXCHANGE_MEMORY:
+            reason = "iterations need the memory flux exchange mode"
+        else:
+            reason = None
+        if reason is not None:
+            log.warning("Running %s without coupling iterations: %s", ags.couplingtype, reason)
+            self.enabled = False
+            return
+        log.info("Coupling iterations: up to %d per window, qout tolerance %s, eta tolerance %s m, "
+                 "relaxation %s", self.maxiter, self.qtol, self.etatol, self.relax)
+
+    #--------------------------------------------------------------------------#
+    def window(self, ags):
+        '''Iterations of the coming window: yields 1, 2, ... and, after the
+        caller ran the window, goes back to its start for another run, until
+        it converges. Must be run through on all PEs, which all take the same
+        decisions from broadcast and reduced values.'''
+        self.reduced = None
+        if not (self.enabled and ags.adcirctprev < ags.adcirctfinal and
+                ags.gsshamv.timer < ags.gsshatfinal):
+            self.counts.append(1)
+            yield 1
+            return
+
+        state = save_state(ags)
+        adcircfirst = (ags.couplingtype == 'AdgdA')
+        if adcircfirst:
+            # ADCIRC's flux series ends at GSSHA's last qout.
+            guess = ags.gsshamv.qout
+            prev = (guess, None)
+        else:
+            # GSSHA's head series ends at its last head sample.
+            jul_time, val = ags.gsshaboundts.views()
+            sample = guess = val[-1]
+            prev = (None, ags.adcirc_hprev)
+        for i in range(1, self.maxiter+1):
+            yield i
+            qout = ags.gsshamv.qout
+            eta = ags.adcirc_hprev if adcircfirst else self._mean_eta(ags)
+            dq = 0.0 if prev[0] is None else abs(qout - prev[0])
+            deta = 0.0 if prev[1] is None else abs(eta - prev[1])
+            converged = (dq <= self.qtol*max(abs(qout), abs(prev[0] or 0.0), QOUT_FLOOR)
+                         and deta <= self.etatol)
+            if converged or i == self.maxiter:
+                break
+            if adcircfirst:
+                guess += self.relax*(qout - guess)
+            else:
+                guess += self.relax*(sample + (eta - state['adcirc_hprev']) - guess)
+            restore_state(ags, state)
+            self._set_guess(ags, guess)
+            prev = (qout, eta)
+
+        if not adcircfirst:
+            # The next head builds on the sample, not on the iterated value.
+            jul_time, val = ags.gsshaboundts.views()
+            val[-1] = sample
+        if not converged:
+            self.unconverged += 1
+        self.counts.append(i)
+        log.info("Coupling window %d: %d iteration(s), %s; qout change %s m3/s, eta change %s m",
+                 len(self.counts), i, 'converged' if converged else 'NOT converged', dq, deta)
+
+    #--------------------------------------------------------------------------#
+    def _mean_eta(self, ags):
+        '''Edge string mean eta at the end of ADCIRC's run, as gssha_set_bc
+        will reduce it; kept for gssha_set_bc to use.'''
+        from .gssha_set_bc_func import edgestring_eta_stats
+        strings = ags.adcircedgestrings
+        self.reduced = ags.messenger.allreduce(*edgestring_eta_stats(ags))
+        reduced = np.array(self.reduced).reshape(5, len(strings))
+        return strings.head(reduced[0]/reduced[2])
+
+    #--------------------------------------------------------------------------#
+    def _set_guess(self, ags, guess):
+        '''End the series read in the window at guess.'''
+        if ags.couplingtype == 'AdgdA':
+            ags.adcircedgestrings.setflux(ags.adcircqnin2, guess)
+        else:
+            jul_time, val = ags.gsshaboundts.views()
+            val[-2:] = guess
+
+    #--------------------------------------------------------------------------#
+    def close(self):
+        '''Log the iteration counts. Call before finalizing.'''
+        if not self.enabled or not self.counts:
+            return
+        counts = np.array(self.counts)
+        log.info("Coupling iterations: %d windows, %d runs, mean %.2f, max %d; %d window(s) not converged",
+                 len(counts), counts.sum(), counts.mean(), counts.max(), self.unconverged)
+
+################################################################################
+if __name__ == '__main__':
+    pass
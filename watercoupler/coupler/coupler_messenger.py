@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+
+import numpy as np
+
+from .coupler_timers import PHASE_MPI
+
+################################################################################
+MSG_SUM = 'sum'
+MSG_MAX = 'max'
+MSG_MIN = 'min'
+
+################################################################################
+def _import_mpi():
+    '''mpi4py's MPI module, or None without mpi4py.
+
+    Imported only once MPI is initialized, by ADCIRC's MSG_INIT or, with a
+    dedicated GSSHA rank, by gssharanksplit: these own MPI_Init and
+    MPI_Finalize, so mpi4py must do neither.
+    '''
+    try:
+        import mpi4py
+    except ImportError:
+        return None
+    mpi4py.rc.initialize = False
+    mpi4py.rc.finalize = False
+    from mpi4py import MPI
+    return MPI
+
+#------------------------------------------------------------------------------#
+def _make_sum_max_op(MPI, nsum):
+    '''MPI user op on doubles: sum of the first nsum entries, max of the rest.'''
+    def _sum_max(inmem, outmem, datatype):
+        a = np.frombuffer(inmem,  dtype=np.float64)
+        b = np.frombuffer(outmem, dtype=np.float64)
+        b[:nsum] += a[:nsum]
+        np.maximum(b[nsum:], a[nsum:], out=b[nsum:])
+    return MPI.Op.Create(_sum_max, commute=True)
+
+################################################################################
+class couplermessenger(): #Note: This is not a ctypes Structure!!!!
+    '''Batched collectives over ADCIRC's compute communicator.
+
+    All scalars needed at one point of a coupling window are packed into a
+    single vector and exchanged with one collective, instead of one blocking
+    pymsg_dbl_sum/max/min call per scalar. Mixed sum/max/min reductions go
+    through a single MPI user op: min entries are negated and reduced as max.
+    This needs mpi4py; without it, every value falls back to its own pymsg
+    call, which gives the same results with the old number of collectives.
+    '''
+    def __init__(self, ags):
+        self.pmsg = ags.pmsg
+        self.myid = ags.myid
+        self.parallel = (ags.pu.messg == ags.pu.on)
+        self.comm_f = ags.adcirc_comm_comp
+        self.comm = None
+        self.MPI = None
+        # The synthetic backend's communicator handle is not a real one.
+        if self.parallel and ags.backend.native:
+            self.MPI = _import_mpi()
+        if self.MPI is not None:
+            assert(self.MPI.Is_initialized())
+            self.comm = self.MPI.Comm.f2py(self.comm_f)
+        self.timers = ags.timers
+        self.ncollectives = 0 # Number of collectives issued so far.
+        self._ops = {}
+
+    #--------------------------------------------------------------------------#
+    def allreduce(self, values, ops):
+        '''Reduce values[i] with ops[i] (MSG_SUM, MSG_MAX or MSG_MIN) over all
+        PEs. Returns a list of floats in the same order.'''
+        assert(len(values) == len(ops))
+        if not self.parallel:
+            return [float(v) for v in values]
+        with self.timers.phase(PHASE_MPI):
+            return self._allreduce(values, ops)
+
+    #--------------------------------------------------------------------------#
+    def _allreduce(self, values, ops):
+        if self.comm is None:
+            funcs = {MSG_SUM: self.pmsg.pymsg_dbl_sum,
+                     MSG_MAX: self.pmsg.pymsg_dbl_max,
+                     MSG_MIN: self.pmsg.pymsg_dbl_min}
+            self.ncollectives += len(values)
+            return [float(funcs[op](float(v), self.comm_f)) for v, op in zip(values, ops)]
+
+        # Pack sums first, then max and negated min entries.
+        isum = [i for i, op in enumerate(ops) if op == MSG_SUM]
+        imax = [i for i, op in enumerate(ops) if op != MSG_SUM]
+        sendbuf = np.empty(len(values), dtype=np.float64)
+        for k, i in enumerate(isum + imax):
+            sendbuf[k] = -values[i] if ops[i] == MSG_MIN else values[i]
+        recvbuf = np.empty_like(sendbuf)
+
+        if len(imax) == 0:
+            op = self.MPI.SUM
+        elif len(isum) == 0:
+            op = self.MPI.MAX
+        else:
+            op = self._ops.get(len(isum))
+            if op is None:
+                op = self._ops[len(isum)] = _make_sum_max_op(self.MPI, len(isum))
+        self.comm.Allreduce(sendbuf, recvbuf, op=op)
+        self.ncollectives += 1
+
+        result = [0.0]*len(values)
+        for k, i in enumerate(isum + imax):
+            result[i] = -recvbuf[k] if ops[i] == MSG_MIN else recvbuf[k]
+        return [float(v) for v in result]
+
+    #--------------------------------------------------------------------------#
+    def bcast(self, values, root=0):
+        '''Broadcast values from PE root to all PEs. Returns a list of floats.
+
+        Replaces the max-with-a-sentinel idiom for values that only one PE,
+        e.g. the one running GSSHA, knows.
+        '''
+        if not self.parallel:
+            return [float(v) for v in values]
+        with self.timers.phase(PHASE_MPI):
+            return self._bcast(values, root)
+
+    #--------------------------------------------------------------------------#
+    def _bcast(self, values, root):
+        if self.comm is None:
+            self.ncollectives += len(values)
+            return [float(self.pmsg.pymsg_dbl_max(
+                        float(v) if self.myid == root else -1.0E+200, self.comm_f))
+                    for v in values]
+
+        buf = np.array(values, dtype=np.float64)
+        self.comm.Bcast(buf, root=root)
+        self.ncollectives += 1
+        return [float(v) for v in buf]
+
+################################################################################
+if __name__ == '__main__':
+    pass
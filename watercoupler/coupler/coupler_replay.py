@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import ctypes as ct
+import logging
+
+import numpy as np
+
+from ..synthetic.synthetic_gssha import main_var_struct, define_h, types_h
+from .coupler_archive import NETA_STATS, NETA_STATS_INIT
+
+################################################################################
+log = logging.getLogger(__name__)
+
+################################################################################
+class _module(): #Note: This is not a ctypes Structure!!!!
+    '''Stand-in for one f2py module of pyADCIRC.pyadcirc.'''
+    def __init__(self, **attributes):
+        for name, value in attributes.items():
+            setattr(self, name, value)
+
+################################################################################
+class recordedadcirc(): #Note: This is not a ctypes Structure!!!!
+    '''Stand-in for pyADCIRC.pyadcirc that plays back a couplerrecording.
+
+    Has the run's time stepping, on a single PE, and steps through it without
+    computing anything. GSSHA's BC functions get the edge string eta
+    statistics recorded at ADCIRC's current time step from etastats(), so a
+    replay must reach the same ADCIRC time steps as the recorded run at the
+    end of every window, i.e., keep its coupling interval and time steps.
+
+    Every coupled edge string is a two node stand-in with the recorded length,
+    which is all the coupler needs of its topology when ADCIRC is replayed.
+    '''
+    def __init__(self, recording):
+        meta = recording.meta
+        self.recording = recording
+        self.nedgestrings = len(meta['edgestrings'])
+
+        self.utilities = _module(on=1, off=0, messg=0,
+                pycloseopenedfileforread=self.pycloseopenedfileforread,
+                pyfindelapsedtime=self.pyfindelapsedtime)
+        self.sizes = _module(mnproc=1, myproc=0, inputdir=b'.')
+        self.pyglobal = _module(comm=0, pyopenfileforread=self.pyopenfileforread,
+                statim=meta['adcirc_statim'], rnday=meta['adcirc_rnday'],
+                dt=meta['adcirc_dt'], dtdp=meta['adcirc_dtdp'], nt=meta['adcirc_nt'],
+                nhstar=0, nhsinc=0)
+        self.pymesh = _module()
+        self.pymessenger = _module(mpi_comm_adcirc=0)
+        self.pyboundaries = _module()
+        self.pyadcirc_mod = _module(itime_bgn=meta['adcirc_itime']+1, itime_end=meta['adcirc_ntsteps'],
+                pyadcirc_init=self.pyadcirc_init, pyadcirc_run=self.pyadcirc_run,
+                pyadcirc_finalize=self.pyadcirc_finalize)
+
+        # Edge string eta statistics by (ADCIRC time step, number of values).
+        self.etastatsat = {}
+        if meta['eta_stats_init'] is not None:
+            self.etastatsat[(meta['adcirc_itime'], NETA_STATS_INIT*self.nedgestrings)] = meta['eta_stats_init']
+        windows = recording.windows
+        for itime, stats in zip(windows['adcirc_itime'], windows['eta_stats']):
+            if not np.any(np.isnan(stats)):
+                self.etastatsat[(int(itime), len(stats))] = [float(v) for v in stats]
+
+    ############################################################################
+    # pyadcirc_mod
+    ############################################################################
+    def pyadcirc_init(self):
+        pg, pm, pb = self.pyglobal, self.pymesh, self.pyboundaries
+        edgestrings, lengths = self.recording.meta['edgestrings'], self.recording.meta['lengths']
+
+        nnodes = 2*self.nedgestrings
+        pm.np = nnodes
+        pm.x = np.zeros(nnodes, dtype=np.float64)
+        pm.x[1::2] = lengths
+        pm.y = np.zeros(nnodes, dtype=np.float64)
+        self.pymessenger.resnode = np.ones(nnodes, dtype=np.int32)
+
+        pb.nope = max(edgestrings) + 1
+        pb.nvel = nnodes
+        pb.nvell = np.zeros(pb.nope, dtype=np.int32)
+        pb.nbvv = np.zeros((pb.nope, 3), dtype=np.int32)
+        for i, edgestringid in enumerate(edgestrings):
+            pb.nvell[edgestringid] = 2
+            pb.nbvv[edgestringid, 1:] = [2*i+1, 2*i+2]
+        pb.ibtype = np.full(pb.nope, 22, dtype=np.int32)
+        pb.lbcodei = np.full(pb.nvel, 22, dtype=np.int32)
+
+        pg.eta1 = np.zeros(nnodes, dtype=np.float64)
+        pg.eta2 = np.zeros(nnodes, dtype=np.float64)
+        pg.qnin1 = np.zeros(pb.nvel, dtype=np.float64)
+        pg.qnin2 = np.zeros(pb.nvel, dtype=np.float64)
+        pg.enin2 = np.zeros(pb.nvel, dtype=np.float64)
+        windows = self.recording.windows
+        pg.ftiminc, pg.qtime1, pg.qtime2 = [float(windows[name][0]) for name in ('ftiminc', 'qtime1', 'qtime2')]
+        log.info("Replaying ADCIRC from %s: %d coupling windows",
+                 self.recording.pathname, len(self.recording))
+        return 0
+
+    #--------------------------------------------------------------------------#
+    def pyadcirc_run(self, ntsteps):
+        pmain = self.pyadcirc_mod
+        pmain.itime_end = min(pmain.itime_bgn + int(ntsteps) - 1, self.pyglobal.nt)
+        pmain.itime_bgn = pmain.itime_end + 1
+        return 0
+
+    #--------------------------------------------------------------------------#
+    def pyadcirc_finalize(self):
+        return 0
+
+    ############################################################################
+    # utilities and pyglobal
+    ############################################################################
+    def pyfindelapsedtime(self, itime):
+        return self.pyglobal.statim*86400.0 + itime*self.pyglobal.dtdp
+
+    #--------------------------------------------------------------------------#
+    def pyopenfileforread(self, unit, pathname):
+        return 0
+
+    #--------------------------------------------------------------------------#
+    def pycloseopenedfileforread(self, unit):
+        return 0
+
+    ############################################################################
+    # Recorded edge string eta statistics
+    ############################################################################
+    def etastats(self, nvalues):
+        '''The reduced edge string eta statistics at the current time step:
+        those of gssha_init_bc (NETA_STATS_INIT per edge string) or of
+        gssha_set_bc (NETA_STATS per edge string).'''
+        itime = self.pyadcirc_mod.itime_bgn - 1
+        assert(nvalues in (NETA_STATS*self.nedgestrings, NETA_STATS_INIT*self.nedgestrings))
+        stats = self.etastatsat.get((itime, nvalues))
+        if stats is None:
+            raise RuntimeError("Coupling archive '{0}' has no ADCIRC depths at time step {1}: "
+                               "replays need the recorded run's coupling windows, and an archive "
+                               "of a coupling type that sets GSSHA's head boundary".format(
+                                   self.recording.pathname, itime))
+        return stats
+
+################################################################################
+class recordedgssha(): #Note: This is not a ctypes Structure!!!!
+    '''Stand-in for gsshapython's fnctn_h that plays back a couplerrecording.
+
+    main_gssha_run sets GSSHA's clock and outlet totals to those recorded at
+    the end of GSSHA's next recorded run, so a replay must end GSSHA's runs
+    where the recorded run did, i.e., keep its coupling interval and time
+    steps. GSSHA gets no head boundary: it is not driven by ADCIRC.
+    '''
+    def __init__(self, recording):
+        self.recording = recording
+        self.mv = main_var_struct()
+        self.mvs = ct.POINTER(main_var_struct)()
+        self.nx = (ct.c_int*2)(1, 1)
+        self.rows = [(ct.c_double*2)(1.0, 1.0) for i in range(4)]
+        self.area = (ct.POINTER(ct.c_double)*2)(self.rows[0], self.rows[1])
+        self.chan_depth = (ct.POINTER(ct.c_double)*2)(self.rows[2], self.rows[3])
+        # Windows in which GSSHA ran, starting with the first run of window 0.
+        windows = recording.windows
+        self.runs = [i for i in range(len(recording)) if windows['gssharunflag'][i] != define_h.OFF]
+        self.nruns = 0
+
+    #--------------------------------------------------------------------------#
+    def main_gssha_initialize(self, pmvs, prj_name, sm, prj_name2):
+        meta, mv = self.recording.meta, self.mv
+        mv.timer = meta['gssha_timer']
+        mv.niter = meta['gssha_niter']
+        mv.go = types_h.TRUE
+        mv.dt = meta['gssha_dt']
+        mv.btime = meta['gssha_btime']
+        mv.b_lt_start = meta['gssha_b_lt_start']
+        mv.single_event_end = meta['gssha_single_event_end']
+        mv.vout = 0.0
+        mv.qout = 0.0
+        mv.yes_head_bound = 0
+        mv.bound_ts = 0
+        mv.nlinks = 1
+        mv.nx = ct.cast(self.nx, ct.POINTER(ct.c_int))
+        mv.area = ct.cast(self.area, ct.POINTER(ct.POINTER(ct.c_double)))
+        mv.chan_depth = ct.cast(self.chan_depth, ct.POINTER(ct.POINTER(ct.c_double)))
+        log.info("Replaying GSSHA from %s: %d runs", self.recording.pathname, len(self.runs))
+
+        getattr(pmvs, '_obj', pmvs).contents = mv
+        return 0
+
+    #--------------------------------------------------------------------------#
+    def main_gssha_run(self, mvs):
+        mv, windows = mvs[0], self.recording.windows
+        if self.nruns == len(self.runs):
+            raise RuntimeError("Coupling archive '{0}' ends at GSSHA time {1} min".format(
+                self.recording.pathname, mv.timer))
+        i = self.runs[self.nruns]
+        timer = float(windows['gssha_timer'][i])
+        if mv.niter > 0:
+            # Where the coupler asked this run to end, within a GSSHA time step.
+            tend = min(float(mv.niter), (mv.single_event_end - mv.b_lt_start)*1440.0)
+            if abs(timer - tend) > mv.dt/60.0:
+                raise RuntimeError("GSSHA run to {0} min, but the run recorded in coupling "
+                                   "archive '{1}' ended at {2} min: replays need the recorded "
+                                   "run's coupling windows".format(tend, self.recording.pathname, timer))
+        mv.timer = timer
+        mv.btime = mv.b_lt_start + timer/1440.0
+        mv.vout = float(windows['gssha_vout'][i])
+        mv.qout = float(windows['gssha_qout'][i])
+        mv.go = types_h.FALSE
+        self.nruns += 1
+        return 0
+
+    #--------------------------------------------------------------------------#
+    def main_gssha_finalize(self, mvs):
+        return 0
+
+################################################################################
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import os
+import logging
+
+import numpy as np
+
+from .coupler_messenger import MSG_SUM
+
+################################################################################
+log = logging.getLogger(__name__)
+
+################################################################################
+SAMPLING_OFF    = 'off'    # One value per window, at its end (original)
+SAMPLING_MEAN   = 'mean'   # The time mean over the window
+SAMPLING_SERIES = 'series' # Points across the window
+SAMPLING_MODES  = [SAMPLING_OFF, SAMPLING_MEAN, SAMPLING_SERIES]
+DEFAULT_CHUNKS  = 4        # Runs of each model per window
+
+################################################################################
+def time_mean(times, values):
+    '''Trapezoidal time mean of values, one row per time.'''
+    return 0.5*np.dot(np.diff(times), values[1:] + values[:-1])/(times[-1] - times[0])
+
+#------------------------------------------------------------------------------#
+def resample(times, values, newtimes):
+    '''values, one row per time, linearly interpolated at newtimes.'''
+    return np.column_stack([np.interp(newtimes, times, column) for column in values.T])
+
+################################################################################
+class couplersampling(): #Note: This is not a ctypes Structure!!!!
+    '''Sub-sampling of the exchanged quantities within every coupling window.
+
+    Without it, each model hands the other one value per window, taken when
+    it pauses: the edge string mean eta after pyadcirc_run, GSSHA's outlet
+    discharge after main_gssha_run, and a tide or hydrograph peak shorter
+    than a window falls in between. With mean or series, each model runs a
+    window in chunks runs, and the coupler keeps its value at the start and
+    after every run in preallocated buffers: this PE's edge string eta sums,
+    reduced over all PEs in one collective per window, and GSSHA's qout (of
+    every watershed), broadcast along with GSSHA's state. The other model
+    then gets
+     - mean: the time mean over the window instead of the end value, which
+       does not alias peaks but lags them by half a window;
+     - series: chunks points evenly spaced across the window, linear in
+       between the samples, where its boundary series ends at the other
+       model's current time: ADCIRC's flux in gdA and gdAdg, GSSHA's head in
+       Adg and AdgdA. A series set one window ahead (ADCIRC_BC_AHEAD and
+       GSSHA_BC_AHEAD types) still ends at the newest sample. ADCIRC reads
+       the points of its flux series from fort.20, so series uses the file
+       flux exchange mode in gdA and gdAdg.
+    Only the quantities the other model reads are sampled, e.g., GSSHA's in
+    gdA, and only in the window by window runs of the sequential types.
+
+    Configured by the environment:
+        WATERCOUPLER_SAMPLING         off (default), mean or series
+        WATERCOUPLER_SAMPLING_CHUNKS  chunks (4)
+    '''
+    def __init__(self, mode=SAMPLING_OFF, chunks=DEFAULT_CHUNKS):
+        if mode not in SAMPLING_MODES:
+            raise ValueError("WATERCOUPLER_SAMPLING must be one of: {0}".format(', '.join(SAMPLING_MODES)))
+        if chunks < 2:
+            raise ValueError("WATERCOUPLER_SAMPLING_CHUNKS must be at least 2, got {0}".format(chunks))
+        self.mode = mode
+        self.chunks = chunks
+        self.enabled = (mode != SAMPLING_OFF)
+        self.adcircsampled = False
+        self.gsshasampled = False
+
+        # Allocated on first use, once the edge strings and outlets are known.
+        self.adcirctimes = None # s
+        self.adcircsums = None  # chunks+1 x edge strings, this PE's eta sums
+        self.adcirccount = 0
+        self.gsshatimes = None  # s
+        self.gsshaqouts = None  # chunks+1 x outlets, m3/s
+        self.gsshacount = 0
+
+    #--------------------------------------------------------------------------#
+    @classmethod
+    def from_environ(cls):
+        return cls(os.environ.get('WATERCOUPLER_SAMPLING', SAMPLING_OFF),
+                   int(os.environ.get('WATERCOUPLER_SAMPLING_CHUNKS', DEFAULT_CHUNKS)))
+
+    #--------------------------------------------------------------------------#
+    @property
+    def mean(self):
+        return self.enabled and self.mode == SAMPLING_MEAN
+
+    #--------------------------------------------------------------------------#
+    @property
+    def series(self):
+        return self.enabled and self.mode == SAMPLING_SERIES
+
+    #--------------------------------------------------------------------------#
+    def setup(self, ags):
+        '''Fall back to one value per window where sampling cannot run, and
+        switch to the file flux exchange mode for series of ADCIRC fluxes.
+        Call before the flux exchange mode is used.'''
+        from .adcircgsshastruct import FLUX_EXCHANGE_FILE, ADCIRC_BC_AHEAD, COUPLING_CONCURRENT
+        if not self.enabled:
+            return
+        if ags.couplingtype == COUPLING_CONCURRENT:
+            reason = "{0} runs both models at once, once per window".format(COUPLING_CONCURRENT)
+        elif ags.backend.replayed is not None:
+            reason = "a model replayed from an archive runs window by window"
+        elif ags.exchangeinterp.cubic:
+            reason = "the {0} exchange interpolation puts its own points in a window".format(
+                ags.exchangeinterp.mode)
+        else:
+            reason = None
+        if reason is not None:
+            log.warning("Running %s without sub-sampling: %s", ags.couplingtype, reason)
+            self.enabled = False
+            return
+        # What the other model reads.
+        self.adcircsampled = (ags.couplingtype != 'gdA')
+        self.gsshasampled = (ags.couplingtype != 'Adg')
+        log.info("Sub-sampling: %s of %d runs per window", self.mode, self.chunks)
+        if (self.series and self.gsshasampled and ags.couplingtype not in ADCIRC_BC_AHEAD
+                and ags.adcircfluxexchange != FLUX_EXCHANGE_FILE):
+            # ADCIRC reads the points of its flux series from fort.20.
+            log.info("Using the file flux exchange mode for the %s sampling", self.mode)
+            ags.adcircfluxexchange = FLUX_EXCHANGE_FILE
+
+    #--------------------------------------------------------------------------#
+    def npoints(self, num_vals):
+        '''New points per window of a series with num_vals points; see
+        exchangeinterpolation.npoints.'''
+        return max(1, min(self.chunks, num_vals-2))
+
+    ############################################################################
+    # ADCIRC
+    ############################################################################
+    def run_adcirc(self, ags, ntsteps):
+        '''pyadcirc_run(ntsteps), in chunks runs when sampling ADCIRC. Call
+        on all PEs.'''
+        self.adcirccount = 0
+        if not self.adcircsampled or ags.gssharunflag == ags.gsshadefine.OFF or ntsteps < 2:
+            ags.pmain.pyadcirc_run(ntsteps)
+            return
+        nchunks = min(self.chunks, ntsteps)
+        self._sample_adcirc(ags)
+        done = 0
+        for j in range(1, nchunks+1):
+            steps = (j*ntsteps)//nchunks - done
+            ags.pmain.pyadcirc_run(steps)
+            done += steps
+            self._sample_adcirc(ags)
+
+    #--------------------------------------------------------------------------#
+    def _sample_adcirc(self, ags):
+        strings = ags.adcircedgestrings
+        if self.adcircsums is None:
+            self.adcirctimes = np.zeros(self.chunks+1, dtype=np.float64)
+            self.adcircsums = np.zeros((self.chunks+1, len(strings)), dtype=np.float64)
+        # Only nodes owned by this PE, as in edgestring_eta_stats.
+        self.adcirctimes[self.adcirccount] = (ags.pmain.itime_bgn-1)*ags.pg.dtdp + ags.pg.statim*86400.0
+        self.adcircsums[self.adcirccount] = strings.sum_max_min(strings.gather(ags.adcirceta2))[0]
+        self.adcirccount += 1
+
+    #--------------------------------------------------------------------------#
+    def adcirc_etas(self, ags, counts):
+        '''(times, edge string mean etas, one row per time) of ADCIRC's last
+        run, with the edge strings' node counts, or None if it was not
+        sampled. Reduces over all PEs, so call on all PEs; once per run.'''
+        n = self.adcirccount
+        if n < 2:
+            return None
+        self.adcirccount = 0
+        nvalues = n*self.adcircsums.shape[1]
+        sums = ags.messenger.allreduce(self.adcircsums[:n].ravel().tolist(), [MSG_SUM]*nvalues)
+        return self.adcirctimes[:n].copy(), np.array(sums).reshape(n, -1)/counts
+
+    ############################################################################
+    # GSSHA
+    ############################################################################
+    def run_gssha(self, ags, tend):
+        '''main_gssha_run to tend s, in chunks runs on GSSHA's time step grid
+        when sampling GSSHA. Call on PE 0, after setting niter and
+        single_event_end for the whole run.'''
+        mv = ags.gsshamv
+        schedule = ags.schedule
+        self.gsshacount = 0
+        timer = schedule.ticks(mv.timer*ags.gsshatimefact)
+        nsteps = (schedule.ticks(tend) - timer)//schedule.gsshadt
+        if not self.gsshasampled or ags.adcircrunflag == ags.pu.off or nsteps < 2:
+            return ags.gsshafnctn.main_gssha_run(ags.mvs)
+        nchunks = min(self.chunks, nsteps)
+        self._sample_gssha(ags)
+        for j in range(1, nchunks+1):
+            t = schedule.seconds(timer + schedule.gsshadt*((j*nsteps)//nchunks))
+            mv.niter = schedule.gssha_niter(t)
+            mv.single_event_end = mv.b_lt_start + t/86400.0 #Julian
+            mv.go = ags.gsshatypes.TRUE
+            ierr_code = ags.gsshafnctn.main_gssha_run(ags.mvs)
+            if ierr_code != 0:
+                return ierr_code
+            self._sample_gssha(ags)
+        return 0
+
+    #--------------------------------------------------------------------------#
+    def _gssha_buffers(self, ags):
+        if self.gsshaqouts is None:
+            noutlets = 1 if ags.gsshaqouts is None else len(ags.gsshaqouts)
+            self.gsshatimes = np.zeros(self.chunks+1, dtype=np.float64)
+            self.gsshaqouts = np.zeros((self.chunks+1, noutlets), dtype=np.float64)
+
+    #--------------------------------------------------------------------------#
+    def _sample_gssha(self, ags):
+        self._gssha_buffers(ags)
+        self.gsshatimes[self.gsshacount] = ags.gsshamv.timer*ags.gsshatimefact
+        self.gsshaqouts[self.gsshacount] = ags.gsshamv.qout if ags.gsshaqouts is None else ags.gsshaqouts
+        self.gsshacount += 1
+
+    #--------------------------------------------------------------------------#
+    def gssha_values(self, ags):
+        '''GSSHA's samples, for broadcast_gssha_state to send from PE 0: the
+        same number of values on all PEs, none if GSSHA is not sampled.'''
+        if not self.gsshasampled:
+            return []
+        self._gssha_buffers(ags)
+        return [self.gsshacount] + self.gsshatimes.tolist() + self.gsshaqouts.ravel().tolist()
+
+    #--------------------------------------------------------------------------#
+    def set_gssha_values(self, ags, values):
+        '''GSSHA's samples, as broadcast from the values of gssha_values.'''
+        if not self.gsshasampled:
+            return
+        ntimes = self.chunks+1
+        self.gsshacount = int(values[0])
+        self.gsshatimes[:] = values[1:1+ntimes]
+        self.gsshaqouts[:] = np.reshape(values[1+ntimes:], self.gsshaqouts.shape)
+
+    #--------------------------------------------------------------------------#
+    def gssha_qouts(self):
+        '''(times, qouts, one row per time) of GSSHA's last run, or None if
+        it was not sampled; once per run.'''
+        n = self.gsshacount
+        if n < 2:
+            return None
+        self.gsshacount = 0
+        return self.gsshatimes[:n].copy(), self.gsshaqouts[:n].copy()
+
+################################################################################
+if __name__ == '__main__':
+    pass
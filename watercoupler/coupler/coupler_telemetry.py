@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import os
+import sys
+import json
+import time
+import logging
+try:
+    import resource
+except ImportError:
+    # Windows: no peak RSS.
+    resource = None
+
+from .coupler_timers import PHASES, PHASE_TELEMETRY
+
+################################################################################
+log = logging.getLogger(__name__)
+
+################################################################################
+DEFAULT_EVERY = 1 # Coupling windows per record
+FORMAT_JSON = 'json'
+FORMAT_PROMETHEUS = 'prometheus'
+PROMETHEUS_SUFFIX = '.prom' # As read by the node_exporter textfile collector
+
+################################################################################
+def peak_rss():
+    '''Peak resident set size of this process in bytes, 0 if unknown.'''
+    if resource is None:
+        return 0.0
+    rss = float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    # Bytes on macOS, KiB elsewhere.
+    return rss if sys.platform == 'darwin' else 1024.0*rss
+
+#------------------------------------------------------------------------------#
+def _rate(dsim, dwall):
+    return dsim/dwall if dwall > 0.0 else None
+
+################################################################################
+class couplertelemetry(): #Note: This is not a ctypes Structure!!!!
+    '''Live progress record of a running coupled job, for monitoring.
+
+    After every coupling window (every every windows), PE 0 replaces
+    pathname with a small record of the run: the simulated time of ADCIRC
+    and GSSHA and their final times, the simulated seconds per wall second of
+    each over the whole run and over the last window, the projected wall
+    time to the end of the run, the last window's phase times, and the
+    peak RSS of the ADCIRC PEs (max, min and sum over PEs). The record is
+    written to a temporary file that is then renamed, so a reader never sees
+    it half written.
+
+    pathname is JSON, or a Prometheus text exposition if it ends in .prom,
+    e.g., in the node_exporter textfile collector directory. Every record
+    costs one small reduction over all PEs and one file write on PE 0; its
+    time is the telemetry phase of the timing report, and logged at the end.
+    The phase times need the coupler timers, which the telemetry turns on.
+
+    Configured by the environment:
+        WATERCOUPLER_TELEMETRY        pathname (unset: no telemetry)
+        WATERCOUPLER_TELEMETRY_EVERY  every (1)
+    '''
+    def __init__(self, pathname='', every=DEFAULT_EVERY, myid=0):
+        if every < 1:
+            raise ValueError("WATERCOUPLER_TELEMETRY_EVERY must be at least 1, got {0}".format(every))
+        self.pathname = pathname
+        self.every = every
+        self.myid = myid
+        self.format = FORMAT_PROMETHEUS if pathname.endswith(PROMETHEUS_SUFFIX) else FORMAT_JSON
+
+        self.nwindows = 0
+        self.nrecords = 0
+        self.start = None # (wall time, ADCIRC time, GSSHA time) at the end of window 0
+        self.last = None  # The same at the last record
+
+    #--------------------------------------------------------------------------#
+    @classmethod
+    def from_environ(cls, myid=0):
+        return cls(os.environ.get('WATERCOUPLER_TELEMETRY', ''),
+                   int(os.environ.get('WATERCOUPLER_TELEMETRY_EVERY', DEFAULT_EVERY)), myid)
+
+    #--------------------------------------------------------------------------#
+    @property
+    def enabled(self):
+        return self.pathname != ''
+
+    #--------------------------------------------------------------------------#
+    def publish(self, ags):
+        '''Record the window that just ended, if due. Call on all PEs after
+        ags.timers.end_window().'''
+        if not self.enabled:
+            return
+        self.nwindows += 1
+        if (self.nwindows-1) % self.every != 0:
+            return
+        from .coupler_messenger import MSG_SUM, MSG_MAX, MSG_MIN
+        with ags.timers.phase(PHASE_TELEMETRY):
+            rss = peak_rss()
+            rss = ags.messenger.allreduce([rss, rss, rss, 1.0], [MSG_MAX, MSG_MIN, MSG_SUM, MSG_SUM])
+            now = (time.time(), ags.adcirctprev - ags.adcirctstart,
+                   (ags.gsshamv.timer - ags.gsshatprev)*ags.gsshatimefact)
+            if self.start is None:
+                self.start = now
+            if self.myid == 0:
+                record = self._record(ags, now, rss)
+                self._write(record)
+            self.last = now
+            self.nrecords += 1
+
+    #--------------------------------------------------------------------------#
+    def _record(self, ags, now, rss):
+        adcircfinal = ags.adcirctfinal - ags.adcirctstart
+        gsshafinal = (ags.gsshatfinal - ags.gsshatprev)*ags.gsshatimefact
+        elapsed = now[0] - self.start[0]
+        rates = [_rate(now[i] - self.start[i], elapsed) for i in [1, 2]]
+        remaining = [(final - now[i])/rate if rate else None
+                     for i, final, rate in [(1, adcircfinal, rates[0]), (2, gsshafinal, rates[1])]]
+        remaining = [r for r in remaining if r is not None]
+        last = self.last or now
+        phases = {}
+        if ags.timers.enabled and ags.timers.nwindows > 0:
+            phases = dict((name, ags.timers.windows[name][-1]*1.0E-9) for name in PHASES)
+        iterations = ags.iteration.counts[-1] if ags.iteration is not None and ags.iteration.counts else 1
+        return {'updated'      : now[0],
+                'couplingtype' : ags.couplingtype,
+                'window'       : ags.couplinginterval.nwindows,
+                'iterations'   : iterations,
+                'elapsed'      : elapsed,
+                'remaining'    : max(remaining) if remaining else None,
+                'window_wall'  : now[0] - last[0],
+                'adcirc'       : {'time'        : now[1],
+                                  'final'       : adcircfinal,
+                                  'rate'        : rates[0],
+                                  'window_rate' : _rate(now[1] - last[1], now[0] - last[0])},
+                'gssha'        : {'time'        : now[2],
+                                  'final'       : gsshafinal,
+                                  'rate'        : rates[1],
+                                  'window_rate' : _rate(now[2] - last[2], now[0] - last[0])},
+                'phases'       : phases,
+                'rss'          : {'max' : rss[0], 'min' : rss[1], 'sum' : rss[2], 'npes' : int(rss[3])}}
+
+    #--------------------------------------------------------------------------#
+    def _write(self, record):
+        tmppathname = self.pathname + '.tmp'
+        with open(tmppathname, 'w') as telemetryfile:
+            if self.format == FORMAT_PROMETHEUS:
+                telemetryfile.write(prometheus_text(record))
+            else:
+                json.dump(record, telemetryfile, indent=1)
+        os.rename(tmppathname, self.pathname) # Atomic on POSIX file systems
+
+    #--------------------------------------------------------------------------#
+    def close(self, ags):
+        '''Log what the telemetry cost. Call before finalizing.'''
+        if not self.enabled or self.myid != 0 or self.start is None:
+            return
+        cost = sum(ags.timers.windows[PHASE_TELEMETRY])*1.0E-9
+        elapsed = max(time.time() - self.start[0], 1.0E-9)
+        log.info("Telemetry: %d records in %s, %.6f s, %.3f%% of the run",
+                 self.nrecords, self.pathname, cost, 100.0*cost/elapsed)
+
+################################################################################
+def prometheus_text(record):
+    '''A telemetry record in the Prometheus text exposition format.'''
+    labels = 'couplingtype="{0}"'.format(record['couplingtype'])
+    lines = []
+    def metric(name, description, value, extra=''):
+        if value is None:
+            return
+        if not any(line.startswith('# HELP watercoupler_'+name+' ') for line in lines):
+            lines.append('# HELP watercoupler_{0} {1}'.format(name, description))
+            lines.append('# TYPE watercoupler_{0} gauge'.format(name))
+        lines.append('watercoupler_{0}{{{1}{2}}} {3!r}'.format(name, labels, extra, float(value)))
+    metric('updated_timestamp_seconds', 'Wall time of this record.', record['updated'])
+    metric('window', 'Coupling windows finished.', record['window'])
+    metric('window_iterations', 'Runs of the last coupling window.', record['iterations'])
+    metric('elapsed_seconds', 'Wall time since the first coupling window.', record['elapsed'])
+    metric('remaining_seconds', 'Projected wall time to the end of the run.', record['remaining'])
+    metric('window_wall_seconds', 'Wall time of the last record interval.', record['window_wall'])
+    for model in ['adcirc', 'gssha']:
+        values = record[model]
+        metric(model+'_time_seconds', 'Simulated time since the start.', values['time'])
+        metric(model+'_final_seconds', 'Simulated time at the end of the run.', values['final'])
+        metric(model+'_rate', 'Simulated seconds per wall second over the run.', values['rate'])
+        metric(model+'_window_rate', 'Simulated seconds per wall second over the last interval.',
+               values['window_rate'])
+    for name, seconds in sorted(record['phases'].items()):
+        metric('phase_seconds', 'Phase times of the last coupling window.', seconds,
+               ',phase="{0}"'.format(name))
+    for stat in ['max', 'min', 'sum']:
+        metric('peak_rss_bytes', 'Peak resident set size over the ADCIRC PEs.', record['rss'][stat],
+               ',stat="{0}"'.format(stat))
+    metric('npes', 'ADCIRC PEs.', record['rss']['npes'])
+    return '\n'.join(lines) + '\n'
+
+################################################################################
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import os
+import csv
+import json
+import time
+import logging
+
+import numpy as np
+
+################################################################################
+log = logging.getLogger(__name__)
+
+################################################################################
+PHASE_ADCIRC_RUN = 'adcirc_run'    # pyadcirc_run
+PHASE_GSSHA_RUN  = 'gssha_run'     # main_gssha_run
+PHASE_GSSHA_WAIT = 'gssha_wait'    # Waiting for the GSSHA thread; A|g coupling only
+PHASE_ADCIRC_BC  = 'adcirc_set_bc' # adcirc_init/set_bc_from_gssha_hydrograph
+PHASE_GSSHA_BC   = 'gssha_set_bc'  # gssha_init/set_bc_from_adcirc_depths
+PHASE_MPI        = 'mpi'           # couplermessenger collectives
+PHASE_FORT20_IO  = 'fort20_io'     # fort.20 close/rewrite/reopen, file exchange mode only
+PHASE_CHECKPOINT = 'checkpoint'    # Coupler state snapshot; the write itself is in the background
+PHASE_ARCHIVE    = 'archive'       # Coupling archive writes
+PHASE_TELEMETRY  = 'telemetry'     # Telemetry records
+PHASES = [PHASE_ADCIRC_RUN, PHASE_GSSHA_RUN, PHASE_GSSHA_WAIT, PHASE_ADCIRC_BC,
+          PHASE_GSSHA_BC, PHASE_MPI, PHASE_FORT20_IO, PHASE_CHECKPOINT, PHASE_ARCHIVE,
+          PHASE_TELEMETRY]
+
+# Fixed, log-spaced histogram bin edges in seconds (1 us to 10^4 s, 2 bins per
+# decade), shared by all PEs so that their bin counts can simply be summed.
+HISTOGRAM_EDGES = 10.0**np.arange(-6.0, 4.0+0.25, 0.5)
+
+try:
+    _clock_ns = time.perf_counter_ns
+except AttributeError:
+    # Python < 3.7
+    _clock = getattr(time, 'perf_counter', time.time)
+    def _clock_ns():
+        return int(_clock()*1.0E+9)
+
+################################################################################
+class _nullphase(): #Note: This is not a ctypes Structure!!!!
+    '''Context manager that does nothing; returned when timing is disabled.'''
+    __slots__ = ()
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        return False
+
+_NULLPHASE = _nullphase()
+
+#------------------------------------------------------------------------------#
+class _phase(): #Note: This is not a ctypes Structure!!!!
+    '''Context manager adding its elapsed time to one phase of a timer registry.
+
+    One instance per phase is reused, so a phase must not be nested in itself.
+    Different phases may nest, e.g. mpi within gssha_set_bc; times are
+    inclusive.
+    '''
+    __slots__ = ('timers', 'name', 't0')
+    def __init__(self, timers, name):
+        self.timers = timers
+        self.name = name
+        self.t0 = 0
+    def __enter__(self):
+        self.t0 = _clock_ns()
+        return self
+    def __exit__(self, *args):
+        self.timers.add(self.name, _clock_ns()-self.t0)
+        return False
+
+################################################################################
+class couplertimers(): #Note: This is not a ctypes Structure!!!!
+    '''Per-phase, per-coupling-window wall clock timers of one PE.
+
+    Usage:
+        with ags.timers.phase(PHASE_ADCIRC_RUN):
+            ags.pmain.pyadcirc_run(ntsteps)
+        ...
+        ags.timers.end_window() # Once per coupling window.
+
+    Window 0 holds everything timed before the first coupling window, i.e.,
+    the initial BCs and the first GSSHA run. When disabled, phase() returns a
+    shared no-op context manager and nothing is recorded. Without outdir,
+    the times are recorded, e.g., for the telemetry, but not reported.
+    '''
+    def __init__(self, enabled=False, myid=0, outdir=None):
+        self.enabled = enabled
+        self.myid = myid
+        self.outdir = outdir
+        self._phases = dict((name, _phase(self, name)) for name in PHASES)
+        self.current = dict((name, 0) for name in PHASES) # ns in this window
+        self.ncalls = dict((name, 0) for name in PHASES)
+        self.windows = dict((name, []) for name in PHASES) # ns per window
+
+    #--------------------------------------------------------------------------#
+    def phase(self, name):
+        if not self.enabled:
+            return _NULLPHASE
+        return self._phases[name]
+
+    #--------------------------------------------------------------------------#
+    def add(self, name, ns):
+        self.current[name] += ns
+        self.ncalls[name] += 1
+
+    #--------------------------------------------------------------------------#
+    def end_window(self):
+        if not self.enabled:
+            return
+        for name in PHASES:
+            self.windows[name].append(self.current[name])
+            self.current[name] = 0
+
+    #--------------------------------------------------------------------------#
+    @property
+    def nwindows(self):
+        return len(self.windows[PHASES[0]])
+
+    #--------------------------------------------------------------------------#
+    def seconds(self, name):
+        '''Per-window times of a phase in seconds, as a NumPy array.'''
+        return np.array(self.windows[name], dtype=np.float64)*1.0E-9
+
+    #--------------------------------------------------------------------------#
+    def histogram(self, name):
+        '''Counts of windows per HISTOGRAM_EDGES bin. Windows where the phase
+        did not run are not counted; times out of range go to the end bins.'''
+        t = self.seconds(name)
+        t = np.clip(t[t > 0.0], HISTOGRAM_EDGES[0], HISTOGRAM_EDGES[-1])
+        return np.histogram(t, bins=HISTOGRAM_EDGES)[0]
+
+    #--------------------------------------------------------------------------#
+    def summary(self):
+        '''Per-phase totals and per-window statistics of this PE.'''
+        result = {}
+        for name in PHASES:
+            t = self.seconds(name)
+            result[name] = {
+                'ncalls' : self.ncalls[name],
+                'total'  : float(t.sum()),
+                'window_mean' : float(t.mean()) if t.size > 0 else 0.0,
+                'window_max'  : float(t.max())  if t.size > 0 else 0.0,
+                'histogram'   : self.histogram(name).tolist(),
+            }
+        return result
+
+    #--------------------------------------------------------------------------#
+    def report(self, messenger):
+        '''Write the per-PE and aggregated timing reports to outdir.
+
+        Every PE writes timing.PE<myid>.json/.csv with its per-window times.
+        PE 0 writes timing.json/.csv with the min/mean/max over PEs of every
+        phase total, and histograms summed over PEs. Must be called on all
+        PEs, before MPI is finalized: all aggregates go in one collective.
+        '''
+        from .coupler_messenger import MSG_SUM, MSG_MAX, MSG_MIN
+
+        if not self.enabled or not self.outdir:
+            return
+        local = self.summary()
+        nbins = len(HISTOGRAM_EDGES)-1
+
+        values, ops = [1.0], [MSG_SUM]
+        for name in PHASES:
+            values += [local[name]['total']]*3 + local[name]['histogram']
+            ops    += [MSG_SUM, MSG_MAX, MSG_MIN] + [MSG_SUM]*nbins
+        values = messenger.allreduce(values, ops)
+        npes = values[0]
+
+        aggregated = {}
+        k = 1
+        for name in PHASES:
+            aggregated[name] = {
+                'ncalls' : local[name]['ncalls'],
+                'total_min'  : values[k+2],
+                'total_mean' : values[k]/npes,
+                'total_max'  : values[k+1],
+                'histogram'  : [int(round(c)) for c in values[k+3:k+3+nbins]],
+            }
+            k += 3+nbins
+
+        try:
+            os.makedirs(self.outdir)
+        except OSError:
+            # Another PE may have just created it.
+            if not os.path.isdir(self.outdir):
+                raise
+
+        # Per-PE report.
+        basename = os.path.join(self.outdir, 'timing.PE{0:04d}'.format(self.myid))
+        with open(basename+'.json', 'w') as jsonfile:
+            json.dump({'myid' : self.myid,
+                       'nwindows' : self.nwindows,
+                       'histogram_edges' : HISTOGRAM_EDGES.tolist(),
+                       'phases' : local,
+                       'windows' : dict((name, self.seconds(name).tolist()) for name in PHASES)},
+                      jsonfile, indent=1)
+        with open(basename+'.csv', 'w') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['window'] + PHASES)
+            columns = [self.seconds(name) for name in PHASES]
+            for i in range(self.nwindows):
+                writer.writerow([i] + ['{0:.9f}'.format(c[i]) for c in columns])
+
+        # Aggregated report.
+        if self.myid == 0:
+            basename = os.path.join(self.outdir, 'timing')
+            with open(basename+'.json', 'w') as jsonfile:
+                json.dump({'npes' : int(npes),
+                           'nwindows' : self.nwindows,
+                           'histogram_edges' : HISTOGRAM_EDGES.tolist(),
+                           'phases' : aggregated},
+                          jsonfile, indent=1)
+            with open(basename+'.csv', 'w') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(['phase', 'ncalls', 'total_min', 'total_mean', 'total_max'])
+                for name in PHASES:
+                    a = aggregated[name]
+                    writer.writerow([name, a['ncalls']] + ['{0:.9f}'.format(a[key])
+                                    for key in ['total_min', 'total_mean', 'total_max']])
+
+            log.info("Coupler timing over %d PEs and %d windows (total min/mean/max, s):",
+                     int(npes), self.nwindows)
+            for name in PHASES:
+                a = aggregated[name]
+                log.info("  %-14s %12.6f %12.6f %12.6f", name,
+                         a['total_min'], a['total_mean'], a['total_max'])
+            log.info("Timing report written to %s", self.outdir)
+
+################################################################################
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import os
+import math
+import logging
+
+################################################################################
+log = logging.getLogger(__name__)
+
+################################################################################
+DEFAULT_DTFACTOR = 480   # ADCIRC time steps per coupling interval
+DEFAULT_TOL = 0.05       # Target relative change of the boundary state per interval
+DEFAULT_ETA_SCALE = 1.0  # m, change of the edge string mean eta taken as 100%
+QOUT_FLOOR = 1.0E-3      # m3/s, keeps relative changes of tiny discharges finite
+SAFETY = 0.9
+GROWTH_MAX = 2.0
+SHRINK_MAX = 0.25
+
+################################################################################
+def _parse_dtfactor(spec):
+    '''"<n>" for a fixed interval, or "<min>:<initial>:<max>" for an adaptive
+    one, all in ADCIRC time steps.'''
+    values = [int(v) for v in str(spec).split(':')]
+    if len(values) == 1:
+        return values[0], values[0], values[0]
+    if len(values) != 3 or not (0 < values[0] <= values[1] <= values[2]):
+        raise ValueError("Coupling interval must be '<n>' or '<min>:<initial>:<max>'"
+                         " with 0 < min <= initial <= max, got '{0}'".format(spec))
+    return values[0], values[1], values[2]
+
+#------------------------------------------------------------------------------#
+def _relchange(value, prev):
+    if value is None or prev is None:
+        return 0.0
+    return abs(value - prev)/max(abs(value), abs(prev), QOUT_FLOOR)
+
+################################################################################
+class couplinginterval(): #Note: This is not a ctypes Structure!!!!
+    '''Length of the coupling interval, fixed or adapted between windows.
+
+    The interval is couplingdtfactor ADCIRC time steps. When adaptive, it is
+    rescaled after every window so that the relative change of the boundary
+    state over one interval stays near tol. The change is the largest of the
+    relative changes of GSSHA's outlet discharge qout and of its mean over
+    the window, from vout, and the change of the edge string mean eta in
+    units of etascale. The interval grows at most by GROWTH_MAX and shrinks at
+    most by SHRINK_MAX per window, within [dtfactormin, dtfactormax]. While
+    qout is at or above eventqout, if set, the interval is dtfactormin. With
+    coupler checkpoints, adaptive windows are cut to end on ADCIRC's hot
+    starts; see align().
+
+    Configured by the environment:
+        WATERCOUPLER_COUPLING_DTFACTOR   <n> or <min>:<initial>:<max> (480)
+        WATERCOUPLER_COUPLING_TOL        tol (0.05)
+        WATERCOUPLER_COUPLING_ETA_SCALE  etascale, m (1.0)
+        WATERCOUPLER_COUPLING_EVENT_QOUT eventqout, m3/s (unset)
+    '''
+    def __init__(self, dtfactor=DEFAULT_DTFACTOR, dtfactormin=None, dtfactormax=None,
+                 tol=DEFAULT_TOL, etascale=DEFAULT_ETA_SCALE, eventqout=None):
+        self.dtfactor = dtfactor
+        self.dtfactormin = dtfactor if dtfactormin is None else dtfactormin
+        self.dtfactormax = dtfactor if dtfactormax is None else dtfactormax
+        self.tol = tol
+        self.etascale = etascale
+        self.eventqout = eventqout
+        assert(0 < self.dtfactormin <= self.dtfactor <= self.dtfactormax)
+        assert(self.tol > 0.0 and self.etascale > 0.0)
+
+        self.nwindows = 0
+        self.prev = None  # (qout, vout, time in s, edge string mean eta)
+        self.qmean = None # Mean qout over the last window, from vout
+
+    #--------------------------------------------------------------------------#
+    @classmethod
+    def from_environ(cls):
+        dtfactormin, dtfactor, dtfactormax = _parse_dtfactor(
+                os.environ.get('WATERCOUPLER_COUPLING_DTFACTOR', DEFAULT_DTFACTOR))
+        eventqout = os.environ.get('WATERCOUPLER_COUPLING_EVENT_QOUT', '')
+        return cls(dtfactor, dtfactormin, dtfactormax,
+                   tol=float(os.environ.get('WATERCOUPLER_COUPLING_TOL', DEFAULT_TOL)),
+                   etascale=float(os.environ.get('WATERCOUPLER_COUPLING_ETA_SCALE', DEFAULT_ETA_SCALE)),
+                   eventqout=(float(eventqout) if eventqout else None))
+
+    #--------------------------------------------------------------------------#
+    @property
+    def adaptive(self):
+        return self.dtfactormin < self.dtfactormax
+
+    #--------------------------------------------------------------------------#
+    def apply(self, ags):
+        '''Set the coupler's interval, ags.couplingdtfactor/adcircdt.'''
+        ags.couplingdtfactor = self.dtfactor
+        ags.adcircdt = 0.+ags.pg.dt*float(self.dtfactor)
+
+    #--------------------------------------------------------------------------#
+    def snapshot(self):
+        '''State carried from window to window, for coupler checkpoints.'''
+        return {'dtfactor' : self.dtfactor,
+                'nwindows' : self.nwindows,
+                'prev'     : [] if self.prev is None else list(self.prev),
+                'qmean'    : float('nan') if self.qmean is None else self.qmean}
+
+    #--------------------------------------------------------------------------#
+    def restore(self, ags, state):
+        '''Pick up where snapshot() left off, and set the coupler's interval.'''
+        self.dtfactor = int(state['dtfactor'])
+        self.nwindows = int(state['nwindows'])
+        self.prev = tuple(float(v) for v in state['prev']) or None
+        self.qmean = None if math.isnan(state['qmean']) else float(state['qmean'])
+        self.apply(ags)
+
+    #--------------------------------------------------------------------------#
+    def align(self, dtfactor, itime, nhsinc):
+        '''dtfactor, cut so that the window from ADCIRC time step itime ends
+        on the next multiple of nhsinc if it would pass it, or stretched to it
+        rather than leave less than dtfactormin before it. Then adaptive
+        windows end on ADCIRC's hot starts, where coupler checkpoints are
+        taken.'''
+        tonext = nhsinc - itime % nhsinc
+        if dtfactor < tonext and tonext - dtfactor >= self.dtfactormin:
+            return dtfactor
+        if tonext <= self.dtfactormax:
+            return tonext
+        return max(self.dtfactormin, tonext - self.dtfactormin)
+
+    #--------------------------------------------------------------------------#
+    def update(self, ags):
+        '''Choose the next interval, once both models have finished a window
+        and before the boundary series set one interval ahead are updated.
+
+        Uses only values every PE has, GSSHA's broadcast qout/vout/timer and
+        the edge string mean eta from the last GSSHA BC update, so all PEs
+        choose the same interval without communicating.
+        '''
+        self.nwindows += 1
+        if not self.adaptive:
+            return
+        qout, vout = ags.gsshamv.qout, ags.gsshamv.vout
+        time = ags.gsshamv.timer*ags.gsshatimefact
+        prev, self.prev = self.prev, (qout, vout, time, ags.adcirc_hprev)
+        change = None
+        if prev is not None:
+            qmean, self.qmean = self.qmean, None
+            if time > prev[2]:
+                self.qmean = (vout - prev[1])/(time - prev[2])
+
+            if self.eventqout is not None and qout >= self.eventqout:
+                dtfactor = self.dtfactormin
+            else:
+                change = max(_relchange(qout, prev[0]),
+                             _relchange(self.qmean, qmean),
+                             abs(ags.adcirc_hprev - prev[3])/self.etascale)
+                if change > 0.0:
+                    scale = min(GROWTH_MAX, max(SHRINK_MAX, SAFETY*self.tol/change))
+                else:
+                    scale = GROWTH_MAX
+                dtfactor = int(round(self.dtfactor*scale))
+            self.dtfactor = min(self.dtfactormax, max(self.dtfactormin, dtfactor))
+        if ags.checkpoints is not None and ags.checkpoints.nhsinc > 0:
+            self.dtfactor = self.align(self.dtfactor, int(ags.pmain.itime_bgn) - 1, ags.checkpoints.nhsinc)
+        self.apply(ags)
+        log.debug("Coupling interval: change = %s, next interval = %d ADCIRC time steps (%s s)",
+                  change, self.dtfactor, ags.adcircdt)
+
+################################################################################
+if __name__ == '__main__':
+    pass
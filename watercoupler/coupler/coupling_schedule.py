@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import sys
+import csv
+import json
+import logging
+from fractions import Fraction
+try:
+    from math import gcd as _gcd
+except ImportError:
+    # Python < 3.5
+    from fractions import gcd as _gcd
+
+################################################################################
+log = logging.getLogger(__name__)
+
+################################################################################
+MAX_DENOMINATOR = 1000000 # Time steps are taken to be multiples of 1 us at worst
+GSSHA_DRIVING  = ['gdA', 'gdAdg']
+ADCIRC_DRIVING = ['Adg', 'AdgdA']
+TIMELINE_COLUMNS = ['window', 'adcirc_start', 'adcirc_end', 'adcirc_ntsteps',
+                    'gssha_start', 'gssha_end', 'gssha_niter']
+
+################################################################################
+def _ceildiv(a, b):
+    return -((-a)//b)
+
+#------------------------------------------------------------------------------#
+def _tick(*seconds):
+    '''Largest time, as a Fraction of a second, that divides all of seconds.'''
+    tick = Fraction(0)
+    for value in seconds:
+        value = Fraction(value).limit_denominator(MAX_DENOMINATOR)
+        tick = Fraction(_gcd(tick.numerator*value.denominator, value.numerator*tick.denominator),
+                        tick.denominator*value.denominator)
+    return abs(tick)
+
+################################################################################
+class couplingschedule(): #Note: This is not a ctypes Structure!!!!
+    '''Coupling window boundaries, in closed form on an integer time grid.
+
+    All times are counted in ticks, the largest time that divides the ADCIRC
+    and GSSHA time steps, a minute (GSSHA's niter) and the ADCIRC start time,
+    i.e., the resolution at which both models' time levels fall on the grid.
+    Each window boundary is then a ceiling division instead of a float loop
+    adding one time step at a time against TIME_TOL, and times do not drift.
+
+    The run loops and the BC functions get their window boundaries from the
+    methods below, one call per window, for the coupler's current interval.
+    timeline() replays the same loops without running either model, for a
+    fixed interval, to give the full synchronization timeline.
+    '''
+    def __init__(self, ags):
+        from .coupler_arguments import COUPLING_TYPES
+
+        assert(ags.couplingtype in COUPLING_TYPES)
+        self.couplingtype = ags.couplingtype
+        self.tick = _tick(ags.pg.dt, ags.pg.dtdp, ags.gsshadt, 60.0, ags.adcirctstart)
+        self.tickseconds = float(self.tick)
+        self.adcircdt = self.ticks(ags.pg.dt)    # One ADCIRC time step
+        self.adcircdtdp = self.ticks(ags.pg.dtdp)
+        self.gsshadt = self.ticks(ags.effectivegsshadt)
+        self.minute = self.ticks(60.0)
+        assert(self.adcircdt > 0 and self.gsshadt > 0)
+
+        self.adcirctstart = self.ticks(ags.adcirctstart)
+        self.adcircntsteps = ags.adcircntsteps
+        self.adcirctfinal = self.ticks(ags.adcirctfinal)
+        self.gsshatstart = self.ticks(ags.gsshamv.timer*ags.gsshatimefact)
+        self.gsshatfinal = ags.gsshatfinal*self.minute
+        self.dtfactor = ags.couplingdtfactor # Initial coupling interval
+        self.adaptive = ags.couplinginterval is not None and ags.couplinginterval.adaptive
+
+    #--------------------------------------------------------------------------#
+    def ticks(self, seconds):
+        '''Nearest tick to a time in seconds.'''
+        return int(round(seconds/self.tickseconds))
+
+    #--------------------------------------------------------------------------#
+    def seconds(self, ticks):
+        return float(ticks*self.tick)
+
+    ############################################################################
+    # Window boundaries, in ticks
+    ############################################################################
+    def gssha_run_ticks(self, timer, tprev, tnext, interval):
+        '''Length of GSSHA's next run, from timer: the smallest positive
+        number of GSSHA time steps that reaches
+         - one interval past ADCIRC, when GSSHA drives (gdA, gdAdg),
+         - past one GSSHA time step before ADCIRC, when ADCIRC drives,
+         - the end of ADCIRC's window, when they run concurrently.
+        '''
+        if self.couplingtype in GSSHA_DRIVING:
+            target = tprev + interval
+        elif self.couplingtype in ADCIRC_DRIVING:
+            target = tprev - self.gsshadt + 1
+        else:
+            target = tnext
+        return self.gsshadt*max(1, _ceildiv(target - timer, self.gsshadt))
+
+    #--------------------------------------------------------------------------#
+    def adcirc_run_intervals(self, timer, tnext, interval):
+        '''Number of coupling intervals in ADCIRC's next run, from tnext: the
+        fewest that reach
+         - past one interval before GSSHA, when GSSHA drives (gdA, gdAdg),
+         - one GSSHA time step past GSSHA, when ADCIRC drives,
+        and always one when they run concurrently.
+        '''
+        if self.couplingtype in GSSHA_DRIVING:
+            target = timer - interval + 1
+        elif self.couplingtype in ADCIRC_DRIVING:
+            target = timer + self.gsshadt
+        else:
+            return 1
+        return max(0, _ceildiv(target - tnext, interval))
+
+    #--------------------------------------------------------------------------#
+    def adcirc_lead_ticks(self, timer, tprev, interval):
+        '''How far past tprev the ADCIRC flux series reaches when it is set
+        ahead: the fewest intervals reaching one GSSHA time step past timer.'''
+        return interval*max(0, _ceildiv(timer + self.gsshadt - tprev, interval))
+
+    #--------------------------------------------------------------------------#
+    def gssha_lead_ticks(self, timer, tprev, interval):
+        '''How far past timer the GSSHA head series reaches when it is set
+        ahead: the fewest GSSHA time steps reaching one interval past tprev.'''
+        return self.gsshadt*max(0, _ceildiv(tprev + interval - timer, self.gsshadt))
+
+    ############################################################################
+    # Window boundaries for the coupler's current state, in seconds
+    ############################################################################
+    def _state(self, ags):
+        return (self.ticks(ags.gsshamv.timer*ags.gsshatimefact), self.ticks(ags.adcirctprev),
+                self.ticks(ags.adcirctnext), ags.couplingdtfactor*self.adcircdt)
+
+    #--------------------------------------------------------------------------#
+    def gssha_window(self, ags):
+        '''(superdt, end time) of GSSHA's next run, in seconds.'''
+        timer, tprev, tnext, interval = self._state(ags)
+        superdt = self.gssha_run_ticks(timer, tprev, tnext, interval)
+        return self.seconds(superdt), self.seconds(timer + superdt)
+
+    #--------------------------------------------------------------------------#
+    def gssha_niter(self, tend):
+        '''GSSHA's niter, in whole minutes, for a run ending at tend seconds.
+
+        Rounded up, so that single_event_end is what ends the run: with coupling
+        intervals that are not whole minutes, rounding down would leave GSSHA
+        further behind ADCIRC with every window.
+        '''
+        return _ceildiv(self.ticks(tend), self.minute)
+
+    #--------------------------------------------------------------------------#
+    def adcirc_window(self, ags):
+        '''(ntsteps, adcirctnext) of ADCIRC's next run.'''
+        timer, tprev, tnext, interval = self._state(ags)
+        nintervals = self.adcirc_run_intervals(timer, tnext, interval)
+        return nintervals*ags.couplingdtfactor, self.seconds(tnext + nintervals*interval)
+
+    #--------------------------------------------------------------------------#
+    def adcirc_lead(self, ags):
+        timer, tprev, tnext, interval = self._state(ags)
+        return self.seconds(self.adcirc_lead_ticks(timer, tprev, interval))
+
+    #--------------------------------------------------------------------------#
+    def gssha_lead(self, ags):
+        timer, tprev, tnext, interval = self._state(ags)
+        return self.seconds(self.gssha_lead_ticks(timer, tprev, interval))
+
+    #--------------------------------------------------------------------------#
+    def adcirc_init_ftiminc(self, ags):
+        '''Initial flux time increment: the fewest intervals past the ADCIRC
+        start time that reach one GSSHA time step, or one interval if ADCIRC
+        starts after GSSHA.'''
+        interval = ags.couplingdtfactor*self.adcircdt
+        if self.adcirctstart > 0:
+            return self.seconds(interval)
+        return self.seconds(interval*max(0, _ceildiv(self.gsshadt - self.adcirctstart, interval)))
+
+    #--------------------------------------------------------------------------#
+    def gssha_init_superdt(self, ags):
+        '''Initial spacing of the GSSHA head series: the fewest GSSHA time
+        steps that reach one interval past the ADCIRC start time.'''
+        interval = ags.couplingdtfactor*self.adcircdt
+        return self.seconds(self.gsshadt*max(0, _ceildiv(self.adcirctstart + interval, self.gsshadt)))
+
+    ############################################################################
+    # Full timeline
+    ############################################################################
+    def timeline(self, dtfactor=None):
+        '''List of the coupling windows of a whole run, as dicts with the
+        TIMELINE_COLUMNS, replaying the run loops of _coupler_run with a fixed
+        interval of dtfactor ADCIRC time steps (the initial one by default).
+
+        Assumes that each model run ends exactly where it was asked to, and
+        that ADCIRC's nt time steps reach its final time.
+        '''
+        dtfactor = self.dtfactor if dtfactor is None else dtfactor
+        interval = dtfactor*self.adcircdt
+        tfinal = self.adcirctstart + self.adcircntsteps*self.adcircdtdp
+        tprev = tnext = self.adcirctstart
+        timer = self.gsshatstart
+        adcircrun = gssharun = True
+        gsshafirst = self.couplingtype in GSSHA_DRIVING
+
+        windows = []
+        while tprev < tfinal or timer < self.gsshatfinal:
+            window = dict(window=len(windows)+1, adcirc_start=tprev, adcirc_ntsteps=0,
+                          gssha_start=timer, gssha_niter=None)
+            for model in (['gssha', 'adcirc'] if gsshafirst else ['adcirc', 'gssha']):
+                if model == 'gssha':
+                    if timer < self.gsshatfinal:
+                        if adcircrun:
+                            timer += self.gssha_run_ticks(timer, tprev, tnext, interval)
+                        else:
+                            timer = self.gsshatfinal
+                        window['gssha_niter'] = _ceildiv(timer, self.minute)
+                    else:
+                        gssharun = False
+                elif tprev < tfinal:
+                    nintervals = self.adcirc_run_intervals(timer, tnext, interval)
+                    ntsteps = nintervals*dtfactor
+                    tnext += nintervals*interval
+                    if not gssharun:
+                        ntsteps = (tfinal - tprev)//self.adcircdtdp
+                        tnext = tfinal
+                    window['adcirc_ntsteps'] = ntsteps
+                    # Concurrent windows start GSSHA before running ADCIRC,
+                    # but GSSHA's window depends on tnext only, not tprev.
+                    tprev = min(tprev + ntsteps*self.adcircdtdp, tfinal)
+                else:
+                    adcircrun = False
+            window['adcirc_end'] = tprev
+            window['gssha_end'] = timer
+            assert(window['adcirc_end'] > window['adcirc_start'] or
+                   window['gssha_end'] > window['gssha_start'])
+            windows.append(window)
+
+        for window in windows:
+            for name in ['adcirc_start', 'adcirc_end', 'gssha_start', 'gssha_end']:
+                window[name] = self.seconds(window[name])
+        return windows
+
+    #--------------------------------------------------------------------------#
+    def report(self, pathname=None):
+        '''Write the timeline as a table to stdout, or to a .csv or .json file.'''
+        windows = self.timeline()
+        if self.adaptive:
+            log.warning("Adaptive coupling interval: the timeline uses the "
+                        "initial interval of %d ADCIRC time steps throughout", self.dtfactor)
+        log.info("Coupling schedule: %s, %d windows, tick = %s s",
+                 self.couplingtype, len(windows), self.tick)
+        if pathname and pathname.endswith('.json'):
+            with open(pathname, 'w') as jsonfile:
+                json.dump({'couplingtype' : self.couplingtype,
+                           'tick' : str(self.tick),
+                           'dtfactor' : self.dtfactor,
+                           'windows' : windows}, jsonfile, indent=1)
+        elif pathname:
+            with open(pathname, 'w') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(TIMELINE_COLUMNS)
+                for window in windows:
+                    writer.writerow([window[name] for name in TIMELINE_COLUMNS])
+        else:
+            out = sys.stdout
+            out.write(''.join('{0:>16s}'.format(name) for name in TIMELINE_COLUMNS) + '\n')
+            for window in windows:
+                out.write(''.join('{0:>16}'.format('-' if window[name] is None else window[name])
+                                  for name in TIMELINE_COLUMNS) + '\n')
+        return windows
+
+################################################################################
+if __name__ == '__main__':
+    pass
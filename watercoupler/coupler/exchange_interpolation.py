@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import os
+import logging
+
+import numpy as np
+
+################################################################################
+log = logging.getLogger(__name__)
+
+################################################################################
+EXCHANGE_LINEAR = 'linear' # One point per window, linear in between (original)
+EXCHANGE_PCHIP  = 'pchip'  # Monotone cubic through the last samples, points across the window
+EXCHANGE_MODES  = [EXCHANGE_LINEAR, EXCHANGE_PCHIP]
+DEFAULT_HISTORY = 4        # Exchanged samples kept on each side
+DEFAULT_POINTS  = 4        # Series points per window
+
+################################################################################
+def pchip_slopes(t, y):
+    '''Slopes at the samples (t, y) of the monotone piecewise cubic Hermite
+    interpolant of Fritsch and Carlson, with the shape-preserving three-point
+    end slopes of Fritsch and Butland; y has one column per quantity.
+
+    Slopes are zero at local extrema, so the interpolant never overshoots
+    its samples in between them. Two samples give the straight line.
+    '''
+    h = np.diff(t)[:, None]
+    delta = np.diff(y, axis=0)/h
+    d = np.zeros_like(y)
+    if len(t) == 2:
+        d[:] = delta
+        return d
+    # Interior: weighted harmonic mean of the neighbouring secants, or zero
+    # where they differ in sign.
+    w1 = 2.0*h[1:] + h[:-1]
+    w2 = h[1:] + 2.0*h[:-1]
+    same = (delta[:-1]*delta[1:] > 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d[1:-1] = np.where(same, (w1+w2)/(w1/delta[:-1] + w2/delta[1:]), 0.0)
+    d[0] = _end_slope(h[0], h[1], delta[0], delta[1])
+    d[-1] = _end_slope(h[-1], h[-2], delta[-1], delta[-2])
+    return d
+
+#------------------------------------------------------------------------------#
+def _end_slope(h0, h1, delta0, delta1):
+    d = ((2.0*h0 + h1)*delta0 - h0*delta1)/(h0 + h1)
+    d = np.where(np.sign(d) != np.sign(delta0), 0.0, d)
+    return np.where((np.sign(delta0) != np.sign(delta1)) & (np.abs(d) > 3.0*np.abs(delta0)), 3.0*delta0, d)
+
+#------------------------------------------------------------------------------#
+def pchip_evaluate(t, y, d, tnew):
+    '''Hermite cubic of the samples (t, y) and slopes d at times tnew,
+    continued past either end along the end slope.'''
+    tnew = np.asarray(tnew, dtype=np.float64)
+    i = np.clip(np.searchsorted(t, tnew, side='right') - 1, 0, len(t)-2)
+    h = (t[i+1] - t[i])[:, None]
+    s = ((tnew - t[i])[:, None])/h
+    values = ((1.0 + 2.0*s)*(1.0 - s)**2*y[i] + s*(1.0 - s)**2*h*d[i]
+              + s**2*(3.0 - 2.0*s)*y[i+1] + s**2*(s - 1.0)*h*d[i+1])
+    before, after = (tnew < t[0]), (tnew > t[-1])
+    values[before] = y[0] + (tnew[before] - t[0])[:, None]*d[0]
+    values[after] = y[-1] + (tnew[after] - t[-1])[:, None]*d[-1]
+    return values
+
+################################################################################
+class exchangehistory(): #Note: This is not a ctypes Structure!!!!
+    '''The last nsamples samples of exchanged quantities, oldest first, in
+    preallocated arrays, and their monotone cubic interpolant.'''
+    def __init__(self, nsamples=DEFAULT_HISTORY):
+        self.nsamples = nsamples
+        self.times = np.zeros(nsamples, dtype=np.float64)
+        self.values = None # nsamples x quantities, allocated by the first append
+        self.count = 0
+
+    #--------------------------------------------------------------------------#
+    def append(self, time, values):
+        '''Add the sample of values (a scalar or 1D array) at time, dropping
+        the oldest sample once full. A sample at the time of the newest one
+        replaces it.'''
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        if self.values is None:
+            self.values = np.zeros((self.nsamples, len(values)), dtype=np.float64)
+        if self.count > 0 and time <= self.times[self.count-1]:
+            # E.g., the same GSSHA time again once GSSHA has finished.
+            self.count -= 1
+        elif self.count == self.nsamples:
+            self.times[:-1] = self.times[1:]
+            self.values[:-1] = self.values[1:]
+            self.count -= 1
+        self.times[self.count] = time
+        self.values[self.count] = values
+        self.count += 1
+
+    #--------------------------------------------------------------------------#
+    def snapshot(self):
+        '''The samples, for coupler checkpoints.'''
+        return {'times'  : self.times[:self.count].copy(),
+                'values' : np.zeros((0, 0)) if self.values is None else self.values[:self.count].copy()}
+
+    #--------------------------------------------------------------------------#
+    def restore(self, state):
+        '''Pick up the samples of snapshot().'''
+        times, values = state['times'], state['values']
+        self.count = min(len(times), self.nsamples)
+        if self.count == 0:
+            return
+        self.times[:self.count] = times[-self.count:]
+        self.values = np.zeros((self.nsamples, values.shape[1]), dtype=np.float64)
+        self.values[:self.count] = values[-self.count:]
+
+    #--------------------------------------------------------------------------#
+    def newest(self):
+        '''Values of the newest sample.'''
+        return self.values[self.count-1]
+
+    #--------------------------------------------------------------------------#
+    def evaluate(self, times):
+        '''Values at times, one row each: the monotone cubic through the
+        samples, or the newest sample while there is only one.'''
+        if self.count < 2:
+            return np.repeat(self.values[self.count-1:self.count], len(times), axis=0)
+        t, y = self.times[:self.count], self.values[:self.count]
+        return pchip_evaluate(t, y, pchip_slopes(t, y), times)
+
+################################################################################
+class exchangeinterpolation(): #Note: This is not a ctypes Structure!!!!
+    '''How the exchanged boundary values fill the boundary series of the
+    coming window.
+
+    linear, the original scheme, gives every window one new point of each
+    series, at its end, and the models interpolate linearly in between.
+    pchip keeps the last history exchanged samples of each side, GSSHA's
+    outlet discharge and GSSHA's head boundary value, and gives every window
+    points new points, evenly spaced to its end, from the monotone cubic
+    through them: interpolated where the window ends at the newest sample,
+    and continued along the end slope where the series runs ahead of it
+    (ADCIRC_BC_AHEAD and GSSHA_BC_AHEAD types). ADCIRC reads the points of
+    its flux series from fort.20 as it goes, so pchip uses the file flux
+    exchange mode.
+
+    Configured by the environment:
+        WATERCOUPLER_EXCHANGE_INTERP   linear (default) or pchip
+        WATERCOUPLER_EXCHANGE_HISTORY  history, samples (4)
+        WATERCOUPLER_EXCHANGE_POINTS   points per window (4)
+    '''
+    def __init__(self, mode=EXCHANGE_LINEAR, history=DEFAULT_HISTORY, points=DEFAULT_POINTS):
+        if mode not in EXCHANGE_MODES:
+            raise ValueError("WATERCOUPLER_EXCHANGE_INTERP must be one of: {0}".format(', '.join(EXCHANGE_MODES)))
+        if history < 2 or points < 1:
+            raise ValueError("The exchange history needs at least 2 samples and 1 point per window, "
+                             "got {0} and {1}".format(history, points))
+        self.mode = mode
+        self.history = history
+        self.points = points
+        self.flux = exchangehistory(history) # GSSHA qout (per watershed), by GSSHA time in s
+        self.head = exchangehistory(history) # GSSHA head boundary value, by Julian time
+        self.fluxend = None # (time, qnin) at the end of the last window's flux series
+
+    #--------------------------------------------------------------------------#
+    @classmethod
+    def from_environ(cls):
+        return cls(os.environ.get('WATERCOUPLER_EXCHANGE_INTERP', EXCHANGE_LINEAR),
+                   history=int(os.environ.get('WATERCOUPLER_EXCHANGE_HISTORY', DEFAULT_HISTORY)),
+                   points=int(os.environ.get('WATERCOUPLER_EXCHANGE_POINTS', DEFAULT_POINTS)))
+
+    #--------------------------------------------------------------------------#
+    @property
+    def cubic(self):
+        return self.mode == EXCHANGE_PCHIP
+
+    #--------------------------------------------------------------------------#
+    def snapshot(self):
+        '''State carried from window to window, for coupler checkpoints.'''
+        state = {}
+        for side, history in [('flux', self.flux), ('head', self.head)]:
+            for name, value in history.snapshot().items():
+                state[side+'_'+name] = value
+        state['fluxend_time'] = float('nan') if self.fluxend is None else self.fluxend[0]
+        state['fluxend_qnin'] = [] if self.fluxend is None else self.fluxend[1].copy()
+        return state
+
+    #--------------------------------------------------------------------------#
+    def restore(self, state):
+        '''Pick up where snapshot() left off.'''
+        for side, history in [('flux', self.flux), ('head', self.head)]:
+            history.restore({'times'  : np.asarray(state[side+'_times'], dtype=np.float64),
+                             'values' : np.asarray(state[side+'_values'], dtype=np.float64)})
+        fluxtime = float(state['fluxend_time'])
+        self.fluxend = None if np.isnan(fluxtime) else (fluxtime, np.array(state['fluxend_qnin']))
+
+    #--------------------------------------------------------------------------#
+    def npoints(self, num_vals=None):
+        '''New points per window of a series, with num_vals points if given:
+        at most num_vals-2, which leaves the point the window starts at and
+        the end point's duplicate.'''
+        if not self.cubic:
+            return 1
+        if num_vals is None:
+            return self.points
+        return max(1, min(self.points, num_vals-2))
+
+    #--------------------------------------------------------------------------#
+    def subtimes(self, tstart, tend, npoints):
+        '''npoints times evenly spaced from tstart, excluded, to tend.'''
+        times = tstart + (tend - tstart)*np.arange(1, npoints+1)/float(npoints)
+        times[-1] = tend
+        return times
+
+################################################################################
+if __name__ == '__main__':
+    pass
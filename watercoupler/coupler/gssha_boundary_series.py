@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+
+import ctypes as ct
+import numpy as np
+
+################################################################################
+_DBL = ct.sizeof(ct.c_double)
+
+################################################################################
+def _address(ptr):
+    '''Address held by a ctypes POINTER(c_double).'''
+    return ct.cast(ptr, ct.c_void_p).value
+
+################################################################################
+class gsshaboundaryseries(): #Note: This is not a ctypes Structure!!!!
+    '''Manager of GSSHA's head boundary time series, mvs[0].bound_ts_ptr[0].
+
+    shift() drops the oldest (jul_time, val) point of the num_vals long series
+    and duplicates the newest one into the freed last slot, which the caller
+    then overwrites. Two modes are available:
+     - ring (default): jul_time/val are moved into coupler-owned buffers with
+       room for `history` extra points, and shifting only advances the
+       jul_time/val pointers GSSHA reads through. Once the buffers run out,
+       the window is moved back to the start with one memmove, so the cost of
+       a shift is constant on average, however long the series is.
+     - in place: one memmove per array within GSSHA's own buffers.
+    release() must be called before GSSHA is finalized, so that GSSHA frees
+    its own buffers, holding the current series, and not the coupler's.
+
+    In ring mode, reserve() followed by history() hands GSSHA every point
+    shifted through so far as one long series, e.g. to run GSSHA through many
+    coupling windows in a single call; window() goes back to the last
+    num_vals points.
+    '''
+    def __init__(self, ts, ring=True, history=None):
+        self.ts = ts
+        self.num_vals = ts.num_vals
+        self.ring = ring
+        self.orig_jul_time = _address(ts.jul_time)
+        self.orig_val = _address(ts.val)
+        self.offset = 0
+
+        if self.ring:
+            if history is None:
+                history = max(self.num_vals, 256)
+            self.capacity = self.num_vals + max(1, history)
+            self.jul_time_buf = (ct.c_double*self.capacity)()
+            self.val_buf = (ct.c_double*self.capacity)()
+            ct.memmove(self.jul_time_buf, self.orig_jul_time, self.num_vals*_DBL)
+            ct.memmove(self.val_buf, self.orig_val, self.num_vals*_DBL)
+            self.jul_time_addr = ct.addressof(self.jul_time_buf)
+            self.val_addr = ct.addressof(self.val_buf)
+            self._point()
+        else:
+            self.capacity = self.num_vals
+            self.jul_time_addr = self.orig_jul_time
+            self.val_addr = self.orig_val
+        # Zero-copy NumPy views over the whole buffers; see views().
+        self._views_all()
+
+    #--------------------------------------------------------------------------#
+    def views(self):
+        '''Zero-copy NumPy views of the jul_time/val series GSSHA sees now.
+
+        Only valid until the next shift().
+        '''
+        return (self.jul_time_arr[self.offset:self.offset+self.num_vals],
+                self.val_arr[self.offset:self.offset+self.num_vals])
+
+    #--------------------------------------------------------------------------#
+    def _point(self):
+        '''Point GSSHA's jul_time/val at the current window of the buffers.'''
+        self.ts.jul_time = ct.cast(self.jul_time_addr + self.offset*_DBL, ct.POINTER(ct.c_double))
+        self.ts.val = ct.cast(self.val_addr + self.offset*_DBL, ct.POINTER(ct.c_double))
+
+    #--------------------------------------------------------------------------#
+    def _move_window(self, dst, src):
+        '''Move num_vals-1 points of the window starting at offset src to dst.'''
+        nbytes = (self.num_vals-1)*_DBL
+        ct.memmove(self.jul_time_addr + dst*_DBL, self.jul_time_addr + src*_DBL, nbytes)
+        ct.memmove(self.val_addr + dst*_DBL, self.val_addr + src*_DBL, nbytes)
+
+    #--------------------------------------------------------------------------#
+    def shift(self):
+        '''Shift the series backward by one point; see the class docstring.'''
+        n = self.num_vals
+        last_jul_time = self.jul_time_arr[self.offset+n-1]
+        last_val = self.val_arr[self.offset+n-1]
+        if not self.ring:
+            self._move_window(0, 1)
+        elif self.offset + n < self.capacity:
+            self.offset += 1
+            self._point()
+        else:
+            self._move_window(0, self.offset+1)
+            self.offset = 0
+            self._point()
+        self.jul_time_arr[self.offset+n-1] = last_jul_time
+        self.val_arr[self.offset+n-1] = last_val
+        self.ts.last_access = max(self.ts.last_access-1, 0)
+
+    #--------------------------------------------------------------------------#
+    def _views_all(self):
+        self.jul_time_arr = np.ctypeslib.as_array(
+                ct.cast(self.jul_time_addr, ct.POINTER(ct.c_double)), shape=(self.capacity,))
+        self.val_arr = np.ctypeslib.as_array(
+                ct.cast(self.val_addr, ct.POINTER(ct.c_double)), shape=(self.capacity,))
+
+    #--------------------------------------------------------------------------#
+    def snapshot(self):
+        '''Copy of the series GSSHA sees now, and where it is in the buffers.'''
+        jul_time, val = self.views()
+        return (self.offset, jul_time.copy(), val.copy(), self.ts.last_access)
+
+    #--------------------------------------------------------------------------#
+    def restore(self, state):
+        '''Go back to the series of snapshot(), however far it was shifted since.'''
+        self.offset, jul_time, val, self.ts.last_access = state
+        if self.ring:
+            self._point()
+        self.jul_time_arr[self.offset:self.offset+self.num_vals] = jul_time
+        self.val_arr[self.offset:self.offset+self.num_vals] = val
+
+    #--------------------------------------------------------------------------#
+    def reserve(self, nshifts):
+        '''Make room for nshifts more shifts without moving the window back to
+        the start of the buffers, so that no point shifted through is lost.'''
+        assert(self.ring)
+        capacity = self.offset + self.num_vals + nshifts
+        if capacity <= self.capacity:
+            return
+        jul_time_buf = (ct.c_double*capacity)()
+        val_buf = (ct.c_double*capacity)()
+        nbytes = (self.offset + self.num_vals)*_DBL
+        ct.memmove(jul_time_buf, self.jul_time_addr, nbytes)
+        ct.memmove(val_buf, self.val_addr, nbytes)
+        self.jul_time_buf, self.val_buf = jul_time_buf, val_buf
+        self.jul_time_addr = ct.addressof(self.jul_time_buf)
+        self.val_addr = ct.addressof(self.val_buf)
+        self.capacity = capacity
+        self._views_all()
+        self._point()
+
+    #--------------------------------------------------------------------------#
+    def history(self, last_access):
+        '''Point GSSHA at all the points from the start of the buffers on, to
+        be read from point last_access of these on.'''
+        assert(self.ring)
+        self.ts.jul_time = ct.cast(self.jul_time_addr, ct.POINTER(ct.c_double))
+        self.ts.val = ct.cast(self.val_addr, ct.POINTER(ct.c_double))
+        self.ts.num_vals = self.offset + self.num_vals
+        self.ts.last_access = last_access
+
+    #--------------------------------------------------------------------------#
+    def window(self):
+        '''Point GSSHA back at the current num_vals points, after history().'''
+        self.ts.num_vals = self.num_vals
+        self.ts.last_access = max(self.ts.last_access - self.offset, 0)
+        self._point()
+
+    #--------------------------------------------------------------------------#
+    def release(self):
+        '''Copy the current series back into GSSHA's buffers and restore them.'''
+        if not self.ring:
+            return
+        ct.memmove(self.orig_jul_time, self.jul_time_addr + self.offset*_DBL, self.num_vals*_DBL)
+        ct.memmove(self.orig_val, self.val_addr + self.offset*_DBL, self.num_vals*_DBL)
+        self.ts.jul_time = ct.cast(self.orig_jul_time, ct.POINTER(ct.c_double))
+        self.ts.val = ct.cast(self.orig_val, ct.POINTER(ct.c_double))
+        # From here on, behave like the in place mode.
+        self.ring = False
+        self.offset = 0
+        self.capacity = self.num_vals
+        self.jul_time_addr = self.orig_jul_time
+        self.val_addr = self.orig_val
+        self.jul_time_arr = np.ctypeslib.as_array(self.ts.jul_time, shape=(self.num_vals,))
+        self.val_arr = np.ctypeslib.as_array(self.ts.val, shape=(self.num_vals,))
+
+################################################################################
+if __name__ == '__main__':
+    pass
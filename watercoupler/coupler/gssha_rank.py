@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import os
+import ctypes as ct
+import logging
+
+import numpy as np
+
+from ..synthetic.synthetic_gssha import main_var_struct, ts_struct
+from .coupler_backend import BACKEND_NATIVE, adcirc_takes_comm
+
+################################################################################
+log = logging.getLogger(__name__)
+
+################################################################################
+GSSHA_RANK_SHARED    = 'shared'    # GSSHA runs on ADCIRC's PE 0
+GSSHA_RANK_DEDICATED = 'dedicated' # GSSHA runs on an extra, last MPI rank (one per watershed)
+GSSHA_RANK_MODES     = [GSSHA_RANK_SHARED, GSSHA_RANK_DEDICATED]
+
+# main_var_struct members that the coupler reads or sets, exchanged as doubles
+# (the int members are exact) before and after every remote GSSHA run.
+SCALARS = ['timer', 'niter', 'go', 'dt', 'btime', 'b_lt_start', 'single_event_end',
+           'vout', 'qout', 'yes_head_bound', 'bound_ts', 'boundary_depth']
+_INT_SCALARS = ['niter', 'go', 'yes_head_bound', 'bound_ts']
+# The members that several watersheds share: their run clock. Only these are
+# set on the GSSHA ranks of several watersheds, which keep their own outlet
+# and head boundary.
+CLOCK_SCALARS = ['timer', 'niter', 'go', 'dt', 'btime', 'b_lt_start', 'single_event_end']
+
+# Requests to the GSSHA ranks, broadcast over gsshacomm: a header of
+# [command, num_vals, last_access] and SCALARS, followed by the head boundary
+# series if num_vals > 0. The replies, [last_access] and SCALARS, or
+# [ierr_code] at finalize, are gathered on ADCIRC's PE 0.
+CMD_RUN = 1
+CMD_FINALIZE = 2
+NHEADER = 3
+
+################################################################################
+def _get_scalars(mv):
+    return [float(getattr(mv, name)) for name in SCALARS]
+
+#------------------------------------------------------------------------------#
+def _set_scalars(mv, values, names=SCALARS):
+    for name, value in zip(SCALARS, values):
+        if name in names:
+            setattr(mv, name, int(value) if name in _INT_SCALARS else float(value))
+
+#------------------------------------------------------------------------------#
+def _series(ts):
+    '''Copy of a head boundary series, jul_time then val, as one array.'''
+    n = ts.num_vals
+    return np.concatenate([np.ctypeslib.as_array(ts.jul_time, (n,)),
+                           np.ctypeslib.as_array(ts.val, (n,))])
+
+#------------------------------------------------------------------------------#
+def _clock_mismatch(states):
+    '''Message naming the first watershed whose run clock differs from the
+    first one's, or None if they all run on the same clock.'''
+    for k, state in enumerate(states[1:], 1):
+        for name in CLOCK_SCALARS:
+            i = SCALARS.index(name)
+            if state['scalars'][i] != states[0]['scalars'][i]:
+                return ("Watershed {0} has GSSHA {1} = {2}, but watershed 1 has {3}: all watersheds "
+                        "must share the time step and the start and end times".format(
+                            k+1, name, state['scalars'][i], states[0]['scalars'][i]))
+    return None
+
+################################################################################
+class gssharanksplit(): #Note: This is not a ctypes Structure!!!!
+    '''MPI_COMM_WORLD split into ADCIRC's PEs and dedicated GSSHA ranks, one
+    per watershed.
+
+    The last ngssharanks world ranks run GSSHA alone, watershed k on the k-th
+    of them; the others form ADCIRC's communicator, in world order, so
+    ADCIRC's PE 0 is world rank 0. ADCIRC's PE 0 and the GSSHA ranks, in
+    world order, form gsshacomm, over which PE 0 broadcasts every run
+    request and gathers the replies. Needs mpi4py, and an ADCIRC library
+    whose pyadcirc_init takes ADCIRC's communicator.
+
+    The communicator must exist before ADCIRC initializes, so MPI is
+    initialized here rather than by ADCIRC's MSG_INIT, which, handed a
+    communicator, leaves MPI_Init and MPI_Finalize to its caller; finalize()
+    finalizes MPI once ADCIRC and GSSHA are done.
+
+    Configured by the environment, for one watershed:
+        WATERCOUPLER_GSSHA_RANK  shared (default) or dedicated
+    '''
+    def __init__(self, ngssharanks=1, backend=BACKEND_NATIVE):
+        # Checked on every rank, before MPI starts, so that all of them stop.
+        if not adcirc_takes_comm(backend):
+            raise ValueError("A dedicated GSSHA rank needs a pyADCIRC whose pyadcirc_init takes "
+                             "ADCIRC's MPI communicator; run with WATERCOUPLER_GSSHA_RANK=shared")
+        import mpi4py
+        mpi4py.rc.initialize = False
+        mpi4py.rc.finalize = False
+        from mpi4py import MPI
+        self.MPI = MPI
+        if not MPI.Is_initialized():
+            MPI.Init_thread(MPI.THREAD_MULTIPLE)
+        world = MPI.COMM_WORLD
+        if world.size < ngssharanks+1:
+            MPI.Finalize()
+            raise ValueError("{0} dedicated GSSHA rank(s) need at least {1} MPI ranks, got {2}".format(
+                ngssharanks, ngssharanks+1, world.size))
+        self.comm = world.Dup()
+        self.rank = world.rank
+        self.ngssharanks = ngssharanks
+        self.gssharanks = list(range(world.size-ngssharanks, world.size))
+        self.adcircroot = 0
+        self.isgssharank = (world.rank in self.gssharanks)
+        self.isadcircroot = (world.rank == self.adcircroot)
+        # Index of the watershed that this rank runs, if a GSSHA rank.
+        self.watershed = world.rank-self.gssharanks[0] if self.isgssharank else None
+        self.adcirccomm = world.Split(1 if self.isgssharank else 0, world.rank)
+        ingsshacomm = (self.isgssharank or self.isadcircroot)
+        self.gsshacomm = world.Split(0 if ingsshacomm else MPI.UNDEFINED, world.rank)
+        self.threadmultiple = (MPI.Query_thread() >= MPI.THREAD_MULTIPLE)
+        log.info("Dedicated GSSHA rank(s) %d to %d; ADCIRC on world ranks 0 to %d",
+                 self.gssharanks[0], self.gssharanks[-1], self.gssharanks[0]-1)
+
+    #--------------------------------------------------------------------------#
+    @classmethod
+    def from_environ(cls, backend=BACKEND_NATIVE):
+        '''The split with a dedicated GSSHA rank, or None if GSSHA shares PE 0.'''
+        mode = os.environ.get('WATERCOUPLER_GSSHA_RANK', GSSHA_RANK_SHARED)
+        if mode not in GSSHA_RANK_MODES:
+            raise ValueError("WATERCOUPLER_GSSHA_RANK must be one of: {0}".format(', '.join(GSSHA_RANK_MODES)))
+        if mode == GSSHA_RANK_SHARED:
+            return None
+        return cls(backend=backend)
+
+    #--------------------------------------------------------------------------#
+    @property
+    def adcirccomm_f(self):
+        '''ADCIRC's communicator as a Fortran handle, for pyadcirc_init.'''
+        return self.adcirccomm.py2f()
+
+    #--------------------------------------------------------------------------#
+    def finalize(self):
+        '''Frees the communicators and finalizes MPI, on every world rank,
+        after ADCIRC and GSSHA have finalized.'''
+        MPI = self.MPI
+        for comm in [self.gsshacomm, self.adcirccomm, self.comm]:
+            if comm != MPI.COMM_NULL:
+                comm.Free()
+        if not MPI.Is_finalized():
+            MPI.Finalize()
+
+################################################################################
+class remotegssha(): #Note: This is not a ctypes Structure!!!!
+    '''Stand-in for gsshapython's fnctn_h on ADCIRC's PEs, running GSSHA on
+    the dedicated GSSHA ranks of a gssharanksplit.
+
+    Every PE holds a mirror of GSSHA's main_var_struct and head boundary
+    series, set from the GSSHA ranks at initialize, which the coupler reads
+    and sets as it would GSSHA's own. main_gssha_run, on PE 0 only,
+    broadcasts the mirror's SCALARS and head boundary series to the GSSHA
+    ranks, which run GSSHA on them, and sets the mirror from their gathered
+    replies. From a background thread ('A|g'), this needs
+    MPI_THREAD_MULTIPLE.
+
+    With several watersheds, the GSSHA ranks only take the mirror's run
+    clock, and its head boundary series is not sent; the mirror's vout and
+    qout are the totals over the watersheds, and vouts and qouts hold each
+    watershed's own.
+    '''
+    def __init__(self, split):
+        self.split = split
+        self.mv = main_var_struct()
+        self.mvs = ct.POINTER(main_var_struct)()
+        self.ts = ts_struct()
+        self.nx = (ct.c_int*2)(1, 1)
+        self.rows = [(ct.c_double*2)(1.0, 1.0) for i in range(4)]
+        self.area = (ct.POINTER(ct.c_double)*2)(self.rows[0], self.rows[1])
+        self.chan_depth = (ct.POINTER(ct.c_double)*2)(self.rows[2], self.rows[3])
+        # Row 0 is PE 0's own, unused; row k+1 is watershed k's reply.
+        self.replies = np.zeros((split.ngssharanks+1, 1+len(SCALARS)), dtype=np.float64)
+        self.vouts = np.zeros(split.ngssharanks, dtype=np.float64)
+        self.qouts = np.zeros(split.ngssharanks, dtype=np.float64)
+
+    #--------------------------------------------------------------------------#
+    def _set_outlets(self, mv, scalars):
+        '''Set vouts, qouts, and the mirror's totals, from the watersheds'
+        SCALARS, one row each.'''
+        self.vouts[:] = scalars[:, SCALARS.index('vout')]
+        self.qouts[:] = scalars[:, SCALARS.index('qout')]
+        mv.vout = float(np.sum(self.vouts))
+        mv.qout = float(np.sum(self.qouts))
+
+    #--------------------------------------------------------------------------#
+    def main_gssha_initialize(self, pmvs, prj_name, sm, prj_name2):
+        split, mv, ts = self.split, self.mv, self.ts
+        states = split.comm.allgather(None)[split.gssharanks[0]:]
+        mismatch = _clock_mismatch(states)
+        if mismatch is not None:
+            raise RuntimeError(mismatch)
+        state = states[0]
+        _set_scalars(mv, state['scalars'])
+        self._set_outlets(mv, np.array([s['scalars'] for s in states]))
+        mv.nlinks = 1
+        mv.nx = ct.cast(self.nx, ct.POINTER(ct.c_int))
+        mv.area = ct.cast(self.area, ct.POINTER(ct.POINTER(ct.c_double)))
+        mv.chan_depth = ct.cast(self.chan_depth, ct.POINTER(ct.POINTER(ct.c_double)))
+        if state['series'] is not None:
+            n = len(state['series'])//2
+            self.jul_time = (ct.c_double*n)(*state['series'][:n])
+            self.val = (ct.c_double*n)(*state['series'][n:])
+            ts.num_vals = n
+            ts.last_access = state['last_access']
+            ts.jul_time = ct.cast(self.jul_time, ct.POINTER(ct.c_double))
+            ts.val = ct.cast(self.val, ct.POINTER(ct.c_double))
+            mv.bound_ts_ptr = ct.pointer(ts)
+
+        getattr(pmvs, '_obj', pmvs).contents = mv
+        return max(abs(s['ierr_code']) for s in states)
+
+    #--------------------------------------------------------------------------#
+    def _hasseries(self, mv):
+        return bool(self.split.ngssharanks == 1 and mv.yes_head_bound and mv.bound_ts and mv.bound_ts_ptr)
+
+    #--------------------------------------------------------------------------#
+    def main_gssha_run(self, mvs):
+        split, mv = self.split, mvs[0]
+        assert(split.isadcircroot)
+        ts = mv.bound_ts_ptr[0] if self._hasseries(mv) else None
+        num_vals = ts.num_vals if ts is not None else 0
+        header = np.array([CMD_RUN, num_vals, ts.last_access if ts is not None else 0]
+                          + _get_scalars(mv), dtype=np.float64)
+        split.gsshacomm.Bcast(header, root=0)
+        if num_vals > 0:
+            split.gsshacomm.Bcast(_series(ts), root=0)
+        split.gsshacomm.Gather(self.replies[0].copy(), self.replies, root=0)
+        replies = self.replies[1:]
+        timers = replies[:, 1+SCALARS.index('timer')]
+        if np.any(timers != timers[0]):
+            raise RuntimeError("GSSHA watersheds ran to different times: {0}".format(timers.tolist()))
+        _set_scalars(mv, replies[0, 1:])
+        self._set_outlets(mv, replies[:, 1:])
+        if ts is not None:
+            ts.last_access = int(replies[0, 0])
+        return 0
+
+    #--------------------------------------------------------------------------#
+    def main_gssha_finalize(self, mvs):
+        split = self.split
+        if split.isadcircroot:
+            header = np.zeros(NHEADER + len(SCALARS), dtype=np.float64)
+            header[0] = CMD_FINALIZE
+            split.gsshacomm.Bcast(header, root=0)
+            split.gsshacomm.Gather(self.replies[0].copy(), self.replies, root=0)
+            return int(np.max(np.abs(self.replies[1:, 0])))
+        return 0
+
+################################################################################
+class gssharankserver(): #Note: This is not a ctypes Structure!!!!
+    '''GSSHA, one watershed, on a dedicated GSSHA rank of a gssharanksplit,
+    run on the requests of remotegssha on ADCIRC's PE 0 until it asks to
+    finalize.
+
+    The head boundary series sent with every request is copied into buffers
+    of this rank, which GSSHA's series points at while it runs; GSSHA gets
+    its own buffers back before it is finalized.
+    '''
+    def __init__(self, backend, split):
+        self.backend = backend
+        self.split = split
+        self.mvs = backend.mvs
+        self.header = np.zeros(NHEADER + len(SCALARS), dtype=np.float64)
+        self.series = np.zeros(0, dtype=np.float64)
+        self.nruns = 0
+
+    #--------------------------------------------------------------------------#
+    def serve(self, prj_name):
+        '''Initialize GSSHA, run it on request, and finalize it. Returns the
+        error code of main_gssha_finalize.'''
+        split, fnctn, comm = self.split, self.backend.gsshafnctn, self.split.gsshacomm
+        ierr_code = fnctn.main_gssha_initialize(ct.byref(self.mvs), prj_name, None, prj_name)
+        mv = self.mvs[0]
+        hasseries = bool(mv.yes_head_bound and mv.bound_ts and mv.bound_ts_ptr)
+        ts = mv.bound_ts_ptr[0] if hasseries else None
+        if ts is not None:
+            self.orig = (ts.num_vals, ts.jul_time, ts.val)
+        states = split.comm.allgather({'ierr_code'   : ierr_code,
+                                       'scalars'     : _get_scalars(mv),
+                                       'last_access' : ts.last_access if ts is not None else 0,
+                                       'series'      : _series(ts).tolist() if ts is not None else None})
+        mismatch = _clock_mismatch(states[split.gssharanks[0]:])
+        if mismatch is not None:
+            # ADCIRC's PEs raise on the same mismatch and send no request.
+            log.error("\n%s", mismatch)
+            fnctn.main_gssha_finalize(self.mvs)
+            return -1
+        # Several watersheds share the run clock, but keep their own outlet
+        # and head boundary.
+        names = SCALARS if split.ngssharanks == 1 else CLOCK_SCALARS
+        log.info("********************** GSSHA Initialized **********************\n"
+                 "GSSHA watershed %d of %d, %s, runs on dedicated rank %d",
+                 split.watershed+1, split.ngssharanks, prj_name, split.rank)
+
+        while True:
+            comm.Bcast(self.header, root=0)
+            if int(self.header[0]) == CMD_FINALIZE:
+                break
+            num_vals = int(self.header[1])
+            _set_scalars(mv, self.header[NHEADER:], names)
+            if num_vals > 0:
+                self._receive_series(ts, num_vals)
+                ts.last_access = int(self.header[2])
+            ierr_code = fnctn.main_gssha_run(self.mvs)
+            assert(ierr_code == 0)
+            self.nruns += 1
+            reply = np.array([ts.last_access if ts is not None else 0] + _get_scalars(mv),
+                             dtype=np.float64)
+            comm.Gather(reply, None, root=0)
+
+        if ts is not None:
+            ts.num_vals, ts.jul_time, ts.val = self.orig
+        ierr_code = fnctn.main_gssha_finalize(self.mvs)
+        reply = np.zeros(1 + len(SCALARS), dtype=np.float64)
+        reply[0] = ierr_code
+        comm.Gather(reply, None, root=0)
+        log.info("*********************** GSSHA Finalized ***********************\n"
+                 "GSSHA ran %d times on dedicated rank %d", self.nruns, split.rank)
+        return ierr_code
+
+    #--------------------------------------------------------------------------#
+    def _receive_series(self, ts, num_vals):
+        if len(self.series) < 2*num_vals:
+            # Grows, e.g., for the whole history of a two-phase 'Adg' run.
+            self.series = np.zeros(2*num_vals, dtype=np.float64)
+        series = self.series[:2*num_vals]
+        self.split.gsshacomm.Bcast(series, root=0)
+        ts.num_vals = num_vals
+        ts.jul_time = series[:num_vals].ctypes.data_as(ct.POINTER(ct.c_double))
+        ts.val = series[num_vals:].ctypes.data_as(ct.POINTER(ct.c_double))
+
+################################################################################
+if __name__ == '__main__':
+    pass
@@ -4,100 +4,124 @@
 # LICENSE: BSD 3-Clause "New" or "Revised"
 #------------------------------------------------------------------------------#
 from __future__ import absolute_import, print_function
+import logging
 
-import gsshapython.sclass.build_options   as gsshaopts
-import gsshapython.sclass.define_h        as gsshadefine
-import gsshapython.sclass.fnctn_h         as gsshafnctn
-from gsshapython.sclass.timeseriesdefs_h import ts_struct
+import numpy as np
+
+from .coupler_messenger import MSG_SUM, MSG_MAX, MSG_MIN
+from .coupler_backend import REPLAY_ADCIRC
+from .coupler_sampling import time_mean, resample
+
+################################################################################
+log = logging.getLogger(__name__)
 
 ################################################################################
-DEBUG_LOCAL = 1
+def edgestring_eta_stats(ags):
+    '''This PE's edge string eta statistics for gssha_set_bc, and the ops that
+    reduce them over all PEs: per edge string, the sum of eta, and the sum,
+    count, max and min of its change over the last ADCIRC time step.'''
+    # Only nodes owned by this PE, so that ghost nodes are not double-counted.
+    strings = ags.adcircedgestrings
+    eta     = strings.gather(ags.adcirceta2)
+    old_eta = strings.gather(ags.adcirceta1)
+    my_eta_sum = strings.sum_max_min(eta)[0]
+    # Gajanan gkc warning : These are only okay to use if the coupling time step is = adcirc time step!
+    my_avg_delta_eta, my_max_delta_eta, my_min_delta_eta, counts = strings.sum_max_min(eta - old_eta)
+    nes = len(strings)
+    return (list(my_eta_sum) + list(my_avg_delta_eta) + list(counts) + list(my_max_delta_eta) + list(my_min_delta_eta),
+            [MSG_SUM]*nes    + [MSG_SUM]*nes          + [MSG_SUM]*nes + [MSG_MAX]*nes          + [MSG_MIN]*nes)
 
 ################################################################################
-def gssha_set_bc_from_adcirc_depths(ags): # ags is of type adcircgsshatruct.
+def gssha_set_bc_from_adcirc_depths(ags, reduced=None): # ags is of type adcircgsshatruct.
+    '''Set GSSHA's head boundary series one point further from ADCIRC's eta.
 
-    from .adcircgsshastruct import SERIESLENGTH, TIME_TOL
-    assert(ags.mvs[0].yes_head_bound == 1)
-    assert(ags.mvs[0].bound_ts == 1)
-    assert(ags.mvs[0].bound_ts_ptr[0].num_vals > 3)
-    ts = ags.mvs[0].bound_ts_ptr[0]
+    reduced, if given, holds the edge string eta statistics of this window
+    already reduced over all PEs; see edgestring_eta_stats.
+    '''
 
-    if (ags.pu.debug ==ags.pu.on or gsshaopts._DEBUG == gsshadefine.ON) and DEBUG_LOCAL != 0 and ags.myid == 0:
-        print()
+    from .adcircgsshastruct import TIME_TOL, GSSHA_BC_AHEAD
+    assert(ags.gsshamv.yes_head_bound == 1)
+    assert(ags.gsshamv.bound_ts == 1)
+    assert(ags.gsshaboundts.num_vals > 3)
+    ts = ags.gsshaboundts.ts
+    n = ags.gsshaboundts.num_vals
+
+    if ags.myid == 0 and log.isEnabledFor(logging.DEBUG):
         for i in range(ts.num_vals):
-            print('Before:(t,v)[',i,'] = (', ts.jul_time[i],',', ts.val[i],')')
+            log.debug('Before:(t,v)[ %d ] = ( %s , %s )', i, ts.jul_time[i], ts.val[i])
 
     ######################################################
     #SET UP gssha BC from ADCIRC.
     ######################################################
     # Find the value of maximum depth first.
     if (ags.adcircrunflag != ags.pu.off):
-        my_max_delta_eta = -1.0e+200
-        my_min_delta_eta =  1.0e+200
-        count=0.0
-        my_avg_delta_eta=0.0
-        my_eta_sum=0.0
-
-        for inode in range(ags.adcircedgestringnnodes):
-            # -1 needed below since Python is 0 indexed whereas Fortan node numbers are 1-indexed
-            node = ags.adcircedgestringnodes[inode]-1
-            eta     = ags.pg.eta2[node]
-            old_eta = ags.pg.eta1[node]
-            my_eta_sum       += eta
-            # Gajanan gkc warning : These are only okay to use if the coupling time step is = adcirc time step!
-            my_avg_delta_eta += eta - old_eta
-            my_max_delta_eta = max(my_max_delta_eta, eta-old_eta)
-            my_min_delta_eta = min(my_min_delta_eta, eta-old_eta)
-            count += 1.0
+        strings = ags.adcircedgestrings
 
         # Note: Hoping whichever depth is closes to GSSHA current depth works better in damping oscillations than dmax alone!
-        if (ags.pu.messg==ags.pu.on):
-            eta_sum       = ags.pmsg.pymsg_dbl_sum(my_eta_sum      , ags.adcirc_comm_comp)
-            avg_delta_eta = ags.pmsg.pymsg_dbl_sum(my_avg_delta_eta, ags.adcirc_comm_comp)
-            max_delta_eta = ags.pmsg.pymsg_dbl_max(my_max_delta_eta, ags.adcirc_comm_comp)
-            min_delta_eta = ags.pmsg.pymsg_dbl_min(my_min_delta_eta, ags.adcirc_comm_comp)
-            count         = ags.pmsg.pymsg_dbl_sum(count           , ags.adcirc_comm_comp)
-        else:
-            eta_sum       = my_eta_sum
-            avg_delta_eta = my_avg_delta_eta
-            max_delta_eta = my_max_delta_eta
-            min_delta_eta = my_min_delta_eta
-
-        avg_eta = eta_sum/count
+        # All five reductions of all edge strings go in a single collective.
+        if reduced is None and ags.backend.replayed == REPLAY_ADCIRC:
+            # As recorded at ADCIRC's current time step.
+            reduced = ags.pa.etastats(5*len(strings))
+        elif reduced is None:
+            reduced = ags.messenger.allreduce(*edgestring_eta_stats(ags))
+        ags.adcircetastats = reduced
+        reduced = np.array(reduced).reshape(5, len(strings))
+        eta_sum, counts, max_delta_eta, min_delta_eta = reduced[0], reduced[2], reduced[3], reduced[4]
+
+        avg_etas = eta_sum/counts
+        # The edge strings' mean eta across ADCIRC's last run, when sub-sampling.
+        sampling = ags.sampling
+        samples = sampling.adcirc_etas(ags, counts)
+        if samples is not None and sampling.mean:
+            avg_etas = time_mean(*samples)
+        avg_eta = strings.head(avg_etas)
         #avg_delta_eta = avg_delta_eta/count # Previous time step
         avg_delta_eta    = avg_eta - ags.adcirc_hprev #Previous stopped ADCIRC time.
         ags.adcirc_hprev = avg_eta
-        ags.adcirc_hprev_len = count
-
-        if ags.pu.debug == ags.pu.on or DEBUG_LOCAL != 0:
-            print("PE[",ags.myid,"] Edge string(",ags.adcircedgestringid,"): Average eta = ", avg_eta)
-            print("PE[",ags.myid,"] Edge string(",ags.adcircedgestringid,"): Maximum delta_eta = ", max_delta_eta)
-            print("PE[",ags.myid,"] Edge string(",ags.adcircedgestringid,"): Minimum delta_eta = ", min_delta_eta)
-            print("PE[",ags.myid,"] Edge string(",ags.adcircedgestringid,"): Average delta_eta = ", avg_delta_eta)
-
-        if ags.couplingtype == 'gdAdg':
-            DT = 0.0
-            #while (ags.mvs[0].niter*ags.gsshatimefact+DT < ags.sm[0].submodel[0].t_prev+ags.adcircdt-TIME_TOL):
-            #assert(ags.mvs[0].timer*ags.gsshatimefact -TIME_TOL < ags.sm[0].submodel[0].t_prev+ags.adcircdt+TIME_TOL and ags.mvs[0].timer*ags.gsshatimefact + TIME_TOL> ags.sm[0].submodel[0].t_prev)
-            while (ags.mvs[0].timer*ags.gsshatimefact + DT < ags.adcirctprev+ags.adcircdt-TIME_TOL):
-                DT += ags.effectivegsshadt
+        ags.adcirc_hprevs = avg_etas
+        ags.adcirc_hprev_len = float(np.sum(counts))
+
+        if log.isEnabledFor(logging.DEBUG):
+            for i, es in enumerate(strings):
+                log.debug("Edge string( %d ): Average eta = %s", es.id+1, avg_etas[i])
+                log.debug("Edge string( %d ): Maximum delta_eta = %s", es.id+1, max_delta_eta[i])
+                log.debug("Edge string( %d ): Minimum delta_eta = %s", es.id+1, min_delta_eta[i])
+            log.debug("Edge strings: Average eta = %s , Average delta_eta = %s", avg_eta, avg_delta_eta)
+
+        if ags.couplingtype in GSSHA_BC_AHEAD:
+            #while (ags.gsshamv.niter*ags.gsshatimefact+DT < ags.sm[0].submodel[0].t_prev+ags.adcircdt-TIME_TOL):
+            #assert(ags.gsshamv.timer*ags.gsshatimefact -TIME_TOL < ags.sm[0].submodel[0].t_prev+ags.adcircdt+TIME_TOL and ags.gsshamv.timer*ags.gsshatimefact + TIME_TOL> ags.sm[0].submodel[0].t_prev)
+            DT = ags.schedule.gssha_lead(ags)
         else: # For adg and adgda:
             pass
         #DT = 0.0
-        #while (ags.mvs[0].niter*ags.gsshatimefact+DT < ags.sm[0].submodel[0].t_prev-ags.effectivegsshadt+TIME_TOL):
+        #while (ags.gsshamv.niter*ags.gsshatimefact+DT < ags.sm[0].submodel[0].t_prev-ags.effectivegsshadt+TIME_TOL):
         #    DT += ags.effectivegsshadt
         #if ags.couplingtype == 'gdAdg':
         #    DT += ags.effectivegsshadt
         #print(DT, DT/86400.0)
 
+        # Start of this window's points, and the head value it ends with:
+        # the last one plus ADCIRC's change, from the last sample, not from
+        # points continued past it.
+        interp = ags.exchangeinterp
+        jul_time, val = ags.gsshaboundts.views()
+        tstart = jul_time[n-2]
+        head = (val[n-1] if interp.head.count == 0 else interp.head.newest()[0]) + avg_delta_eta
+        npoints = interp.npoints(n)
+        points = (samples is not None and sampling.series and ags.couplingtype not in GSSHA_BC_AHEAD)
+        if points:
+            npoints = sampling.npoints(n)
+
         # Shift the time series
-        for i in range(ts.num_vals-1):
-            ts.jul_time[i] = ts.jul_time[i+1]
-            ts.val[i]      = ts.val[i+1]
-        ts.last_access = ts.last_access-1
+        for i in range(npoints):
+            ags.gsshaboundts.shift()
+        jul_time, val = ags.gsshaboundts.views()
 
         # Add the new value of time.
-        ts.jul_time[ts.num_vals-2] = ags.gsshatstartjul+(ags.adcirctprev/86400.0) # Have to convert ADCIRC current time to corresponding next GSSHA Julian time.
+        jul_time[n-2] = ags.gsshatstartjul+(ags.adcirctprev/86400.0) # Have to convert ADCIRC current time to corresponding next GSSHA Julian time.
+        if interp.cubic:
+            interp.head.append(jul_time[n-2], head)
 
         ######################################################################################
         # Gajanan gkc. We need to decide what to use here. Stability is likely going to get
@@ -113,30 +137,42 @@ def gssha_set_bc_from_adcirc_depths(ags): # ags is of type adcircgsshatruct.
         #ts.val[ts.num_vals-2] += delta_eta
 
         # TYPE 2  -  This uses average change in depth.
-        ts.val[ts.num_vals-2] += avg_delta_eta
+        val[n-2] += avg_delta_eta
 
         ######################################################################################
 
 
-        if ags.couplingtype == 'gdAdg':
+        if ags.couplingtype in GSSHA_BC_AHEAD:
             #ts.jul_time[ts.num_vals-2] += max(ags.effectivegsshadt, ags.adcircdt)/86400.0 #Julian
-            ts.jul_time[ts.num_vals-2] = ags.mvs[0].btime + DT/86400.0 #Julian
+            jul_time[n-2] = ags.gsshamv.btime + DT/86400.0 #Julian
+        if interp.cubic:
+            # Points across the window from the monotone cubic through the
+            # last samples, continued past the newest one when ahead of it.
+            times = interp.subtimes(tstart, jul_time[n-2], npoints)
+            jul_time[n-1-npoints:n-1] = times
+            val[n-1-npoints:n-1] = interp.head.evaluate(times)[:, 0]
+        elif points:
+            # Points across the window, following ADCIRC's samples from the
+            # head value it ends with.
+            times = interp.subtimes(samples[0][0], samples[0][-1], npoints)
+            heads = np.array([strings.head(etas) for etas in resample(samples[0], samples[1], times)])
+            jul_time[n-1-npoints:n-1] = ags.gsshatstartjul + times/86400.0
+            val[n-1-npoints:n-1] = head + (heads - avg_eta)
         # For round of errors:
-        ts.jul_time[ts.num_vals-1] = ts.jul_time[ts.num_vals-2] + (TIME_TOL/86400.0)
-        ts.val[ts.num_vals-1]      = ts.val[ts.num_vals-2]
+        jul_time[n-1] = jul_time[n-2] + (TIME_TOL/86400.0)
+        val[n-1]      = val[n-2]
     else:
 
-        for i in range (ts.num_vals-1):
-            ts.jul_time[i] = ts.jul_time[i+1]
-            ts.val[i]      = ts.val[i+1]
-        ts.jul_time[ts.num_vals-1] += ts.jul_time[ts.num_vals-3]-ts.jul_time[ts.num_vals-4]
+        ags.gsshaboundts.shift()
+        jul_time, val = ags.gsshaboundts.views()
+        jul_time[n-1] += jul_time[n-3]-jul_time[n-4]
 
-    if (ags.pu.debug ==ags.pu.on or gsshaopts._DEBUG == gsshadefine.ON) and DEBUG_LOCAL != 0 and ags.myid == 0:
-        print('Current GSSHA julian time =', ags.mvs[0].btime)
-        #assert(ags.mvs[0].btime <= ts.jul_time[ts.num_vals-2])
-        #assert(ags.mvs[0].btime >= ts.jul_time[0])
+    if ags.myid == 0 and log.isEnabledFor(logging.DEBUG):
+        log.debug('Current GSSHA julian time = %s', ags.gsshamv.btime)
+        #assert(ags.gsshamv.btime <= ts.jul_time[ts.num_vals-2])
+        #assert(ags.gsshamv.btime >= ts.jul_time[0])
         for i in range(ts.num_vals):
-            print('After :(t,v)[',i,'] = (', ts.jul_time[i],',', ts.val[i],')')
+            log.debug('After :(t,v)[ %d ] = ( %s , %s )', i, ts.jul_time[i], ts.val[i])
 
 ############################################################################################################
 if __name__ == '__main__':
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import time
+import logging
+import threading
+
+from .coupler_timers import PHASE_GSSHA_RUN, PHASE_GSSHA_WAIT
+
+################################################################################
+log = logging.getLogger(__name__)
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Runs shorter than this, in s, are too short to tell whether the models
+# overlapped.
+MIN_CHECKED_RUN = 0.01
+# The models must overlap for at least this fraction of the shorter run.
+MIN_OVERLAP = 0.5
+
+################################################################################
+class gsshathread(): #Note: This is not a ctypes Structure!!!!
+    '''Runs main_gssha_run in a background thread, for the concurrent 'A|g'
+    coupling type, while the main thread runs ADCIRC. Only used on PE 0.
+
+    GIL and thread-safety requirements:
+     - main_gssha_run must release the GIL while it runs. ctypes does so for
+       functions of a ctypes.CDLL (not ctypes.PyDLL) library, which is how
+       gsshapython loads GSSHA. GSSHA must not call back into Python.
+     - pyadcirc_run should release the GIL too, i.e., pyADCIRC should be
+       built with f2py's `threadsafe` statement. Otherwise ADCIRC holds the
+       GIL for its whole run, and the GSSHA thread gets going only if it
+       reaches its ctypes call before ADCIRC starts. start() waits for the
+       thread to get there, which makes this very likely but not certain;
+       the results are the same either way, only the overlap is lost.
+       check_overlap() times the overlap of the first window long enough
+       to tell, and warns if the models ran in turn instead.
+     - GSSHA never calls MPI, and the thread never calls the messenger, so
+       MPI only needs MPI_THREAD_FUNNELED: all collectives stay on the main
+       thread. With a dedicated GSSHA rank, the thread sends and receives
+       the remotegssha messages, which needs MPI_THREAD_MULTIPLE.
+     - While the thread runs, the main thread must not touch GSSHA's
+       main_var_struct or its boundary series. All exchanges happen after
+       join().
+     - ADCIRC and GSSHA share no memory, but they may both write to stdout,
+       so their outputs can interleave.
+    '''
+    def __init__(self, ags):
+        self.ags = ags
+        self.thread = None
+        self.ierr_code = 0
+        self.error = None
+        self.started = threading.Event()
+        # Start and end of the last GSSHA run, by clock().
+        self.run = None
+        self.checked = False
+
+    #--------------------------------------------------------------------------#
+    def _run(self):
+        try:
+            with self.ags.timers.phase(PHASE_GSSHA_RUN):
+                self.started.set()
+                # Only taken once the thread holds the GIL, so GSSHA starts
+                # right after, not while another call holds the GIL.
+                start = _clock()
+                self.ierr_code = self.ags.gsshafnctn.main_gssha_run(self.ags.mvs)
+                self.run = (start, _clock())
+        except BaseException as err:
+            self.error = err
+        finally:
+            self.started.set()
+
+    #--------------------------------------------------------------------------#
+    def start(self):
+        '''Start running GSSHA up to its current niter/single_event_end.'''
+        assert(self.thread is None)
+        self.ierr_code = 0
+        self.error = None
+        self.run = None
+        self.started.clear()
+        self.thread = threading.Thread(target=self._run, name='gssha')
+        self.thread.daemon = True
+        self.thread.start()
+        self.started.wait()
+
+    #--------------------------------------------------------------------------#
+    def join(self):
+        '''Wait for GSSHA to reach the end of the coupling window.'''
+        assert(self.thread is not None)
+        with self.ags.timers.phase(PHASE_GSSHA_WAIT):
+            self.thread.join()
+        self.thread = None
+        if self.error is not None:
+            raise self.error
+        assert(self.ierr_code == 0)
+
+    #--------------------------------------------------------------------------#
+    @staticmethod
+    def clock():
+        '''The clock, in s, of the runs that check_overlap compares.'''
+        return _clock()
+
+    #--------------------------------------------------------------------------#
+    def check_overlap(self, adcircrun):
+        '''Warn, once, if ADCIRC's run of the window just joined, its start
+        and end by clock(), overlapped GSSHA's for less than MIN_OVERLAP of
+        the shorter one: then one of them held the GIL, and the models ran
+        in turn. Windows where either run is shorter than MIN_CHECKED_RUN
+        are skipped. Returns the overlap in s, or None if not checked.'''
+        if self.checked or adcircrun is None or self.run is None:
+            return None
+        shorter = min(adcircrun[1]-adcircrun[0], self.run[1]-self.run[0])
+        if shorter < MIN_CHECKED_RUN:
+            return None
+        self.checked = True
+        overlap = max(0.0, min(adcircrun[1], self.run[1]) - max(adcircrun[0], self.run[0]))
+        if overlap < MIN_OVERLAP*shorter:
+            log.warning("Running A|g without overlap: ADCIRC and GSSHA ran at the same time for "
+                        "%.3g s of the %.3g s of the shorter run of the first window timed, so "
+                        "pyadcirc_run or main_gssha_run holds the GIL; the results are those of "
+                        "A|g, but the wall time is that of AdgdA", overlap, shorter)
+        else:
+            log.debug("A|g: ADCIRC and GSSHA overlapped for %.3g s of %.3g s", overlap, shorter)
+        return overlap
+
+################################################################################
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Ensemble driver of watercoupler: runs the members of a JSON manifest, each a
+coupled run of python -m watercoupler, on a local pool of cores.
+
+Usage: python -m watercoupler.ensemble [options] <manifest.json>
+
+The manifest lists the members, with defaults for all of them:
+    {"workdir"  : "ensemble",
+     "cores"    : 32,
+     "mpirun"   : ["mpirun", "-np"],
+     "copy"     : ["*.out"],
+     "defaults" : {"source": "base", "args": ["3", "gdA", "Stream.prj", "fort"]},
+     "members"  : [{"name": "storm1-240",
+                    "files": {"Stream.gag": "rain/storm1.gag"},
+                    "env": {"WATERCOUPLER_COUPLING_DTFACTOR": "240"}},
+                   {"name": "storm1-AdgdA-np8", "np": 8,
+                    "args": ["3", "AdgdA", "Stream.prj", "fort"]}]}
+A member takes its defaults, and its env is added to theirs. Its source
+directory tree is hard-linked into <workdir>/<name>, but for the files that
+the models write, of COPY_PATTERNS and copy, which are copied; its files,
+e.g., a precipitation file, are then linked over it, and it runs there with its args,
+its env, and, with np > 1, under the MPI launcher. Relative paths are relative
+to the manifest's directory.
+
+Every member's exit status and the timing summary of its main.py log go to
+<workdir>/results.csv. The driver returns 0 if every member succeeded.
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import csv
+import fnmatch
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+from watercoupler.watercoupler_logging import configure_logging
+
+################################################################################
+log = logging.getLogger("watercoupler.ensemble") # Not __name__: may run as __main__.
+
+# Files that the models write, which must not be hard links shared with the
+# source and the other members, should the source hold them from an earlier
+# run: ADCIRC's log, global and station outputs, hot start files, and the
+# fort.20 replacement of the file flux exchange mode, and GSSHA's summary,
+# outlet and location hydrographs, and channel depths and discharges.
+ADCIRC_OUTPUTS = ['fort.16', 'fort.33', 'fort.6?', 'fort.7?', 'max*.63', 'min*.63',
+                  'fort.67', 'fort.68', 'fort.20.new.*']
+GSSHA_OUTPUTS = ['*.sum', '*.otl', '*.ohl', '*.cdp', '*.cdq']
+COPY_PATTERNS = ADCIRC_OUTPUTS + GSSHA_OUTPUTS
+MEMBER_LOG = 'watercoupler.out'
+RESULTS = 'results.csv'
+RESULT_FIELDS = ['name', 'np', 'status', 'initialize', 'run', 'finalize', 'total', 'wall', 'directory']
+# Timing summary that main() logs at the end of a run.
+_TIMING = re.compile(r'(Initialize|Run|Finalize|Total) time\s*=\s*(\S+)')
+_POLL = 0.05 # s
+
+################################################################################
+def available_cores():
+    '''Cores this process may run on.'''
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+#------------------------------------------------------------------------------#
+def link_tree(source, directory, copy=COPY_PATTERNS):
+    '''Hard-link the files of the source tree into directory, but copy those
+    matching copy, and those of a source on another file system.'''
+    linked = True
+    for root, dirs, files in os.walk(source):
+        target = os.path.join(directory, os.path.relpath(root, source))
+        if not os.path.isdir(target):
+            os.makedirs(target)
+        for name in files:
+            src, dst = os.path.join(root, name), os.path.join(target, name)
+            if linked and not any(fnmatch.fnmatch(name, pattern) for pattern in copy):
+                try:
+                    os.link(src, dst)
+                    continue
+                except OSError as err:
+                    log.warning("Copying, not hard-linking, %s into %s: %s", source, directory, err)
+                    linked = False
+            shutil.copy2(src, dst)
+
+################################################################################
+class ensemblemember(): #Note: This is not a ctypes Structure!!!!
+    '''One coupled run of an ensemble, in its own directory.'''
+    def __init__(self, spec, defaults, basedir, workdir):
+        merged = dict(defaults)
+        merged.update(spec)
+        merged['env'] = dict(defaults.get('env', {}), **spec.get('env', {}))
+        if 'name' not in spec:
+            raise ValueError("Ensemble member without a name: {0}".format(spec))
+        if 'source' not in merged or 'args' not in merged:
+            raise ValueError("Ensemble member '{0}' needs a source and args".format(spec['name']))
+        self.name = str(spec['name'])
+        self.source = os.path.join(basedir, merged['source'])
+        self.files = dict((dst, os.path.join(basedir, src)) for dst, src in merged.get('files', {}).items())
+        self.args = [str(arg) for arg in merged['args']]
+        self.env = dict((str(key), str(value)) for key, value in merged['env'].items())
+        self.np = int(merged.get('np', 1))
+        self.directory = os.path.join(workdir, self.name)
+        self.process = None
+        self.logfile = None
+        self.t0 = 0.0
+        self.result = {'name': self.name, 'np': self.np, 'status': '', 'directory': self.directory}
+
+    #--------------------------------------------------------------------------#
+    def prepare(self, copy, force=False):
+        '''Link the member's input files into its directory.'''
+        if os.path.exists(self.directory):
+            if not force:
+                raise ValueError("Ensemble member directory {0} exists; remove it, or "
+                                 "rerun with --force".format(self.directory))
+            shutil.rmtree(self.directory)
+        link_tree(self.source, self.directory, copy)
+        for dst, src in self.files.items():
+            pathname = os.path.join(self.directory, dst)
+            if os.path.lexists(pathname):
+                os.remove(pathname)
+            elif not os.path.isdir(os.path.dirname(pathname)):
+                os.makedirs(os.path.dirname(pathname))
+            try:
+                os.link(src, pathname)
+            except OSError:
+                shutil.copy2(src, pathname)
+
+    #--------------------------------------------------------------------------#
+    def command(self, mpirun):
+        args = self.args
+        if not any(arg.startswith('--log-level') for arg in args):
+            # The timing summary is logged at INFO.
+            args = ['--log-level=INFO'] + args
+        command = [sys.executable, '-m', 'watercoupler'] + args
+        if self.np > 1:
+            command = list(mpirun) + [str(self.np)] + command
+        return command
+
+    #--------------------------------------------------------------------------#
+    def start(self, mpirun):
+        env = dict(os.environ)
+        env.update(self.env)
+        # The member runs this watercoupler, wherever it is run from.
+        package = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env['PYTHONPATH'] = os.pathsep.join([package, env.get('PYTHONPATH', '')])
+        pathname = os.path.join(self.directory, MEMBER_LOG)
+        if os.path.lexists(pathname):
+            # A link to the source's, which must not be written through.
+            os.remove(pathname)
+        self.logfile = open(pathname, 'w')
+        self.t0 = time.time()
+        self.process = subprocess.Popen(self.command(mpirun), cwd=self.directory, env=env,
+                                        stdout=self.logfile, stderr=subprocess.STDOUT)
+        log.info("Started  %s (np = %d)", self.name, self.np)
+
+    #--------------------------------------------------------------------------#
+    def poll(self):
+        '''True once the member has finished, with its result set.'''
+        status = self.process.poll()
+        if status is None:
+            return False
+        self.logfile.close()
+        self.result['status'] = status
+        self.result['wall'] = time.time() - self.t0
+        with open(os.path.join(self.directory, MEMBER_LOG)) as logfile:
+            for line in logfile:
+                match = _TIMING.search(line)
+                if match and match.group(1).lower() not in self.result:
+                    self.result[match.group(1).lower()] = float(match.group(2))
+        log.info("Finished %s: status %d, %.1f s", self.name, status, self.result['wall'])
+        return True
+
+    #--------------------------------------------------------------------------#
+    def terminate(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+            self.logfile.close()
+            self.result['status'] = 'terminated'
+
+################################################################################
+class ensemble(): #Note: This is not a ctypes Structure!!!!
+    '''The members of a manifest, run on a budget of cores.
+
+    MPI members (np > 1) start first, largest first, as many at a time as
+    their ranks fit in the cores, and the serial members take the cores they
+    leave free, one each. While an MPI member waits for cores, no serial
+    member starts, so that the serial members cannot hold it back for good;
+    smaller MPI members still start on the cores it waits for. The cores are
+    only counted: members are not pinned to them, so concurrent MPI members
+    need a launcher that does not bind their ranks to the same cores, e.g.,
+    "mpirun": ["mpirun", "--bind-to", "none", "-np"] with Open MPI.
+    '''
+    def __init__(self, manifest, workdir=None, cores=None):
+        with open(manifest) as manifestfile:
+            spec = json.load(manifestfile)
+        basedir = os.path.dirname(os.path.abspath(manifest))
+        self.workdir = os.path.join(basedir, workdir or spec.get('workdir', 'ensemble'))
+        self.cores = int(cores or spec.get('cores', 0) or available_cores())
+        self.mpirun = spec.get('mpirun', ['mpirun', '-np'])
+        self.copy = COPY_PATTERNS + list(spec.get('copy', []))
+        defaults = spec.get('defaults', {})
+        self.members = [ensemblemember(member, defaults, basedir, self.workdir)
+                        for member in spec.get('members', [])]
+        names = [member.name for member in self.members]
+        if not names:
+            raise ValueError("Ensemble manifest {0} lists no member".format(manifest))
+        if len(set(names)) != len(names):
+            raise ValueError("Ensemble member names must be distinct")
+        for member in self.members:
+            if member.np > self.cores:
+                log.warning("Member %s needs %d cores, more than %d: it runs alone, oversubscribed",
+                            member.name, member.np, self.cores)
+
+    #--------------------------------------------------------------------------#
+    def run(self, force=False):
+        '''Prepare and run all members. Returns their results, in manifest order.'''
+        for member in self.members:
+            member.prepare(self.copy, force)
+        mpi = sorted([m for m in self.members if m.np > 1], key=lambda m: -m.np)
+        serial = [m for m in self.members if m.np == 1]
+        log.info("Ensemble of %d members (%d MPI, %d serial) on %d cores, in %s",
+                 len(self.members), len(mpi), len(serial), self.cores, self.workdir)
+        self._schedule(mpi + serial)
+        return [member.result for member in self.members]
+
+    #--------------------------------------------------------------------------#
+    def _schedule(self, pending):
+        running, free = [], self.cores
+        try:
+            while pending or running:
+                # Start every pending member that fits, or one alone if none
+                # runs, but no serial member while an MPI member waits.
+                waiting = False
+                for member in list(pending):
+                    if member.np == 1 and waiting:
+                        break
+                    if member.np <= free or not running:
+                        pending.remove(member)
+                        member.start(self.mpirun)
+                        running.append(member)
+                        free -= member.np
+                    else:
+                        waiting = True
+                finished = [member for member in running if member.poll()]
+                for member in finished:
+                    running.remove(member)
+                    free += member.np
+                if not finished:
+                    time.sleep(_POLL)
+        finally:
+            for member in running:
+                member.terminate()
+
+    #--------------------------------------------------------------------------#
+    def report(self, results, pathname=None):
+        '''Write the results table to pathname, <workdir>/results.csv by default.'''
+        pathname = pathname or os.path.join(self.workdir, RESULTS)
+        with open(pathname, 'w') as csvfile:
+            writer = csv.DictWriter(csvfile, RESULT_FIELDS)
+            writer.writeheader()
+            for result in results:
+                writer.writerow(result)
+        log.info("%-24s %4s %10s %10s %10s", 'member', 'np', 'status', 'run s', 'wall s')
+        for result in results:
+            log.info("%-24s %4d %10s %10.1f %10.1f", result['name'], result['np'], result['status'],
+                     result.get('run', float('nan')), result.get('wall', float('nan')))
+        log.info("Results in %s", pathname)
+
+################################################################################
+def main(args=None):
+    '''Run the ensemble of a manifest. Returns 0 if every member succeeded.'''
+    parser = argparse.ArgumentParser(
+        prog='python -m watercoupler.ensemble',
+        description='Runs an ensemble of coupled watercoupler runs on a local pool of cores.')
+    parser.add_argument('manifest', metavar='<manifest.json>', help='ensemble manifest')
+    parser.add_argument('--workdir', metavar='<dir>', default=None,
+                        help="overrides the manifest's workdir")
+    parser.add_argument('--cores', metavar='<n>', type=int, default=None,
+                        help="overrides the manifest's cores, by default the available cores")
+    parser.add_argument('--force', action='store_true',
+                        help='remove existing member directories instead of stopping')
+    parser.add_argument('--log-level', metavar='<DEBUG|INFO|WARNING|ERROR>', default=None,
+                        help='overrides the WATERCOUPLER_LOG_LEVEL environment variable')
+    parsed = parser.parse_args(sys.argv[1:] if args is None else args)
+    configure_logging(level=parsed.log_level)
+
+    try:
+        runs = ensemble(parsed.manifest, parsed.workdir, parsed.cores)
+        results = runs.run(parsed.force)
+    except (IOError, ValueError) as err:
+        log.error("\n%s", err)
+        return -1
+    runs.report(results)
+    return 0 if all(result['status'] == 0 for result in results) else 1
+
+################################################################################
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,8 +9,12 @@ Main function of watercoupler, calling inititialize, run, and finalize.
 
 from __future__ import absolute_import, print_function
 from sys import version_info as _version_info
+import os
+import sys
 import time
+import argparse
 import ctypes as _ct
+import logging
 
 if (__package__ == 'watercoupler'):
     from . import watercoupler_path as _watercoupler_path
@@ -19,88 +23,263 @@ elif (__name__ == '__main__'):
 else:
     from . import watercoupler_path as _watercoupler_path
 
-from watercoupler.coupler.adcircgsshastruct import  adcircgsshastruct
+from watercoupler.watercoupler_logging import configure_logging, logging_rank, set_logging_rank
+from watercoupler.watercoupler_version import __version__
+from watercoupler.coupler.coupler_arguments import COUPLING_TYPES, ONE_WAY_TYPES, parse_edgestrings, \
+        parse_watersheds
+from watercoupler.coupler.coupler_backend import BACKENDS, BACKEND_NATIVE, BACKEND_SYNTHETIC, \
+        REPLAY_ADCIRC, REPLAY_GSSHA
+# NumPy, the coupler and the model libraries are imported in main(), once the
+# command line is known to be good, so that --help, --version and mistakes on
+# the command line cost milliseconds rather than loading both models.
 
 ################################################################################
-DEBUG_LOCAL = 1
+log = logging.getLogger("watercoupler.main") # Not __name__: main.py may run as __main__.
 
 __all__ = ['main'] # The only thing from this module to import if needed.
 
+# Optional arguments that are also flags without a value: '--dry-run' stands
+# for '--dry-run=', so that a bare flag never takes the next positional.
+_FLAGS_WITH_VALUE = ['--dry-run', '--restart']
+_SYNTHETIC_PREFIX = '--synthetic-'
+
+#------------------------------------------------------------------------------#
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='watercoupler',
+        usage='python -m watercoupler [options] <edge strings> <coupling type> <GSSHA project> <ADCIRC model>',
+        description='Couples ADCIRC (hydrodynamic) and GSSHA (hydrologic) models '
+                    'through ADCIRC open boundary edge strings and the GSSHA outlet.',
+        epilog='Environment variables WATERCOUPLER_* further configure the run; see README.md.')
+    parser.add_argument('edgestrings', metavar='<edge strings>',
+                        help="coupled ADCIRC edge string ID, or several, e.g., 3,5 or 3:0.6,5:0.4, "
+                             "where the optional fractions split GSSHA's outlet discharge among them")
+    parser.add_argument('couplingtype', metavar='<coupling type>', choices=COUPLING_TYPES,
+                        help='one of: '+', '.join(COUPLING_TYPES))
+    parser.add_argument('gsshaproject', metavar='<GSSHA project>', help='GSSHA project file name')
+    parser.add_argument('adcircmodel', metavar='<ADCIRC model>',
+                        help='ADCIRC input file names without extension')
+    parser.add_argument('--version', action='version', version='%(prog)s '+__version__)
+    parser.add_argument('--log-level', metavar='<DEBUG|INFO|WARNING|ERROR>', default=None,
+                        help='overrides the WATERCOUPLER_LOG_LEVEL environment variable')
+    parser.add_argument('--backend', metavar='<'+'|'.join(BACKENDS)+'>', default=BACKEND_NATIVE,
+                        choices=BACKENDS,
+                        help='synthetic runs on the NumPy/ctypes stand-ins of watercoupler.synthetic '
+                             'instead of ADCIRC and GSSHA, sized and costed with '
+                             '--synthetic-<option>=<value>; the model file names are then ignored')
+    parser.add_argument('--dry-run', metavar='<file>', default=None,
+                        help='initialize both models and print the coupling schedule, i.e., every '
+                             "window's ADCIRC and GSSHA start and end times, without running either "
+                             'model; --dry-run=<file>.csv or .json writes it to a file instead')
+    parser.add_argument('--restart', metavar='<dir>', default=None,
+                        help='carry on from the coupler checkpoint, in WATERCOUPLER_CHECKPOINT_DIR '
+                             'or in --restart=<dir>, at the time step ADCIRC is hot started from')
+    parser.add_argument('--replay', metavar='<archive>', default=None,
+                        help='replay one model from a coupling archive (see WATERCOUPLER_ARCHIVE) '
+                             'and run the other: with gdA, GSSHA is replayed and ADCIRC runs; '
+                             'with Adg, ADCIRC is replayed and GSSHA runs')
+    parser.add_argument('--watersheds', action='store_true',
+                        help='couple several GSSHA watersheds, with gdA: <GSSHA project> is then a '
+                             'manifest of one <GSSHA project> <edge strings> line per watershed, '
+                             'and <edge strings> lists all of theirs, in order; every watershed '
+                             'runs on its own dedicated MPI rank, the last ones')
+    return parser
+
+#------------------------------------------------------------------------------#
+def _parse_args(parser, args):
+    '''Parsed arguments and the --synthetic-<option>=<value> options, as a
+    dict. Exits, like argparse, on a bad command line.'''
+    args = [arg+'=' if arg in _FLAGS_WITH_VALUE else arg for arg in args]
+    parsed, unknown = parser.parse_known_args(args)
+    options, unrecognized = {}, []
+    for arg in unknown:
+        if arg.startswith(_SYNTHETIC_PREFIX) and '=' in arg:
+            name, value = arg[len(_SYNTHETIC_PREFIX):].split('=', 1)
+            options[name] = value
+        else:
+            unrecognized.append(arg)
+    if unrecognized:
+        parser.error('unrecognized arguments: '+' '.join(unrecognized))
+    if options and parsed.backend != BACKEND_SYNTHETIC:
+        parser.error('--synthetic-* options need --backend='+BACKEND_SYNTHETIC)
+    try:
+        parse_edgestrings(parsed.edgestrings)
+    except ValueError as err:
+        parser.error(str(err))
+    if parsed.restart == '':
+        parsed.restart = os.environ.get('WATERCOUPLER_CHECKPOINT_DIR', '')
+        if parsed.restart == '':
+            parser.error('--restart needs WATERCOUPLER_CHECKPOINT_DIR, or --restart=<checkpoint directory>')
+    if parsed.replay is not None:
+        if parsed.couplingtype not in ONE_WAY_TYPES:
+            parser.error('--replay needs a one-way coupling type: '+', '.join(ONE_WAY_TYPES))
+        if parsed.restart is not None:
+            parser.error('--replay cannot be combined with --restart')
+    if parsed.watersheds:
+        if parsed.couplingtype != 'gdA':
+            parser.error('--watersheds needs coupling type gdA')
+        if parsed.replay is not None:
+            parser.error('--watersheds cannot be combined with --replay')
+    return parsed, options
+
 #------------------------------------------------------------------------------#
-def _getargcargv():
-    '''Get argc and argv into Python 2 or 3 version-independently.
+def _missing_inputs(parsed):
+    '''Input files of the command line that do not exist.
 
-    The Py_GetArgcArgv function returns argv[i] as c_wchar_p in Python 3x and
-    c_char_p in Python 2x. We need them to be of type c_char_p since that is the
-    correct equivalent to a NULL terminated string, char *, in C.
+    The synthetic backend ignores the model file names, but not a watershed
+    manifest. ADCIRC ignores its
+    own, and reads fort.15 from the working directory, or, in parallel, from
+    the PE directories that adcprep writes.
     '''
+    missing = []
+    if parsed.watersheds and not os.path.isfile(parsed.gsshaproject):
+        missing.append(parsed.gsshaproject)
+    elif parsed.backend == BACKEND_NATIVE:
+        projects = [parsed.gsshaproject]
+        if parsed.watersheds:
+            try:
+                projects = [prj for prj, ids, fractions in parse_watersheds(parsed.gsshaproject)]
+            except ValueError:
+                projects = [] # Reported by main()
+        missing += [prj for prj in projects if not os.path.isfile(prj)]
+        if not (os.path.isfile('fort.15') or os.path.isfile(os.path.join('PE0000', 'fort.15'))):
+            missing.append('fort.15')
+    if parsed.replay is not None and not os.path.isfile(parsed.replay):
+        missing.append(parsed.replay)
+    return missing
 
-    argc = _ct.c_int()
-    if (_version_info < (3, 0)):
-        # Python 2x
-        argv = _ct.POINTER(_ct.c_char_p)()
-        _ct.pythonapi.Py_GetArgcArgv(_ct.byref(argc), _ct.byref(argv))
-    else:
-        # Python 3x
-        argw = _ct.POINTER(_ct.c_wchar_p)()
-        _ct.pythonapi.Py_GetArgcArgv(_ct.byref(argc), _ct.byref(argw))
-        argv = (_ct.c_char_p*argc.value)()
-        for i in range(argc.value):
-            argv[i] = argw[i].encode()
-        argv = _ct.cast(argv, _ct.POINTER(_ct.c_char_p))
+#------------------------------------------------------------------------------#
+def _read_watersheds(parsed):
+    '''Watersheds of the --watersheds manifest, checked against the edge
+    strings of the command line, or None without --watersheds.'''
+    if not parsed.watersheds:
+        return None
+    watersheds = parse_watersheds(parsed.gsshaproject)
+    ids = [i for prj, watershedids, fractions in watersheds for i in watershedids]
+    if ids != parse_edgestrings(parsed.edgestrings)[0]:
+        raise ValueError("Edge strings {0} do not match those of watershed manifest {1}: {2}".format(
+            parsed.edgestrings, parsed.gsshaproject, ','.join(str(i+1) for i in ids)))
+    return watersheds
 
-    return argc, argv
+#------------------------------------------------------------------------------#
+def _cargv(args):
+    '''argc and argv as ctypes, the NULL terminated strings (char *) that
+    coupler_initialize takes, of a list of str.'''
+    if (_version_info >= (3, 0)):
+        args = [arg.encode() for arg in args]
+    argv = (_ct.c_char_p*len(args))(*args)
+    return _ct.c_int(len(args)), _ct.cast(argv, _ct.POINTER(_ct.c_char_p))
 
 ################################################################################
-def main():
+def main(args=None):
     """Main function of watercoupler.
 
-    Requires 4 command line arguments.
-    The format is : python -m watercoupler \\
+    Requires 4 command line arguments, in args or else sys.argv.
+    The format is : python -m watercoupler [options] \\
                         <coupled ADCIRC edge string ID> \\
                         <coupling type identifier> \\
                         <GSSHA project file name> \\
                         <ADCIRC input file names without extension>
-    Coupling type identifier is one of: gdA, Adg, AdgdA, gdAdg.
+    See python -m watercoupler --help for the options.
+
+    The command line is checked before NumPy, the coupler or either model
+    library loads: usage errors exit with status 2, like argparse, and every
+    PE also checks that the input files exist, returning -1 otherwise, with
+    the error logged by PE 0.
     """
 
-    argc, argv = _getargcargv()
+    parsed, options = _parse_args(_parser(), sys.argv[1:] if args is None else args)
+    configure_logging(level=parsed.log_level)
+    couplingtype = parsed.couplingtype
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug('Command line arguments: %s', parsed)
 
-    if (DEBUG_LOCAL == 1):
-        print('Number of arguments passed to python: {0} \nArgs:'.format(
-            argc.value), end = '')
-        [print(argv[i], end = ' ') for i in range(argc.value)]
-        print()
-    if (_version_info < (3, 0)):
-        couplingtype = argv[argc.value-3]
-    else:
-        couplingtype = str(argv[argc.value-3], 'utf-8')
-    if (argc.value<6) or (couplingtype not in ['gdA', 'Adg', 'gdAdg', 'AdgdA']):
-        print("\nProblem with command line arguments.")
-        print("Format is : python -m watercoupler "
-                "<coupled ADCIRC edge string ID> <coupling type> "
-                "<GSSHA model> <ADCIRC model>")
-        print("Coupling type options are: gdA, Adg, AdgdA, gdAdg")
-        print("Exiting without testing.")
+    # Every PE checks, a stat per file, so that all of them stop before the
+    # models load; only PE 0 says why.
+    missing = _missing_inputs(parsed)
+    if missing:
+        if logging_rank() == 0:
+            log.error("\nInput files not found: %s", ', '.join(missing))
         return -1
 
-    print("Coupling type :", argv[argc.value-3])
-    print("ADCIRC project: {0}, coupled edge string ID {1}".format(
-            argv[argc.value-1], argv[argc.value-4]))
-    print("GSSHA project :", argv[argc.value-2])
+    from watercoupler.coupler.adcircgsshastruct import adcircgsshastruct
+    from watercoupler.coupler.coupler_archive import couplerrecording
+    from watercoupler.coupler.coupler_backend import couplerbackend
+    from watercoupler.coupler.gssha_rank import gssharanksplit, gssharankserver
+
+    recording, replayed = None, None
+    log.info("Backend       : %s", parsed.backend)
+    log.info("Coupling type : %s", couplingtype)
+    if parsed.replay is not None:
+        replayed = REPLAY_ADCIRC if couplingtype == 'Adg' else REPLAY_GSSHA
+        try:
+            recording = couplerrecording(parsed.replay)
+            recording.check_edgestrings(*parse_edgestrings(parsed.edgestrings))
+        except ValueError as err:
+            log.error("\n%s", err)
+            return -1
+        log.info("Replaying %s from coupling archive %s", replayed, parsed.replay)
+
+    log.info("ADCIRC project: %s, coupled edge string ID %s",
+             parsed.adcircmodel, parsed.edgestrings)
+    try:
+        watersheds = _read_watersheds(parsed)
+    except (IOError, ValueError) as err:
+        log.error("\n%s", err)
+        return -1
+    if watersheds is not None:
+        log.info("GSSHA projects: %d watersheds of manifest %s", len(watersheds), parsed.gsshaproject)
+        for k, (prj, ids, fractions) in enumerate(watersheds):
+            log.info("  watershed %d: %s, edge strings %s", k+1, prj, ','.join(str(i+1) for i in ids))
+    else:
+        log.info("GSSHA project : %s", parsed.gsshaproject)
+    argc, argv = _cargv([sys.argv[0], parsed.edgestrings, couplingtype,
+                         parsed.gsshaproject, parsed.adcircmodel])
 
     t0 = time.time()
-    print("Initializing watercoupler")
-    ags = adcircgsshastruct()
+    log.info("Initializing watercoupler")
+    try:
+        if watersheds is not None:
+            # Every watershed runs on its own dedicated GSSHA rank.
+            split = gssharanksplit(len(watersheds), parsed.backend)
+        else:
+            split = gssharanksplit.from_environ(parsed.backend)
+        if split is not None and split.isgssharank:
+            # A dedicated GSSHA rank only serves GSSHA runs to ADCIRC's PE 0.
+            set_logging_rank(split.rank)
+            backend = couplerbackend(parsed.backend, options, recording, replayed, split)
+            prj_name = argv[argc.value-2]
+            if watersheds is not None:
+                prj_name = watersheds[split.watershed][0]
+                if (_version_info >= (3, 0)):
+                    prj_name = prj_name.encode()
+            ierr_code = gssharankserver(backend, split).serve(prj_name)
+            split.finalize()
+            return ierr_code
+        ags = adcircgsshastruct(parsed.backend, options, recording, replayed, split)
+    except ValueError as err:
+        log.error("\n%s", err)
+        return -1
+    if ags.backend.config is not None:
+        log.info("Synthetic backend: %s", ags.backend.config)
+    ags.restartdir = parsed.restart
+    ags.watersheds = watersheds
     ags.coupler_initialize(couplingtype, argc, argv)
 
     t1 = time.time()
-    print("Running watercoupler")
-    ags.coupler_run()
+    if parsed.dry_run is not None:
+        log.info("Dry run: writing the coupling schedule without running the models")
+        if ags.myid == 0:
+            ags.schedule.report(parsed.dry_run or None)
+    else:
+        log.info("Running watercoupler")
+        ags.coupler_run()
 
     t2 = time.time()
-    print("Finalizing watercoupler")
+    log.info("Finalizing watercoupler")
     ags.coupler_finalize()
+    if ags.backend.split is not None:
+        ags.backend.split.finalize()
 
     t3 = time.time()
 
@@ -109,15 +288,15 @@ def main():
     tFin = t3-t2
     tTot = t3-t0
 
-    print("Initialize time = {0}".format(tInit))
-    print("Run time        = {0}".format(tRun))
-    print("Finalize time   = {0}".format(tFin))
-    print("Total time      = {0}".format(tTot))
+    log.info("Initialize time = %s", tInit)
+    log.info("Run time        = %s", tRun)
+    log.info("Finalize time   = %s", tFin)
+    log.info("Total time      = %s", tTot)
 
-    print("\nFinished running watercoupler")
+    log.info("\nFinished running watercoupler")
 
     return 0
 
 ################################################################################
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Synthetic stand-ins for ADCIRC (pyADCIRC) and GSSHA (gsshapython).
+
+Used with --backend=synthetic to run, profile and regression test the coupler
+without the model libraries. Only NumPy and ctypes are needed.
+"""
+
+from __future__ import absolute_import, print_function
+
+from .synthetic_config import syntheticconfig, SYNTHETIC_OPTIONS
+from .synthetic_adcirc import syntheticadcirc
+from .synthetic_gssha  import syntheticgssha
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+
+import numpy as np
+
+from .synthetic_config import spend
+
+################################################################################
+UNSET_INT = -99999
+FLUX_LBCODES = [2, 12, 22, 32]  # Flux boundary types read from unit 20
+NODE_SPACING = 100.0           # m, between consecutive mesh nodes
+TIDE_PERIOD = 44712.0          # s, M2
+FLUX_WIDTH = 1000.0            # m, width over which boundary inflow spreads
+STORAGE_DECAY = 1.0E-4         # 1/s, drainage of the boundary storage
+
+################################################################################
+class _module(): #Note: This is not a ctypes Structure!!!!
+    '''Stand-in for one f2py module of pyADCIRC.pyadcirc.'''
+    def __init__(self, **attributes):
+        for name, value in attributes.items():
+            setattr(self, name, value)
+
+################################################################################
+class syntheticadcirc(): #Note: This is not a ctypes Structure!!!!
+    '''Pure NumPy stand-in for pyADCIRC.pyadcirc, running on a single PE.
+
+    Provides the f2py modules and members that watercoupler uses, with the
+    same names and semantics: scalars as attributes, nodal and boundary arrays
+    as NumPy arrays that are never reallocated after pyadcirc_init, and flux
+    boundaries that follow ADCIRC's QTIME1/QTIME2/FTIMINC interpolation and
+    read the next record from unit 20 once the time exceeds QTIME2.
+
+    The mesh is a line of config.nodes nodes, and the flux edge strings are
+    config.boundaries runs of config.edgenodes consecutive nodes. The water
+    surface elevation is an M2 tide of amplitude config.tide plus the water
+    stored at the flux boundary nodes by their inflow. pymessenger reductions
+    return their arguments, since the only PE is the whole communicator.
+
+    Like ADCIRC, it writes hot start files every config.nhsinc time steps,
+    alternating between fort.67 and fort.68, and starts from one of them
+    with config.ihot. Unlike pyADCIRC, it can also save its state in memory
+    and go back to it, which the coupler's iterations need.
+    '''
+    def __init__(self, config):
+        self.config = config
+        self.units = {} # Open files, by unit number.
+
+        self.utilities = _module(on=1, off=0, unset_int=UNSET_INT,
+                messg=(1 if config.messg else 0), debug=0,
+                pycloseopenedfileforread=self.pycloseopenedfileforread,
+                pyfindelapsedtime=self.pyfindelapsedtime)
+        self.sizes = _module(mnproc=1, myproc=0, inputdir=b'.')
+        self.pyglobal = _module(comm=0, pyopenfileforread=self.pyopenfileforread)
+        self.pymesh = _module()
+        self.pymessenger = _module(mpi_comm_adcirc=0,
+                pymsg_dbl_sum=self.pymsg_dbl, pymsg_dbl_max=self.pymsg_dbl,
+                pymsg_dbl_min=self.pymsg_dbl)
+        self.pyboundaries = _module()
+        self.pyadcirc_mod = _module(itime_bgn=1, itime_end=0,
+                pyadcirc_init=self.pyadcirc_init, pyadcirc_run=self.pyadcirc_run,
+                pyadcirc_finalize=self.pyadcirc_finalize,
+                pyadcirc_save_state=self.pyadcirc_save_state,
+                pyadcirc_restore_state=self.pyadcirc_restore_state)
+
+    ############################################################################
+    # pyadcirc_mod
+    ############################################################################
+    def pyadcirc_init(self, comm=None):
+        '''comm, ADCIRC's MPI communicator if given, is kept but not used:
+        this ADCIRC is always a single PE.'''
+        config = self.config
+        pg, pm, pb = self.pyglobal, self.pymesh, self.pyboundaries
+        if comm is not None:
+            self.pymessenger.mpi_comm_adcirc = comm
+            pg.comm = comm
+
+        pg.statim = 0.0
+        pg.rnday = config.rnday
+        pg.dt = config.dt
+        pg.dtdp = config.dt
+        pg.nt = int(round(config.rnday*86400.0/config.dt))
+        pg.nhstar = (1 if config.nhsinc > 0 else 0)
+        pg.nhsinc = config.nhsinc
+        self.hotstartunit = 67
+
+        pm.np = config.nodes
+        pm.x = NODE_SPACING*np.arange(config.nodes, dtype=np.float64)
+        pm.y = np.zeros(config.nodes, dtype=np.float64)
+        self.pymessenger.resnode = np.ones(config.nodes, dtype=np.int32)
+
+        nope, nedge = config.boundaries, config.edgenodes
+        pb.nope = nope
+        pb.nvel = nope*nedge
+        pb.nvell = np.full(nope, nedge, dtype=np.int32)
+        pb.nbvv = np.zeros((nope, nedge+1), dtype=np.int32)
+        pb.nbvv[:, 1:] = 1 + np.arange(pb.nvel, dtype=np.int32).reshape(nope, nedge)
+        pb.ibtype = np.full(nope, 22, dtype=np.int32)
+        pb.lbcodei = np.full(pb.nvel, 22, dtype=np.int32)
+        self.fluxnodes = pb.nbvv[:, 1:].ravel() - 1
+        self.fluxcodes = np.nonzero(np.isin(pb.lbcodei, FLUX_LBCODES))[0]
+
+        pg.eta1 = np.zeros(config.nodes, dtype=np.float64)
+        pg.eta2 = np.zeros(config.nodes, dtype=np.float64)
+        self.storage = np.zeros(config.nodes, dtype=np.float64)
+        pg.qnin1 = np.zeros(pb.nvel, dtype=np.float64)
+        pg.qnin2 = np.zeros(pb.nvel, dtype=np.float64)
+        pg.enin2 = np.zeros(pb.nvel, dtype=np.float64)
+        # Zero flux for (ten times) the whole run, as if read from a fort.20
+        # with a single all-zero record. The coupler replaces all of this.
+        pg.ftiminc = 10.0*config.rnday*86400.0
+        pg.qtime1 = pg.statim*86400.0
+        pg.qtime2 = pg.qtime1 + pg.ftiminc
+
+        self.pyadcirc_mod.itime_bgn = 1
+        self.pyadcirc_mod.itime_end = pg.nt
+        self._update_eta(pg.statim*86400.0)
+        pg.eta1[:] = pg.eta2
+        if config.ihot:
+            self._read_hotstart(config.ihot)
+        return 0
+
+    #--------------------------------------------------------------------------#
+    def pyadcirc_run(self, ntsteps):
+        '''Run ntsteps time steps, or until the end of the run.'''
+        pg, pmain = self.pyglobal, self.pyadcirc_mod
+        pmain.itime_end = min(pmain.itime_bgn + int(ntsteps) - 1, pg.nt)
+        for itime in range(pmain.itime_bgn, pmain.itime_end+1):
+            self._timestep(itime)
+        spend((pmain.itime_end - pmain.itime_bgn + 1)*self.config.adcirccost, self.config.busy)
+        pmain.itime_bgn = pmain.itime_end + 1
+        return 0
+
+    #--------------------------------------------------------------------------#
+    def pyadcirc_finalize(self):
+        for unit in list(self.units):
+            self.pycloseopenedfileforread(unit)
+        return 0
+
+    #--------------------------------------------------------------------------#
+    def pyadcirc_save_state(self):
+        '''Copy of everything carried from one time step to the next.'''
+        pg, pmain = self.pyglobal, self.pyadcirc_mod
+        return {'itime_bgn' : pmain.itime_bgn, 'itime_end' : pmain.itime_end,
+                'hotstartunit' : self.hotstartunit,
+                'qtime1' : pg.qtime1, 'qtime2' : pg.qtime2, 'ftiminc' : pg.ftiminc,
+                'arrays' : [a.copy() for a in [pg.eta1, pg.eta2, self.storage,
+                                               pg.qnin1, pg.qnin2, pg.enin2]]}
+
+    #--------------------------------------------------------------------------#
+    def pyadcirc_restore_state(self, state):
+        '''Go back to a state of pyadcirc_save_state, in place.'''
+        pg, pmain = self.pyglobal, self.pyadcirc_mod
+        pmain.itime_bgn, pmain.itime_end = state['itime_bgn'], state['itime_end']
+        self.hotstartunit = state['hotstartunit']
+        pg.qtime1, pg.qtime2, pg.ftiminc = state['qtime1'], state['qtime2'], state['ftiminc']
+        for a, saved in zip([pg.eta1, pg.eta2, self.storage, pg.qnin1, pg.qnin2, pg.enin2],
+                            state['arrays']):
+            a[:] = saved
+        return 0
+
+    ############################################################################
+    # Time stepping
+    ############################################################################
+    def _timestep(self, itime):
+        pg = self.pyglobal
+        timeh = pg.statim*86400.0 + itime*pg.dtdp
+        if timeh > pg.qtime2:
+            self._read_flux_record()
+        qratio = (timeh - pg.qtime1)/pg.ftiminc
+        qn = pg.qnin1 + qratio*(pg.qnin2 - pg.qnin1) # m2/s per boundary node
+
+        pg.eta1[:] = pg.eta2
+        self.storage *= (1.0 - STORAGE_DECAY*pg.dtdp)
+        self.storage[self.fluxnodes] += qn*pg.dtdp/FLUX_WIDTH
+        self._update_eta(timeh)
+        if pg.nhstar and itime % pg.nhsinc == 0:
+            self._write_hotstart(itime)
+
+    #--------------------------------------------------------------------------#
+    def _update_eta(self, timeh):
+        pg = self.pyglobal
+        np.add(self.storage, self.config.tide*np.sin(2.0*np.pi*timeh/TIDE_PERIOD), out=pg.eta2)
+
+    #--------------------------------------------------------------------------#
+    def _read_flux_record(self):
+        '''Shift QTIME/QNIN forward and read QNIN2 from unit 20, like ADCIRC.'''
+        pg, pb = self.pyglobal, self.pyboundaries
+        if 20 not in self.units:
+            raise RuntimeError("Synthetic ADCIRC needs the next flux record, but "
+                               "unit 20 is not open")
+        pg.qtime1 = pg.qtime2
+        pg.qtime2 = pg.qtime2 + pg.ftiminc
+        pg.qnin1[:] = pg.qnin2
+        fort20file = self.units[20]
+        for i in self.fluxcodes:
+            values = fort20file.readline().split()
+            if not values:
+                raise RuntimeError("Synthetic ADCIRC reached the end of unit 20")
+            pg.qnin2[i] = float(values[0])
+            if pb.lbcodei[i] == 32:
+                pg.enin2[i] = float(values[1])
+
+    ############################################################################
+    # Hot start
+    ############################################################################
+    def _hotstart_pathname(self, unit):
+        return 'fort.{0}'.format(unit)
+
+    #--------------------------------------------------------------------------#
+    def _write_hotstart(self, itime):
+        pg = self.pyglobal
+        with open(self._hotstart_pathname(self.hotstartunit), 'wb') as hotstartfile:
+            np.savez(hotstartfile, itime=itime, eta1=pg.eta1, eta2=pg.eta2, storage=self.storage)
+        self.hotstartunit = 68 if self.hotstartunit == 67 else 67
+
+    #--------------------------------------------------------------------------#
+    def _read_hotstart(self, unit):
+        '''Start from time step ITHS of a hot start file, like ADCIRC's IHOT.'''
+        pg, pmain = self.pyglobal, self.pyadcirc_mod
+        with np.load(self._hotstart_pathname(unit)) as data:
+            pmain.itime_bgn = int(data['itime']) + 1
+            pg.eta1[:] = data['eta1']
+            pg.eta2[:] = data['eta2']
+            self.storage[:] = data['storage']
+
+    ############################################################################
+    # File handling
+    ############################################################################
+    def pyopenfileforread(self, unit, pathname):
+        if unit in self.units:
+            return 1
+        if isinstance(pathname, bytes):
+            pathname = pathname.decode('utf-8')
+        try:
+            self.units[unit] = open(pathname.strip(), 'r')
+        except IOError:
+            return 1
+        return 0
+
+    #--------------------------------------------------------------------------#
+    def pycloseopenedfileforread(self, unit):
+        # ADCIRC's original fort.20 counts as open; closing it is fine.
+        fileobj = self.units.pop(unit, None)
+        if fileobj is not None:
+            fileobj.close()
+        return 0
+
+    #--------------------------------------------------------------------------#
+    def pyfindelapsedtime(self, itime):
+        pg = self.pyglobal
+        return pg.statim*86400.0 + itime*pg.dtdp
+
+    ############################################################################
+    # pymessenger
+    ############################################################################
+    def pymsg_dbl(self, value, comm):
+        '''Sum, max and min over a single PE.'''
+        return float(value)
+
+################################################################################
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import time
+
+################################################################################
+# Option name: (type, default, description). Every option can be given on the
+# command line as --synthetic-<name>=<value>.
+SYNTHETIC_OPTIONS = {
+    'nodes'      : (int,   10000, 'Number of ADCIRC mesh nodes'),
+    'edgenodes'  : (int,   100,   'Number of nodes per ADCIRC flux edge string'),
+    'boundaries' : (int,   1,     'Number of ADCIRC flux edge strings'),
+    'dt'         : (float, 1.0,   'ADCIRC time step, s'),
+    'rnday'      : (float, 0.25,  'Run length, days'),
+    'gsshadt'    : (float, 30.0,  'GSSHA time step, s'),
+    'gsshacells' : (int,   10000, 'Number of GSSHA grid cells'),
+    'numvals'    : (int,   8,     'Length of the GSSHA head boundary time series'),
+    'tide'       : (float, 0.5,   'M2 tide amplitude at the ADCIRC nodes, m'),
+    'nhsinc'     : (int,   0,     'ADCIRC hot start output interval, time steps; 0: none'),
+    'ihot'       : (int,   0,     'ADCIRC hot start file to start from, 67 or 68; 0: cold start'),
+    'adcirccost' : (float, 0.0,   'Extra compute time per ADCIRC time step, s'),
+    'gsshacost'  : (float, 0.0,   'Extra compute time per GSSHA time step, s'),
+    'busy'       : (int,   0,     '1: spend the extra compute time spinning, holding the GIL; '
+                                  '0: sleeping, like compiled code that releases it'),
+    'messg'      : (int,   1,     '1: run the MPI code paths on a single PE; 0: serial'),
+}
+
+################################################################################
+class syntheticconfig(): #Note: This is not a ctypes Structure!!!!
+    '''Sizes and costs of the synthetic ADCIRC and GSSHA stand-ins.
+
+    options is a dict of option name to value (a string or of the right type);
+    options left out take the defaults of SYNTHETIC_OPTIONS.
+    '''
+    def __init__(self, options=None):
+        options = dict(options or {})
+        for name, (kind, default, desc) in SYNTHETIC_OPTIONS.items():
+            setattr(self, name, kind(options.pop(name, default)))
+        if options:
+            raise ValueError("Unknown synthetic backend option(s): {0}".format(
+                ', '.join(sorted(options))))
+        if self.nodes < self.edgenodes*self.boundaries:
+            raise ValueError("Synthetic mesh has fewer nodes than its edge strings")
+        if self.edgenodes < 2 or self.boundaries < 1:
+            raise ValueError("Synthetic edge strings need at least 2 nodes")
+        if self.ihot not in [0, 67, 68]:
+            raise ValueError("Synthetic ADCIRC hot starts from fort.67 or fort.68 only")
+        if self.numvals < 4:
+            raise ValueError("Synthetic GSSHA boundary series needs at least 4 values")
+
+    def __repr__(self):
+        return 'syntheticconfig({0})'.format(', '.join(
+            '{0}={1}'.format(name, getattr(self, name)) for name in sorted(SYNTHETIC_OPTIONS)))
+
+################################################################################
+def spend(seconds, busy):
+    '''Stand in for seconds worth of model computation.'''
+    if seconds <= 0.0:
+        return
+    if not busy:
+        time.sleep(seconds)
+        return
+    tend = time.time() + seconds
+    while time.time() < tend:
+        pass
+
+################################################################################
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+from __future__ import absolute_import, print_function
+import ctypes as ct
+
+import numpy as np
+
+from .synthetic_config import spend
+
+################################################################################
+START_JULIAN = 2458849.5  # 2020-01-01 00:00
+BOUNDARY_DEPTH = 1.0      # m, initial head at the outlet
+BASE_FLOW = 1.0           # m3/s
+PEAK_FLOW = 50.0          # m3/s, on top of the base flow
+PEAK_TIME = 0.4           # fraction of the run
+PEAK_WIDTH = 0.15         # fraction of the run
+BACKWATER = 5.0           # m2/s, outflow reduction per m of head rise
+# Members of main_var_struct that change as GSSHA runs.
+_RUN_STATE = ['timer', 'niter', 'go', 'btime', 'single_event_end', 'vout', 'qout']
+
+################################################################################
+class define_h(): #Note: This is not a ctypes Structure!!!!
+    '''Stand-in for gsshapython.sclass.define_h.'''
+    ON = 1
+    OFF = 0
+
+class types_h(): #Note: This is not a ctypes Structure!!!!
+    '''Stand-in for gsshapython.sclass.types_h.'''
+    TRUE = 1
+    FALSE = 0
+
+################################################################################
+class ts_struct(ct.Structure):
+    '''The members of GSSHA's time series struct that watercoupler uses.'''
+    _fields_ = [
+        ('num_vals',    ct.c_int),
+        ('last_access', ct.c_int),
+        ('jul_time',    ct.POINTER(ct.c_double)),
+        ('val',         ct.POINTER(ct.c_double)),
+    ]
+
+class main_var_struct(ct.Structure):
+    '''The members of GSSHA's main_var_struct that watercoupler uses.'''
+    _fields_ = [
+        ('timer',            ct.c_double), # minutes
+        ('niter',            ct.c_int),    # minutes
+        ('go',               ct.c_int),
+        ('dt',               ct.c_double), # seconds
+        ('btime',            ct.c_double), # Julian, current time
+        ('b_lt_start',       ct.c_double), # Julian, start time
+        ('single_event_end', ct.c_double), # Julian
+        ('vout',             ct.c_double), # m3
+        ('qout',             ct.c_double), # m3/s
+        ('yes_head_bound',   ct.c_int),
+        ('bound_ts',         ct.c_int),
+        ('bound_ts_ptr',     ct.POINTER(ts_struct)),
+        ('boundary_depth',   ct.c_double), # m
+        ('nlinks',           ct.c_int),
+        ('nx',               ct.POINTER(ct.c_int)),
+        ('area',             ct.POINTER(ct.POINTER(ct.c_double))),
+        ('chan_depth',       ct.POINTER(ct.POINTER(ct.c_double))),
+    ]
+
+################################################################################
+class syntheticgssha(): #Note: This is not a ctypes Structure!!!!
+    '''Stand-in for gsshapython's fnctn_h, with GSSHA state in ctypes structs.
+
+    A watershed of config.gsshacells cells drains through one outlet with a
+    Gaussian hydrograph on top of a base flow. The outlet discharge drops as
+    the head boundary series, which the coupler sets from ADCIRC, rises above
+    its initial value. The head is read from bound_ts_ptr[0] the way GSSHA
+    does, i.e., interpolated in Julian time from last_access on. Unlike
+    gsshapython, it can also save its state in memory and go back to it.
+    '''
+    def __init__(self, config):
+        self.config = config
+        self.mv = main_var_struct()
+        self.mvs = ct.POINTER(main_var_struct)()
+
+        # Buffers must outlive the structs pointing at them.
+        n = config.numvals
+        self.ts = ts_struct()
+        self.jul_time = (ct.c_double*n)()
+        self.val = (ct.c_double*n)()
+        self.nx = (ct.c_int*2)(1, 1)
+        self.rows = [(ct.c_double*2)(1.0, 1.0) for i in range(4)]
+        self.area = (ct.POINTER(ct.c_double)*2)(self.rows[0], self.rows[1])
+        self.chan_depth = (ct.POINTER(ct.c_double)*2)(self.rows[2], self.rows[3])
+        self.cells = np.zeros(config.gsshacells, dtype=np.float64)
+
+    #--------------------------------------------------------------------------#
+    def main_gssha_initialize(self, pmvs, prj_name, sm, prj_name2):
+        config, mv, ts = self.config, self.mv, self.ts
+        ts.num_vals = config.numvals
+        ts.last_access = 0
+        ts.jul_time = ct.cast(self.jul_time, ct.POINTER(ct.c_double))
+        ts.val = ct.cast(self.val, ct.POINTER(ct.c_double))
+        for i in range(config.numvals):
+            self.jul_time[i] = START_JULIAN + i*config.rnday/(config.numvals-1)
+            self.val[i] = BOUNDARY_DEPTH
+
+        mv.timer = 0.0
+        mv.niter = int(round(config.rnday*1440.0))
+        mv.go = types_h.TRUE
+        mv.dt = config.gsshadt
+        mv.btime = START_JULIAN
+        mv.b_lt_start = START_JULIAN
+        mv.single_event_end = START_JULIAN + mv.niter/1440.0
+        mv.vout = 0.0
+        mv.qout = BASE_FLOW
+        mv.yes_head_bound = 1
+        mv.bound_ts = 1
+        mv.bound_ts_ptr = ct.pointer(ts)
+        mv.boundary_depth = BOUNDARY_DEPTH
+        mv.nlinks = 1
+        mv.nx = ct.cast(self.nx, ct.POINTER(ct.c_int))
+        mv.area = ct.cast(self.area, ct.POINTER(ct.POINTER(ct.c_double)))
+        mv.chan_depth = ct.cast(self.chan_depth, ct.POINTER(ct.POINTER(ct.c_double)))
+
+        # pmvs is byref(mvs): point mvs at the main struct, like GSSHA does.
+        getattr(pmvs, '_obj', pmvs).contents = mv
+        return 0
+
+    #--------------------------------------------------------------------------#
+    def main_gssha_run(self, mvs):
+        '''Run until niter minutes or single_event_end, whichever is first.'''
+        mv = mvs[0]
+        tend = min(float(mv.niter), (mv.single_event_end - mv.b_lt_start)*1440.0)
+        nsteps = 0
+        while mv.go and mv.timer + mv.dt/60.0 <= tend + 1.0E-6:
+            self._timestep(mv)
+            nsteps += 1
+        spend(nsteps*self.config.gsshacost, self.config.busy)
+        mv.go = types_h.FALSE
+        return 0
+
+    #--------------------------------------------------------------------------#
+    def main_gssha_finalize(self, mvs):
+        return 0
+
+    #--------------------------------------------------------------------------#
+    def main_gssha_save_state(self, mvs):
+        '''Copy of everything carried from one time step to the next, but the
+        head boundary series, which the coupler owns.'''
+        mv = mvs[0]
+        state = dict((name, getattr(mv, name)) for name in _RUN_STATE)
+        state['cells'] = self.cells.copy()
+        return state
+
+    #--------------------------------------------------------------------------#
+    def main_gssha_restore_state(self, mvs, state):
+        '''Go back to a state of main_gssha_save_state, in place.'''
+        mv = mvs[0]
+        for name in _RUN_STATE:
+            setattr(mv, name, state[name])
+        self.cells[:] = state['cells']
+        return 0
+
+    ############################################################################
+    def _timestep(self, mv):
+        mv.timer += mv.dt/60.0
+        mv.btime = mv.b_lt_start + mv.timer/1440.0
+        # Not niter: the coupler moves niter along with the coupling windows.
+        fraction = mv.timer/(self.config.rnday*1440.0)
+
+        # Stand-in for the overland and channel routing work.
+        self.cells *= 0.999
+        self.cells += 1.0E-3
+
+        head = self._boundary_head(mv, mv.btime)
+        qout = BASE_FLOW + PEAK_FLOW*np.exp(-((fraction - PEAK_TIME)/PEAK_WIDTH)**2) \
+                - BACKWATER*(head - BOUNDARY_DEPTH)
+        mv.qout = max(0.0, float(qout))
+        mv.vout += mv.qout*mv.dt
+
+    #--------------------------------------------------------------------------#
+    def _boundary_head(self, mv, julian):
+        '''Head boundary value at a Julian time, searched from last_access on.'''
+        if not (mv.yes_head_bound and mv.bound_ts):
+            return BOUNDARY_DEPTH
+        ts = mv.bound_ts_ptr[0]
+        n = ts.num_vals
+        i = min(max(ts.last_access, 0), n-2)
+        while i < n-2 and julian > ts.jul_time[i+1]:
+            i += 1
+        ts.last_access = i
+        t0, t1 = ts.jul_time[i], ts.jul_time[i+1]
+        if t1 <= t0:
+            return ts.val[i+1]
+        ratio = min(max((julian - t0)/(t1 - t0), 0.0), 1.0)
+        return ts.val[i] + ratio*(ts.val[i+1] - ts.val[i])
+
+################################################################################
+if __name__ == '__main__':
+    pass
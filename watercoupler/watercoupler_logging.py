@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+#------------------------------------------------------------------------------#
+# watercoupler - Software for coupling hydrodynamic and hydrologic software
+# LICENSE: BSD 3-Clause "New" or "Revised"
+#------------------------------------------------------------------------------#
+"""
+Rank-aware logging for watercoupler.
+
+Every watercoupler module logs through logging.getLogger(__name__), i.e., a
+child of the 'watercoupler' logger configured here. The level comes from the
+--log-level command line option or the WATERCOUPLER_LOG_LEVEL environment
+variable (default INFO). Console output comes from PE 0 only, unless
+WATERCOUPLER_LOG_RANKS is 'all' or a comma separated list of PEs. With
+WATERCOUPLER_LOG_DIR set, every PE also writes all of its messages to its own
+file, watercoupler.PE<myid>.log, in that directory.
+
+Messages use lazy %-formatting, and diagnostics that cost anything to compute
+are guarded by log.isEnabledFor(...), so that disabled levels cost nothing.
+"""
+
+from __future__ import absolute_import, print_function
+
+import logging
+import os
+import sys
+
+################################################################################
+LOGGER_NAME = 'watercoupler'
+DEFAULT_LEVEL = 'INFO'
+
+# Environment variables set by common MPI launchers, used to know the rank
+# before ADCIRC has initialized MPI.
+_RANK_ENVIRON = ['OMPI_COMM_WORLD_RANK', 'PMI_RANK', 'PMIX_RANK',
+                 'MV2_COMM_WORLD_RANK', 'SLURM_PROCID']
+
+_state = {'myid': None, 'ranks': None, 'logdir': None, 'filehandler': None}
+
+################################################################################
+def _environ_rank():
+    for name in _RANK_ENVIRON:
+        if name in os.environ:
+            try:
+                return int(os.environ[name])
+            except ValueError:
+                pass
+    return 0
+
+#------------------------------------------------------------------------------#
+def logging_rank():
+    '''This process's PE: ADCIRC's, once set, or else the MPI launcher's.'''
+    if _state['myid'] is None:
+        return _environ_rank()
+    return _state['myid']
+
+#------------------------------------------------------------------------------#
+def _parse_level(level):
+    if isinstance(level, int):
+        return level
+    level = str(level).strip().upper()
+    if level.isdigit():
+        return int(level)
+    value = logging.getLevelName(level)
+    if not isinstance(value, int):
+        raise ValueError("Unknown log level '{0}'".format(level))
+    return value
+
+#------------------------------------------------------------------------------#
+def _parse_ranks(ranks):
+    ranks = str(ranks).strip().lower()
+    if ranks == 'all':
+        return None
+    return set(int(r) for r in ranks.split(',') if r.strip())
+
+################################################################################
+class _RankFilter(logging.Filter):
+    '''Adds the PE number to every record and, if console is set, drops the
+    records of PEs not selected for console output.'''
+    def __init__(self, console):
+        logging.Filter.__init__(self)
+        self.console = console
+
+    def filter(self, record):
+        record.myid = _state['myid']
+        if self.console and _state['ranks'] is not None:
+            return _state['myid'] in _state['ranks']
+        return True
+
+################################################################################
+def configure_logging(level=None, ranks=None, logdir=None):
+    '''Set up the 'watercoupler' logger. Arguments left as None are taken from
+    the WATERCOUPLER_LOG_LEVEL/_RANKS/_DIR environment variables.'''
+    if level is None:
+        level = os.environ.get('WATERCOUPLER_LOG_LEVEL', DEFAULT_LEVEL)
+    if ranks is None:
+        ranks = os.environ.get('WATERCOUPLER_LOG_RANKS', '0')
+    if logdir is None:
+        logdir = os.environ.get('WATERCOUPLER_LOG_DIR', None)
+
+    if _state['myid'] is None:
+        _state['myid'] = _environ_rank()
+    _state['ranks'] = _parse_ranks(ranks)
+    _state['logdir'] = logdir
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(_parse_level(level))
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+    console = logging.StreamHandler(sys.stdout)
+    if _state['ranks'] is not None and len(_state['ranks']) == 1:
+        console.setFormatter(logging.Formatter('%(message)s'))
+    else:
+        console.setFormatter(logging.Formatter('PE[%(myid)s] %(message)s'))
+    console.addFilter(_RankFilter(console=True))
+    logger.addHandler(console)
+
+    _state['filehandler'] = None
+    _open_rank_file()
+    return logger
+
+#------------------------------------------------------------------------------#
+def _open_rank_file():
+    logger = logging.getLogger(LOGGER_NAME)
+    if _state['filehandler'] is not None:
+        logger.removeHandler(_state['filehandler'])
+        _state['filehandler'].close()
+        _state['filehandler'] = None
+    if not _state['logdir']:
+        return
+    try:
+        os.makedirs(_state['logdir'])
+    except OSError:
+        # Another PE may have just created it.
+        if not os.path.isdir(_state['logdir']):
+            raise
+    pathname = os.path.join(_state['logdir'], 'watercoupler.PE{0:04d}.log'.format(_state['myid']))
+    handler = logging.FileHandler(pathname, mode='w')
+    handler.setFormatter(logging.Formatter(
+        '%(asctime)s PE[%(myid)s] %(levelname)s %(name)s: %(message)s'))
+    handler.addFilter(_RankFilter(console=False))
+    logger.addHandler(handler)
+    _state['filehandler'] = handler
+
+#------------------------------------------------------------------------------#
+def set_logging_rank(myid):
+    '''Set the PE number once ADCIRC has initialized MPI.'''
+    if myid == _state['myid']:
+        return
+    _state['myid'] = myid
+    _open_rank_file()
+
+################################################################################
+if __name__ == '__main__':
+    pass